@@ -4,84 +4,173 @@ Handles sales reports, expenses, profit & loss, balance sheet, and tax managemen
 """
 
 import database
+import inventory_manager
+import ledger
+import report_cache
+import sales_summary
 from datetime import datetime, timedelta
 
 class AccountingSystem:
     """Accounting system for financial management"""
     
+    # Orders fetched per page/batch of the sales report
+    SALES_REPORT_PAGE_SIZE = 100
+    
     @staticmethod
+    @report_cache.ReportCache.cached(('orders',), ttl=60)
     def get_daily_sales_report(date=None):
-        """Get daily sales report"""
+        """Get daily sales report for a business date (default: today's)"""
         if date is None:
-            date = datetime.now().strftime('%Y-%m-%d')
+            date = database.get_business_date_string()
+        date = str(date)
         
         conn = database.get_connection()
         cursor = conn.cursor()
         
-        # Get orders for the day
+        # Order totals for the business day (idx_orders_business_date), the
+        # same day basis as the daily summaries and the corrections below
         cursor.execute("""
-            SELECT o.id, o.total_amount, o.gst_amount, o.final_amount, o.service_charge,
-                   oi.menu_item_id, oi.quantity, oi.price as item_price,
-                   mi.name as item_name
-            FROM orders o
-            LEFT JOIN order_items oi ON o.id = oi.order_id
-            LEFT JOIN menu_items mi ON oi.menu_item_id = mi.id
-            WHERE DATE(o.order_date) = ?
-            AND o.status = 'completed'
+            SELECT COUNT(*) as order_count,
+                   COALESCE(SUM(total_amount), 0) as total_sales,
+                   COALESCE(SUM(gst_amount), 0) as total_gst,
+                   COALESCE(SUM(service_charge), 0) as total_service_charge,
+                   COALESCE(SUM(final_amount), 0) as total_revenue
+            FROM orders
+            WHERE business_date = ? AND status = 'completed'
         """, (date,))
+        totals = dict(cursor.fetchone())
         
-        orders_data = cursor.fetchall()
-        conn.close()
+        # Net of voids, refunds and amendments made that business day
+        corrections = sales_summary.SalesSummary._correction_totals(cursor, date, date)
+        totals['order_count'] -= corrections['voided_count']
+        totals['total_sales'] += corrections['subtotal']
+        totals['total_gst'] += corrections['gst_amount']
+        totals['total_service_charge'] += corrections['service_charge']
+        totals['total_revenue'] += corrections['final_amount']
+        
+        # Item rollup, less the lines of bills voided that business day
+        cursor.execute("""
+            SELECT mi.name as item_name,
+                   SUM(l.quantity) as quantity,
+                   SUM(l.revenue) as revenue
+            FROM (
+                SELECT oi.menu_item_id, oi.quantity, oi.price * oi.quantity as revenue
+                FROM orders o
+                JOIN order_items oi ON o.id = oi.order_id
+                WHERE o.business_date = ? AND o.status = 'completed'
+                UNION ALL
+                SELECT oi.menu_item_id, -oi.quantity, -oi.price * oi.quantity
+                FROM order_corrections c
+                JOIN orders o ON o.id = c.order_id
+                JOIN order_items oi ON oi.order_id = c.order_id
+                WHERE c.business_date = ? AND c.correction_type = 'void' AND o.status = 'completed'
+            ) l
+            JOIN menu_items mi ON l.menu_item_id = mi.id
+            GROUP BY mi.name
+            HAVING SUM(l.quantity) != 0
+        """, (date, date))
         
-        # Process data
-        total_sales = 0
-        total_gst = 0
-        total_service_charge = 0
-        total_final = 0
         items_sold = {}
+        for row in cursor.fetchall():
+            items_sold[row['item_name']] = {'quantity': row['quantity'] or 0, 'revenue': row['revenue'] or 0}
         
-        for order in orders_data:
-            order_id, total, gst, final, service, menu_id, qty, item_price, item_name = order
-            
-            if order_id not in [o[0] for o in orders_data if o[0] == order_id]:
-                # Count each order once
-                total_sales += total or 0
-                total_gst += gst or 0
-                total_service_charge += service or 0
-                total_final += final or 0
-            
-            if item_name:
-                if item_name not in items_sold:
-                    items_sold[item_name] = {'quantity': 0, 'revenue': 0}
-                items_sold[item_name]['quantity'] += qty or 0
-                items_sold[item_name]['revenue'] += (item_price or 0) * (qty or 0)
+        conn.close()
         
         return {
             'date': date,
-            'total_sales': total_sales,
-            'total_gst': total_gst,
-            'total_service_charge': total_service_charge,
-            'total_revenue': total_final,
+            'total_sales': totals['total_sales'],
+            'total_gst': totals['total_gst'],
+            'total_service_charge': totals['total_service_charge'],
+            'total_revenue': totals['total_revenue'],
             'items_sold': items_sold,
-            'order_count': len(set([o[0] for o in orders_data]))
+            'order_count': totals['order_count']
         }
     
     @staticmethod
     def get_payment_method_breakdown(start_date=None, end_date=None):
-        """Get payment method breakdown"""
+        """Get payment method breakdown for a range of business dates"""
         if start_date is None:
-            start_date = datetime.now().strftime('%Y-%m-%d')
+            start_date = database.get_business_date_string()
         if end_date is None:
             end_date = start_date
         
-        # Note: Payment method is not stored in orders table currently
-        # This is a placeholder for future implementation
-        return {
-            'cash': 0,
-            'card': 0,
-            'upi': 0,
-            'total': 0
-        }
+        breakdown = sales_summary.SalesSummary.get_payment_totals(start_date, end_date)
+        breakdown['total'] = sum(breakdown.values())
+        return breakdown
+    
+    @staticmethod
+    def get_shift_payment_breakdown(start_time, end_time=None):
+        """
+        Payment method breakdown between two timestamps (shift close)
+        Args:
+            start_time: Shift start, 'YYYY-MM-DD HH:MM:SS'
+            end_time: Shift end (default now)
+        """
+        if end_time is None:
+            end_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        # Served entirely from idx_order_payments_paid_at
+        cursor.execute("""
+            SELECT payment_method, SUM(amount)
+            FROM order_payments
+            WHERE paid_at >= ? AND paid_at <= ?
+            GROUP BY payment_method
+        """, (start_time, end_time))
+        
+        breakdown = {method: 0 for method in sales_summary.SalesSummary.PAYMENT_METHODS}
+        for method, amount in cursor.fetchall():
+            breakdown[method] = amount or 0
+        conn.close()
+        
+        breakdown['total'] = sum(breakdown.values())
+        return breakdown
+    
+    @staticmethod
+    def set_payment_account(payment_method, account_id):
+        """Route a payment method's receipts to an account"""
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("""
+                INSERT INTO payment_method_accounts (payment_method, account_id)
+                VALUES (?, ?)
+                ON CONFLICT (payment_method) DO UPDATE SET account_id = excluded.account_id
+            """, (sales_summary.SalesSummary.normalize_payment_method(payment_method), account_id))
+            
+            conn.commit()
+            conn.close()
+            return True, "Payment account updated successfully"
+        except Exception as e:
+            conn.close()
+            return False, f"Error: {str(e)}"
+    
+    @staticmethod
+    def _get_payment_accounts(cursor):
+        """Payment method -> account id (unmapped methods go to the cash account)"""
+        cursor.execute("SELECT payment_method, account_id FROM payment_method_accounts")
+        return {row[0]: row[1] for row in cursor.fetchall()}
+    
+    @staticmethod
+    def _record_order_payments(cursor, order_id, business_date, payments):
+        """
+        Store the tenders of an order (caller commits)
+        Args:
+            payments: List of (payment_method, amount); several entries for a split payment
+        """
+        accounts = AccountingSystem._get_payment_accounts(cursor)
+        paid_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        cursor.executemany("""
+            INSERT INTO order_payments (order_id, payment_method, amount, account_id, business_date, paid_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (order_id, method, amount, accounts.get(method, 1), business_date, paid_at)
+            for method, amount in payments
+        ])
     
     @staticmethod
     def add_expense(date, category, amount, description='', payment_method='cash'):
@@ -95,7 +184,12 @@ class AccountingSystem:
                 VALUES (?, ?, ?, ?, ?)
             """, (date, category, amount, description, payment_method))
             
+            ledger.Ledger._post_expense(
+                cursor, cursor.lastrowid, date, amount, payment_method, description or category
+            )
+            
             conn.commit()
+            report_cache.ReportCache.invalidate('expenses')
             conn.close()
             return True, "Expense added successfully"
         except Exception as e:
@@ -148,6 +242,7 @@ class AccountingSystem:
         return summary
     
     @staticmethod
+    @report_cache.ReportCache.cached(('orders', 'expenses', 'ingredients', 'menu_ingredients'))
     def get_profit_loss(start_date=None, end_date=None):
         """Calculate Profit & Loss statement"""
         if start_date is None:
@@ -155,58 +250,319 @@ class AccountingSystem:
         if end_date is None:
             end_date = datetime.now().strftime('%Y-%m-%d')
         
-        # Get revenue from orders
+        # Closed months come from their snapshots, the rest from live data
+        totals = AccountingSystem.get_period_totals(start_date, end_date)
+        revenue = totals['revenue']
+        expenses = totals['expenses']
+        
+        # Ingredient costs (COGS) at the FIFO lot prices actually paid, and
+        # what the dishes sold should have cost per their recipes
+        cogs = totals['cogs']
+        recipe_cogs = totals['recipe_cogs']
+        
+        # Calculate metrics
+        gross_profit = revenue - cogs
+        net_profit = gross_profit - expenses
+        
+        return {
+            'period': f"{start_date} to {end_date}",
+            'revenue': revenue,
+            'cost_of_goods_sold': cogs,
+            'recipe_cogs': recipe_cogs,
+            'cogs_variance': cogs - recipe_cogs,
+            'gross_profit': gross_profit,
+            'expenses': expenses,
+            'net_profit': net_profit
+        }
+    
+    @staticmethod
+    def get_recipe_cogs(start_date, end_date):
+        """
+        Recipe (standard) cost of the dishes sold in a range of business dates
+        
+        One join of the period's order items against menu_item_cost; dishes
+        without a recipe count as zero cost.
+        """
         conn = database.get_connection()
         cursor = conn.cursor()
         
+        recipe_cogs = AccountingSystem._recipe_cogs(cursor, start_date, end_date)
+        conn.close()
+        return recipe_cogs
+    
+    @staticmethod
+    def _recipe_cogs(cursor, start_date, end_date):
+        """
+        Recipe cost of the dishes sold in a range of business dates, on an open cursor
+        
+        Like revenue, the dishes of a voided bill come off on the void's own
+        business date.
+        """
         cursor.execute("""
-            SELECT SUM(final_amount) as revenue
-            FROM orders
-            WHERE DATE(order_date) BETWEEN ? AND ?
-            AND status = 'completed'
+            SELECT COALESCE(SUM(l.quantity * c.recipe_cost), 0)
+            FROM (
+                SELECT oi.menu_item_id, oi.quantity
+                FROM orders o
+                JOIN order_items oi ON oi.order_id = o.id
+                WHERE o.business_date BETWEEN ? AND ?
+                AND o.status = 'completed'
+                UNION ALL
+                SELECT oi.menu_item_id, -oi.quantity
+                FROM order_corrections v
+                JOIN orders o ON o.id = v.order_id
+                JOIN order_items oi ON oi.order_id = v.order_id
+                WHERE v.business_date BETWEEN ? AND ?
+                AND v.correction_type = 'void' AND o.status = 'completed'
+            ) l
+            JOIN menu_item_cost c ON c.menu_item_id = l.menu_item_id
+        """, (str(start_date), str(end_date)) * 2)
+        return cursor.fetchone()[0]
+    
+    @staticmethod
+    def _live_period_totals(cursor, start_date, end_date):
+        """
+        P&L and GST totals for a range of business dates from live data
+        Returns:
+            Dict with order_count, subtotal, revenue, gst_collected, service_charge,
+            discount, cogs, recipe_cogs, expenses and expenses_by_category
+        """
+        start_date, end_date = str(start_date), str(end_date)
+        cursor.execute("""
+            SELECT COALESCE(SUM(order_count), 0), COALESCE(SUM(subtotal), 0),
+                   COALESCE(SUM(final_amount), 0), COALESCE(SUM(gst_amount), 0),
+                   COALESCE(SUM(service_charge), 0), COALESCE(SUM(discount), 0)
+            FROM daily_sales_summary
+            WHERE business_date BETWEEN ? AND ?
         """, (start_date, end_date))
+        order_count, subtotal, revenue, gst_collected, service_charge, discount = cursor.fetchone()
         
-        revenue_result = cursor.fetchone()
-        revenue = revenue_result[0] if revenue_result[0] else 0
+        # Voids, refunds and amendments count on the day they were made
+        corrections = sales_summary.SalesSummary._correction_totals(cursor, start_date, end_date)
+        order_count -= corrections['voided_count']
+        subtotal += corrections['subtotal']
+        revenue += corrections['final_amount']
+        gst_collected += corrections['gst_amount']
+        service_charge += corrections['service_charge']
+        discount += corrections['discount']
         
-        # Get expenses
         cursor.execute("""
-            SELECT SUM(amount) as expenses
+            SELECT category, SUM(amount)
             FROM expenses
             WHERE date BETWEEN ? AND ?
+            GROUP BY category
         """, (start_date, end_date))
+        expenses_by_category = {category: amount for category, amount in cursor.fetchall()}
         
-        expenses_result = cursor.fetchone()
-        expenses = expenses_result[0] if expenses_result[0] else 0
-        
-        # Get ingredient costs (COGS)
+        return {
+            'order_count': order_count,
+            'subtotal': subtotal,
+            'revenue': revenue,
+            'gst_collected': gst_collected,
+            'service_charge': service_charge,
+            'discount': discount,
+            'cogs': inventory_manager.InventoryManager._consumption_cost(cursor, start_date, end_date),
+            'recipe_cogs': AccountingSystem._recipe_cogs(cursor, start_date, end_date),
+            'expenses': sum(expenses_by_category.values()),
+            'expenses_by_category': expenses_by_category
+        }
+    
+    @staticmethod
+    def _split_range(cursor, start_date, end_date):
+        """
+        Split a date range into closed periods and the open stretches between them
+        Returns:
+            (closed periods fully inside the range, list of (start, end) open ranges)
+        """
+        start_date, end_date = str(start_date), str(end_date)
         cursor.execute("""
-            SELECT SUM(oi.quantity * mi.cost_per_unit) as cogs
-            FROM order_items oi
-            JOIN orders o ON oi.order_id = o.id
-            JOIN menu_ingredients ming ON oi.menu_item_id = ming.menu_item_id
-            JOIN ingredients ing ON ming.ingredient_id = ing.id
-            WHERE DATE(o.order_date) BETWEEN ? AND ?
-            AND o.status = 'completed'
+            SELECT period, start_date, end_date FROM accounting_periods
+            WHERE status = 'closed' AND start_date >= ? AND end_date <= ?
+            ORDER BY period
         """, (start_date, end_date))
         
-        cogs_result = cursor.fetchone()
-        cogs = cogs_result[0] if cogs_result[0] else 0
+        closed = []
+        open_ranges = []
+        next_open = start_date
+        for period, period_start, period_end in cursor.fetchall():
+            if period_start > next_open:
+                day_before = datetime.strptime(period_start, '%Y-%m-%d') - timedelta(days=1)
+                open_ranges.append((next_open, day_before.strftime('%Y-%m-%d')))
+            closed.append(period)
+            next_open = (datetime.strptime(period_end, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        
+        if next_open <= end_date:
+            open_ranges.append((next_open, end_date))
+        return closed, open_ranges
+    
+    @staticmethod
+    def get_period_totals(start_date, end_date):
+        """
+        P&L and GST totals for a range of business dates
+        
+        Months closed with close_period are read from their snapshots; only
+        the days outside closed months are computed from live data.
+        Returns:
+            Same dict as _live_period_totals
+        """
+        conn = database.get_connection()
+        cursor = conn.cursor()
         
-        conn.close()
+        closed, open_ranges = AccountingSystem._split_range(cursor, start_date, end_date)
+        parts = [AccountingSystem._live_period_totals(cursor, start, end) for start, end in open_ranges]
+        
+        if closed:
+            placeholders = ','.join(['?'] * len(closed))
+            cursor.execute(f"""
+                SELECT SUM(order_count) as order_count, SUM(subtotal) as subtotal,
+                       SUM(revenue) as revenue, SUM(gst_collected) as gst_collected,
+                       SUM(service_charge) as service_charge, SUM(discount) as discount,
+                       SUM(cogs) as cogs, SUM(recipe_cogs) as recipe_cogs, SUM(expenses) as expenses
+                FROM period_snapshots
+                WHERE period IN ({placeholders})
+            """, closed)
+            snapshot = dict(cursor.fetchone())
+            cursor.execute(f"""
+                SELECT category, SUM(amount) FROM period_expense_snapshots
+                WHERE period IN ({placeholders})
+                GROUP BY category
+            """, closed)
+            snapshot['expenses_by_category'] = {category: amount for category, amount in cursor.fetchall()}
+            parts.append(snapshot)
         
-        # Calculate metrics
-        gross_profit = revenue - cogs
-        net_profit = gross_profit - expenses
+        conn.close()
         
-        return {
-            'period': f"{start_date} to {end_date}",
-            'revenue': revenue,
-            'cost_of_goods_sold': cogs,
-            'gross_profit': gross_profit,
-            'expenses': expenses,
-            'net_profit': net_profit
+        totals = {
+            'order_count': 0, 'subtotal': 0, 'revenue': 0, 'gst_collected': 0, 'service_charge': 0,
+            'discount': 0, 'cogs': 0, 'recipe_cogs': 0, 'expenses': 0, 'expenses_by_category': {}
         }
+        for part in parts:
+            for key, value in part.items():
+                if key == 'expenses_by_category':
+                    for category, amount in value.items():
+                        totals[key][category] = totals[key].get(category, 0) + amount
+                else:
+                    totals[key] += value or 0
+        return totals
+    
+    @staticmethod
+    def close_period(period):
+        """
+        Close a month: freeze its totals and make it read-only
+        Args:
+            period: 'YYYY-MM'
+        
+        Snapshots revenue, GST, COGS and expenses by category, snapshots the
+        ledger's closing balances and locks the period so later writes dated
+        inside it (bills, payments, expenses, journal lines) are rejected.
+        Months are closed in order and only once they have ended.
+        """
+        try:
+            period_start = datetime.strptime(period, '%Y-%m').strftime('%Y-%m-%d')
+        except (TypeError, ValueError):
+            return False, "Period must be in YYYY-MM format"
+        period_end = ledger.Ledger._period_end(period)
+        
+        if period_end >= database.get_business_date_string():
+            return False, f"Period {period} has not ended yet"
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT MAX(period) FROM accounting_periods WHERE status = 'closed'")
+            last_closed = cursor.fetchone()[0]
+            if last_closed and last_closed >= period:
+                conn.close()
+                return False, f"Period {last_closed} is already closed"
+            
+            totals = AccountingSystem._live_period_totals(cursor, period_start, period_end)
+            closed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            
+            cursor.execute("""
+                INSERT INTO accounting_periods (period, start_date, end_date, status, closed_at)
+                VALUES (?, ?, ?, 'closed', ?)
+                ON CONFLICT (period) DO UPDATE SET status = 'closed', closed_at = excluded.closed_at
+            """, (period, period_start, period_end, closed_at))
+            cursor.execute("""
+                INSERT OR REPLACE INTO period_snapshots
+                (period, order_count, subtotal, revenue, gst_collected, service_charge, discount,
+                 cogs, recipe_cogs, expenses, closed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                period, totals['order_count'], totals['subtotal'], totals['revenue'],
+                totals['gst_collected'], totals['service_charge'], totals['discount'],
+                totals['cogs'], totals['recipe_cogs'], totals['expenses'], closed_at
+            ))
+            cursor.execute("DELETE FROM period_expense_snapshots WHERE period = ?", (period,))
+            cursor.executemany("""
+                INSERT INTO period_expense_snapshots (period, category, amount)
+                VALUES (?, ?, ?)
+            """, [(period, category, amount) for category, amount in totals['expenses_by_category'].items()])
+            
+            ledger.Ledger._close_period(cursor, period)
+            
+            conn.commit()
+            report_cache.ReportCache.invalidate('orders', 'expenses', 'ingredients')
+            conn.close()
+            return True, f"Period {period} closed"
+        except ValueError as e:
+            conn.rollback()
+            conn.close()
+            return False, str(e)
+        except Exception as e:
+            conn.rollback()
+            conn.close()
+            return False, f"Error: {str(e)}"
+    
+    @staticmethod
+    def reopen_period(period):
+        """
+        Reopen the most recently closed month so corrections can be made
+        
+        Its snapshots are dropped; close it again afterwards.
+        """
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT MAX(period) FROM accounting_periods WHERE status = 'closed'")
+            last_closed = cursor.fetchone()[0]
+            if last_closed != period:
+                conn.close()
+                return False, "Only the most recently closed period can be reopened"
+            
+            cursor.execute("UPDATE accounting_periods SET status = 'open', closed_at = NULL WHERE period = ?",
+                           (period,))
+            cursor.execute("DELETE FROM period_snapshots WHERE period = ?", (period,))
+            cursor.execute("DELETE FROM period_expense_snapshots WHERE period = ?", (period,))
+            cursor.execute("DELETE FROM ledger_period_balances WHERE period = ?", (period,))
+            
+            conn.commit()
+            report_cache.ReportCache.invalidate('orders', 'expenses', 'ingredients')
+            conn.close()
+            return True, f"Period {period} reopened"
+        except Exception as e:
+            conn.rollback()
+            conn.close()
+            return False, f"Error: {str(e)}"
+    
+    @staticmethod
+    def get_accounting_periods():
+        """Closed (and reopened) periods with their frozen totals, newest first"""
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT p.period, p.start_date, p.end_date, p.status, p.closed_at,
+                   s.order_count, s.revenue, s.gst_collected, s.cogs, s.expenses
+            FROM accounting_periods p
+            LEFT JOIN period_snapshots s ON s.period = p.period
+            ORDER BY p.period DESC
+        """)
+        
+        periods = cursor.fetchall()
+        conn.close()
+        return periods
     
     @staticmethod
     def get_inventory_valuation():
@@ -214,9 +570,22 @@ class AccountingSystem:
         conn = database.get_connection()
         cursor = conn.cursor()
         
+        # Open lots at the price paid; stock that predates lot tracking
+        # falls back to the ingredient's cost_per_unit
         cursor.execute("""
-            SELECT SUM(current_stock * cost_per_unit) as valuation
-            FROM ingredients
+            SELECT SUM(
+                COALESCE(l.lot_value, 0) +
+                MAX(i.current_stock - COALESCE(l.lot_quantity, 0), 0) * i.cost_per_unit
+            ) as valuation
+            FROM ingredients i
+            LEFT JOIN (
+                SELECT ingredient_id,
+                       SUM(remaining_quantity) as lot_quantity,
+                       SUM(remaining_quantity * unit_price) as lot_value
+                FROM stock_lots
+                WHERE remaining_quantity > 0
+                GROUP BY ingredient_id
+            ) l ON l.ingredient_id = i.id
         """)
         
         result = cursor.fetchone()
@@ -226,33 +595,30 @@ class AccountingSystem:
         return valuation
     
     @staticmethod
-    def get_balance_sheet():
-        """Get balance sheet"""
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        # Get accounts balance
-        cursor.execute("SELECT SUM(balance) as total FROM accounts")
-        cash_bank = cursor.fetchone()[0] or 0
-        
-        # Get inventory valuation
+    def get_balance_sheet(as_of=None):
+        """
+        Get balance sheet
+        Args:
+            as_of: Date 'YYYY-MM-DD' (default: all postings)
+        
+        Cash/bank and liabilities come from the general ledger; inventory is
+        valued from the open FIFO stock lots.
+        """
+        balances = ledger.Ledger.get_account_balances(as_of)
+        
+        def total(account_type, cash_only=False):
+            return sum(
+                account['balance'] for account in balances
+                if account['account_type'] == account_type
+                and (not cash_only or account['cash_account_id'] is not None)
+            )
+        
+        cash_bank = total('asset', cash_only=True)
         inventory_value = AccountingSystem.get_inventory_valuation()
-        
-        # Calculate total assets
         total_assets = cash_bank + inventory_value
         
-        # Get total expenses as liabilities estimate
-        cursor.execute("SELECT SUM(amount) FROM expenses")
-        total_expenses = cursor.fetchone()[0] or 0
-        
-        # Get total revenue
-        cursor.execute("SELECT SUM(final_amount) FROM orders WHERE status = 'completed'")
-        total_revenue = cursor.fetchone()[0] or 0
-        
-        # Calculate equity
-        equity = total_revenue - total_expenses
-        
-        conn.close()
+        gst_payable = sum(account['balance'] for account in balances if account['code'] == ledger.Ledger.GST_PAYABLE)
+        total_liabilities = total('liability')
         
         return {
             'assets': {
@@ -261,10 +627,11 @@ class AccountingSystem:
                 'total_assets': total_assets
             },
             'liabilities': {
-                'expenses': total_expenses,
-                'total_liabilities': total_expenses
+                'gst_payable': gst_payable,
+                'total_liabilities': total_liabilities
             },
-            'equity': equity
+            'retained_earnings': total('revenue') - total('expense'),
+            'equity': total_assets - total_liabilities
         }
     
     @staticmethod
@@ -275,20 +642,7 @@ class AccountingSystem:
         if end_date is None:
             end_date = datetime.now().strftime('%Y-%m-%d')
         
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT SUM(gst_amount) as gst_collected
-            FROM orders
-            WHERE DATE(order_date) BETWEEN ? AND ?
-            AND status = 'completed'
-        """, (start_date, end_date))
-        
-        result = cursor.fetchone()
-        gst_collected = result[0] if result[0] else 0
-        
-        conn.close()
+        gst_collected = AccountingSystem.get_period_totals(start_date, end_date)['gst_collected']
         
         return {
             'period': f"{start_date} to {end_date}",
@@ -299,49 +653,98 @@ class AccountingSystem:
     
     @staticmethod
     def record_order_transaction(order_id, amount, payment_method='cash'):
-        """Record order transaction in accounting"""
+        """
+        Record order transaction in accounting
+        
+        Checkout records this in the same transaction as the order (see
+        _record_order_transaction); this entry point is for orders saved
+        without it.
+        """
         conn = database.get_connection()
         cursor = conn.cursor()
         
         try:
-            # Determine account based on payment method
-            if payment_method.lower() == 'cash':
-                account_id = 1  # Default cash account
-            else:
-                # For card/UPI, use cash account for now
-                # In production, you'd have separate bank accounts
-                account_id = 1
-            
-            # Record credit (money coming in)
-            cursor.execute("""
-                INSERT INTO transactions (date, account_id, type, amount, description, order_id)
-                VALUES (?, ?, 'credit', ?, ?, ?)
-            """, (datetime.now().strftime('%Y-%m-%d'), account_id, amount, f'Order #{order_id}', order_id))
-            
-            # Update account balance
-            cursor.execute("""
-                UPDATE accounts SET balance = balance + ? WHERE id = ?
-            """, (amount, account_id))
-            
+            AccountingSystem._record_order_transaction(cursor, order_id, amount, payment_method)
             conn.commit()
             conn.close()
             return True
         except Exception as e:
+            conn.rollback()
             conn.close()
             print(f"Error recording transaction: {e}")
             return False
     
+    @staticmethod
+    def _record_order_transaction(cursor, order_id, amount, payment_method='cash'):
+        """
+        Post a checkout to the ledger and the cash book (caller commits)
+        
+        Posts one balanced journal entry for the checkout (tenders to their
+        routed cash/bank accounts, against sales, service charge and GST
+        payable) and lists each tender in the transactions cash book. Orders
+        without stored tenders are recorded as a single payment of amount by
+        payment_method. Errors propagate so the caller can roll the bill back.
+        """
+        cursor.execute("""
+            SELECT payment_method, amount, account_id FROM order_payments WHERE order_id = ?
+        """, (order_id,))
+        payments = cursor.fetchall()
+        
+        if not payments:
+            method = sales_summary.SalesSummary.normalize_payment_method(payment_method)
+            accounts = AccountingSystem._get_payment_accounts(cursor)
+            payments = [(method, amount, accounts.get(method, 1))]
+        
+        ledger.Ledger._post_order(cursor, order_id)
+        
+        today = datetime.now().strftime('%Y-%m-%d')
+        
+        # Cash book: money coming in, one row per tender
+        cursor.executemany("""
+            INSERT INTO transactions (date, account_id, type, amount, description, order_id)
+            VALUES (?, ?, 'credit', ?, ?, ?)
+        """, [
+            (today, account_id or 1, tender_amount, f'Order #{order_id} ({method})', order_id)
+            for method, tender_amount, account_id in payments
+        ])
+    
     @staticmethod
     def get_sales_report(start_date=None, end_date=None):
-        """Comprehensive sales report"""
+        """Comprehensive sales report (every order in the range; see get_sales_report_page for paging)"""
         if start_date is None:
             start_date = datetime.now().strftime('%Y-%m-%d')
         if end_date is None:
             end_date = start_date
         
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
+        return {
+            'period': f"{start_date} to {end_date}",
+            'orders': list(AccountingSystem.iter_sales_report(start_date, end_date)),
+            'summary': AccountingSystem.get_sales_report_summary(start_date, end_date)
+        }
+    
+    @staticmethod
+    def get_sales_report_summary(start_date, end_date):
+        """Sales report totals for a range of business dates, from the daily sales summary"""
+        totals = sales_summary.SalesSummary.get_totals(start_date, end_date)
+        return {
+            'total_orders': totals['order_count'],
+            'total_sales': totals['subtotal'],
+            'total_gst': totals['gst_amount'],
+            'total_service_charge': totals['service_charge'],
+            'total_revenue': totals['final_amount']
+        }
+    
+    @staticmethod
+    def _sales_report_query(cursor, start_date, end_date, after=None, limit=-1):
+        """
+        Run the sales report order query, newest first (caller fetches)
+        
+        Orders are read through idx_orders_status_date in (order_date, id)
+        order; a business date runs from 01:00 to 01:00, so its orders lie
+        between midnight on start_date and 01:00 the day after end_date.
+        """
+        upper = (datetime.strptime(str(end_date), '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d 01:00:00')
+        after_date, after_id = after or (None, None)
         cursor.execute("""
             SELECT 
                 o.id as order_id,
@@ -351,44 +754,56 @@ class AccountingSystem:
                 o.gst_amount,
                 o.service_charge,
                 o.final_amount,
-                COUNT(DISTINCT oi.id) as item_count
+                (SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = o.id) as item_count
             FROM orders o
-            LEFT JOIN order_items oi ON o.id = oi.order_id
-            WHERE DATE(o.order_date) BETWEEN ? AND ?
-            AND o.status = 'completed'
-            GROUP BY o.id
-            ORDER BY o.order_date DESC
-        """, (start_date, end_date))
-        
+            WHERE o.status = 'completed'
+            AND o.order_date >= ? AND o.order_date < ?
+            AND o.business_date BETWEEN ? AND ?
+            AND (? IS NULL OR (o.order_date, o.id) < (?, ?))
+            ORDER BY o.order_date DESC, o.id DESC
+            LIMIT ?
+        """, (str(start_date), upper, str(start_date), str(end_date), after_date, after_date, after_id, limit))
+    
+    @staticmethod
+    def get_sales_report_page(start_date, end_date, after=None, page_size=None):
+        """
+        One page of the sales report's orders, newest first
+        Args:
+            after: (order_date, order_id) of the last order already shown, or
+                   None for the first page
+            page_size: Orders per page (default SALES_REPORT_PAGE_SIZE)
+        Returns:
+            (orders, next_after): next_after is the key to pass for the next
+            page, None after the last page
+        
+        Keyset pagination: every page is an index range read, however deep
+        into a long period it is.
+        """
+        page_size = page_size or AccountingSystem.SALES_REPORT_PAGE_SIZE
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        AccountingSystem._sales_report_query(cursor, start_date, end_date, after, page_size)
         orders = cursor.fetchall()
-        
-        # Calculate totals
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as order_count,
-                SUM(total_amount) as total_sales,
-                SUM(gst_amount) as total_gst,
-                SUM(service_charge) as total_service,
-                SUM(final_amount) as total_revenue
-            FROM orders
-            WHERE DATE(order_date) BETWEEN ? AND ?
-            AND status = 'completed'
-        """, (start_date, end_date))
-        
-        totals = cursor.fetchone()
         conn.close()
         
-        return {
-            'period': f"{start_date} to {end_date}",
-            'orders': orders,
-            'summary': {
-                'total_orders': totals[0] or 0,
-                'total_sales': totals[1] or 0,
-                'total_gst': totals[2] or 0,
-                'total_service_charge': totals[3] or 0,
-                'total_revenue': totals[4] or 0
-            }
-        }
+        next_after = (orders[-1]['order_date'], orders[-1]['order_id']) if len(orders) == page_size else None
+        return orders, next_after
+    
+    @staticmethod
+    def iter_sales_report(start_date, end_date, batch_size=None):
+        """Yield every order of the sales report, newest first, fetching in batches"""
+        batch_size = batch_size or AccountingSystem.SALES_REPORT_PAGE_SIZE
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        try:
+            AccountingSystem._sales_report_query(cursor, start_date, end_date)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield from batch
+        finally:
+            conn.close()
     
     @staticmethod
     def get_account_summary():
@@ -396,10 +811,19 @@ class AccountingSystem:
         conn = database.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("SELECT id, name, type, balance FROM accounts ORDER BY type, name")
-        accounts = cursor.fetchall()
+        cursor.execute("SELECT id, name, type FROM accounts ORDER BY type, name")
+        accounts = [dict(row) for row in cursor.fetchall()]
         conn.close()
         
+        # Balances from the general ledger
+        balances = {
+            account['cash_account_id']: account['balance']
+            for account in ledger.Ledger.get_account_balances()
+            if account['cash_account_id'] is not None
+        }
+        for account in accounts:
+            account['balance'] = balances.get(account['id'], 0)
+        
         return accounts
     
     @staticmethod
@@ -210,7 +210,7 @@ class AdminPanel:
         self.gst_enabled_var = tk.BooleanVar(value=bool(settings[1]))
         gst_enabled_check = tk.Checkbutton(
             form_frame,
-            text="Enable GST (5% on subtotal)",
+            text="Enable GST (CGST + SGST at each item's rate)",
             variable=self.gst_enabled_var,
             font=('Arial', 12),
             bg='white'
@@ -220,7 +220,7 @@ class AdminPanel:
         # Info label
         info_label = tk.Label(
             form_frame,
-            text="Note: GST is calculated as 5% of subtotal.",
+            text="Note: Items are taxed at 5% unless a different rate is set for the item.",
             font=('Arial', 10, 'italic'),
             bg='white',
             fg='#7f8c8d'
@@ -237,6 +237,43 @@ class AdminPanel:
             command=self.save_gst_settings
         )
         save_btn.grid(row=3, column=0, columnspan=2, pady=30)
+        
+        # GST return export button
+        export_btn = tk.Button(
+            form_frame,
+            text="Export GST Return Data",
+            font=('Arial', 12, 'bold'),
+            bg='#3498db',
+            fg='white',
+            command=self.export_gst_return
+        )
+        export_btn.grid(row=4, column=0, columnspan=2, pady=10)
+    
+    def export_gst_return(self):
+        """Export last month's invoice lines (CSV or JSON) for GST filing"""
+        from tkinter import messagebox, filedialog
+        from datetime import date, timedelta
+        import gst_engine
+        
+        end_date = date.today().replace(day=1) - timedelta(days=1)
+        start_date = end_date.replace(day=1)
+        
+        file_path = filedialog.asksaveasfilename(
+            parent=self.admin_window,
+            title=f"GST return data {start_date:%Y-%m}",
+            initialfile=f"gst_return_{start_date:%Y_%m}.csv",
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("JSON files", "*.json")]
+        )
+        if not file_path:
+            return
+        
+        file_format = 'json' if file_path.lower().endswith('.json') else 'csv'
+        success, message = gst_engine.GSTEngine.export_return(start_date, end_date, file_path, file_format)
+        if success:
+            messagebox.showinfo("Success", message)
+        else:
+            messagebox.showerror("Error", message)
     
     def create_menu_price_tab(self, notebook):
         """Create menu price management tab"""
@@ -1179,6 +1216,32 @@ class AdminPanel:
         )
         title.pack(pady=20)
         
+        # Stock take buttons
+        btn_frame = tk.Frame(inv_frame, bg='white')
+        btn_frame.pack(pady=10)
+        
+        export_btn = tk.Button(
+            btn_frame,
+            text="Export Count Sheet",
+            font=('Arial', 11, 'bold'),
+            bg='#3498db',
+            fg='white',
+            width=25,
+            command=self.export_stock_take_sheet
+        )
+        export_btn.pack(pady=10, padx=10)
+        
+        import_btn = tk.Button(
+            btn_frame,
+            text="Import Stock Take (CSV)",
+            font=('Arial', 11, 'bold'),
+            bg='#27ae60',
+            fg='white',
+            width=25,
+            command=self.import_stock_take
+        )
+        import_btn.pack(pady=10, padx=10)
+        
         info_label = tk.Label(
             inv_frame,
             text="Inventory management features coming soon...\n\nAccess via Inventory Manager Module",
@@ -1189,6 +1252,103 @@ class AdminPanel:
         )
         info_label.pack(pady=50)
     
+    def export_stock_take_sheet(self):
+        """Save a count sheet for the weekly physical stock take"""
+        from tkinter import filedialog
+        from datetime import datetime
+        import inventory_manager
+        
+        file_path = filedialog.asksaveasfilename(
+            parent=self.admin_window,
+            title="Save Count Sheet",
+            defaultextension=".csv",
+            initialfile=f"stock_take_{datetime.now().strftime('%Y%m%d')}.csv",
+            filetypes=[("CSV files", "*.csv")]
+        )
+        if not file_path:
+            return
+        
+        success, message = inventory_manager.InventoryManager.export_stock_take_sheet(file_path)
+        if success:
+            messagebox.showinfo("Count Sheet", message)
+        else:
+            messagebox.showerror("Error", message)
+    
+    def import_stock_take(self):
+        """Post a counted CSV and show the variance report"""
+        from tkinter import filedialog
+        import inventory_manager
+        
+        file_path = filedialog.askopenfilename(
+            parent=self.admin_window,
+            title="Select Counted Stock Sheet",
+            filetypes=[("CSV files", "*.csv")]
+        )
+        if not file_path:
+            return
+        
+        if not messagebox.askyesno(
+            "Post Stock Take",
+            "Set stock levels to the counted quantities in this file?"
+        ):
+            return
+        
+        success, report = inventory_manager.InventoryManager.import_stock_take_csv(file_path)
+        if not success:
+            messagebox.showerror("Error", report)
+            return
+        
+        # Variance report window
+        report_window = tk.Toplevel(self.admin_window)
+        report_window.title(f"Stock Take #{report['stock_take_id']} - Variance Report")
+        report_window.geometry("800x600")
+        report_window.configure(bg='white')
+        
+        tk.Label(
+            report_window,
+            text=f"Stock Take #{report['stock_take_id']} - {report['count_date']}",
+            font=('Arial', 14, 'bold'),
+            bg='white',
+            fg='#2c3e50'
+        ).pack(pady=10)
+        
+        summary = f"Ingredients counted: {len(report['lines'])}    Total variance: ₹{report['total_variance_value']:.2f}"
+        if report['unmatched']:
+            summary += f"    Unmatched rows: {len(report['unmatched'])}"
+        tk.Label(
+            report_window,
+            text=summary,
+            font=('Arial', 11),
+            bg='white',
+            fg='#7f8c8d'
+        ).pack(pady=5)
+        
+        columns = ('name', 'system', 'counted', 'variance', 'value')
+        tree = ttk.Treeview(report_window, columns=columns, show='headings')
+        for column, heading, width in [
+            ('name', 'Ingredient', 250),
+            ('system', 'System Qty', 110),
+            ('counted', 'Counted Qty', 110),
+            ('variance', 'Variance', 110),
+            ('value', 'Value (₹)', 120)
+        ]:
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor='w' if column == 'name' else 'e')
+        
+        for line in report['lines']:
+            tree.insert('', 'end', values=(
+                f"{line['name']} ({line['unit']})",
+                f"{line['system_quantity']:.2f}",
+                f"{line['counted_quantity']:.2f}",
+                f"{line['variance']:+.2f}",
+                f"{line['variance_value']:+.2f}"
+            ))
+        
+        scrollbar = ttk.Scrollbar(report_window, orient='vertical', command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side='left', fill='both', expand=True, padx=(20, 0), pady=10)
+        scrollbar.pack(side='right', fill='y', padx=(0, 20), pady=10)
+    
     def create_accounting_tab(self, notebook):
         """Create accounting tab"""
         acc_frame = tk.Frame(notebook, bg='white')
@@ -1255,14 +1415,86 @@ class AdminPanel:
         )
         balance_btn.pack(pady=10, padx=10)
         
+        # Dashboard button
+        dashboard_btn = tk.Button(
+            btn_frame,
+            text="Business Dashboard",
+            font=('Arial', 11, 'bold'),
+            bg='#16a085',
+            fg='white',
+            width=25,
+            command=self.show_dashboard
+        )
+        dashboard_btn.pack(pady=10, padx=10)
+        
+        # Dish pairings button
+        pairings_btn = tk.Button(
+            btn_frame,
+            text="Dish Pairings",
+            font=('Arial', 11, 'bold'),
+            bg='#27ae60',
+            fg='white',
+            width=25,
+            command=self.show_dish_pairings
+        )
+        pairings_btn.pack(pady=10, padx=10)
+        
+        # Prep sheet button
+        prep_btn = tk.Button(
+            btn_frame,
+            text="Kitchen Prep Sheet",
+            font=('Arial', 11, 'bold'),
+            bg='#d35400',
+            fg='white',
+            width=25,
+            command=self.show_prep_sheet
+        )
+        prep_btn.pack(pady=10, padx=10)
+        
+        # Menu engineering button
+        engineering_btn = tk.Button(
+            btn_frame,
+            text="Menu Engineering",
+            font=('Arial', 11, 'bold'),
+            bg='#8e44ad',
+            fg='white',
+            width=25,
+            command=self.show_menu_engineering
+        )
+        engineering_btn.pack(pady=10, padx=10)
+        
+        # Report cache statistics button
+        cache_btn = tk.Button(
+            btn_frame,
+            text="Report Cache Statistics",
+            font=('Arial', 11, 'bold'),
+            bg='#7f8c8d',
+            fg='white',
+            width=25,
+            command=self.show_report_cache_stats
+        )
+        cache_btn.pack(pady=10, padx=10)
+        
+        # Month Close button
+        close_btn = tk.Button(
+            btn_frame,
+            text="Close Accounting Month",
+            font=('Arial', 11, 'bold'),
+            bg='#34495e',
+            fg='white',
+            width=25,
+            command=self.close_accounting_month
+        )
+        close_btn.pack(pady=10, padx=10)
+        
         # Separator
         separator = tk.Frame(btn_frame, bg='#bdc3c7', height=2)
         separator.pack(fill='x', pady=20, padx=10)
         
-        # Delete Bills button
+        # Void / Delete Bills button
         delete_btn = tk.Button(
             btn_frame,
-            text="⚠️ Delete All Bills",
+            text="⚠️ Void / Delete Bills",
             font=('Arial', 11, 'bold'),
             bg='#e74c3c',
             fg='white',
@@ -1314,12 +1546,19 @@ class AdminPanel:
         report_content += f"Service Charge: ₹{report.get('total_service_charge', 0):.2f}\n"
         report_content += f"Final Revenue: ₹{report.get('total_revenue', 0):.2f}\n"
         
+        # Tender split for the day (shift close)
+        payments = accounting.AccountingSystem.get_payment_method_breakdown(report['date'])
+        report_content += f"\nPayments\n{'-'*60}\n"
+        for method, amount in payments.items():
+            if method != 'total':
+                report_content += f"{method.upper():<15} ₹{amount:.2f}\n"
+        report_content += f"{'TOTAL':<15} ₹{payments['total']:.2f}\n"
+        
         report_text.insert('1.0', report_content)
         report_text.config(state='disabled')
     
     def show_sales_report(self):
         """Show sales report with custom date range"""
-        from tkinter import scrolledtext
         from datetime import datetime
         
         # Create date selection window
@@ -1339,12 +1578,19 @@ class AdminPanel:
         end_entry.insert(0, datetime.now().strftime('%Y-%m-%d'))
         
         def generate_report():
-            start_date = start_entry.get()
-            end_date = end_entry.get()
+            start_date = start_entry.get().strip()
+            end_date = end_entry.get().strip()
+            try:
+                datetime.strptime(start_date, '%Y-%m-%d')
+                datetime.strptime(end_date, '%Y-%m-%d')
+            except ValueError:
+                messagebox.showerror("Error", "Dates must be in YYYY-MM-DD format", parent=date_window)
+                return
             date_window.destroy()
             
+            import threading
+            import queue
             import accounting
-            report = accounting.AccountingSystem.get_sales_report(start_date, end_date)
             
             # Show report
             report_window = tk.Toplevel(self.admin_window)
@@ -1361,31 +1607,96 @@ class AdminPanel:
             )
             title.pack(pady=10)
             
-            report_text = scrolledtext.ScrolledText(
+            summary_label = tk.Label(
                 report_window,
-                font=('Courier', 9),
-                bg='#f8f9fa',
-                wrap='word'
+                text="Calculating totals...",
+                font=('Arial', 11),
+                bg='white',
+                fg='#7f8c8d',
+                justify='left'
             )
-            report_text.pack(fill='both', expand=True, padx=20, pady=10)
+            summary_label.pack(pady=5)
             
-            # Format report
-            content = f"Sales Report\n{'='*80}\n\n"
-            content += f"Period: {report['period']}\n"
-            content += f"Total Orders: {report['summary']['total_orders']}\n"
-            content += f"Total Sales: ₹{report['summary']['total_sales']:.2f}\n"
-            content += f"Total GST: ₹{report['summary']['total_gst']:.2f}\n"
-            content += f"Total Service Charge: ₹{report['summary']['total_service_charge']:.2f}\n"
-            content += f"Total Revenue: ₹{report['summary']['total_revenue']:.2f}\n\n"
-            content += f"{'Order ID':<10}{'Date':<20}{'Table':<10}{'Amount':>15}\n"
-            content += f"{'-'*60}\n"
+            columns = ('order_id', 'date', 'table', 'items', 'subtotal', 'gst', 'service', 'amount')
+            tree = ttk.Treeview(report_window, columns=columns, show='headings')
+            for column, heading, width in [
+                ('order_id', 'Order ID', 80),
+                ('date', 'Date', 150),
+                ('table', 'Table', 90),
+                ('items', 'Items', 60),
+                ('subtotal', 'Subtotal (₹)', 110),
+                ('gst', 'GST (₹)', 90),
+                ('service', 'Service (₹)', 100),
+                ('amount', 'Amount (₹)', 110)
+            ]:
+                tree.heading(column, text=heading)
+                tree.column(column, width=width, anchor='w' if column in ('date', 'table') else 'e')
             
-            for order in report['orders'][:50]:  # Show first 50 orders
-                order_id, order_date, table, total, gst, service, final, item_count = order
-                content += f"{order_id:<10}{order_date.strftime('%Y-%m-%d %H:%M'):<20}{table or 'Takeaway':<10}{final:>15.2f}\n"
+            # Orders arrive a page at a time as the list is scrolled to its end
+            paging = {'after': None, 'done': False, 'pending': False}
+            
+            def load_page():
+                paging['pending'] = False
+                if paging['done']:
+                    return
+                orders, paging['after'] = accounting.AccountingSystem.get_sales_report_page(
+                    start_date, end_date, paging['after']
+                )
+                paging['done'] = paging['after'] is None
+                for order in orders:
+                    tree.insert('', 'end', values=(
+                        order['order_id'],
+                        str(order['order_date'])[:16],
+                        order['table_number'] or 'Takeaway',
+                        order['item_count'],
+                        f"{order['total_amount']:.2f}",
+                        f"{order['gst_amount'] or 0:.2f}",
+                        f"{order['service_charge'] or 0:.2f}",
+                        f"{order['final_amount']:.2f}"
+                    ))
             
-            report_text.insert('1.0', content)
-            report_text.config(state='disabled')
+            scrollbar = ttk.Scrollbar(report_window, orient='vertical', command=tree.yview)
+            
+            def on_scroll(first, last):
+                scrollbar.set(first, last)
+                if float(last) > 0.95 and not paging['done'] and not paging['pending']:
+                    paging['pending'] = True
+                    report_window.after_idle(load_page)
+            
+            tree.configure(yscrollcommand=on_scroll)
+            tree.pack(side='left', fill='both', expand=True, padx=(20, 0), pady=10)
+            scrollbar.pack(side='right', fill='y', padx=(0, 20), pady=10)
+            load_page()
+            
+            # Totals come from a separate aggregate query on a worker thread
+            ready = queue.Queue()
+            
+            def compute_summary():
+                try:
+                    ready.put(accounting.AccountingSystem.get_sales_report_summary(start_date, end_date))
+                except Exception as e:
+                    ready.put(e)
+            
+            def show_summary():
+                if not report_window.winfo_exists():
+                    return
+                if ready.empty():
+                    report_window.after(100, show_summary)
+                    return
+                summary = ready.get()
+                if isinstance(summary, Exception):
+                    summary_label.config(text=f"Error calculating totals: {summary}")
+                    return
+                summary_label.config(text=(
+                    f"Total Orders: {summary['total_orders']}    "
+                    f"Total Sales: ₹{summary['total_sales']:.2f}    "
+                    f"Total GST: ₹{summary['total_gst']:.2f}\n"
+                    f"Total Service Charge: ₹{summary['total_service_charge']:.2f}    "
+                    f"Total Revenue: ₹{summary['total_revenue']:.2f}"
+                ))
+            
+            threading.Thread(target=compute_summary, daemon=True).start()
+            show_summary()
         
         tk.Button(
             date_window,
@@ -1412,244 +1723,743 @@ class AdminPanel:
         from tkinter import messagebox
         messagebox.showinfo("Info", "Balance Sheet feature is available in the Accounting module. Use Sales Report for financial tracking.")
     
-    def delete_all_bills(self):
-        """Show bills list for selection and deletion"""
-        from tkinter import messagebox
-        import database
+    def show_dashboard(self):
+        """Show dashboard widgets, each one as soon as its query finishes"""
+        import threading
+        import queue
+        import analytics
         from tkinter import scrolledtext
-        import tkinter as tk
         
-        # Create bills list window
+        dashboard_window = tk.Toplevel(self.admin_window)
+        dashboard_window.title("Business Dashboard")
+        dashboard_window.geometry("800x600")
+        dashboard_window.configure(bg='white')
+        
+        status_label = tk.Label(
+            dashboard_window,
+            text="Loading widgets...",
+            font=('Arial', 12, 'bold'),
+            bg='white',
+            fg='#2c3e50'
+        )
+        status_label.pack(pady=10)
+        
+        text_area = scrolledtext.ScrolledText(dashboard_window, font=('Courier', 10), wrap=tk.WORD)
+        text_area.pack(fill='both', expand=True, padx=10, pady=10)
+        
+        # Widgets are computed on worker threads; Tk is only touched from here
+        ready = queue.Queue()
+        total = len(analytics.DashboardEngine.WIDGETS)
+        
+        def compute():
+            for widget in analytics.DashboardEngine.iter_widgets():
+                ready.put(widget)
+        
+        def format_value(value):
+            if isinstance(value, list):
+                rows = [dict(row) if hasattr(row, 'keys') else row for row in value[:5]]
+                return '\n'.join(f"    {row}" for row in rows) or "    (none)"
+            if isinstance(value, dict):
+                return '\n'.join(f"    {key}: {item}" for key, item in value.items())
+            return f"    {value}"
+        
+        def poll(shown=0):
+            if not dashboard_window.winfo_exists():
+                return
+            while not ready.empty():
+                name, data, elapsed_ms, error = ready.get()
+                shown += 1
+                title = name.replace('_', ' ').title()
+                text_area.insert(tk.END, f"{title}  ({elapsed_ms:.1f} ms)\n")
+                text_area.insert(tk.END, (f"    Error: {error}" if error else format_value(data)) + "\n\n")
+            status_label.config(text=f"{shown} of {total} widgets loaded")
+            if shown < total:
+                dashboard_window.after(100, poll, shown)
+        
+        threading.Thread(target=compute, daemon=True).start()
+        poll()
+    
+    def show_dish_pairings(self):
+        """Show the dishes most often ordered together with each dish"""
+        import item_affinity
+        
+        pairings_window = tk.Toplevel(self.admin_window)
+        pairings_window.title("Dish Pairings")
+        pairings_window.geometry("850x600")
+        pairings_window.configure(bg='white')
+        
+        tk.Label(
+            pairings_window,
+            text="Dishes Ordered Together",
+            font=('Arial', 14, 'bold'),
+            bg='white',
+            fg='#2c3e50'
+        ).pack(pady=10)
+        
+        tk.Label(
+            pairings_window,
+            text="Lift above 1 means the pair is ordered together more often than chance - a combo candidate",
+            font=('Arial', 10),
+            bg='white',
+            fg='#7f8c8d'
+        ).pack(pady=5)
+        
+        columns = ('item', 'rank', 'partner', 'bills', 'support', 'confidence', 'lift')
+        tree = ttk.Treeview(pairings_window, columns=columns, show='headings')
+        for column, heading, width in [
+            ('item', 'Dish', 200),
+            ('rank', '#', 40),
+            ('partner', 'Ordered With', 200),
+            ('bills', 'Bills', 70),
+            ('support', 'Support %', 90),
+            ('confidence', 'Confidence %', 100),
+            ('lift', 'Lift', 70)
+        ]:
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor='w' if column in ('item', 'partner') else 'e')
+        
+        def load():
+            tree.delete(*tree.get_children())
+            for row in item_affinity.ItemAffinity.get_top_affinities():
+                tree.insert('', 'end', values=(
+                    row['item'] if row['rank'] == 1 else '',
+                    row['rank'],
+                    row['partner'],
+                    row['pair_count'],
+                    f"{row['support'] * 100:.2f}",
+                    f"{row['confidence'] * 100:.1f}",
+                    f"{row['lift']:.2f}"
+                ))
+        
+        def update():
+            success, message = item_affinity.ItemAffinity.update()
+            if not success:
+                messagebox.showerror("Error", message, parent=pairings_window)
+            load()
+        
+        tk.Button(
+            pairings_window,
+            text="Update Now",
+            font=('Arial', 10, 'bold'),
+            bg='#27ae60',
+            fg='white',
+            command=update
+        ).pack(pady=5)
+        
+        scrollbar = ttk.Scrollbar(pairings_window, orient='vertical', command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side='left', fill='both', expand=True, padx=(20, 0), pady=10)
+        scrollbar.pack(side='right', fill='y', padx=(0, 20), pady=10)
+        load()
+    
+    def show_prep_sheet(self):
+        """Show tomorrow's forecast sales per dish and hour, for kitchen prep"""
+        import prep_forecast
+        
+        if not prep_forecast.PrepForecast.is_available():
+            messagebox.showerror("Error", "The prep forecast requires NumPy (pip install numpy)")
+            return
+        
+        prep_window = tk.Toplevel(self.admin_window)
+        prep_window.title("Kitchen Prep Sheet")
+        prep_window.geometry("900x600")
+        prep_window.configure(bg='white')
+        
+        title_label = tk.Label(
+            prep_window,
+            font=('Arial', 14, 'bold'),
+            bg='white',
+            fg='#2c3e50'
+        )
+        title_label.pack(pady=10)
+        
+        info_label = tk.Label(
+            prep_window,
+            font=('Arial', 10),
+            bg='white',
+            fg='#7f8c8d'
+        )
+        info_label.pack(pady=5)
+        
+        columns = ('name', 'category', 'expected', 'prep', 'peak', 'lunch', 'dinner')
+        tree = ttk.Treeview(prep_window, columns=columns, show='headings')
+        for column, heading, width in [
+            ('name', 'Dish', 220),
+            ('category', 'Category', 180),
+            ('expected', 'Expected', 80),
+            ('prep', 'Prep', 60),
+            ('peak', 'Peak Hour', 80),
+            ('lunch', 'Lunch (11-16)', 100),
+            ('dinner', 'Dinner (18-24)', 100)
+        ]:
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor='w' if column in ('name', 'category') else 'e')
+        
+        def load(refresh=False):
+            sheet = prep_forecast.PrepForecast.get_prep_sheet()
+            if refresh or not sheet['generated_at']:
+                success, message = prep_forecast.PrepForecast.refresh(sheet['forecast_date'])
+                if not success:
+                    messagebox.showerror("Error", message, parent=prep_window)
+                sheet = prep_forecast.PrepForecast.get_prep_sheet(sheet['forecast_date'])
+            
+            title_label.config(text=f"Prep Sheet - {sheet['forecast_date']}")
+            info_label.config(text=f"Forecast generated {sheet['generated_at'] or '-'}; "
+                                   "prep quantity includes a buffer for busier-than-usual days")
+            tree.delete(*tree.get_children())
+            for dish in sheet['dishes']:
+                hourly = dish['hourly']
+                tree.insert('', 'end', values=(
+                    dish['name'],
+                    dish['category'],
+                    f"{dish['expected_quantity']:.1f}",
+                    dish['prep_quantity'],
+                    f"{dish['peak_hour']:02d}:00",
+                    f"{sum(hourly.get(hour, 0) for hour in range(11, 16)):.1f}",
+                    f"{sum(hourly.get(hour, 0) for hour in range(18, 24)):.1f}"
+                ))
+        
+        tk.Button(
+            prep_window,
+            text="Recalculate",
+            font=('Arial', 10, 'bold'),
+            bg='#d35400',
+            fg='white',
+            command=lambda: load(refresh=True)
+        ).pack(pady=5)
+        
+        scrollbar = ttk.Scrollbar(prep_window, orient='vertical', command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side='left', fill='both', expand=True, padx=(20, 0), pady=10)
+        scrollbar.pack(side='right', fill='y', padx=(0, 20), pady=10)
+        load()
+    
+    def show_menu_engineering(self):
+        """Show every dish's ABC, XYZ and star/plowhorse/puzzle/dog class for a month"""
+        import menu_engineering
+        
+        engineering_window = tk.Toplevel(self.admin_window)
+        engineering_window.title("Menu Engineering")
+        engineering_window.geometry("1000x620")
+        engineering_window.configure(bg='white')
+        
+        controls = tk.Frame(engineering_window, bg='white')
+        controls.pack(pady=10)
+        tk.Label(controls, text="Month (YYYY-MM):", font=('Arial', 11), bg='white').pack(side='left', padx=5)
+        period_var = tk.StringVar(value=database.get_business_date_string()[:7])
+        tk.Entry(controls, textvariable=period_var, width=10, font=('Arial', 11)).pack(side='left', padx=5)
+        
+        summary_label = tk.Label(
+            engineering_window,
+            font=('Arial', 10),
+            bg='white',
+            fg='#7f8c8d'
+        )
+        summary_label.pack(pady=5)
+        
+        columns = ('name', 'category', 'quantity', 'revenue', 'share', 'abc', 'xyz', 'margin', 'class')
+        tree = ttk.Treeview(engineering_window, columns=columns, show='headings')
+        for column, heading, width in [
+            ('name', 'Dish', 200),
+            ('category', 'Category', 170),
+            ('quantity', 'Sold', 60),
+            ('revenue', 'Revenue (₹)', 100),
+            ('share', 'Share %', 70),
+            ('abc', 'ABC', 45),
+            ('xyz', 'XYZ', 45),
+            ('margin', 'Margin/Unit (₹)', 110),
+            ('class', 'Class', 90)
+        ]:
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor='w' if column in ('name', 'category', 'class') else 'e')
+        
+        def load(refresh=False):
+            period = period_var.get().strip()
+            report = menu_engineering.MenuEngineering.get_report(period)
+            if refresh or not report['run']:
+                success, message = menu_engineering.MenuEngineering.refresh(period)
+                if not success:
+                    messagebox.showerror("Error", message, parent=engineering_window)
+                    return
+                report = menu_engineering.MenuEngineering.get_report(period)
+            
+            run = report['run']
+            classes = report['counts']['menu_class']
+            summary_label.config(text=(
+                f"{run['start_date']} to {run['end_date']}  |  Revenue ₹{run['total_revenue']:.2f}  |  "
+                f"Average margin ₹{run['average_margin']:.2f}/unit  |  "
+                + "  ".join(f"{name.title()}s: {classes.get(name, 0)}"
+                            for name in menu_engineering.MenuEngineering.MENU_CLASSES)
+            ))
+            tree.delete(*tree.get_children())
+            for item in report['items']:
+                tree.insert('', 'end', values=(
+                    item['name'],
+                    item['category'],
+                    item['quantity'],
+                    f"{item['revenue']:.2f}",
+                    f"{item['revenue_share'] * 100:.1f}",
+                    item['abc_class'],
+                    item['xyz_class'],
+                    f"{item['contribution_margin']:.2f}",
+                    item['menu_class'].title()
+                ))
+        
+        tk.Button(controls, text="Show", font=('Arial', 10, 'bold'), bg='#8e44ad', fg='white',
+                  command=load).pack(side='left', padx=5)
+        tk.Button(controls, text="Recalculate", font=('Arial', 10, 'bold'), bg='#7f8c8d', fg='white',
+                  command=lambda: load(refresh=True)).pack(side='left', padx=5)
+        
+        scrollbar = ttk.Scrollbar(engineering_window, orient='vertical', command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side='left', fill='both', expand=True, padx=(20, 0), pady=10)
+        scrollbar.pack(side='right', fill='y', padx=(0, 20), pady=10)
+        load()
+    
+    def show_report_cache_stats(self):
+        """Show report cache hit/miss counters, with the option to clear it"""
+        from tkinter import messagebox
+        import report_cache
+        
+        stats = report_cache.ReportCache.get_stats()
+        clear = messagebox.askyesno(
+            "Report Cache Statistics",
+            f"Hits: {stats['hits']}\n"
+            f"Misses: {stats['misses']}\n"
+            f"Hit rate: {stats['hit_rate']}%\n"
+            f"Cached reports: {stats['entries']}\n"
+            f"Invalidated by writes: {stats['invalidations']}\n"
+            f"Evicted (LRU): {stats['evictions']}\n\n"
+            "Clear the cache and reset the counters?",
+            parent=self.admin_window
+        )
+        if clear:
+            report_cache.ReportCache.clear()
+    
+    def close_accounting_month(self):
+        """Freeze last month's totals and lock it against further edits"""
+        from tkinter import messagebox, simpledialog
+        from datetime import date, timedelta
+        import accounting
+        
+        last_month = (date.today().replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+        period = simpledialog.askstring(
+            "Close Accounting Month",
+            "Month to close (YYYY-MM).\n\nBills, payments and expenses dated in a closed month can no longer be changed.",
+            initialvalue=last_month,
+            parent=self.admin_window
+        )
+        if not period:
+            return
+        
+        success, message = accounting.AccountingSystem.close_period(period.strip())
+        if success:
+            messagebox.showinfo("Success", message)
+        else:
+            messagebox.showerror("Error", message)
+    
+    def delete_all_bills(self):
+        """Browse bills by filter and void, refund or delete them"""
+        from datetime import datetime
+        from bill_manager import BillManager
+        
         bills_window = tk.Toplevel(self.admin_window)
-        bills_window.title("Delete Bills")
-        bills_window.geometry("800x600")
+        bills_window.title("Void / Delete Bills")
+        bills_window.geometry("900x650")
         bills_window.configure(bg='white')
         
-        # Title
         title = tk.Label(
             bills_window,
-            text="Select Bills to Delete",
+            text="Select Bills to Void or Delete",
             font=('Arial', 16, 'bold'),
             bg='white',
             fg='#2c3e50'
         )
         title.pack(pady=10)
         
-        # Instructions
-        inst_label = tk.Label(
+        # Filters
+        filter_frame = tk.Frame(bills_window, bg='white')
+        filter_frame.pack(fill='x', padx=20, pady=5)
+        
+        entries = {}
+        for column, (key, label) in enumerate([
+            ('start_date', "From (YYYY-MM-DD)"),
+            ('end_date', "To (YYYY-MM-DD)"),
+            ('table_number', "Table"),
+            ('min_amount', "Min ₹"),
+            ('max_amount', "Max ₹")
+        ]):
+            tk.Label(filter_frame, text=label, font=('Arial', 10), bg='white').grid(row=0, column=column, sticky='w', padx=5)
+            entries[key] = tk.Entry(filter_frame, font=('Arial', 10), width=14)
+            entries[key].grid(row=1, column=column, padx=5)
+        
+        tk.Label(filter_frame, text="Status", font=('Arial', 10), bg='white').grid(row=0, column=5, sticky='w', padx=5)
+        status_var = tk.StringVar(value='All')
+        ttk.Combobox(
+            filter_frame,
+            textvariable=status_var,
+            values=['All', 'completed', 'voided', 'pending', 'cancelled'],
+            state='readonly',
+            width=11
+        ).grid(row=1, column=5, padx=5)
+        
+        tk.Button(
+            filter_frame,
+            text="Apply",
+            font=('Arial', 10, 'bold'),
+            bg='#3498db',
+            fg='white',
+            command=lambda: apply_filters()
+        ).grid(row=1, column=6, padx=5)
+        
+        totals_label = tk.Label(
             bills_window,
-            text="Select the bills you want to delete by checking the boxes below",
-            font=('Arial', 11),
+            text="",
+            font=('Arial', 11, 'bold'),
             bg='white',
-            fg='#7f8c8d'
+            fg='#2c3e50'
         )
-        inst_label.pack(pady=5)
+        totals_label.pack(pady=5)
+        
+        # Buttons are packed before the list so they stay visible when the window shrinks
+        btn_frame = tk.Frame(bills_window, bg='white')
+        btn_frame.pack(side='bottom', pady=10)
+        
+        list_frame = tk.Frame(bills_window, bg='white')
+        list_frame.pack(fill='both', expand=True)
+        
+        columns = ('bill', 'date', 'table', 'amount', 'payment', 'status')
+        tree = ttk.Treeview(list_frame, columns=columns, show='headings', selectmode='extended')
+        for column, heading, width in [
+            ('bill', 'Bill #', 80),
+            ('date', 'Date', 150),
+            ('table', 'Table', 100),
+            ('amount', 'Amount (₹)', 110),
+            ('payment', 'Payment', 100),
+            ('status', 'Status', 100)
+        ]:
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor='e' if column == 'amount' else 'w')
+        
+        # Bills arrive a page at a time as the list is scrolled to its end; with
+        # "Select All Matching" the selection is the applied filter, not the rows
+        state = {
+            'filters': {}, 'before_id': None, 'done': True, 'pending': False,
+            'all_matching': False, 'matching': 0
+        }
+        
+        def read_filters():
+            filters = {key: entry.get().strip() for key, entry in entries.items() if entry.get().strip()}
+            for key in ('start_date', 'end_date'):
+                if key in filters:
+                    datetime.strptime(filters[key], '%Y-%m-%d')
+            for key in ('min_amount', 'max_amount'):
+                if key in filters:
+                    filters[key] = float(filters[key])
+            if status_var.get() != 'All':
+                filters['status'] = status_var.get()
+            return filters
+        
+        def update_selection_label():
+            if state['all_matching']:
+                count = state['matching'] - (len(tree.get_children()) - len(tree.selection()))
+            else:
+                count = len(tree.selection())
+            selection_label.config(text=f"Selected: {count}")
         
-        # Scrollable frame for checkboxes
-        canvas = tk.Canvas(bills_window, bg='white')
-        scrollbar = tk.Scrollbar(bills_window, orient="vertical", command=canvas.yview)
-        scrollable_frame = tk.Frame(canvas, bg='white')
+        def load_page():
+            state['pending'] = False
+            if state['done']:
+                return
+            bills, state['before_id'] = BillManager.get_bills_page(state['filters'], state['before_id'])
+            state['done'] = state['before_id'] is None
+            for bill in bills:
+                tree.insert('', 'end', iid=str(bill['id']), values=(
+                    f"{bill['id']:05d}",
+                    str(bill['order_date'])[:16],
+                    bill['table_number'] or 'Takeaway',
+                    f"{bill['final_amount'] or 0:.2f}",
+                    bill['payment_method'] or '',
+                    'voided' if bill['voided'] else bill['status']
+                ))
+                if state['all_matching']:
+                    tree.selection_add(str(bill['id']))
+            update_selection_label()
+        
+        def apply_filters():
+            try:
+                filters = read_filters()
+            except ValueError:
+                messagebox.showerror("Error", "Dates must be YYYY-MM-DD and amounts numbers", parent=bills_window)
+                return
+            state.update({'filters': filters, 'before_id': None, 'done': False, 'all_matching': False})
+            tree.delete(*tree.get_children())
+            totals = BillManager.get_filter_totals(filters)
+            state['matching'] = totals['bill_count']
+            totals_label.config(
+                text=f"Matching Bills: {totals['bill_count']}    Total Amount: ₹{totals['total_amount']:.2f}"
+            )
+            load_page()
+        
+        scrollbar = ttk.Scrollbar(list_frame, orient='vertical', command=tree.yview)
+        
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(last) > 0.95 and not state['done'] and not state['pending']:
+                state['pending'] = True
+                bills_window.after_idle(load_page)
+        
+        tree.configure(yscrollcommand=on_scroll)
+        tree.bind('<<TreeviewSelect>>', lambda e: update_selection_label())
+        tree.pack(side='left', fill='both', expand=True, padx=(20, 0), pady=10)
+        scrollbar.pack(side='right', fill='y', padx=(0, 20), pady=10)
+        
+        def select_all_matching():
+            state['all_matching'] = True
+            tree.selection_set(tree.get_children())
+            update_selection_label()
+        
+        def clear_selection():
+            state['all_matching'] = False
+            tree.selection_remove(tree.selection())
+            update_selection_label()
+        
+        def current_selection():
+            if state['all_matching']:
+                selected = set(tree.selection())
+                return {
+                    'filters': dict(state['filters']),
+                    'exclude': [int(iid) for iid in tree.get_children() if iid not in selected]
+                }
+            return {'ids': [int(iid) for iid in tree.selection()]}
+        
+        def refund_selected():
+            if state['all_matching'] or len(tree.selection()) != 1:
+                messagebox.showwarning("Refund", "Select exactly one bill to refund.", parent=bills_window)
+                return
+            self.refund_bill(bills_window, int(tree.selection()[0]), apply_filters)
         
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
+        selection_label = tk.Label(btn_frame, text="Selected: 0", font=('Arial', 10), bg='white', fg='#7f8c8d')
+        selection_label.pack(side='left', padx=10)
         
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
+        tk.Button(
+            btn_frame,
+            text="Select All Matching",
+            font=('Arial', 10, 'bold'),
+            bg='#3498db',
+            fg='white',
+            command=select_all_matching
+        ).pack(side='left', padx=5)
         
-        canvas.pack(side='left', fill='both', expand=True, padx=10, pady=10)
-        scrollbar.pack(side='right', fill='y')
+        tk.Button(
+            btn_frame,
+            text="Clear Selection",
+            font=('Arial', 10, 'bold'),
+            bg='#95a5a6',
+            fg='white',
+            command=clear_selection
+        ).pack(side='left', padx=5)
+        
+        tk.Button(
+            btn_frame,
+            text="Void Selected",
+            font=('Arial', 11, 'bold'),
+            bg='#e67e22',
+            fg='white',
+            command=lambda: self.confirm_void_selected(bills_window, current_selection(), apply_filters)
+        ).pack(side='left', padx=5)
+        
+        tk.Button(
+            btn_frame,
+            text="Refund Bill",
+            font=('Arial', 11, 'bold'),
+            bg='#f39c12',
+            fg='white',
+            command=refund_selected
+        ).pack(side='left', padx=5)
+        
+        tk.Button(
+            btn_frame,
+            text="Delete Selected",
+            font=('Arial', 11, 'bold'),
+            bg='#e74c3c',
+            fg='white',
+            command=lambda: self.confirm_delete_selected(bills_window, current_selection())
+        ).pack(side='left', padx=5)
         
-        # Get all bills from database
         try:
-            conn = database.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                SELECT id, table_number, order_date, final_amount, status
-                FROM orders
-                ORDER BY order_date DESC
-            """)
-            
-            bills = cursor.fetchall()
-            conn.close()
-            
-            if not bills:
-                tk.Label(
-                    scrollable_frame,
-                    text="No bills found in database.",
-                    font=('Arial', 11),
-                    bg='white',
-                    fg='#7f8c8d'
-                ).pack(pady=20)
-            else:
-                # Store selected bill IDs
-                self.selected_bills = []
-                
-                # Header
-                header = tk.Label(
-                    scrollable_frame,
-                    text=f"Total Bills: {len(bills)}",
-                    font=('Arial', 11, 'bold'),
-                    bg='white',
-                    fg='#2c3e50'
-                )
-                header.pack(pady=5)
-                
-                # Add checkboxes for each bill
-                for bill in bills:
-                    bill_id, table_num, order_date, amount, status = bill
-                    
-                    # Frame for each bill
-                    bill_frame = tk.Frame(scrollable_frame, bg='#f8f9fa', relief='solid', bd=1)
-                    bill_frame.pack(fill='x', padx=5, pady=2)
-                    
-                    # Checkbox
-                    var = tk.BooleanVar()
-                    checkbox = tk.Checkbutton(
-                        bill_frame,
-                        variable=var,
-                        bg='#f8f9fa',
-                        command=lambda bid=bill_id, v=var: self.toggle_bill_selection(bid, v)
-                    )
-                    checkbox.pack(side='left', padx=5, pady=5)
-                    
-                    # Bill info
-                    bill_info = f"Bill #{bill_id:05d} | Table: {table_num or 'Takeaway'} | Amount: ₹{amount:.2f} | Date: {order_date}"
-                    tk.Label(
-                        bill_frame,
-                        text=bill_info,
-                        font=('Arial', 10),
-                        bg='#f8f9fa',
-                        anchor='w'
-                    ).pack(side='left', padx=5, fill='x', expand=True)
-                
-                # Delete button
-                delete_btn = tk.Button(
-                    bills_window,
-                    text="Delete Selected Bills",
-                    font=('Arial', 11, 'bold'),
-                    bg='#e74c3c',
-                    fg='white',
-                    command=lambda: self.confirm_delete_selected(bills_window)
-                )
-                delete_btn.pack(pady=10)
-                
-                # Select all / Deselect all buttons
-                btn_frame = tk.Frame(bills_window, bg='white')
-                btn_frame.pack(pady=5)
-                
-                tk.Button(
-                    btn_frame,
-                    text="Select All",
-                    font=('Arial', 10, 'bold'),
-                    bg='#3498db',
-                    fg='white',
-                    command=lambda: self.select_all_bills(bills_window, True)
-                ).pack(side='left', padx=5)
-                
-                tk.Button(
-                    btn_frame,
-                    text="Deselect All",
-                    font=('Arial', 10, 'bold'),
-                    bg='#95a5a6',
-                    fg='white',
-                    command=lambda: self.select_all_bills(bills_window, False)
-                ).pack(side='left', padx=5)
-            
+            apply_filters()
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load bills: {str(e)}")
             bills_window.destroy()
     
-    def toggle_bill_selection(self, bill_id, var):
-        """Toggle bill selection"""
-        if not hasattr(self, 'selected_bills'):
-            self.selected_bills = []
-        
-        if var.get():
-            if bill_id not in self.selected_bills:
-                self.selected_bills.append(bill_id)
-        else:
-            if bill_id in self.selected_bills:
-                self.selected_bills.remove(bill_id)
-    
-    def select_all_bills(self, window, select):
-        """Select or deselect all bills"""
-        # This is a simplified version - in a real implementation,
-        # you'd need to store references to all checkboxes
-        messagebox.showinfo("Info", "Please use individual checkboxes to select bills.")
+    def run_bills_job(self, parent_window, title, count, job, finish):
+        """
+        Run a bulk bill job on a worker thread behind a progress bar
+        Args:
+            job: Callable(progress) returning (success, result); progress(processed, total)
+            finish: Callable(success, result) run on the Tk thread when the job ends
+        """
+        import threading
+        import queue
+        
+        progress_window = tk.Toplevel(parent_window)
+        progress_window.title(title)
+        progress_window.geometry("400x120")
+        progress_window.configure(bg='white')
+        progress_window.transient(parent_window)
+        
+        status_label = tk.Label(progress_window, text=f"{title}: 0 of {count}...", font=('Arial', 11), bg='white')
+        status_label.pack(pady=15)
+        progress_bar = ttk.Progressbar(progress_window, length=340, maximum=count)
+        progress_bar.pack(pady=5)
+        
+        # Tk is only touched from here; the worker reports through the queue
+        updates = queue.Queue()
+        
+        def run():
+            updates.put(('done', job(lambda processed, total: updates.put(('progress', processed)))))
+        
+        def poll():
+            while not updates.empty():
+                kind, value = updates.get()
+                if kind == 'done':
+                    progress_window.destroy()
+                    finish(*value)
+                    return
+                progress_bar['value'] = value
+                status_label.config(text=f"{title}: {value} of {count}...")
+            progress_window.after(100, poll)
+        
+        threading.Thread(target=run, daemon=True).start()
+        poll()
     
-    def confirm_delete_selected(self, parent_window):
-        """Confirm and delete selected bills"""
-        from tkinter import messagebox
-        import database
+    def confirm_void_selected(self, parent_window, selection, on_done):
+        """
+        Confirm and void selected bills (they stay on record, reversed as of today)
+        Args:
+            selection: BillManager selection (explicit 'ids', or 'filters' and 'exclude')
+            on_done: Called after the bills are voided, to reload the list
+        """
+        from tkinter import simpledialog
         import telegram_notifier
+        from bill_manager import BillManager
         
-        if not hasattr(self, 'selected_bills') or not self.selected_bills:
-            messagebox.showwarning("No Selection", "Please select at least one bill to delete.")
+        count = BillManager.count_selection(selection)
+        if not count:
+            messagebox.showwarning("No Selection", "Please select at least one bill to void.", parent=parent_window)
             return
         
-        count = len(self.selected_bills)
+        reason = simpledialog.askstring(
+            "Void Bills", f"Reason for voiding {count} bill(s):", parent=parent_window
+        )
+        if reason is None:
+            return
+        
+        def finish(success, result):
+            if not success:
+                messagebox.showerror("Error", f"Failed to void bills: {result}", parent=parent_window)
+                on_done()
+                return
+            try:
+                telegram_notifier.send_telegram_message(
+                    f"⚠️ Bills Voided!\n\nVoided: {result['voided']} bill(s)\nTotal amount: ₹{result['total_amount']:.2f}\nReason: {reason}"
+                )
+            except:
+                pass
+            message = f"Voided {result['voided']} bill(s).\nTotal amount: ₹{result['total_amount']:.2f}"
+            if result['skipped']:
+                message += f"\n{result['skipped']} bill(s) were not completed or already voided."
+            messagebox.showinfo("Success", message, parent=parent_window)
+            on_done()
+        
+        self.run_bills_job(
+            parent_window, "Voiding bills", count,
+            lambda progress: BillManager.void_bills(selection, reason, progress=progress),
+            finish
+        )
+    
+    def refund_bill(self, parent_window, order_id, on_done):
+        """Refund part or all of one bill through a chosen tender"""
+        from tkinter import simpledialog
+        from order_corrections import OrderCorrections
+        
+        net = OrderCorrections.get_net_order(order_id)
+        if not net or net['voided']:
+            messagebox.showwarning("Refund", f"Bill #{order_id:05d} cannot be refunded.", parent=parent_window)
+            return
+        
+        amount = simpledialog.askfloat(
+            "Refund", f"Refund amount for bill #{order_id:05d} (remaining ₹{net['final_amount']:.2f}):",
+            parent=parent_window, minvalue=0.01, maxvalue=net['final_amount']
+        )
+        if amount is None:
+            return
+        payment_method = simpledialog.askstring(
+            "Refund", "Refund through (cash / card / upi):",
+            parent=parent_window, initialvalue=max(net['tenders'], key=net['tenders'].get)
+        )
+        if payment_method is None:
+            return
+        reason = simpledialog.askstring("Refund", "Reason:", parent=parent_window) or ''
+        
+        success, message = OrderCorrections.refund_order(order_id, amount, payment_method, reason)
+        if success:
+            messagebox.showinfo("Success", message, parent=parent_window)
+            on_done()
+        else:
+            messagebox.showerror("Error", message, parent=parent_window)
+    
+    def confirm_delete_selected(self, parent_window, selection):
+        """
+        Confirm and delete selected bills
+        Args:
+            selection: BillManager selection (explicit 'ids', or 'filters' and 'exclude')
+        """
+        import telegram_notifier
+        from bill_manager import BillManager
+        
+        count = BillManager.count_selection(selection)
+        if not count:
+            messagebox.showwarning("No Selection", "Please select at least one bill to delete.", parent=parent_window)
+            return
         
         # Confirm deletion
         confirm = messagebox.askyesno(
             "Delete Selected Bills",
-            f"Are you sure you want to delete {count} bill(s)?\n\nThis action cannot be undone!",
+            f"Are you sure you want to delete {count} bill(s)?\n\nThis action cannot be undone!\n"
+            f"Use Void to cancel a bill and keep it on record.",
             icon='warning'
         )
         
         if not confirm:
             return
         
-        try:
-            conn = database.get_connection()
-            cursor = conn.cursor()
-            
-            # Get bill details before deletion
-            placeholders = ','.join(['?'] * count)
-            cursor.execute(f"SELECT id, final_amount FROM orders WHERE id IN ({placeholders})", tuple(self.selected_bills))
-            bills_to_delete = cursor.fetchall()
-            
-            total_amount = sum(bill[1] for bill in bills_to_delete)
-            
-            # Delete order items first
-            cursor.execute(f"DELETE FROM order_items WHERE order_id IN ({placeholders})", tuple(self.selected_bills))
-            
-            # Delete orders
-            cursor.execute(f"DELETE FROM orders WHERE id IN ({placeholders})", tuple(self.selected_bills))
-            
-            # Check if all bills are deleted - if yes, reset invoice numbers
-            cursor.execute("SELECT COUNT(*) FROM orders")
-            remaining_bills = cursor.fetchone()[0]
-            
-            if remaining_bills == 0:
-                # Reset auto-increment sequences to start from 0
-                cursor.execute("DELETE FROM sqlite_sequence WHERE name IN ('orders', 'order_items')")
-                invoice_reset_msg = "\nInvoice numbers reset to start from #00001."
-            else:
-                invoice_reset_msg = ""
-            
-            conn.commit()
-            conn.close()
-            
+        def finish(success, result):
+            if not success:
+                messagebox.showerror("Error", f"Failed to delete bills: {result}", parent=parent_window)
+                return
             parent_window.destroy()
             
             # Send Telegram notification
             try:
                 telegram_notifier.send_telegram_message(
-                    f"⚠️ Bills Deleted!\n\nDeleted: {count} bill(s)\nTotal amount: ₹{total_amount:.2f}"
+                    f"⚠️ Bills Deleted!\n\nDeleted: {result['deleted']} bill(s)\nTotal amount: ₹{result['total_amount']:.2f}"
                 )
             except:
                 pass
             
-            messagebox.showinfo(
-                "Success",
-                f"Successfully deleted {count} bill(s).\nTotal amount: ₹{total_amount:.2f}\nTelegram notification sent.{invoice_reset_msg}"
-            )
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to delete bills: {str(e)}")
+            message = (f"Successfully deleted {result['deleted']} bill(s).\n"
+                       f"Total amount: ₹{result['total_amount']:.2f}\nTelegram notification sent.")
+            if result['locked']:
+                message += f"\n{result['locked']} bill(s) in closed accounting periods were kept."
+            messagebox.showinfo("Success", message)
+        
+        self.run_bills_job(
+            parent_window, "Deleting bills", count,
+            lambda progress: BillManager.delete_bills(selection, progress=progress),
+            finish
+        )
     
     def create_purchase_tab(self, notebook):
         """Create purchase management tab"""
@@ -1745,4 +2555,88 @@ class AdminPanel:
             fg='#7f8c8d',
             justify='center'
         )
-        info_label.pack(pady=50)
+        info_label.pack(pady=20)
+        
+        self.create_scheduled_jobs_section(backup_frame)
+    
+    def create_scheduled_jobs_section(self, parent_frame):
+        """Scheduled background jobs with their last run and a Run Now button"""
+        import job_scheduler
+        
+        tk.Label(
+            parent_frame,
+            text="Scheduled Jobs",
+            font=('Arial', 14, 'bold'),
+            bg='white',
+            fg='#2c3e50'
+        ).pack(pady=10)
+        
+        tk.Label(
+            parent_frame,
+            text="Jobs run in the background once service is over; missed runs catch up when the app starts",
+            font=('Arial', 10),
+            bg='white',
+            fg='#7f8c8d'
+        ).pack(pady=5)
+        
+        columns = ('job', 'schedule', 'next_run', 'last_run', 'duration', 'status', 'message')
+        tree = ttk.Treeview(parent_frame, columns=columns, show='headings', height=4)
+        for column, heading, width in [
+            ('job', 'Job', 140),
+            ('schedule', 'Schedule', 90),
+            ('next_run', 'Next Run', 130),
+            ('last_run', 'Last Run', 140),
+            ('duration', 'Duration (s)', 90),
+            ('status', 'Status', 90),
+            ('message', 'Details', 300)
+        ]:
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor='e' if column == 'duration' else 'w')
+        
+        def load():
+            tree.delete(*tree.get_children())
+            for job in job_scheduler.JobScheduler.get_job_status():
+                tree.insert('', 'end', iid=job['name'], values=(
+                    job['name'],
+                    job['schedule'],
+                    job['next_run'] or '',
+                    job['started_at'] or 'Never',
+                    '' if job['duration_seconds'] is None else f"{job['duration_seconds']:.1f}",
+                    'running' if job['running'] else (job['status'] or ''),
+                    job['message'] or ''
+                ))
+        
+        def run_now():
+            selected = tree.selection()
+            if not selected:
+                messagebox.showwarning("Warning", "Select a job to run", parent=parent_frame)
+                return
+            success, message = job_scheduler.JobScheduler.run_job(selected[0])
+            if not success:
+                messagebox.showerror("Error", message, parent=parent_frame)
+            load()
+        
+        tree.pack(fill='x', padx=20, pady=5)
+        
+        button_frame = tk.Frame(parent_frame, bg='white')
+        button_frame.pack(pady=5)
+        
+        tk.Button(
+            button_frame,
+            text="Run Now",
+            font=('Arial', 10, 'bold'),
+            bg='#27ae60',
+            fg='white',
+            command=run_now
+        ).pack(side='left', padx=5)
+        
+        tk.Button(
+            button_frame,
+            text="Refresh",
+            font=('Arial', 10),
+            bg='#3498db',
+            fg='white',
+            command=load
+        ).pack(side='left', padx=5)
+        
+        load()
@@ -4,131 +4,89 @@ Comprehensive dashboard analytics and business intelligence
 """
 
 import database
+import inventory_manager
+import sales_summary
+import gst_engine
+import report_cache
+import columnar_analytics
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import calendar
+import time
 
 class Analytics:
     """Analytics and reporting system for business intelligence"""
     
     @staticmethod
+    @report_cache.ReportCache.cached(('orders',), ttl=60)
     def get_today_summary():
         """Get today's business summary"""
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        today = datetime.now().strftime('%Y-%m-%d')
-        
-        # Total orders today
-        cursor.execute("""
-            SELECT COUNT(*) FROM orders 
-            WHERE DATE(order_date) = ?
-        """, (today,))
-        total_orders = cursor.fetchone()[0]
-        
-        # Total revenue today
-        cursor.execute("""
-            SELECT COALESCE(SUM(final_amount), 0) FROM orders 
-            WHERE DATE(order_date) = ?
-        """, (today,))
-        total_revenue = cursor.fetchone()[0]
+        today = database.get_business_date_string()
         
-        # Get revenue by payment method
-        cursor.execute("""
-            SELECT payment_method, SUM(final_amount) as amount
-            FROM orders o
-            JOIN transactions t ON o.id = t.order_id
-            WHERE DATE(o.order_date) = ?
-            GROUP BY payment_method
-        """, (today,))
-        payment_methods = cursor.fetchall()
-        
-        payment_breakdown = {}
-        for row in payment_methods:
-            payment_breakdown[row['payment_method']] = row['amount']
-        
-        conn.close()
+        # Totals and payment split from the daily sales summary
+        totals = sales_summary.SalesSummary.get_totals(today, today)
+        payment_breakdown = sales_summary.SalesSummary.get_payment_totals(today, today)
         
         return {
             'date': today,
-            'total_orders': total_orders,
-            'total_revenue': total_revenue,
+            'total_orders': totals['order_count'],
+            'total_revenue': totals['final_amount'],
             'payment_methods': payment_breakdown
         }
     
     @staticmethod
+    @report_cache.ReportCache.cached(('orders',))
     def get_popular_items(date_range='today', limit=10):
         """Get most popular menu items"""
-        conn = database.get_connection()
-        cursor = conn.cursor()
+        today = database.get_business_date()
         
         if date_range == 'today':
-            start_date = datetime.now().strftime('%Y-%m-%d')
-            end_date = start_date
+            start_date = end_date = today
         elif date_range == 'week':
-            start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-            end_date = datetime.now().strftime('%Y-%m-%d')
+            start_date, end_date = today - timedelta(days=7), today
         elif date_range == 'month':
-            start_date = datetime.now().replace(day=1).strftime('%Y-%m-%d')
-            end_date = datetime.now().strftime('%Y-%m-%d')
-        else:
-            start_date = None
-            end_date = None
-        
-        if start_date:
-            cursor.execute("""
-                SELECT mi.name, mi.category, SUM(oi.quantity) as total_quantity, 
-                       SUM(oi.total) as total_revenue
-                FROM order_items oi
-                JOIN menu_items mi ON oi.menu_item_id = mi.id
-                JOIN orders o ON oi.order_id = o.id
-                WHERE DATE(o.order_date) BETWEEN ? AND ?
-                GROUP BY mi.id
-                ORDER BY total_quantity DESC
-                LIMIT ?
-            """, (start_date, end_date, limit))
+            start_date, end_date = today.replace(day=1), today
         else:
-            cursor.execute("""
-                SELECT mi.name, mi.category, SUM(oi.quantity) as total_quantity, 
-                       SUM(oi.total) as total_revenue
-                FROM order_items oi
-                JOIN menu_items mi ON oi.menu_item_id = mi.id
-                GROUP BY mi.id
-                ORDER BY total_quantity DESC
-                LIMIT ?
-            """, (limit,))
-        
-        popular_items = cursor.fetchall()
-        conn.close()
-        
-        return popular_items
+            start_date = end_date = None
+        
+        items = SalesCube.query(('item',), start_date=start_date, end_date=end_date,
+                                order_by='quantity', limit=limit)
+        return [
+            {'name': row['name'], 'category': row['category'],
+             'total_quantity': row['quantity'], 'total_revenue': row['revenue']}
+            for row in items
+        ]
     
     @staticmethod
-    def get_monthly_revenue_trend(months=6):
-        """Get monthly revenue trend"""
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT 
-                strftime('%Y-%m', order_date) as month,
-                COUNT(*) as total_orders,
-                SUM(final_amount) as revenue,
-                SUM(CASE WHEN t.type = 'cash' THEN final_amount ELSE 0 END) as cash_revenue,
-                SUM(CASE WHEN t.type = 'card' THEN final_amount ELSE 0 END) as card_revenue,
-                SUM(CASE WHEN t.type = 'upi' THEN final_amount ELSE 0 END) as upi_revenue
-            FROM orders o
-            LEFT JOIN transactions t ON o.id = t.order_id
-            WHERE order_date >= date('now', '-' || ? || ' months')
-            GROUP BY month
-            ORDER BY month ASC
-        """, (months,))
-        
-        trend = cursor.fetchall()
-        conn.close()
-        
+    @report_cache.ReportCache.cached(('orders',), ttl=900)
+    def get_monthly_revenue_trend(months=6, start_month=None, end_month=None):
+        """
+        Get monthly revenue trend
+        Args:
+            months: Number of months ending with end_month, when start_month is not given
+            start_month, end_month: 'YYYY-MM' range, inclusive (end defaults to the current month)
+        Returns:
+            One dict per month (empty months included) with total_orders,
+            revenue and <method>_revenue per payment method (cash, card and upi
+            always present; split bills counted per tender)
+        """
+        end_month = end_month or database.get_business_date().strftime('%Y-%m')
+        if not start_month:
+            first_month = int(end_month[:4]) * 12 + int(end_month[5:7]) - months
+            start_month = f"{first_month // 12:04d}-{first_month % 12 + 1:02d}"
+        
+        trend = []
+        for month in sales_summary.SalesSummary.get_monthly_totals(start_month, end_month):
+            trend.append({
+                'month': month['month'],
+                'total_orders': month['order_count'],
+                'revenue': month['final_amount'],
+                **{f"{method}_revenue": amount for method, amount in month['payments'].items()}
+            })
         return trend
     
     @staticmethod
+    @report_cache.ReportCache.cached(('expenses',))
     def get_expense_breakdown(start_date=None, end_date=None):
         """Get expense breakdown by category"""
         conn = database.get_connection()
@@ -167,6 +125,7 @@ class Analytics:
         return breakdown
     
     @staticmethod
+    @report_cache.ReportCache.cached(('orders', 'expenses', 'ingredients'))
     def get_profit_margin(start_date=None, end_date=None):
         """Get profit margin analysis"""
         conn = database.get_connection()
@@ -177,11 +136,7 @@ class Analytics:
             end_date = datetime.now().strftime('%Y-%m-%d')
         
         # Get total revenue
-        cursor.execute("""
-            SELECT COALESCE(SUM(final_amount), 0) FROM orders
-            WHERE DATE(order_date) BETWEEN ? AND ?
-        """, (start_date, end_date))
-        total_revenue = cursor.fetchone()[0]
+        total_revenue = sales_summary.SalesSummary.get_totals(start_date, end_date)['final_amount']
         
         # Get total expenses
         cursor.execute("""
@@ -190,15 +145,10 @@ class Analytics:
         """, (start_date, end_date))
         total_expenses = cursor.fetchone()[0]
         
-        # Get COGS (cost of goods sold)
-        cursor.execute("""
-            SELECT COALESCE(SUM(st.quantity * i.cost_per_unit), 0)
-            FROM stock_transactions st
-            JOIN ingredients i ON st.ingredient_id = i.id
-            WHERE st.transaction_type = 'out'
-            AND DATE(st.timestamp) BETWEEN ? AND ?
-        """, (start_date, end_date))
-        cogs = cursor.fetchone()[0]
+        # Get COGS (cost of goods sold) - every stock outflow at FIFO lot cost
+        cogs = inventory_manager.InventoryManager.get_consumption_cost(
+            start_date, end_date, orders_only=False
+        )
         
         # Calculate profit
         gross_profit = total_revenue - cogs
@@ -219,11 +169,9 @@ class Analytics:
         }
     
     @staticmethod
+    @report_cache.ReportCache.cached(('orders',))
     def get_tax_summary(period='month'):
         """Get tax summary"""
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
         if period == 'month':
             start_date = datetime.now().replace(day=1).strftime('%Y-%m-%d')
             end_date = datetime.now().strftime('%Y-%m-%d')
@@ -235,27 +183,23 @@ class Analytics:
             start_date = datetime.now().replace(month=1, day=1).strftime('%Y-%m-%d')
             end_date = datetime.now().strftime('%Y-%m-%d')
         
-        # Get GST collected from orders
-        cursor.execute("""
-            SELECT 
-                COALESCE(SUM(gst_amount), 0) as gst_collected,
-                COALESCE(SUM(final_amount - gst_amount), 0) as taxable_amount
-            FROM orders
-            WHERE DATE(order_date) BETWEEN ? AND ? AND gst_enabled = 1
-        """, (start_date, end_date))
-        
-        tax_data = cursor.fetchone()
-        conn.close()
+        # Get GST collected from the daily sales summary, split per rate by the GST engine
+        totals = sales_summary.SalesSummary.get_totals(start_date, end_date)
+        gst_return = gst_engine.GSTEngine.get_return_summary(start_date, end_date)
         
         return {
             'period': period,
             'start_date': start_date,
             'end_date': end_date,
-            'gst_collected': tax_data['gst_collected'],
-            'taxable_amount': tax_data['taxable_amount']
+            'gst_collected': totals['gst_amount'],
+            'taxable_amount': totals['final_amount'] - totals['gst_amount'],
+            'cgst': gst_return['cgst'],
+            'sgst': gst_return['sgst'],
+            'rates': gst_return['rates']
         }
     
     @staticmethod
+    @report_cache.ReportCache.cached(('ingredients',))
     def get_low_stock_items(threshold_percentage=20):
         """Get low stock items"""
         conn = database.get_connection()
@@ -281,21 +225,33 @@ class Analytics:
         return low_stock
     
     @staticmethod
-    def get_high_cost_ingredients(limit=10):
-        """Get highest cost ingredients"""
+    def get_high_cost_ingredients(limit=10, days=30):
+        """Get highest cost ingredients by consumption value over recent days"""
         conn = database.get_connection()
         cursor = conn.cursor()
         
+        start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        
         cursor.execute("""
             SELECT 
                 i.name,
                 i.current_stock,
                 i.cost_per_unit,
-                (i.current_stock * i.cost_per_unit) as total_value
+                (i.current_stock * i.cost_per_unit) as total_value,
+                COALESCE(r.consumed_quantity, 0) as consumed_quantity,
+                COALESCE(r.consumed_value, 0) as consumed_value
             FROM ingredients i
-            ORDER BY total_value DESC
+            LEFT JOIN (
+                SELECT ingredient_id,
+                       SUM(quantity) as consumed_quantity,
+                       SUM(value) as consumed_value
+                FROM stock_daily_rollup
+                WHERE day >= ? AND transaction_type = 'out'
+                GROUP BY ingredient_id
+            ) r ON r.ingredient_id = i.id
+            ORDER BY consumed_value DESC, total_value DESC
             LIMIT ?
-        """, (limit,))
+        """, (start_date, limit))
         
         high_cost = cursor.fetchall()
         conn.close()
@@ -316,13 +272,13 @@ class Analytics:
             SELECT 
                 i.name,
                 i.unit,
-                SUM(st.quantity) as waste_quantity,
-                SUM(st.quantity * i.cost_per_unit) as waste_value
-            FROM stock_transactions st
-            JOIN ingredients i ON st.ingredient_id = i.id
-            WHERE st.transaction_type = 'out'
-            AND st.reason LIKE '%waste%'
-            AND DATE(st.timestamp) BETWEEN ? AND ?
+                SUM(r.quantity) as waste_quantity,
+                SUM(r.value) as waste_value
+            FROM stock_daily_rollup r
+            JOIN ingredients i ON r.ingredient_id = i.id
+            WHERE r.day BETWEEN ? AND ?
+            AND r.reason_code = 'waste'
+            AND r.transaction_type = 'out'
             GROUP BY i.id
             ORDER BY waste_value DESC
         """, (start_date, end_date))
@@ -399,58 +355,26 @@ class Analytics:
         return attendance
     
     @staticmethod
+    @report_cache.ReportCache.cached(('orders',))
     def get_category_performance(start_date=None, end_date=None):
         """Get sales performance by category"""
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
         if not start_date or not end_date:
             start_date = datetime.now().replace(day=1).strftime('%Y-%m-%d')
             end_date = datetime.now().strftime('%Y-%m-%d')
         
-        cursor.execute("""
-            SELECT 
-                mi.category,
-                COUNT(DISTINCT o.id) as order_count,
-                SUM(oi.quantity) as total_items,
-                SUM(oi.total) as total_revenue
-            FROM orders o
-            JOIN order_items oi ON o.id = oi.order_id
-            JOIN menu_items mi ON oi.menu_item_id = mi.id
-            WHERE DATE(o.order_date) BETWEEN ? AND ?
-            GROUP BY mi.category
-            ORDER BY total_revenue DESC
-        """, (start_date, end_date))
-        
-        category_perf = cursor.fetchall()
-        conn.close()
-        
-        return category_perf
+        return sales_summary.SalesSummary.get_category_totals(start_date, end_date)
     
     @staticmethod
+    @report_cache.ReportCache.cached(('orders',), ttl=60)
     def get_hourly_sales_trend(date=None):
-        """Get hourly sales trend for a specific date"""
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
+        """Get hourly sales trend for a specific business date"""
         if not date:
-            date = datetime.now().strftime('%Y-%m-%d')
-        
-        cursor.execute("""
-            SELECT 
-                strftime('%H', order_date) as hour,
-                COUNT(*) as order_count,
-                SUM(final_amount) as revenue
-            FROM orders
-            WHERE DATE(order_date) = ?
-            GROUP BY hour
-            ORDER BY hour ASC
-        """, (date,))
-        
-        hourly = cursor.fetchall()
-        conn.close()
+            date = database.get_business_date_string()
         
-        return hourly
+        return [
+            {'hour': f"{row['hour']:02d}", 'order_count': row['order_count'], 'revenue': row['final_amount']}
+            for row in SalesCube.query(('hour',), start_date=date, end_date=date, grain='orders', order_by='hour')
+        ]
     
     @staticmethod
     def get_table_occupancy(start_date=None, end_date=None):
@@ -498,39 +422,18 @@ class Analytics:
     @staticmethod
     def get_customer_preferences():
         """Get customer preferences analysis"""
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
         # Most ordered items
-        cursor.execute("""
-            SELECT 
-                mi.name,
-                mi.food_type,
-                SUM(oi.quantity) as total_orders,
-                SUM(oi.total) as total_revenue
-            FROM order_items oi
-            JOIN menu_items mi ON oi.menu_item_id = mi.id
-            GROUP BY mi.id
-            ORDER BY total_orders DESC
-            LIMIT 20
-        """)
-        
-        top_items = cursor.fetchall()
+        top_items = [
+            {'name': row['name'], 'food_type': row['food_type'],
+             'total_orders': row['quantity'], 'total_revenue': row['revenue']}
+            for row in SalesCube.query(('item',), order_by='quantity', limit=20)
+        ]
         
         # Veg vs Non-Veg preference
-        cursor.execute("""
-            SELECT 
-                mi.food_type,
-                COUNT(*) as order_count,
-                SUM(oi.quantity) as total_quantity
-            FROM order_items oi
-            JOIN menu_items mi ON oi.menu_item_id = mi.id
-            GROUP BY mi.food_type
-        """)
-        
-        food_pref = cursor.fetchall()
-        
-        conn.close()
+        food_pref = [
+            {'food_type': row['food_type'], 'order_count': row['order_count'], 'total_quantity': row['quantity']}
+            for row in SalesCube.query(('food_type',))
+        ]
         
         return {
             'top_items': top_items,
@@ -545,27 +448,23 @@ class Analytics:
         
         start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
         
+        query = """
+            SELECT 
+                i.name,
+                i.current_stock,
+                COALESCE(SUM(CASE WHEN r.transaction_type = 'out' THEN r.quantity END), 0) as total_out,
+                COALESCE(SUM(CASE WHEN r.transaction_type = 'in' THEN r.quantity END), 0) as total_in
+            FROM ingredients i
+            LEFT JOIN stock_daily_rollup r ON i.id = r.ingredient_id AND r.day >= ?
+        """
+        
         if ingredient_id:
-            cursor.execute("""
-                SELECT 
-                    i.name,
-                    i.current_stock,
-                    SUM(CASE WHEN st.transaction_type = 'out' THEN st.quantity ELSE 0 END) as total_out,
-                    SUM(CASE WHEN st.transaction_type = 'in' THEN st.quantity ELSE 0 END) as total_in
-                FROM ingredients i
-                LEFT JOIN stock_transactions st ON i.id = st.ingredient_id
-                WHERE i.id = ? AND DATE(st.timestamp) >= ?
+            cursor.execute(query + """
+                WHERE i.id = ?
                 GROUP BY i.id
-            """, (ingredient_id, start_date))
+            """, (start_date, ingredient_id))
         else:
-            cursor.execute("""
-                SELECT 
-                    i.name,
-                    i.current_stock,
-                    SUM(CASE WHEN st.transaction_type = 'out' THEN st.quantity ELSE 0 END) as total_out,
-                    SUM(CASE WHEN st.transaction_type = 'in' THEN st.quantity ELSE 0 END) as total_in
-                FROM ingredients i
-                LEFT JOIN stock_transactions st ON i.id = st.ingredient_id AND DATE(st.timestamp) >= ?
+            cursor.execute(query + """
                 GROUP BY i.id
                 ORDER BY total_out DESC
                 LIMIT 20
@@ -631,22 +530,10 @@ class Analytics:
             end_date = datetime.now().strftime('%Y-%m-%d')
         
         # Revenue
-        cursor.execute("""
-            SELECT COALESCE(SUM(final_amount), 0) FROM orders
-            WHERE DATE(order_date) BETWEEN ? AND ?
-        """, (start_date, end_date))
-        revenue = cursor.fetchone()[0]
+        revenue = sales_summary.SalesSummary.get_totals(start_date, end_date)['final_amount']
         
-        # COGS
-        cursor.execute("""
-            SELECT COALESCE(SUM(st.quantity * i.cost_per_unit), 0)
-            FROM stock_transactions st
-            JOIN ingredients i ON st.ingredient_id = i.id
-            WHERE st.transaction_type = 'out'
-            AND st.reason LIKE '%order%'
-            AND DATE(st.timestamp) BETWEEN ? AND ?
-        """, (start_date, end_date))
-        cogs = cursor.fetchone()[0]
+        # COGS - stock drawn for orders at FIFO lot cost
+        cogs = inventory_manager.InventoryManager.get_consumption_cost(start_date, end_date)
         
         # Expenses
         cursor.execute("""
@@ -682,15 +569,226 @@ class Analytics:
         }
     
     @staticmethod
-    def get_dashboard_widgets():
-        """Get all dashboard widgets data"""
-        return {
-            'today_summary': Analytics.get_today_summary(),
-            'popular_items': Analytics.get_popular_items('today', 5),
-            'monthly_trend': Analytics.get_monthly_revenue_trend(6),
-            'expense_breakdown': Analytics.get_expense_breakdown(),
-            'profit_margin': Analytics.get_profit_margin(),
-            'tax_summary': Analytics.get_tax_summary('month'),
-            'low_stock': Analytics.get_low_stock_items(),
-            'attendance_summary': Analytics.get_attendance_summary()
-        }
+    @report_cache.ReportCache.cached(('orders',), ttl=900)
+    def get_sales_patterns(start_date=None, end_date=None):
+        """
+        Hourly heatmap, weekday x hour matrices, daily revenue with rolling
+        average, basket sizes and bill percentiles (last 12 months by default)
+        Returns:
+            Dict from ColumnarAnalytics.analyze_period, or None without NumPy
+        """
+        if not end_date:
+            end_date = database.get_business_date()
+        if not start_date:
+            start_date = datetime.strptime(str(end_date), '%Y-%m-%d') - timedelta(days=364)
+            start_date = start_date.strftime('%Y-%m-%d')
+        
+        return columnar_analytics.ColumnarAnalytics.analyze_period(start_date, end_date)
+    
+    @staticmethod
+    def get_dashboard_widgets(callback=None):
+        """
+        Get all dashboard widgets data
+        Args:
+            callback: Optional callback(name, data, elapsed_ms) run as each widget is ready
+        Returns:
+            (widgets dict in display order, errors dict of name -> message);
+            a failed widget's data is None and its error is printed
+        """
+        widgets, errors = {}, {}
+        for name, data, elapsed_ms, error in DashboardEngine.iter_widgets():
+            widgets[name] = data
+            if error:
+                errors[name] = error
+                print(f"Error computing dashboard widget {name}: {error}")
+            if callback:
+                callback(name, data, elapsed_ms)
+        return {name: widgets[name] for name in DashboardEngine.WIDGETS}, errors
+
+
+class SalesCube:
+    """
+    Slice, dice and roll-up queries over the pre-aggregated sales cube
+    
+    The cube is kept by SalesSummary on every checkout and void, so these
+    queries read a few rows per business day and hour instead of joining
+    order_items to orders and menu_items.
+    """
+    
+    # Dimension name -> SQL expression on the cube (c) or menu_items (m)
+    DIMENSIONS = {
+        'date': 'c.business_date',
+        'month': 'substr(c.business_date, 1, 7)',
+        'year': 'substr(c.business_date, 1, 4)',
+        'weekday': "CAST(strftime('%w', c.business_date) AS INTEGER)",
+        'hour': 'c.hour',
+        'payment_method': 'c.payment_method',
+        'item': 'c.menu_item_id',
+        'category': 'c.category',
+        'food_type': 'm.food_type'
+    }
+    ITEM_DIMENSIONS = ('item', 'category', 'food_type')
+    
+    # Grain -> (table, measures)
+    GRAINS = {
+        'items': ('sales_cube', {
+            'order_count': 'SUM(c.order_count)',
+            'quantity': 'SUM(c.quantity)',
+            'revenue': 'SUM(c.revenue)'
+        }),
+        'orders': ('sales_cube_orders', {
+            'order_count': 'SUM(c.order_count)',
+            'subtotal': 'SUM(c.subtotal)',
+            'final_amount': 'SUM(c.final_amount)'
+        })
+    }
+    
+    @staticmethod
+    def query(group_by=(), filters=None, start_date=None, end_date=None, grain='items',
+              order_by=None, limit=None):
+        """
+        Aggregate the cube
+        Args:
+            group_by: Dimensions to keep (roll-up is grouping by fewer or coarser
+                      ones, e.g. 'month' instead of 'date')
+            filters: Dict of dimension -> value (slice) or list of values (dice)
+            start_date, end_date: Business date range (inclusive, optional)
+            grain: 'items' (order_count, quantity, revenue of item lines) or
+                   'orders' (order_count, subtotal, final_amount of bills)
+            order_by: Measure or dimension to sort on (descending for measures)
+            limit: Maximum rows
+        Returns:
+            List of dicts with the dimensions and measures; grouping by 'item'
+            also returns the item's name and category
+        """
+        if grain not in SalesCube.GRAINS:
+            raise ValueError(f"Unknown grain: {grain}")
+        table, measures = SalesCube.GRAINS[grain]
+        filters = filters or {}
+        
+        dimensions = list(group_by) + [name for name in filters if name not in group_by]
+        for name in dimensions:
+            if name not in SalesCube.DIMENSIONS:
+                raise ValueError(f"Unknown dimension: {name}")
+            if grain == 'orders' and name in SalesCube.ITEM_DIMENSIONS:
+                raise ValueError(f"Dimension {name} is only available at the items grain")
+        
+        columns = [f"{SalesCube.DIMENSIONS[name]} as {name}" for name in group_by]
+        if 'item' in group_by:
+            columns.append('MIN(m.name) as name')
+            for name in ('category', 'food_type'):
+                if name not in group_by:
+                    columns.append(f"MIN({SalesCube.DIMENSIONS[name]}) as {name}")
+        columns += [f"{expression} as {name}" for name, expression in measures.items()]
+        
+        joins = ''
+        if grain == 'items' and ({'item', 'food_type'} & set(dimensions)):
+            joins = 'LEFT JOIN menu_items m ON m.id = c.menu_item_id'
+        
+        conditions, params = [], []
+        if start_date:
+            conditions.append('c.business_date >= ?')
+            params.append(str(start_date))
+        if end_date:
+            conditions.append('c.business_date <= ?')
+            params.append(str(end_date))
+        for name, value in filters.items():
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            conditions.append(f"{SalesCube.DIMENSIONS[name]} IN ({','.join(['?'] * len(values))})")
+            params.extend(values)
+        
+        sql = f"SELECT {', '.join(columns)} FROM {table} c {joins}"
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        if group_by:
+            sql += ' GROUP BY ' + ', '.join(SalesCube.DIMENSIONS[name] for name in group_by)
+        if order_by:
+            if order_by in measures:
+                sql += f" ORDER BY {order_by} DESC"
+            elif order_by in group_by:
+                sql += f" ORDER BY {order_by}"
+            else:
+                raise ValueError(f"Cannot order by {order_by}")
+        elif group_by:
+            sql += ' ORDER BY ' + ', '.join(group_by)
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        
+        # No matching cells: zero measures rather than NULLs for an ungrouped total
+        if not group_by:
+            rows = [{name: value or 0 for name, value in row.items()} for row in rows]
+        return rows
+
+
+class DashboardEngine:
+    """Runs the independent dashboard widget queries in parallel"""
+    
+    MAX_WORKERS = 4
+    
+    # name -> (function, args); each runs on its own read-only connection
+    WIDGETS = {
+        'today_summary': (Analytics.get_today_summary, ()),
+        'popular_items': (Analytics.get_popular_items, ('today', 5)),
+        'monthly_trend': (Analytics.get_monthly_revenue_trend, (6,)),
+        'expense_breakdown': (Analytics.get_expense_breakdown, ()),
+        'profit_margin': (Analytics.get_profit_margin, ()),
+        'tax_summary': (Analytics.get_tax_summary, ('month',)),
+        'low_stock': (Analytics.get_low_stock_items, ()),
+        'attendance_summary': (Analytics.get_attendance_summary, ())
+    }
+    
+    @staticmethod
+    def _run_widget(name, function, args):
+        """Compute one widget, timing it; errors are returned rather than raised"""
+        start = time.perf_counter()
+        try:
+            data, error = function(*args), None
+        except Exception as e:
+            data, error = None, str(e)
+        return name, data, (time.perf_counter() - start) * 1000, error
+    
+    @staticmethod
+    def iter_widgets(names=None, max_workers=None):
+        """
+        Compute widgets on a thread pool, yielding each one as soon as it is ready
+        Args:
+            names: Widgets to compute (default: all of WIDGETS)
+            max_workers: Thread pool size (default: MAX_WORKERS)
+        Yields:
+            (name, data, elapsed_ms, error) in completion order; data is None
+            and error holds the message when a widget fails
+        
+        Worker threads only get read-only connections, so a dashboard refresh
+        can never write and, in WAL mode, never waits on a checkout.
+        """
+        names = list(names or DashboardEngine.WIDGETS)
+        with ThreadPoolExecutor(max_workers=max_workers or DashboardEngine.MAX_WORKERS,
+                                initializer=database.use_read_only_connections) as executor:
+            futures = [
+                executor.submit(DashboardEngine._run_widget, name, *DashboardEngine.WIDGETS[name])
+                for name in names
+            ]
+            for future in as_completed(futures):
+                yield future.result()
+    
+    @staticmethod
+    def compute(names=None, max_workers=None):
+        """
+        Compute widgets in parallel and collect them
+        Returns:
+            (widgets dict, timings dict of name -> elapsed ms, errors dict of name -> message)
+        """
+        widgets, timings, errors = {}, {}, {}
+        for name, data, elapsed_ms, error in DashboardEngine.iter_widgets(names, max_workers):
+            widgets[name] = data
+            timings[name] = round(elapsed_ms, 2)
+            if error:
+                errors[name] = error
+        return widgets, timings, errors
@@ -15,6 +15,10 @@ import thermal_printer
 import admin_panel
 import inventory_manager
 import accounting
+import sales_summary
+import gst_engine
+import report_cache
+import job_scheduler
 import sqlite3
 from datetime import datetime
 
@@ -53,6 +57,9 @@ class RestaurantApp:
         
         # Start Telegram bot polling
         telegram_bot.start_bot_polling()
+        
+        # Start the nightly automation and backup scheduler
+        job_scheduler.JobScheduler.start()
     
     def load_restaurant_data(self):
         """Load restaurant settings"""
@@ -848,7 +855,8 @@ class RestaurantApp:
         service_charge_rate = settings[1] if settings[1] else 0
         
         service_charge = (subtotal * service_charge_rate / 100) if service_charge_rate > 0 else 0
-        gst_amount = (subtotal * 0.05) if gst_enabled else 0
+        # GST per line at each item's rate (tags the cart items with CGST/SGST)
+        gst_amount = gst_engine.GSTEngine.apply_item_taxes(self.order_cart, gst_enabled=bool(gst_enabled))
         total_amount = subtotal + service_charge + gst_amount
         
         conn.close()
@@ -931,7 +939,10 @@ class RestaurantApp:
             bill_content += f"Service Charge   {self.currency} {service_charge:7.2f}\n"
         
         if gst_amount > 0:
-            bill_content += f"GST (5%)         {self.currency} {gst_amount:7.2f}\n"
+            cgst = sum(item.get('cgst', 0) for item in items)
+            sgst = sum(item.get('sgst', 0) for item in items)
+            bill_content += f"CGST             {self.currency} {cgst:7.2f}\n"
+            bill_content += f"SGST             {self.currency} {sgst:7.2f}\n"
         
         bill_content += f"{'='*50}\n"
         bill_content += f"TOTAL            {self.currency} {total_amount:7.2f}\n"
@@ -985,7 +996,7 @@ class RestaurantApp:
         # Add processing flag to prevent double-clicks
         payment_processing = {'active': False}
         
-        def process_payment(mode):
+        def process_payment(mode, payments=None):
             # Prevent double-clicks
             if payment_processing['active']:
                 return
@@ -994,14 +1005,11 @@ class RestaurantApp:
             payment_processing['active'] = True
             
             try:
-                # Save order to database
-                order_id = self.save_order_to_db(table_number, items, subtotal, service_charge, gst_amount, total_amount)
-            
-                # Record accounting transaction
-                accounting.AccountingSystem.record_order_transaction(order_id, total_amount, mode)
+                # Save order to database, with its ledger and cash book entries
+                order_id = self.save_order_to_db(table_number, items, subtotal, service_charge, gst_amount, total_amount, mode, payments)
                 
                 # Deduct stock for order
-                success, transaction_summary = inventory_manager.InventoryManager.deduct_order_stock(items)
+                success, transaction_summary = inventory_manager.InventoryManager.deduct_order_stock(items, order_id)
                 if not success:
                     print(f"Stock deduction warning: {transaction_summary}")
                 
@@ -1077,9 +1085,54 @@ class RestaurantApp:
             command=lambda: process_payment("UPI")
         )
         btn_upi.pack(side='left', expand=True, padx=5)
+        
+        def process_split_payment():
+            """Ask for the cash and card parts; the remainder is paid by UPI"""
+            cash = simpledialog.askfloat(
+                "Split Payment",
+                f"Cash amount (bill total {self.currency}{total_amount:.2f}):",
+                minvalue=0, maxvalue=total_amount, parent=bill_window
+            )
+            if cash is None:
+                return
+            card = simpledialog.askfloat(
+                "Split Payment",
+                f"Card amount (remaining {self.currency}{total_amount - cash:.2f}):",
+                minvalue=0, maxvalue=total_amount - cash, parent=bill_window
+            )
+            if card is None:
+                return
+            upi = round(total_amount - cash - card, 2)
+            process_payment("Split", [('cash', cash), ('card', card), ('upi', upi)])
+        
+        btn_split = tk.Button(
+            payment_frame,
+            text="Split Payment",
+            font=('Arial', 12, 'bold'),
+            bg='#7f8c8d',
+            fg='white',
+            command=process_split_payment
+        )
+        btn_split.pack(side='left', expand=True, padx=5)
     
-    def save_order_to_db(self, table_number, items, subtotal, service_charge, gst_amount, total_amount):
-        """Save order to database"""
+    def save_order_to_db(self, table_number, items, subtotal, service_charge, gst_amount, total_amount,
+                         payment_method='cash', payments=None):
+        """
+        Save order to database, add it to the daily sales summary and post it
+        to the ledger and cash book, all in one transaction
+        Args:
+            payment_method: Tender mode ('Cash', 'Card', 'UPI'); 'Split' when payments is given
+            payments: List of (payment_method, amount) for a split payment
+        """
+        payment_method = sales_summary.SalesSummary.normalize_payment_method(payment_method)
+        if payments:
+            payments = [(sales_summary.SalesSummary.normalize_payment_method(method), amount)
+                        for method, amount in payments if amount > 0]
+            if abs(sum(amount for method, amount in payments) - total_amount) > 0.01:
+                raise ValueError("Split payment amounts do not add up to the bill total")
+        else:
+            payments = [(payment_method, total_amount)]
+        
         conn = database.get_connection()
         cursor = conn.cursor()
         
@@ -1090,8 +1143,8 @@ class RestaurantApp:
         cursor.execute("""
             INSERT INTO orders 
             (table_number, order_date, business_date, total_amount, gst_amount, service_charge, 
-             discount, final_amount, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+             discount, final_amount, status, payment_method)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (
             table_number,
             datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
@@ -1101,27 +1154,49 @@ class RestaurantApp:
             service_charge,
             0,
             total_amount,
-            'completed'
+            'completed',
+            payment_method
         ))
         
         order_id = cursor.lastrowid
         
-        # Insert order items
+        # Insert order items with their line tax
         for item in items:
             cursor.execute("""
                 INSERT INTO order_items 
-                (order_id, menu_item_id, quantity, price, total)
-                VALUES (?, ?, ?, ?, ?)
+                (order_id, menu_item_id, quantity, price, total,
+                 hsn_code, gst_rate, taxable_value, cgst, sgst)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 order_id,
                 item['item_id'],
                 1,
                 item['price'],
-                item['price']
+                item['price'],
+                item.get('hsn_code'),
+                item.get('gst_rate', 0),
+                item.get('taxable_value', item['price']),
+                item.get('cgst', 0),
+                item.get('sgst', 0)
             ))
         
+        # Store the tenders, routed to their accounts
+        accounting.AccountingSystem._record_order_payments(cursor, order_id, business_date, payments)
+        
+        # Keep the daily summaries in step with this order (same transaction)
+        sales_summary.SalesSummary._apply_order(cursor, order_id)
+        
+        # Journal entry and cash book rows: a bill is never saved without them
+        try:
+            accounting.AccountingSystem._record_order_transaction(cursor, order_id, total_amount, payment_method)
+        except Exception:
+            conn.rollback()
+            conn.close()
+            raise
+        
         conn.commit()
         conn.close()
+        report_cache.ReportCache.invalidate('orders')
         
         return order_id
     
@@ -6,6 +6,11 @@ Handles automatic purchase orders, financial alerts, and performance alerts
 import database
 from datetime import datetime, timedelta
 import json
+from stock_forecast import StockForecast
+from accounting import AccountingSystem
+from item_affinity import ItemAffinity
+from prep_forecast import PrepForecast
+from menu_engineering import MenuEngineering
 
 class Automation:
     """Automation and alerts system"""
@@ -69,9 +74,17 @@ class Automation:
                     return False, "No suppliers available"
                 supplier_id = supplier_data['id']
         
-        # Determine quantity if not provided (order 2x minimum stock)
+        # Determine quantity if not provided: forecast order-up-to quantity,
+        # falling back to 2x minimum stock when there is no forecast
         if not quantity:
-            quantity = min_stock * 2
+            plan = StockForecast.get_reorder_plan([ingredient_id]).get(ingredient_id)
+            if plan and plan['method'] == 'forecast':
+                if plan['order_quantity'] <= 0:
+                    conn.close()
+                    return False, f"No order needed: forecast demand for {ingredient_name} is covered"
+                quantity = plan['order_quantity']
+            else:
+                quantity = min_stock * 2
         
         # Get average price from last purchase
         cursor.execute("""
@@ -116,11 +129,23 @@ class Automation:
     @staticmethod
     def check_all_low_stock_and_create_pos():
         """Check all low stock items and create purchase orders"""
-        low_stock_items = Automation.check_stock_levels()
+        # One vectorised forecast for every ingredient; without NumPy fall back
+        # to the min_stock rule
+        plan = StockForecast.get_reorder_plan()
+        if plan:
+            reorder_items = [
+                {'id': ingredient_id, 'name': item['name'], 'quantity': item['order_quantity']}
+                for ingredient_id, item in plan.items() if item['needs_reorder']
+            ]
+        else:
+            reorder_items = [
+                {'id': item['id'], 'name': item['name'], 'quantity': None}
+                for item in Automation.check_stock_levels()
+            ]
         
         created_pos = []
-        for item in low_stock_items:
-            success, message = Automation.auto_generate_purchase_order(item['id'])
+        for item in reorder_items:
+            success, message = Automation.auto_generate_purchase_order(item['id'], quantity=item['quantity'])
             if success:
                 created_pos.append({
                     'ingredient': item['name'],
@@ -162,19 +187,15 @@ class FinancialAlerts:
     @staticmethod
     def check_cash_balance():
         """Check cash account balance and alert if low"""
-        conn = database.get_connection()
-        cursor = conn.cursor()
-        
-        # Get cash account balance
-        cursor.execute("SELECT balance FROM accounts WHERE type = 'cash' LIMIT 1")
-        cash_data = cursor.fetchone()
-        
-        conn.close()
+        # Get cash account balance from the general ledger
+        cash_accounts = [
+            account for account in AccountingSystem.get_account_summary() if account['type'] == 'cash'
+        ]
         
-        if not cash_data:
+        if not cash_accounts:
             return None, "No cash account found"
         
-        balance = cash_data['balance']
+        balance = cash_accounts[0]['balance']
         
         # Low balance threshold: 10000
         if balance < 10000:
@@ -347,19 +368,15 @@ class PerformanceAlerts:
                 i.id,
                 i.name,
                 i.current_stock,
-                COALESCE(
-                    (SELECT SUM(CASE WHEN st.transaction_type = 'in' THEN st.quantity ELSE -st.quantity END)
-                     FROM stock_transactions st
-                     WHERE st.ingredient_id = i.id),
-                    0
-                ) as calculated_stock
+                COALESCE(r.net_quantity, 0) as calculated_stock
             FROM ingredients i
-            WHERE ABS(i.current_stock - COALESCE(
-                (SELECT SUM(CASE WHEN st.transaction_type = 'in' THEN st.quantity ELSE -st.quantity END)
-                 FROM stock_transactions st
-                 WHERE st.ingredient_id = i.id),
-                0
-            )) > 1
+            LEFT JOIN (
+                SELECT ingredient_id,
+                       SUM(CASE WHEN transaction_type = 'in' THEN quantity ELSE -quantity END) as net_quantity
+                FROM stock_daily_rollup
+                GROUP BY ingredient_id
+            ) r ON r.ingredient_id = i.id
+            WHERE ABS(i.current_stock - COALESCE(r.net_quantity, 0)) > 1
         """)
         
         discrepancies = cursor.fetchall()
@@ -460,6 +477,33 @@ class AutomationManager:
                 'details': created_pos
             })
         
+        # Count the dishes ordered together on days changed since the last run
+        success, message = ItemAffinity.update()
+        results['tasks'].append({
+            'task': 'item_affinity',
+            'status': 'completed' if success else 'failed',
+            'details': message
+        })
+        
+        # Forecast tomorrow's dish sales for the kitchen prep sheet
+        if PrepForecast.is_available():
+            success, message = PrepForecast.refresh()
+            results['tasks'].append({
+                'task': 'prep_forecast',
+                'status': 'completed' if success else 'failed',
+                'details': message
+            })
+        
+        # Reclassify the menu for this month (and last month's final figures on the 1st)
+        yesterday = database.get_business_date() - timedelta(days=1)
+        for period in sorted({yesterday.strftime('%Y-%m'), database.get_business_date().strftime('%Y-%m')}):
+            success, message = MenuEngineering.refresh(period)
+            results['tasks'].append({
+                'task': 'menu_engineering',
+                'status': 'completed' if success else 'failed',
+                'details': message
+            })
+        
         # Get all alerts
         financial_alerts = FinancialAlerts.get_all_financial_alerts()
         performance_alerts = PerformanceAlerts.get_all_performance_alerts()
@@ -4,6 +4,7 @@ Handles database backups, data export, security, and audit logs
 """
 
 import database
+import sqlite3
 import shutil
 import os
 from datetime import datetime, timedelta
@@ -30,8 +31,16 @@ class BackupManager:
         backup_path = os.path.join(BackupManager.BACKUP_DIR, backup_filename)
         
         try:
-            # Copy database file
-            shutil.copy2(database.DATABASE_NAME, backup_path)
+            # Snapshot through SQLite's backup API on a read-only connection: a
+            # file copy would miss commits still in the write-ahead log, and the
+            # read-only source never blocks a checkout
+            source = database.get_read_only_connection()
+            target = sqlite3.connect(backup_path)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
             
             # Create metadata file
             metadata = {
@@ -474,8 +483,9 @@ class AutoBackupScheduler:
             with open(backup_file, 'r') as f:
                 last_backup_date = datetime.fromisoformat(f.read().strip())
             
-            # Run backup if last backup was more than 24 hours ago
-            return (datetime.now() - last_backup_date).total_seconds() > 86400
+            # Run backup once per day; a 24 hour gap would skip every other
+            # day whenever the scheduled run starts a little earlier than the last
+            return last_backup_date.date() < datetime.now().date()
         except:
             return True
     
@@ -0,0 +1,88 @@
+"""
+Accounting Report Benchmark
+Times the daily sales report for growing bill counts to check it scales linearly
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import contextlib
+import io
+import random
+import database
+from accounting import AccountingSystem
+from report_cache import ReportCache
+
+BILL_COUNTS = [250, 500, 1000, 2000]
+ITEMS_PER_BILL = 4
+MENU_SIZE = 120
+RUNS = 5
+REPORT_DATE = '2024-03-10'
+
+def build_database(bill_count):
+    """Fresh database with one business day of bill_count completed bills"""
+    temp_dir = tempfile.mkdtemp()
+    database.DATABASE_NAME = os.path.join(temp_dir, 'benchmark.db')
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_database()
+    
+    rng = random.Random(bill_count)
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.executemany("""
+        INSERT INTO menu_items (name, price_single, price_full, category, food_type, plate_type)
+        VALUES (?, ?, ?, 'THALIS', 'veg', 'full')
+    """, [(f"Item {i}", 50 + i, 50 + i) for i in range(MENU_SIZE)])
+    
+    for bill in range(bill_count):
+        seconds = bill * 40000 // bill_count
+        order_date = f"{REPORT_DATE} {seconds // 3600 + 10:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+        items = [(rng.randint(1, MENU_SIZE), rng.randint(1, 3)) for _ in range(ITEMS_PER_BILL)]
+        total = sum(quantity * (49 + item) for item, quantity in items)
+        cursor.execute("""
+            INSERT INTO orders (table_number, order_date, business_date, total_amount, gst_amount,
+                                service_charge, discount, final_amount, status)
+            VALUES ('1', ?, ?, ?, ?, 0, 0, ?, 'completed')
+        """, (order_date, REPORT_DATE, total, total * 0.05, total * 1.05))
+        order_id = cursor.lastrowid
+        cursor.executemany("""
+            INSERT INTO order_items (order_id, menu_item_id, quantity, price, total)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(order_id, item, quantity, 49 + item, quantity * (49 + item)) for item, quantity in items])
+    
+    conn.commit()
+    conn.close()
+    return temp_dir
+
+def time_report():
+    """Best of RUNS wall-clock time for one daily report, in milliseconds"""
+    best = None
+    for _ in range(RUNS):
+        ReportCache.clear()  # time the query, not a cache hit
+        start = time.perf_counter()
+        report = AccountingSystem.get_daily_sales_report(REPORT_DATE)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, report
+
+def main():
+    print("=" * 60)
+    print("Daily sales report benchmark")
+    print("=" * 60)
+    print(f"{'Bills':>8} {'Rows':>8} {'Time (ms)':>12} {'us/bill':>10}")
+    
+    for bill_count in BILL_COUNTS:
+        temp_dir = build_database(bill_count)
+        try:
+            elapsed, report = time_report()
+            assert report['order_count'] == bill_count
+            print(f"{bill_count:>8} {bill_count * ITEMS_PER_BILL:>8} {elapsed:>12.2f} "
+                  f"{elapsed * 1000 / bill_count:>10.1f}")
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    print("\nTime per bill should stay roughly flat as the bill count grows (linear scaling).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Bill Manager
+Filtered, paged access to saved bills and selections of bills defined by a
+filter rather than by listing every bill
+"""
+
+import database
+import ledger
+import report_cache
+import sales_summary
+from inventory_manager import InventoryManager
+from order_corrections import OrderCorrections
+
+class BillManager:
+    """Bill browsing and bulk selection backed by indexed queries"""
+    
+    # Bills loaded per page of the browser
+    PAGE_SIZE = 200
+    # Bill ids bound per statement; stays below SQLite's default variable limit (999)
+    ID_CHUNK_SIZE = 500
+    
+    @staticmethod
+    def _filter_clause(filters):
+        """
+        WHERE conditions for a bill filter
+        Args:
+            filters: Dict with any of start_date / end_date (business dates),
+                     table_number ('Takeaway' for bills without a table),
+                     min_amount / max_amount (final amount) and status
+                     ('voided' for bills with a void correction)
+        Returns:
+            (list of SQL conditions, list of parameters)
+        """
+        filters = filters or {}
+        conditions, params = [], []
+        
+        if filters.get('start_date'):
+            conditions.append("business_date >= ?")
+            params.append(str(filters['start_date']))
+        if filters.get('end_date'):
+            conditions.append("business_date <= ?")
+            params.append(str(filters['end_date']))
+        if filters.get('table_number'):
+            if str(filters['table_number']).lower() == 'takeaway':
+                conditions.append("(table_number IS NULL OR table_number = '')")
+            else:
+                conditions.append("table_number = ?")
+                params.append(str(filters['table_number']))
+        if filters.get('min_amount') is not None:
+            conditions.append("final_amount >= ?")
+            params.append(float(filters['min_amount']))
+        if filters.get('max_amount') is not None:
+            conditions.append("final_amount <= ?")
+            params.append(float(filters['max_amount']))
+        if filters.get('status') == 'voided':
+            conditions.append("""EXISTS (
+                SELECT 1 FROM order_corrections c WHERE c.order_id = orders.id AND c.correction_type = 'void'
+            )""")
+        elif filters.get('status'):
+            conditions.append("status = ?")
+            params.append(filters['status'])
+        
+        return conditions, params
+    
+    @staticmethod
+    def get_bills_page(filters=None, before_id=None, page_size=None):
+        """
+        One page of bills matching a filter, newest bill number first
+        Args:
+            before_id: Last bill id already shown, or None for the first page
+        Returns:
+            (bills, next_before_id): rows with id, table_number, order_date,
+            business_date, final_amount, status, payment_method and voided;
+            next_before_id is None after the last page
+        """
+        page_size = page_size or BillManager.PAGE_SIZE
+        conditions, params = BillManager._filter_clause(filters)
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT id, table_number, order_date, business_date, final_amount, status, payment_method,
+                   EXISTS (
+                       SELECT 1 FROM order_corrections c
+                       WHERE c.order_id = orders.id AND c.correction_type = 'void'
+                   ) as voided
+            FROM orders
+            {where}
+            ORDER BY id DESC
+            LIMIT ?
+        """, params + [page_size])
+        bills = cursor.fetchall()
+        conn.close()
+        
+        next_before_id = bills[-1]['id'] if len(bills) == page_size else None
+        return bills, next_before_id
+    
+    @staticmethod
+    def get_filter_totals(filters=None):
+        """Number of bills matching a filter and their total final amount"""
+        conditions, params = BillManager._filter_clause(filters)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT COUNT(*) as bill_count, COALESCE(SUM(final_amount), 0) as total_amount
+            FROM orders
+            {where}
+        """, params)
+        totals = dict(cursor.fetchone())
+        conn.close()
+        return totals
+    
+    @staticmethod
+    def iter_selection(selection, chunk_size=None):
+        """
+        Yield the bill ids of a selection in chunks of at most chunk_size
+        Args:
+            selection: Dict with either 'ids' (bills picked one by one) or
+                       'filters' (every bill matching the filter) and optional
+                       'exclude' (ids to leave out of a filter selection)
+        
+        A filter selection is resolved with keyset reads on the bill id, so
+        no more than one chunk of ids is held at a time.
+        """
+        chunk_size = chunk_size or BillManager.ID_CHUNK_SIZE
+        
+        if selection.get('ids') is not None:
+            ids = sorted(set(selection['ids']))
+            for start in range(0, len(ids), chunk_size):
+                yield ids[start:start + chunk_size]
+            return
+        
+        exclude = set(selection.get('exclude') or ())
+        conditions, params = BillManager._filter_clause(selection.get('filters'))
+        conditions.append("id > ?")
+        where = ' AND '.join(conditions)
+        last_id = 0
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        try:
+            while True:
+                cursor.execute(f"""
+                    SELECT id FROM orders
+                    WHERE {where}
+                    ORDER BY id
+                    LIMIT ?
+                """, params + [last_id, chunk_size])
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    break
+                last_id = ids[-1]
+                chunk = [bill_id for bill_id in ids if bill_id not in exclude]
+                if chunk:
+                    yield chunk
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def count_selection(selection):
+        """Number of bills in a selection (excluded ids are bills of the filtered list)"""
+        if selection.get('ids') is not None:
+            return len(set(selection['ids']))
+        matching = BillManager.get_filter_totals(selection.get('filters'))['bill_count']
+        return max(matching - len(set(selection.get('exclude') or ())), 0)
+    
+    @staticmethod
+    def _delete_chunk(cursor, bill_ids):
+        """
+        Delete one chunk of bills and undo their effects (caller commits)
+        Returns:
+            (deleted, locked, amount): bills deleted, bills skipped because
+            they or their corrections lie in a closed accounting period, and
+            the deleted bills' total
+        
+        Every bill comes out of the daily summaries and the sales cube, with
+        its voids, refunds and amendments; its ledger entries, cash book rows
+        and stock consumption are reversed as of today, so closed periods
+        keep their figures.
+        """
+        placeholders = ','.join(['?'] * len(bill_ids))
+        cursor.execute(f"""
+            SELECT o.id, o.final_amount,
+                   p.status = 'closed' OR EXISTS (
+                       SELECT 1 FROM order_corrections c
+                       JOIN accounting_periods cp ON cp.period = substr(c.business_date, 1, 7)
+                       WHERE c.order_id = o.id AND cp.status = 'closed'
+                   ) as locked
+            FROM orders o
+            LEFT JOIN accounting_periods p ON p.period = substr(o.business_date, 1, 7)
+            WHERE o.id IN ({placeholders})
+        """, tuple(bill_ids))
+        rows = cursor.fetchall()
+        locked = sum(1 for row in rows if row[2])
+        bills = [(row[0], row[1] or 0) for row in rows if not row[2]]
+        if not bills:
+            return 0, locked, 0
+        
+        ids = [bill_id for bill_id, _ in bills]
+        placeholders = ','.join(['?'] * len(ids))
+        
+        # Corrections first: they restate the bill's sales cube cells
+        OrderCorrections._remove_for_orders(cursor, ids)
+        for bill_id in ids:
+            sales_summary.SalesSummary._apply_order(cursor, bill_id, sign=-1)
+        ledger.Ledger._reverse_sources(cursor, 'order', ids, "Deleted bill")
+        InventoryManager._restore_order_stock(cursor, ids)
+        
+        # Cash book: mirror every row of the bill, its corrections included
+        cursor.execute(f"""
+            INSERT INTO transactions (date, account_id, type, amount, description, order_id)
+            SELECT ?, account_id, CASE type WHEN 'credit' THEN 'debit' ELSE 'credit' END, amount,
+                   'Bill #' || order_id || ' deleted', order_id
+            FROM transactions
+            WHERE order_id IN ({placeholders})
+        """, [database.get_business_date_string()] + ids)
+        
+        cursor.execute(f"DELETE FROM order_items WHERE order_id IN ({placeholders})", ids)
+        cursor.execute(f"DELETE FROM order_payments WHERE order_id IN ({placeholders})", ids)
+        cursor.execute(f"DELETE FROM orders WHERE id IN ({placeholders})", ids)
+        
+        return len(ids), locked, sum(amount for _, amount in bills)
+    
+    @staticmethod
+    def _void_chunk(cursor, bill_ids, reason=''):
+        """
+        Void one chunk of bills (caller commits)
+        Returns:
+            (voided, skipped, amount): bills voided, bills skipped because they
+            are not completed or already voided, and the amount voided
+        """
+        voided, skipped, amount = 0, 0, 0
+        for bill_id in bill_ids:
+            net = OrderCorrections._net_order(cursor, bill_id)
+            if not net or net['voided']:
+                skipped += 1
+                continue
+            OrderCorrections._void(cursor, net, reason)
+            voided += 1
+            amount += net['final_amount']
+        return voided, skipped, amount
+    
+    @staticmethod
+    def _process_selection(selection, process_chunk, action, progress=None, chunk_size=None):
+        """
+        Run process_chunk(cursor, bill_ids) over a selection, one transaction per chunk
+        Args:
+            process_chunk: Returns (done, skipped, amount) for its chunk
+            action: Verb for the error message, e.g. 'deleting'
+            progress: Optional callable(processed, total) run after each chunk commits
+        Returns:
+            (True, (done, skipped, amount)) or (False, message) naming how many
+            bills were processed before the error
+        
+        A failing chunk is rolled back on its own; chunks already committed
+        stay done with their summaries, ledger and stock consistent.
+        """
+        total = BillManager.count_selection(selection)
+        done, skipped, amount, processed = 0, 0, 0, 0
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            for bill_ids in BillManager.iter_selection(selection, chunk_size):
+                chunk_done, chunk_skipped, chunk_amount = process_chunk(cursor, bill_ids)
+                conn.commit()
+                report_cache.ReportCache.invalidate('orders', 'ingredients')
+                
+                done += chunk_done
+                skipped += chunk_skipped
+                amount += chunk_amount
+                processed += len(bill_ids)
+                if progress:
+                    progress(processed, total)
+            
+            conn.close()
+            return True, (done, skipped, amount)
+        except Exception as e:
+            conn.rollback()
+            conn.close()
+            return False, f"Error after {action} {done} bill(s): {str(e)}"
+    
+    @staticmethod
+    def delete_bills(selection, progress=None, chunk_size=None):
+        """
+        Delete a selection of bills one chunk per transaction
+        Args:
+            selection: Selection dict as for iter_selection
+            progress: Optional callable(processed, total) run after each chunk commits
+            chunk_size: Bills per transaction (default ID_CHUNK_SIZE)
+        Returns:
+            (True, result) with deleted, locked and total_amount, or (False, message)
+        
+        Deleting removes bills from the record; void_bills is the correction
+        path that keeps them. Bill numbers are never reused.
+        """
+        success, outcome = BillManager._process_selection(
+            selection, BillManager._delete_chunk, 'deleting', progress, chunk_size
+        )
+        if not success:
+            return False, outcome
+        deleted, locked, amount = outcome
+        return True, {'deleted': deleted, 'locked': locked, 'total_amount': amount}
+    
+    @staticmethod
+    def void_bills(selection, reason='', progress=None, chunk_size=None):
+        """
+        Void a selection of bills one chunk per transaction
+        Returns:
+            (True, result) with voided, skipped and total_amount, or (False, message)
+        """
+        success, outcome = BillManager._process_selection(
+            selection, lambda cursor, bill_ids: BillManager._void_chunk(cursor, bill_ids, reason),
+            'voiding', progress, chunk_size
+        )
+        if not success:
+            return False, outcome
+        voided, skipped, amount = outcome
+        return True, {'voided': voided, 'skipped': skipped, 'total_amount': amount}
@@ -0,0 +1,181 @@
+"""
+Columnar Analytics
+Loads a period's bills into NumPy arrays in one fetch and computes heatmaps,
+trends and distributions vectorised
+"""
+
+import database
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class ColumnarAnalytics:
+    """Vectorised sales pattern analysis over a period of completed bills"""
+    
+    SECONDS_PER_DAY = 86400
+    # 1970-01-01 was a Thursday; shifts epoch days so Monday = 0
+    EPOCH_WEEKDAY = 3
+    PERCENTILES = (50, 75, 90, 95, 99)
+    
+    @staticmethod
+    def is_available():
+        """The columnar path needs NumPy; Analytics covers the same ground without it"""
+        return np is not None
+    
+    @staticmethod
+    def load_period(start_date, end_date):
+        """
+        Fetch every bill line of a range of business dates as columns
+        Returns:
+            Dict of arrays, one entry per order line: order_id, epoch (order time
+            in seconds, local clock), business_day (business date as days since
+            1970-01-01), amount (bill final amount), menu_item_id (-1 for a bill
+            without lines), quantity and line_total
+        """
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = None  # plain tuples convert to arrays directly
+        
+        cursor.execute("""
+            SELECT o.id, CAST(strftime('%s', o.order_date) AS INTEGER),
+                   CAST(julianday(o.business_date) - 2440587.5 AS INTEGER), o.final_amount,
+                   COALESCE(oi.menu_item_id, -1), COALESCE(oi.quantity, 0), COALESCE(oi.total, 0)
+            FROM orders o
+            LEFT JOIN order_items oi ON oi.order_id = o.id
+            WHERE o.business_date BETWEEN ? AND ?
+            AND o.status = 'completed'
+            ORDER BY o.id
+        """, (str(start_date), str(end_date)))
+        data = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 7)
+        conn.close()
+        
+        return {
+            'order_id': data[:, 0].astype(np.int64),
+            'epoch': data[:, 1].astype(np.int64),
+            'business_day': data[:, 2].astype(np.int64),
+            'amount': data[:, 3],
+            'menu_item_id': data[:, 4].astype(np.int64),
+            'quantity': data[:, 5],
+            'line_total': data[:, 6]
+        }
+    
+    @staticmethod
+    def _orders(lines):
+        """Collapse line columns to one entry per bill: epoch, business day, amount and basket size"""
+        order_ids, first_line, inverse = np.unique(lines['order_id'], return_index=True, return_inverse=True)
+        return {
+            'order_id': order_ids,
+            'epoch': lines['epoch'][first_line],
+            'business_day': lines['business_day'][first_line],
+            'amount': lines['amount'][first_line],
+            'basket_size': np.bincount(inverse, weights=lines['quantity'], minlength=len(order_ids))
+        }
+    
+    @staticmethod
+    def hourly_heatmap(orders):
+        """Bills and revenue per hour of day (24 buckets)"""
+        hours = orders['epoch'] % ColumnarAnalytics.SECONDS_PER_DAY // 3600
+        return {
+            'orders': np.bincount(hours, minlength=24).tolist(),
+            'revenue': np.round(np.bincount(hours, weights=orders['amount'], minlength=24), 2).tolist()
+        }
+    
+    @staticmethod
+    def weekday_hour_matrix(orders, measure='orders'):
+        """
+        7 x 24 matrix of bills (or revenue) by weekday (Monday = 0) and hour
+        Args:
+            measure: 'orders' or 'revenue'
+        """
+        days = orders['epoch'] // ColumnarAnalytics.SECONDS_PER_DAY
+        weekdays = (days + ColumnarAnalytics.EPOCH_WEEKDAY) % 7
+        hours = orders['epoch'] % ColumnarAnalytics.SECONDS_PER_DAY // 3600
+        weights = orders['amount'] if measure == 'revenue' else None
+        matrix = np.bincount(weekdays * 24 + hours, weights=weights, minlength=7 * 24).reshape(7, 24)
+        return np.round(matrix, 2).tolist()
+    
+    @staticmethod
+    def rolling_average(values, window):
+        """Trailing moving average; the first window-1 entries are None"""
+        values = np.asarray(values, dtype=np.float64)
+        if window <= 0 or len(values) < window:
+            return [None] * len(values)
+        cumulative = np.cumsum(np.insert(values, 0, 0.0))
+        averages = (cumulative[window:] - cumulative[:-window]) / window
+        return [None] * (window - 1) + np.round(averages, 2).tolist()
+    
+    @staticmethod
+    def daily_revenue(orders, start_date, end_date):
+        """
+        Revenue per business date, including days without bills
+        Returns:
+            (list of 'YYYY-MM-DD', revenue array)
+        """
+        start = datetime.strptime(str(start_date), '%Y-%m-%d')
+        day_count = (datetime.strptime(str(end_date), '%Y-%m-%d') - start).days + 1
+        first_day = (start - datetime(1970, 1, 1)).days
+        offsets = orders['business_day'] - first_day
+        in_range = (offsets >= 0) & (offsets < day_count)
+        revenue = np.bincount(offsets[in_range], weights=orders['amount'][in_range], minlength=day_count)
+        days = [(start + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(day_count)]
+        return days, revenue
+    
+    @staticmethod
+    def basket_size_distribution(orders):
+        """
+        Items per bill
+        Returns:
+            Dict with counts (bills per basket size, index = items), mean and percentiles
+        """
+        sizes = orders['basket_size'].astype(np.int64)
+        if not len(sizes):
+            return {'counts': [], 'mean': 0, 'percentiles': {}}
+        return {
+            'counts': np.bincount(sizes).tolist(),
+            'mean': round(float(sizes.mean()), 2),
+            'percentiles': ColumnarAnalytics.percentiles(sizes)
+        }
+    
+    @staticmethod
+    def percentiles(values, percentiles=None):
+        """Percentiles of a value column as {percentile: value}"""
+        percentiles = percentiles or ColumnarAnalytics.PERCENTILES
+        if not len(values):
+            return {p: 0 for p in percentiles}
+        return {p: round(float(v), 2) for p, v in zip(percentiles, np.percentile(values, percentiles))}
+    
+    @staticmethod
+    def analyze_period(start_date, end_date, rolling_window=7):
+        """
+        Full sales pattern analysis of a range of business dates from one fetch
+        Returns:
+            Dict with order_count, revenue, hourly heatmap, weekday x hour
+            matrices (orders and revenue), daily revenue with its rolling
+            average, basket-size distribution and bill-amount percentiles;
+            None when NumPy is not installed
+        """
+        if np is None:
+            return None
+        
+        orders = ColumnarAnalytics._orders(ColumnarAnalytics.load_period(start_date, end_date))
+        days, revenue = ColumnarAnalytics.daily_revenue(orders, start_date, end_date)
+        
+        return {
+            'start_date': str(start_date),
+            'end_date': str(end_date),
+            'order_count': int(len(orders['order_id'])),
+            'revenue': round(float(orders['amount'].sum()), 2),
+            'hourly': ColumnarAnalytics.hourly_heatmap(orders),
+            'weekday_hour_orders': ColumnarAnalytics.weekday_hour_matrix(orders, 'orders'),
+            'weekday_hour_revenue': ColumnarAnalytics.weekday_hour_matrix(orders, 'revenue'),
+            'daily_revenue': {
+                'days': days,
+                'revenue': np.round(revenue, 2).tolist(),
+                'rolling_average': ColumnarAnalytics.rolling_average(revenue, rolling_window)
+            },
+            'basket_size': ColumnarAnalytics.basket_size_distribution(orders),
+            'bill_percentiles': ColumnarAnalytics.percentiles(orders['amount'])
+        }
@@ -1,10 +1,15 @@
 import sqlite3
 import os
 import sys
+import threading
+from pathlib import Path
 from datetime import datetime, timedelta
 
 DATABASE_NAME = "restaurant_billing.db"
 
+# Per-thread flag set by use_read_only_connections()
+_thread_state = threading.local()
+
 def get_business_date(dt=None):
     """Get business date - Business day is 1:00 AM to 1:00 AM (next day)"""
     if dt is None:
@@ -46,16 +51,40 @@ def get_database_path():
 
 def get_connection():
     """Create and return database connection"""
+    if getattr(_thread_state, 'read_only', False):
+        return get_read_only_connection()
+    
     db_path = get_database_path()
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
     return conn
 
+def get_read_only_connection():
+    """
+    Open a connection that can only read
+    
+    With the database in WAL mode, readers see the last committed state and
+    never block, or are blocked by, a checkout being written.
+    """
+    uri = Path(get_database_path()).absolute().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+def use_read_only_connections():
+    """Make get_connection() hand out read-only connections on the calling thread (report workers)"""
+    _thread_state.read_only = True
+
 def init_database():
     """Initialize database with all required tables and default data"""
     conn = get_connection()
     cursor = conn.cursor()
     
+    # Write-ahead logging lets report readers run alongside checkouts
+    # (the setting is stored in the database file)
+    cursor.execute("PRAGMA journal_mode = WAL")
+    
     # Create categories table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS categories (
@@ -75,10 +104,20 @@ def init_database():
             food_type TEXT NOT NULL CHECK(food_type IN ('veg', 'non-veg')),
             plate_type TEXT NOT NULL CHECK(plate_type IN ('single', 'full')),
             is_available INTEGER DEFAULT 1,
+            hsn_code TEXT DEFAULT '996331',
+            gst_rate REAL DEFAULT 5,
             FOREIGN KEY (category) REFERENCES categories(name)
         )
     """)
     
+    # Add GST classification columns if they don't exist (for existing databases);
+    # 996331 is the SAC for restaurant services
+    for column in ("hsn_code TEXT DEFAULT '996331'", "gst_rate REAL DEFAULT 5"):
+        try:
+            cursor.execute(f"ALTER TABLE menu_items ADD COLUMN {column}")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+    
     # Create orders table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS orders (
@@ -91,7 +130,8 @@ def init_database():
             service_charge REAL DEFAULT 0,
             discount REAL DEFAULT 0,
             final_amount REAL NOT NULL,
-            status TEXT DEFAULT 'active'
+            status TEXT DEFAULT 'active',
+            payment_method TEXT DEFAULT 'unknown'
         )
     """)
     
@@ -101,6 +141,22 @@ def init_database():
     except sqlite3.OperationalError:
         pass  # Column already exists
     
+    # Orders saved before business_date existed: 1:00 AM to 1:00 AM business day
+    cursor.execute("""
+        UPDATE orders
+        SET business_date = CASE
+            WHEN time(order_date) < '01:00:00' THEN date(order_date, '-1 day')
+            ELSE date(order_date)
+        END
+        WHERE business_date IS NULL
+    """)
+    
+    # Add payment_method column if it doesn't exist (for existing databases)
+    try:
+        cursor.execute("ALTER TABLE orders ADD COLUMN payment_method TEXT DEFAULT 'unknown'")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+    
     # Create order_items table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS order_items (
@@ -110,11 +166,302 @@ def init_database():
             quantity INTEGER NOT NULL,
             price REAL NOT NULL,
             total REAL NOT NULL,
+            hsn_code TEXT,
+            gst_rate REAL DEFAULT 0,
+            taxable_value REAL DEFAULT 0,
+            cgst REAL DEFAULT 0,
+            sgst REAL DEFAULT 0,
             FOREIGN KEY (order_id) REFERENCES orders(id),
             FOREIGN KEY (menu_item_id) REFERENCES menu_items(id)
         )
     """)
     
+    # Add per-line tax columns if they don't exist (for existing databases)
+    try:
+        cursor.execute("ALTER TABLE order_items ADD COLUMN taxable_value REAL DEFAULT 0")
+        for column in ("hsn_code TEXT", "gst_rate REAL DEFAULT 0", "cgst REAL DEFAULT 0", "sgst REAL DEFAULT 0"):
+            cursor.execute(f"ALTER TABLE order_items ADD COLUMN {column}")
+        
+        # Existing lines take their bill's effective rate, split evenly into
+        # CGST and SGST. The period lock trigger is recreated further down.
+        cursor.execute("DROP TRIGGER IF EXISTS trg_order_items_period_lock_update")
+        cursor.execute("""
+            UPDATE order_items
+            SET hsn_code = (SELECT hsn_code FROM menu_items WHERE id = order_items.menu_item_id),
+                taxable_value = total,
+                gst_rate = COALESCE((
+                    SELECT ROUND(o.gst_amount * 100.0 / o.total_amount, 2)
+                    FROM orders o
+                    WHERE o.id = order_items.order_id AND o.total_amount > 0
+                ), 0)
+        """)
+        cursor.execute("""
+            UPDATE order_items
+            SET cgst = ROUND(taxable_value * gst_rate / 200.0, 2),
+                sgst = ROUND(taxable_value * gst_rate / 200.0, 2)
+        """)
+    except sqlite3.OperationalError:
+        pass  # Columns already exist
+    
+    # Indexes for date-range sales reports
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_status_date
+        ON orders (status, order_date)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_order_items_order
+        ON order_items (order_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_business_date
+        ON orders (business_date)
+    """)
+    # Bill browser filter by table, newest bills first
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_orders_table
+        ON orders (table_number, business_date)
+    """)
+    # Covers the GST engine's rate-wise grouping without touching the table
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_order_items_gst
+        ON order_items (order_id, hsn_code, gst_rate, taxable_value, cgst, sgst)
+    """)
+    
+    # Create daily sales summary tables (per business day, maintained on
+    # every checkout and void; period reports sum these instead of orders)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_sales_summary (
+            business_date TEXT PRIMARY KEY,
+            order_count INTEGER DEFAULT 0,
+            subtotal REAL DEFAULT 0,
+            gst_amount REAL DEFAULT 0,
+            service_charge REAL DEFAULT 0,
+            discount REAL DEFAULT 0,
+            final_amount REAL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_payment_summary (
+            business_date TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            order_count INTEGER DEFAULT 0,
+            amount REAL DEFAULT 0,
+            PRIMARY KEY (business_date, payment_method)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_category_summary (
+            business_date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            order_count INTEGER DEFAULT 0,
+            item_count INTEGER DEFAULT 0,
+            revenue REAL DEFAULT 0,
+            PRIMARY KEY (business_date, category)
+        )
+    """)
+    
+    # Build the summaries from existing orders once
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM daily_sales_summary)")
+    if not cursor.fetchone()[0]:
+        cursor.execute("""
+            INSERT INTO daily_sales_summary
+            (business_date, order_count, subtotal, gst_amount, service_charge, discount, final_amount)
+            SELECT business_date, COUNT(*), SUM(total_amount), SUM(COALESCE(gst_amount, 0)),
+                   SUM(COALESCE(service_charge, 0)), SUM(COALESCE(discount, 0)), SUM(final_amount)
+            FROM orders
+            WHERE status = 'completed'
+            GROUP BY business_date
+        """)
+        cursor.execute("""
+            INSERT INTO daily_payment_summary (business_date, payment_method, order_count, amount)
+            SELECT business_date, COALESCE(payment_method, 'unknown'), COUNT(*), SUM(final_amount)
+            FROM orders
+            WHERE status = 'completed'
+            GROUP BY business_date, COALESCE(payment_method, 'unknown')
+        """)
+        cursor.execute("""
+            INSERT INTO daily_category_summary (business_date, category, order_count, item_count, revenue)
+            SELECT o.business_date, mi.category, COUNT(DISTINCT o.id), SUM(oi.quantity), SUM(oi.total)
+            FROM orders o
+            JOIN order_items oi ON o.id = oi.order_id
+            JOIN menu_items mi ON oi.menu_item_id = mi.id
+            WHERE o.status = 'completed'
+            GROUP BY o.business_date, mi.category
+        """)
+    
+    # Create sales cube tables (business date x hour x item/category x payment
+    # method, maintained with the daily summaries on every checkout and void).
+    # sales_cube is the item grain; sales_cube_orders the order grain, so order
+    # counts and bill totals are never double counted across items.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sales_cube (
+            business_date TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            menu_item_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            order_count INTEGER DEFAULT 0,
+            quantity INTEGER DEFAULT 0,
+            revenue REAL DEFAULT 0,
+            PRIMARY KEY (business_date, hour, menu_item_id, payment_method)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS sales_cube_orders (
+            business_date TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            payment_method TEXT NOT NULL,
+            order_count INTEGER DEFAULT 0,
+            subtotal REAL DEFAULT 0,
+            final_amount REAL DEFAULT 0,
+            PRIMARY KEY (business_date, hour, payment_method)
+        ) WITHOUT ROWID
+    """)
+    
+    # Item roll-ups (popular items over long ranges) read this in item order
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_sales_cube_item
+        ON sales_cube (menu_item_id, business_date, category, order_count, quantity, revenue)
+    """)
+    
+    # Build the cube from existing orders once
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM sales_cube_orders)")
+    if not cursor.fetchone()[0]:
+        cursor.execute("""
+            INSERT INTO sales_cube_orders
+            (business_date, hour, payment_method, order_count, subtotal, final_amount)
+            SELECT business_date, CAST(strftime('%H', order_date) AS INTEGER),
+                   COALESCE(payment_method, 'unknown'), COUNT(*), SUM(total_amount), SUM(final_amount)
+            FROM orders
+            WHERE status = 'completed'
+            GROUP BY 1, 2, 3
+        """)
+        cursor.execute("""
+            INSERT INTO sales_cube
+            (business_date, hour, menu_item_id, category, payment_method, order_count, quantity, revenue)
+            SELECT o.business_date, CAST(strftime('%H', o.order_date) AS INTEGER), oi.menu_item_id,
+                   MIN(mi.category), COALESCE(o.payment_method, 'unknown'),
+                   COUNT(DISTINCT o.id), SUM(oi.quantity), SUM(oi.total)
+            FROM orders o
+            JOIN order_items oi ON o.id = oi.order_id
+            JOIN menu_items mi ON oi.menu_item_id = mi.id
+            WHERE o.status = 'completed'
+            GROUP BY 1, 2, 3, 5
+        """)
+    
+    # Create item affinity tables (dishes bought together). Pair and item
+    # counts are kept per business date so a day can be recounted after a
+    # void, and as running totals that the affinity metrics are read from.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS item_affinity_days (
+            business_date TEXT PRIMARY KEY,
+            order_count INTEGER DEFAULT 0,
+            basket_count INTEGER DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS item_pair_daily (
+            business_date TEXT NOT NULL,
+            item_a INTEGER NOT NULL,
+            item_b INTEGER NOT NULL,
+            pair_count INTEGER DEFAULT 0,
+            PRIMARY KEY (business_date, item_a, item_b)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS item_basket_daily (
+            business_date TEXT NOT NULL,
+            menu_item_id INTEGER NOT NULL,
+            basket_count INTEGER DEFAULT 0,
+            PRIMARY KEY (business_date, menu_item_id)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS item_pair_counts (
+            item_a INTEGER NOT NULL,
+            item_b INTEGER NOT NULL,
+            pair_count INTEGER DEFAULT 0,
+            PRIMARY KEY (item_a, item_b),
+            CHECK (item_a < item_b)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS item_basket_counts (
+            menu_item_id INTEGER PRIMARY KEY,
+            basket_count INTEGER DEFAULT 0
+        )
+    """)
+    
+    # Create item_affinity_top table (top partners per dish, rebuilt after
+    # each affinity update and read by the admin panel)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS item_affinity_top (
+            menu_item_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            partner_id INTEGER NOT NULL,
+            pair_count INTEGER NOT NULL,
+            support REAL NOT NULL,
+            confidence REAL NOT NULL,
+            lift REAL NOT NULL,
+            PRIMARY KEY (menu_item_id, rank)
+        ) WITHOUT ROWID
+    """)
+    
+    # Create dish_forecast tables (expected sales per dish and hour for a
+    # business date, written by the nightly prep forecast)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS dish_forecast (
+            forecast_date TEXT NOT NULL,
+            menu_item_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            expected_quantity REAL NOT NULL,
+            PRIMARY KEY (forecast_date, menu_item_id, hour)
+        ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS dish_forecast_runs (
+            forecast_date TEXT PRIMARY KEY,
+            history_start TEXT NOT NULL,
+            history_end TEXT NOT NULL,
+            weekday_samples INTEGER DEFAULT 0,
+            generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Create menu engineering tables (ABC/XYZ and margin class of every dish
+    # for a month, computed in one batch and read by the report)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS menu_engineering_runs (
+            period TEXT PRIMARY KEY,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            trading_days INTEGER DEFAULT 0,
+            item_count INTEGER DEFAULT 0,
+            total_revenue REAL DEFAULT 0,
+            average_margin REAL DEFAULT 0,
+            generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS menu_engineering_results (
+            period TEXT NOT NULL,
+            menu_item_id INTEGER NOT NULL,
+            quantity INTEGER DEFAULT 0,
+            revenue REAL DEFAULT 0,
+            revenue_share REAL DEFAULT 0,
+            abc_class TEXT NOT NULL CHECK(abc_class IN ('A', 'B', 'C')),
+            demand_cv REAL,
+            xyz_class TEXT NOT NULL CHECK(xyz_class IN ('X', 'Y', 'Z')),
+            unit_cost REAL DEFAULT 0,
+            contribution_margin REAL DEFAULT 0,
+            total_margin REAL DEFAULT 0,
+            menu_mix REAL DEFAULT 0,
+            menu_class TEXT NOT NULL CHECK(menu_class IN ('star', 'plowhorse', 'puzzle', 'dog')),
+            PRIMARY KEY (period, menu_item_id)
+        ) WITHOUT ROWID
+    """)
+    
     # Create restaurant_settings table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS restaurant_settings (
@@ -226,6 +573,36 @@ def init_database():
             FOREIGN KEY (ingredient_id) REFERENCES ingredients(id)
         )
     """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_menu_ingredients_item
+        ON menu_ingredients (menu_item_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_menu_ingredients_ingredient
+        ON menu_ingredients (ingredient_id)
+    """)
+    
+    # Create menu_item_cost table (recipe cost per dish, refreshed when a
+    # recipe or an ingredient's cost changes)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS menu_item_cost (
+            menu_item_id INTEGER PRIMARY KEY,
+            recipe_cost REAL NOT NULL DEFAULT 0,
+            ingredient_count INTEGER DEFAULT 0,
+            updated_at TEXT NOT NULL,
+            FOREIGN KEY (menu_item_id) REFERENCES menu_items(id)
+        )
+    """)
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM menu_item_cost)")
+    if not cursor.fetchone()[0]:
+        cursor.execute("""
+            INSERT INTO menu_item_cost (menu_item_id, recipe_cost, ingredient_count, updated_at)
+            SELECT mi.menu_item_id, SUM(mi.quantity_required * COALESCE(i.cost_per_unit, 0)), COUNT(*),
+                   datetime('now', 'localtime')
+            FROM menu_ingredients mi
+            JOIN ingredients i ON mi.ingredient_id = i.id
+            GROUP BY mi.menu_item_id
+        """)
     
     # Create stock_transactions table
     cursor.execute("""
@@ -235,11 +612,157 @@ def init_database():
             transaction_type TEXT NOT NULL CHECK(transaction_type IN ('in', 'out')),
             quantity REAL NOT NULL,
             reason TEXT DEFAULT '',
+            reason_code TEXT,
             timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (ingredient_id) REFERENCES ingredients(id)
         )
     """)
     
+    # Add reason_code column if it doesn't exist (for existing databases)
+    try:
+        cursor.execute("ALTER TABLE stock_transactions ADD COLUMN reason_code TEXT")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+    
+    # Classify free-text reasons recorded before reason codes existed
+    # (same rules as InventoryManager.classify_stock_reason)
+    cursor.execute("""
+        UPDATE stock_transactions
+        SET reason_code = CASE
+            WHEN reason LIKE '%wast%' OR reason LIKE '%spoil%' OR reason LIKE '%expire%' THEN 'waste'
+            WHEN reason LIKE 'PO #%' OR reason LIKE '%purchase%' THEN 'purchase'
+            WHEN reason LIKE 'stock take%' THEN 'stock_take'
+            WHEN reason LIKE 'order%' THEN 'order'
+            WHEN reason LIKE 'initial%' OR reason LIKE 'opening%' THEN 'opening'
+            ELSE 'adjustment'
+        END
+        WHERE reason_code IS NULL
+    """)
+    
+    # Create stock_daily_rollup table (ingredient x day x movement x reason)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_daily_rollup (
+            ingredient_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            transaction_type TEXT NOT NULL CHECK(transaction_type IN ('in', 'out')),
+            reason_code TEXT NOT NULL,
+            quantity REAL DEFAULT 0,
+            value REAL DEFAULT 0,
+            txn_count INTEGER DEFAULT 0,
+            PRIMARY KEY (ingredient_id, day, transaction_type, reason_code),
+            FOREIGN KEY (ingredient_id) REFERENCES ingredients(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_stock_daily_rollup_day
+        ON stock_daily_rollup (day, reason_code)
+    """)
+    
+    # Build the rollup from the existing ledger once; afterwards every
+    # stock write maintains it incrementally
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM stock_daily_rollup)")
+    if not cursor.fetchone()[0]:
+        cursor.execute("""
+            INSERT INTO stock_daily_rollup
+            (ingredient_id, day, transaction_type, reason_code, quantity, value, txn_count)
+            SELECT st.ingredient_id, DATE(st.timestamp), st.transaction_type, st.reason_code,
+                   SUM(st.quantity), SUM(st.quantity * COALESCE(i.cost_per_unit, 0)), COUNT(*)
+            FROM stock_transactions st
+            LEFT JOIN ingredients i ON st.ingredient_id = i.id
+            GROUP BY st.ingredient_id, DATE(st.timestamp), st.transaction_type, st.reason_code
+        """)
+    
+    # Create stock_lots table (one lot per receipt, consumed FIFO)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_lots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ingredient_id INTEGER NOT NULL,
+            po_id INTEGER,
+            quantity REAL NOT NULL,
+            remaining_quantity REAL NOT NULL,
+            unit_price REAL NOT NULL DEFAULT 0,
+            received_date TEXT NOT NULL,
+            FOREIGN KEY (ingredient_id) REFERENCES ingredients(id),
+            FOREIGN KEY (po_id) REFERENCES purchase_orders(id)
+        )
+    """)
+    
+    # Create stock_lot_consumption table (cost of every quantity drawn from lots)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_lot_consumption (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lot_id INTEGER,
+            ingredient_id INTEGER NOT NULL,
+            order_id INTEGER,
+            quantity REAL NOT NULL,
+            unit_price REAL NOT NULL,
+            consumed_date TEXT NOT NULL,
+            FOREIGN KEY (lot_id) REFERENCES stock_lots(id),
+            FOREIGN KEY (ingredient_id) REFERENCES ingredients(id)
+        )
+    """)
+    
+    # Open lots are read oldest-first per ingredient; COGS is summed by date
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_stock_lots_open
+        ON stock_lots (ingredient_id, received_date, id)
+        WHERE remaining_quantity > 0
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_stock_lot_consumption_date
+        ON stock_lot_consumption (consumed_date, order_id)
+    """)
+    # Deleting a bill looks up the stock it consumed
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_stock_lot_consumption_order
+        ON stock_lot_consumption (order_id)
+        WHERE order_id IS NOT NULL
+    """)
+    
+    # Stock held before lot tracking becomes an opening lot so it is drawn first
+    cursor.execute("""
+        INSERT INTO stock_lots
+        (ingredient_id, quantity, remaining_quantity, unit_price, received_date)
+        SELECT i.id, i.current_stock, i.current_stock, COALESCE(i.cost_per_unit, 0),
+               COALESCE(
+                   (SELECT MIN(st.timestamp) FROM stock_transactions st WHERE st.ingredient_id = i.id),
+                   datetime('now', 'localtime')
+               )
+        FROM ingredients i
+        WHERE i.current_stock > 0
+        AND NOT EXISTS (SELECT 1 FROM stock_lots sl WHERE sl.ingredient_id = i.id)
+    """)
+    
+    # Create stock_takes table (physical count header)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_takes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            count_date TEXT NOT NULL,
+            line_count INTEGER DEFAULT 0,
+            total_variance_value REAL DEFAULT 0,
+            notes TEXT DEFAULT ''
+        )
+    """)
+    
+    # Create stock_take_items table (counted vs system quantity per ingredient)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_take_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            stock_take_id INTEGER NOT NULL,
+            ingredient_id INTEGER NOT NULL,
+            system_quantity REAL NOT NULL,
+            counted_quantity REAL NOT NULL,
+            variance REAL NOT NULL,
+            variance_value REAL DEFAULT 0,
+            FOREIGN KEY (stock_take_id) REFERENCES stock_takes(id),
+            FOREIGN KEY (ingredient_id) REFERENCES ingredients(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_stock_take_items_take
+        ON stock_take_items (stock_take_id)
+    """)
+    
     # Create accounts table for accounting
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS accounts (
@@ -256,6 +779,64 @@ def init_database():
         VALUES (1, 'Cash Account', 'cash', 0)
     """)
     
+    # Create default settlement accounts for card and UPI receipts
+    cursor.execute("""
+        INSERT OR IGNORE INTO accounts (id, name, type, balance)
+        VALUES (2, 'Card Settlement Account', 'bank', 0)
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO accounts (id, name, type, balance)
+        VALUES (3, 'UPI Settlement Account', 'bank', 0)
+    """)
+    
+    # Create payment_method_accounts table (which account each tender is paid into)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS payment_method_accounts (
+            payment_method TEXT PRIMARY KEY,
+            account_id INTEGER NOT NULL,
+            FOREIGN KEY (account_id) REFERENCES accounts(id)
+        )
+    """)
+    cursor.execute("""
+        INSERT OR IGNORE INTO payment_method_accounts (payment_method, account_id)
+        VALUES ('cash', 1), ('card', 2), ('upi', 3)
+    """)
+    
+    # Create order_payments table (one row per tender; several for split payments)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS order_payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL,
+            payment_method TEXT NOT NULL,
+            amount REAL NOT NULL,
+            account_id INTEGER,
+            business_date TEXT NOT NULL,
+            paid_at TEXT NOT NULL,
+            FOREIGN KEY (order_id) REFERENCES orders(id),
+            FOREIGN KEY (account_id) REFERENCES accounts(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_order_payments_order
+        ON order_payments (order_id)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_order_payments_paid_at
+        ON order_payments (paid_at, payment_method, amount)
+    """)
+    
+    # Orders paid before tenders were recorded: one payment row each
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM order_payments)")
+    if not cursor.fetchone()[0]:
+        cursor.execute("""
+            INSERT INTO order_payments (order_id, payment_method, amount, account_id, business_date, paid_at)
+            SELECT o.id, COALESCE(o.payment_method, 'unknown'), o.final_amount, pma.account_id,
+                   o.business_date, o.order_date
+            FROM orders o
+            LEFT JOIN payment_method_accounts pma ON pma.payment_method = o.payment_method
+            WHERE o.status = 'completed'
+        """)
+    
     # Create transactions table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS transactions (
@@ -269,6 +850,73 @@ def init_database():
             FOREIGN KEY (account_id) REFERENCES accounts(id)
         )
     """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_transactions_order
+        ON transactions (order_id)
+        WHERE order_id IS NOT NULL
+    """)
+    
+    # Create order corrections tables (voids, refunds and amendments of
+    # completed bills). The original bill is never rewritten: a correction is
+    # dated on its own business date and carries signed amount deltas.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS order_corrections (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL,
+            correction_type TEXT NOT NULL CHECK(correction_type IN ('void', 'refund', 'amendment')),
+            business_date TEXT NOT NULL,
+            subtotal REAL DEFAULT 0,
+            gst_amount REAL DEFAULT 0,
+            service_charge REAL DEFAULT 0,
+            discount REAL DEFAULT 0,
+            final_amount REAL DEFAULT 0,
+            reason TEXT DEFAULT '',
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (order_id) REFERENCES orders(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_order_corrections_order
+        ON order_corrections (order_id, correction_type)
+    """)
+    # A bill is voided at most once
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_order_corrections_void
+        ON order_corrections (order_id)
+        WHERE correction_type = 'void'
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS order_correction_payments (
+            correction_id INTEGER NOT NULL,
+            payment_method TEXT NOT NULL,
+            amount REAL NOT NULL,
+            PRIMARY KEY (correction_id, payment_method),
+            FOREIGN KEY (correction_id) REFERENCES order_corrections(id)
+        )
+    """)
+    
+    # Corrections per business date, netted into the sales summaries by reports
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_correction_summary (
+            business_date TEXT NOT NULL,
+            correction_type TEXT NOT NULL,
+            correction_count INTEGER DEFAULT 0,
+            subtotal REAL DEFAULT 0,
+            gst_amount REAL DEFAULT 0,
+            service_charge REAL DEFAULT 0,
+            discount REAL DEFAULT 0,
+            final_amount REAL DEFAULT 0,
+            PRIMARY KEY (business_date, correction_type)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_correction_payments (
+            business_date TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            amount REAL DEFAULT 0,
+            PRIMARY KEY (business_date, payment_method)
+        )
+    """)
     
     # Create expenses table
     cursor.execute("""
@@ -282,6 +930,185 @@ def init_database():
         )
     """)
     
+    # Create gl_accounts table (general ledger chart of accounts)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS gl_accounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            account_type TEXT NOT NULL CHECK(account_type IN ('asset', 'liability', 'equity', 'revenue', 'expense')),
+            cash_account_id INTEGER UNIQUE,
+            FOREIGN KEY (cash_account_id) REFERENCES accounts(id)
+        )
+    """)
+    cursor.executemany("""
+        INSERT OR IGNORE INTO gl_accounts (code, name, account_type, cash_account_id)
+        VALUES (?, ?, ?, ?)
+    """, [
+        ('1000', 'Cash', 'asset', 1),
+        ('1010', 'Card Settlement', 'asset', 2),
+        ('1020', 'UPI Settlement', 'asset', 3),
+        ('2000', 'GST Payable', 'liability', None),
+        ('3000', 'Owner Equity', 'equity', None),
+        ('4000', 'Food Sales', 'revenue', None),
+        ('4100', 'Service Charge Income', 'revenue', None),
+        ('6000', 'Operating Expenses', 'expense', None)
+    ])
+    
+    # Create journal_entries / journal_lines tables (balanced double-entry postings)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS journal_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entry_date TEXT NOT NULL,
+            description TEXT DEFAULT '',
+            source TEXT,
+            source_id INTEGER,
+            created_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_journal_entries_source
+        ON journal_entries (source, source_id)
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS journal_lines (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entry_id INTEGER NOT NULL,
+            gl_account_id INTEGER NOT NULL,
+            entry_date TEXT NOT NULL,
+            debit REAL DEFAULT 0,
+            credit REAL DEFAULT 0,
+            FOREIGN KEY (entry_id) REFERENCES journal_entries(id),
+            FOREIGN KEY (gl_account_id) REFERENCES gl_accounts(id)
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_journal_lines_date
+        ON journal_lines (entry_date, gl_account_id, debit, credit)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_journal_lines_entry
+        ON journal_lines (entry_id)
+    """)
+    
+    # Create ledger_period_balances table (cumulative balances at each period close)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ledger_period_balances (
+            period TEXT NOT NULL,
+            gl_account_id INTEGER NOT NULL,
+            debit REAL DEFAULT 0,
+            credit REAL DEFAULT 0,
+            closed_at TEXT NOT NULL,
+            PRIMARY KEY (period, gl_account_id),
+            FOREIGN KEY (gl_account_id) REFERENCES gl_accounts(id)
+        )
+    """)
+    
+    # Carry balances kept on the accounts table into the ledger once
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM journal_entries)")
+    if not cursor.fetchone()[0]:
+        cursor.execute("""
+            SELECT g.id, a.balance
+            FROM accounts a
+            JOIN gl_accounts g ON g.cash_account_id = a.id
+            WHERE a.balance != 0
+        """)
+        opening = cursor.fetchall()
+        if opening:
+            now = datetime.now()
+            cursor.execute("""
+                INSERT INTO journal_entries (entry_date, description, source, created_at)
+                VALUES (?, 'Opening balances', 'opening', ?)
+            """, (now.strftime('%Y-%m-%d'), now.strftime('%Y-%m-%d %H:%M:%S')))
+            entry_id = cursor.lastrowid
+            cursor.execute("SELECT id FROM gl_accounts WHERE code = '3000'")
+            equity_id = cursor.fetchone()[0]
+            total = sum(balance for _, balance in opening)
+            lines = [(gl_id, max(balance, 0), max(-balance, 0)) for gl_id, balance in opening]
+            lines.append((equity_id, max(-total, 0), max(total, 0)))
+            cursor.executemany("""
+                INSERT INTO journal_lines (entry_id, gl_account_id, entry_date, debit, credit)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(entry_id, gl_id, now.strftime('%Y-%m-%d'), debit, credit) for gl_id, debit, credit in lines])
+    
+    # Create accounting_periods table (month closes; a closed period is read-only)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS accounting_periods (
+            period TEXT PRIMARY KEY,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            status TEXT DEFAULT 'closed' CHECK(status IN ('open', 'closed')),
+            closed_at TEXT
+        )
+    """)
+    
+    # Create period_snapshots table (P&L and GST totals frozen at month close)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS period_snapshots (
+            period TEXT PRIMARY KEY,
+            order_count INTEGER DEFAULT 0,
+            subtotal REAL DEFAULT 0,
+            revenue REAL DEFAULT 0,
+            gst_collected REAL DEFAULT 0,
+            service_charge REAL DEFAULT 0,
+            discount REAL DEFAULT 0,
+            cogs REAL DEFAULT 0,
+            recipe_cogs REAL DEFAULT 0,
+            expenses REAL DEFAULT 0,
+            closed_at TEXT NOT NULL,
+            FOREIGN KEY (period) REFERENCES accounting_periods(period)
+        )
+    """)
+    
+    # Create period_expense_snapshots table (expenses by category at month close)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS period_expense_snapshots (
+            period TEXT NOT NULL,
+            category TEXT NOT NULL,
+            amount REAL DEFAULT 0,
+            PRIMARY KEY (period, category),
+            FOREIGN KEY (period) REFERENCES accounting_periods(period)
+        )
+    """)
+    
+    # Reject writes dated inside a closed period. Each check is one primary
+    # key lookup on accounting_periods, so open-period writes stay cheap.
+    closed_check = """
+        SELECT RAISE(ABORT, 'Accounting period is closed')
+        WHERE EXISTS (
+            SELECT 1 FROM accounting_periods
+            WHERE period = substr({date}, 1, 7) AND status = 'closed'
+        )
+    """
+    order_closed_check = """
+        SELECT RAISE(ABORT, 'Accounting period is closed')
+        WHERE EXISTS (
+            SELECT 1 FROM orders o
+            JOIN accounting_periods p ON p.period = substr(o.business_date, 1, 7)
+            WHERE o.id = {row}.order_id AND p.status = 'closed'
+        )
+    """
+    period_locks = [
+        ('orders', closed_check, 'business_date'),
+        ('order_payments', closed_check, 'business_date'),
+        ('expenses', closed_check, 'date'),
+        ('journal_lines', closed_check, 'entry_date'),
+        ('order_corrections', closed_check, 'business_date'),
+        ('order_items', order_closed_check, None),
+    ]
+    for table, check, date_column in period_locks:
+        for event, rows in (('INSERT', ['NEW']), ('UPDATE', ['OLD', 'NEW']), ('DELETE', ['OLD'])):
+            body = ''.join(
+                check.format(date=f"{row}.{date_column}", row=row) + ';' for row in rows
+            )
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_period_lock_{event.lower()}
+                BEFORE {event} ON {table}
+                BEGIN
+                    {body}
+                END
+            """)
+    
     # Create tax_records table
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS tax_records (
@@ -448,6 +1275,24 @@ def init_database():
         )
     """)
     
+    # Create job_runs table (background scheduler run history)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_name TEXT NOT NULL,
+            scheduled_for TEXT NOT NULL,
+            started_at TEXT NOT NULL,
+            finished_at TEXT,
+            duration_seconds REAL,
+            status TEXT NOT NULL CHECK(status IN ('running', 'completed', 'failed', 'interrupted')),
+            message TEXT
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_job_runs_job
+        ON job_runs (job_name, scheduled_for)
+    """)
+    
     conn.commit()
     conn.close()
     print("Database initialized successfully!")
@@ -0,0 +1,274 @@
+"""
+GST Engine
+Per-line GST (CGST/SGST) calculation, rate-wise and day-wise return summaries
+and streaming export of filing data
+"""
+
+import csv
+import json
+import database
+
+class GSTEngine:
+    """GST calculation and return data built from per-line tax columns"""
+    
+    DEFAULT_RATE = 5.0
+    DEFAULT_HSN = '996331'  # SAC: restaurant services
+    EXPORT_BATCH_SIZE = 500
+    EXPORT_FIELDS = ['invoice_no', 'invoice_date', 'business_date', 'item', 'hsn_code', 'quantity',
+                     'gst_rate', 'taxable_value', 'cgst', 'sgst', 'total_tax', 'document_type']
+    
+    # Invoice lines of completed bills, followed by the credit/debit note lines
+    # of voids, refunds and amendments dated in the period. A note is spread
+    # over the original bill's lines in proportion to their taxable value and
+    # tax; only a void takes the quantities back. Parameters: the period twice.
+    LINES_SQL = """
+        SELECT 'invoice' as document_type, 0 as document_id, o.id as invoice_no,
+               o.order_date as invoice_date, o.business_date, oi.id as line_id, oi.menu_item_id,
+               oi.hsn_code, oi.gst_rate, oi.quantity, oi.taxable_value, oi.cgst, oi.sgst
+        FROM orders o
+        JOIN order_items oi ON oi.order_id = o.id
+        WHERE o.business_date BETWEEN ? AND ?
+        AND o.status = 'completed'
+        UNION ALL
+        SELECT c.correction_type, c.id, c.order_id, c.created_at, c.business_date, oi.id, oi.menu_item_id,
+               oi.hsn_code, oi.gst_rate,
+               CASE WHEN c.correction_type = 'void' THEN -oi.quantity ELSE 0 END,
+               ROUND(COALESCE(c.subtotal * oi.taxable_value / NULLIF(SUM(oi.taxable_value) OVER note, 0), 0), 2),
+               ROUND(COALESCE(c.gst_amount * (oi.cgst + oi.sgst) / NULLIF(SUM(oi.cgst + oi.sgst) OVER note, 0), 0) / 2, 2),
+               ROUND(COALESCE(c.gst_amount * (oi.cgst + oi.sgst) / NULLIF(SUM(oi.cgst + oi.sgst) OVER note, 0), 0) / 2, 2)
+        FROM order_corrections c
+        JOIN order_items oi ON oi.order_id = c.order_id
+        WHERE c.business_date BETWEEN ? AND ?
+        WINDOW note AS (PARTITION BY c.id)
+    """
+    
+    @staticmethod
+    def compute_line_tax(taxable_value, gst_rate):
+        """
+        Split the GST on one line into its central and state halves
+        Returns:
+            Dict with taxable_value, gst_rate, cgst and sgst (rounded to paise)
+        """
+        half = round(taxable_value * gst_rate / 200.0, 2)
+        return {
+            'taxable_value': taxable_value,
+            'gst_rate': gst_rate,
+            'cgst': half,
+            'sgst': half
+        }
+    
+    @staticmethod
+    def apply_item_taxes(items, gst_enabled=True):
+        """
+        Tag cart items with their HSN code, rate and CGST/SGST
+        Args:
+            items: Cart item dicts with item_id and price; tax keys are added in place
+            gst_enabled: When off every line is taxed at 0%
+        Returns:
+            Total GST for the cart
+        """
+        item_ids = sorted({item['item_id'] for item in items})
+        rates = {}
+        if item_ids:
+            conn = database.get_connection()
+            cursor = conn.cursor()
+            placeholders = ','.join(['?'] * len(item_ids))
+            cursor.execute(f"""
+                SELECT id, hsn_code, gst_rate FROM menu_items WHERE id IN ({placeholders})
+            """, item_ids)
+            rates = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+            conn.close()
+        
+        gst_amount = 0
+        for item in items:
+            hsn_code, gst_rate = rates.get(item['item_id'], (None, None))
+            gst_rate = (gst_rate if gst_rate is not None else GSTEngine.DEFAULT_RATE) if gst_enabled else 0
+            item['hsn_code'] = hsn_code or GSTEngine.DEFAULT_HSN
+            item.update(GSTEngine.compute_line_tax(item['price'], gst_rate))
+            gst_amount += item['cgst'] + item['sgst']
+        
+        return round(gst_amount, 2)
+    
+    @staticmethod
+    def set_item_tax(menu_item_id, gst_rate, hsn_code=None):
+        """Set the GST rate (and optionally HSN/SAC code) charged on a menu item"""
+        if gst_rate < 0:
+            return False, "GST rate cannot be negative"
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("""
+                UPDATE menu_items
+                SET gst_rate = ?, hsn_code = COALESCE(?, hsn_code)
+                WHERE id = ?
+            """, (gst_rate, hsn_code, menu_item_id))
+            if cursor.rowcount == 0:
+                conn.close()
+                return False, "Menu item not found"
+            
+            conn.commit()
+            conn.close()
+            return True, "GST rate updated"
+        except Exception as e:
+            conn.close()
+            return False, f"Error: {str(e)}"
+    
+    @staticmethod
+    def get_rate_summary(start_date, end_date):
+        """
+        Taxable value and tax per HSN code and rate for a range of business dates,
+        net of the voids, refunds and amendments dated in the range
+        Returns:
+            Rows with hsn_code, gst_rate, line_count, quantity, taxable_value,
+            cgst, sgst and total_tax
+        """
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            SELECT hsn_code, gst_rate,
+                   SUM(CASE document_type WHEN 'invoice' THEN 1 WHEN 'void' THEN -1 ELSE 0 END) as line_count,
+                   SUM(quantity) as quantity,
+                   ROUND(SUM(taxable_value), 2) as taxable_value,
+                   ROUND(SUM(cgst), 2) as cgst,
+                   ROUND(SUM(sgst), 2) as sgst,
+                   ROUND(SUM(cgst + sgst), 2) as total_tax
+            FROM ({GSTEngine.LINES_SQL})
+            GROUP BY hsn_code, gst_rate
+            ORDER BY gst_rate, hsn_code
+        """, (str(start_date), str(end_date)) * 2)
+        
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    @staticmethod
+    def get_daily_summary(start_date, end_date):
+        """
+        Taxable value and tax per business date and rate, with corrections on
+        their own business date
+        Returns:
+            Rows with business_date, gst_rate, invoice_count (bills less voids),
+            taxable_value, cgst, sgst and total_tax
+        """
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f"""
+            SELECT business_date, gst_rate,
+                   COUNT(DISTINCT CASE WHEN document_type = 'invoice' THEN invoice_no END)
+                   - COUNT(DISTINCT CASE WHEN document_type = 'void' THEN invoice_no END) as invoice_count,
+                   ROUND(SUM(taxable_value), 2) as taxable_value,
+                   ROUND(SUM(cgst), 2) as cgst,
+                   ROUND(SUM(sgst), 2) as sgst,
+                   ROUND(SUM(cgst + sgst), 2) as total_tax
+            FROM ({GSTEngine.LINES_SQL})
+            GROUP BY business_date, gst_rate
+            ORDER BY business_date, gst_rate
+        """, (str(start_date), str(end_date)) * 2)
+        
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    @staticmethod
+    def get_return_summary(start_date, end_date):
+        """
+        Figures for the outward supplies section of a GST return
+        Returns:
+            Dict with period, invoice_count (bills less voids), note_count
+            (voids, refunds and amendments), taxable_value, cgst, sgst,
+            total_tax and the rate-wise rows (as dicts)
+        """
+        rates = [dict(row) for row in GSTEngine.get_rate_summary(start_date, end_date)]
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*) FROM orders
+            WHERE business_date BETWEEN ? AND ? AND status = 'completed'
+        """, (str(start_date), str(end_date)))
+        invoice_count = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT COUNT(*), COALESCE(SUM(correction_type = 'void'), 0) FROM order_corrections
+            WHERE business_date BETWEEN ? AND ?
+        """, (str(start_date), str(end_date)))
+        note_count, void_count = cursor.fetchone()
+        conn.close()
+        
+        return {
+            'period': f"{start_date} to {end_date}",
+            'invoice_count': invoice_count - void_count,
+            'note_count': note_count,
+            'taxable_value': round(sum(row['taxable_value'] for row in rates), 2),
+            'cgst': round(sum(row['cgst'] for row in rates), 2),
+            'sgst': round(sum(row['sgst'] for row in rates), 2),
+            'total_tax': round(sum(row['total_tax'] for row in rates), 2),
+            'rates': rates
+        }
+    
+    @staticmethod
+    def _iter_invoice_lines(cursor, start_date, end_date):
+        """
+        Yield invoice and note lines for a period in batches, never holding the whole result
+        
+        Each day lists its invoices first, then its notes; a note line
+        carries the original bill's number.
+        """
+        cursor.execute(f"""
+            SELECT l.invoice_no, l.invoice_date, l.business_date,
+                   m.name as item, l.hsn_code, l.quantity, l.gst_rate,
+                   l.taxable_value, l.cgst, l.sgst,
+                   ROUND(l.cgst + l.sgst, 2) as total_tax, l.document_type
+            FROM ({GSTEngine.LINES_SQL}) l
+            LEFT JOIN menu_items m ON m.id = l.menu_item_id
+            ORDER BY l.business_date, l.document_id, l.invoice_no, l.line_id
+        """, (str(start_date), str(end_date)) * 2)
+        
+        while True:
+            batch = cursor.fetchmany(GSTEngine.EXPORT_BATCH_SIZE)
+            if not batch:
+                break
+            for row in batch:
+                yield [row[field] for field in GSTEngine.EXPORT_FIELDS]
+    
+    @staticmethod
+    def export_return(start_date, end_date, file_path, file_format='csv'):
+        """
+        Write the invoice lines of a period for filing
+        Args:
+            file_format: 'csv' (one row per line) or 'json' (summary plus lines)
+        
+        Lines are streamed from the database to the file in batches, so a
+        long period does not have to fit in memory.
+        """
+        if file_format not in ('csv', 'json'):
+            return False, "Export format must be 'csv' or 'json'"
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        count = 0
+        
+        try:
+            with open(file_path, 'w', newline='', encoding='utf-8') as f:
+                if file_format == 'csv':
+                    writer = csv.writer(f)
+                    writer.writerow(GSTEngine.EXPORT_FIELDS)
+                    for line in GSTEngine._iter_invoice_lines(cursor, start_date, end_date):
+                        writer.writerow(line)
+                        count += 1
+                else:
+                    summary = GSTEngine.get_return_summary(start_date, end_date)
+                    f.write('{"summary": ' + json.dumps(summary) + ', "lines": [')
+                    for line in GSTEngine._iter_invoice_lines(cursor, start_date, end_date):
+                        f.write((',' if count else '') + '\n' + json.dumps(dict(zip(GSTEngine.EXPORT_FIELDS, line))))
+                        count += 1
+                    f.write('\n]}\n')
+            
+            conn.close()
+            return True, f"Exported {count} invoice lines to {file_path}"
+        except Exception as e:
+            conn.close()
+            return False, f"Error: {str(e)}"
@@ -3,8 +3,10 @@ Inventory Management System
 Handles ingredients, recipes, stock tracking, and auto-deduction on orders
 """
 
+import csv
 import sqlite3
 import database
+import report_cache
 from datetime import datetime
 
 class InventoryManager:
@@ -13,6 +15,12 @@ class InventoryManager:
     # Standard units for ingredients
     UNITS = ['kg', 'grams', 'liters', 'pieces', 'packets']
     
+    # Structured reasons for stock movements
+    REASON_CODES = ['opening', 'purchase', 'order', 'waste', 'stock_take', 'adjustment']
+    
+    # Quantities below this are treated as zero when drawing from lots
+    QUANTITY_EPSILON = 1e-9
+    
     @staticmethod
     def add_ingredient(name, unit='kg', current_stock=0, min_stock=0, cost_per_unit=0):
         """Add a new ingredient"""
@@ -25,17 +33,20 @@ class InventoryManager:
                 VALUES (?, ?, ?, ?, ?)
             """, (name, unit, current_stock, min_stock, cost_per_unit))
             
-            conn.commit()
             ingredient_id = cursor.lastrowid
             
             # Record initial stock transaction
-            cursor.execute("""
-                INSERT INTO stock_transactions 
-                (ingredient_id, transaction_type, quantity, reason)
-                VALUES (?, ?, ?, ?)
-            """, (ingredient_id, 'in', current_stock, 'Initial stock'))
+            InventoryManager._record_stock_transactions(cursor, [
+                (ingredient_id, 'in', current_stock, 'Initial stock', 'opening',
+                 current_stock * (cost_per_unit or 0))
+            ])
+            
+            # Opening stock becomes the first FIFO lot
+            if current_stock > 0:
+                InventoryManager._create_lot(cursor, ingredient_id, current_stock, cost_per_unit)
             
             conn.commit()
+            report_cache.ReportCache.invalidate('ingredients')
             conn.close()
             return True, "Ingredient added successfully"
         except sqlite3.IntegrityError:
@@ -58,7 +69,13 @@ class InventoryManager:
                 WHERE id = ?
             """, (name, unit, min_stock, cost_per_unit, ingredient_id))
             
+            # Re-cost every dish that uses this ingredient
+            cursor.execute("SELECT DISTINCT menu_item_id FROM menu_ingredients WHERE ingredient_id = ?",
+                           (ingredient_id,))
+            InventoryManager._refresh_menu_item_cost(cursor, [row[0] for row in cursor.fetchall()])
+            
             conn.commit()
+            report_cache.ReportCache.invalidate('ingredients', 'menu_ingredients')
             conn.close()
             return True, "Ingredient updated successfully"
         except Exception as e:
@@ -93,27 +110,22 @@ class InventoryManager:
         return ingredient
     
     @staticmethod
-    def add_stock(ingredient_id, quantity, reason=''):
-        """Add stock to ingredient"""
+    def add_stock(ingredient_id, quantity, reason='', unit_price=None, reason_code=None):
+        """
+        Add stock to ingredient
+        Args:
+            unit_price: Cost of this receipt per unit (defaults to ingredient cost_per_unit)
+            reason_code: One of REASON_CODES (derived from reason if not given)
+        """
         conn = database.get_connection()
         cursor = conn.cursor()
         
         try:
-            # Update current stock
-            cursor.execute("""
-                UPDATE ingredients 
-                SET current_stock = current_stock + ?
-                WHERE id = ?
-            """, (quantity, ingredient_id))
-            
-            # Record transaction
-            cursor.execute("""
-                INSERT INTO stock_transactions 
-                (ingredient_id, transaction_type, quantity, reason)
-                VALUES (?, 'in', ?, ?)
-            """, (ingredient_id, quantity, reason))
+            InventoryManager._add_stock(cursor, ingredient_id, quantity, reason, unit_price,
+                                        reason_code=reason_code)
             
             conn.commit()
+            report_cache.ReportCache.invalidate('ingredients')
             conn.close()
             return True, "Stock added successfully"
         except Exception as e:
@@ -121,41 +133,183 @@ class InventoryManager:
             return False, f"Error: {str(e)}"
     
     @staticmethod
-    def remove_stock(ingredient_id, quantity, reason=''):
-        """Remove stock from ingredient"""
+    def remove_stock(ingredient_id, quantity, reason='', reason_code=None):
+        """
+        Remove stock from ingredient
+        Args:
+            reason_code: One of REASON_CODES, e.g. 'waste' (derived from reason if not given)
+        """
         conn = database.get_connection()
         cursor = conn.cursor()
         
         try:
-            # Check if sufficient stock
-            cursor.execute("SELECT current_stock FROM ingredients WHERE id = ?", (ingredient_id,))
-            result = cursor.fetchone()
+            deducted, conflicts = InventoryManager._deduct_requirements(
+                cursor, {ingredient_id: quantity}, reason,
+                reason_code or InventoryManager.classify_stock_reason(reason)
+            )
             
-            if not result or result[0] < quantity:
+            if conflicts:
+                conn.rollback()
                 conn.close()
                 return False, "Insufficient stock"
             
-            # Update current stock
-            cursor.execute("""
-                UPDATE ingredients 
-                SET current_stock = current_stock - ?
-                WHERE id = ?
-            """, (quantity, ingredient_id))
-            
-            # Record transaction
-            cursor.execute("""
-                INSERT INTO stock_transactions 
-                (ingredient_id, transaction_type, quantity, reason)
-                VALUES (?, 'out', ?, ?)
-            """, (ingredient_id, quantity, reason))
-            
             conn.commit()
+            report_cache.ReportCache.invalidate('ingredients')
             conn.close()
             return True, "Stock removed successfully"
         except Exception as e:
+            conn.rollback()
             conn.close()
             return False, f"Error: {str(e)}"
     
+    @staticmethod
+    def _add_stock(cursor, ingredient_id, quantity, reason='', unit_price=None, po_id=None, reason_code=None):
+        """Add stock and open a FIFO lot on an existing cursor (caller commits)"""
+        if unit_price is None:
+            cursor.execute("SELECT cost_per_unit FROM ingredients WHERE id = ?", (ingredient_id,))
+            result = cursor.fetchone()
+            unit_price = result[0] if result and result[0] else 0
+        
+        # Update current stock
+        cursor.execute("""
+            UPDATE ingredients 
+            SET current_stock = current_stock + ?
+            WHERE id = ?
+        """, (quantity, ingredient_id))
+        
+        # Record transaction
+        if not reason_code:
+            reason_code = 'purchase' if po_id else InventoryManager.classify_stock_reason(reason)
+        InventoryManager._record_stock_transactions(cursor, [
+            (ingredient_id, 'in', quantity, reason, reason_code, quantity * (unit_price or 0))
+        ])
+        
+        InventoryManager._create_lot(cursor, ingredient_id, quantity, unit_price, po_id)
+    
+    @staticmethod
+    def _create_lot(cursor, ingredient_id, quantity, unit_price, po_id=None):
+        """Open a new stock lot (caller commits)"""
+        cursor.execute("""
+            INSERT INTO stock_lots 
+            (ingredient_id, po_id, quantity, remaining_quantity, unit_price, received_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            ingredient_id,
+            po_id,
+            quantity,
+            quantity,
+            unit_price or 0,
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        ))
+    
+    @staticmethod
+    def _plan_fifo_consumption(cursor, ingredient_id, quantity, fallback_price, order_id=None):
+        """
+        Work out which lots a withdrawal draws from, oldest first
+        Returns:
+            (lot_updates, consumption_rows) ready for _apply_fifo_consumption.
+            Quantity not covered by lots (stock that predates lot tracking)
+            is costed at fallback_price with no lot.
+        """
+        cursor.execute("""
+            SELECT id, remaining_quantity, unit_price
+            FROM stock_lots
+            WHERE ingredient_id = ? AND remaining_quantity > 0
+            ORDER BY received_date, id
+        """, (ingredient_id,))
+        
+        consumed_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        lot_updates = []
+        consumption = []
+        outstanding = quantity
+        
+        for lot_id, remaining, unit_price in cursor.fetchall():
+            if outstanding <= InventoryManager.QUANTITY_EPSILON:
+                break
+            taken = min(outstanding, remaining)
+            lot_updates.append((taken, lot_id))
+            consumption.append((lot_id, ingredient_id, order_id, taken, unit_price, consumed_date))
+            outstanding -= taken
+        
+        if outstanding > InventoryManager.QUANTITY_EPSILON:
+            consumption.append((None, ingredient_id, order_id, outstanding, fallback_price or 0, consumed_date))
+        
+        return lot_updates, consumption
+    
+    @staticmethod
+    def _apply_fifo_consumption(cursor, lot_updates, consumption):
+        """Write planned lot withdrawals in two batched statements (caller commits)"""
+        if lot_updates:
+            cursor.executemany("""
+                UPDATE stock_lots
+                SET remaining_quantity = MAX(remaining_quantity - ?, 0)
+                WHERE id = ?
+            """, lot_updates)
+        
+        if consumption:
+            cursor.executemany("""
+                INSERT INTO stock_lot_consumption
+                (lot_id, ingredient_id, order_id, quantity, unit_price, consumed_date)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, consumption)
+    
+    @staticmethod
+    def _consumption_value(consumption):
+        """Total cost of planned consumption rows"""
+        return sum(row[3] * row[4] for row in consumption)
+    
+    @staticmethod
+    def _record_stock_transactions(cursor, records):
+        """
+        Write stock ledger rows and fold them into stock_daily_rollup (caller commits)
+        Args:
+            records: List of (ingredient_id, transaction_type, quantity, reason, reason_code, value)
+        """
+        if not records:
+            return
+        
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        day = timestamp[:10]
+        
+        cursor.executemany("""
+            INSERT INTO stock_transactions 
+            (ingredient_id, transaction_type, quantity, reason, reason_code, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (ingredient_id, transaction_type, quantity, reason, reason_code, timestamp)
+            for ingredient_id, transaction_type, quantity, reason, reason_code, value in records
+        ])
+        
+        cursor.executemany("""
+            INSERT INTO stock_daily_rollup
+            (ingredient_id, day, transaction_type, reason_code, quantity, value, txn_count)
+            VALUES (?, ?, ?, ?, ?, ?, 1)
+            ON CONFLICT (ingredient_id, day, transaction_type, reason_code) DO UPDATE SET
+                quantity = quantity + excluded.quantity,
+                value = value + excluded.value,
+                txn_count = txn_count + 1
+        """, [
+            (ingredient_id, day, transaction_type, reason_code, quantity, value)
+            for ingredient_id, transaction_type, quantity, reason, reason_code, value in records
+        ])
+    
+    @staticmethod
+    def classify_stock_reason(reason):
+        """Map a free-text stock reason to one of REASON_CODES"""
+        text = (reason or '').strip().lower()
+        
+        if 'wast' in text or 'spoil' in text or 'expire' in text:
+            return 'waste'
+        if text.startswith('po #') or 'purchase' in text:
+            return 'purchase'
+        if text.startswith('stock take'):
+            return 'stock_take'
+        if text.startswith('order'):
+            return 'order'
+        if text.startswith('initial') or text.startswith('opening'):
+            return 'opening'
+        return 'adjustment'
+    
     @staticmethod
     def get_low_stock_items():
         """Get ingredients with low stock"""
@@ -179,7 +333,9 @@ class InventoryManager:
         conn = database.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute("SELECT current_stock FROM ingredients WHERE id = ?", (ingredient_id,))
+        cursor.execute("""
+            SELECT current_stock FROM ingredients WHERE id = ?
+        """, (ingredient_id,))
         result = cursor.fetchone()
         conn.close()
         
@@ -188,11 +344,17 @@ class InventoryManager:
         return False
     
     @staticmethod
-    def deduct_order_stock(order_items):
+    def deduct_order_stock(order_items, order_id=None):
         """
         Auto-deduct stock when order is placed
         Args:
             order_items: List of dict with 'item_id', 'quantity', 'plate_type'
+            order_id: Order the stock is consumed for (recorded against COGS)
+        
+        All ingredients of the bill are deducted on one connection and
+        committed once. Each ingredient is decremented with a conditional
+        UPDATE, so concurrent terminals can never drive stock negative;
+        ingredients that are short are skipped and reported as insufficient.
         """
         conn = database.get_connection()
         cursor = conn.cursor()
@@ -200,60 +362,205 @@ class InventoryManager:
         transaction_summary = []
         
         try:
-            for item in order_items:
-                menu_item_id = item['item_id']
-                quantity = item.get('quantity', 1)
-                
-                # Get recipe for this menu item
-                cursor.execute("""
-                    SELECT ingredient_id, quantity_required
-                    FROM menu_ingredients
-                    WHERE menu_item_id = ?
-                """, (menu_item_id,))
-                
-                recipe = cursor.fetchall()
-                
-                if not recipe:
-                    # No recipe defined, skip
-                    continue
-                
-                for ingredient_record in recipe:
-                    ingredient_id = ingredient_record[0]
-                    quantity_per_item = ingredient_record[1]
-                    total_quantity_needed = quantity_per_item * quantity
-                    
-                    # Check stock availability
-                    if not InventoryManager.check_stock_availability(ingredient_id, total_quantity_needed):
-                        # Stock insufficient
-                        ingredient_name = InventoryManager.get_ingredient(ingredient_id)[1]
-                        transaction_summary.append({
-                            'ingredient': ingredient_name,
-                            'status': 'insufficient',
-                            'required': total_quantity_needed
-                        })
-                        continue
-                    
-                    # Deduct stock
-                    success, message = InventoryManager.remove_stock(
-                        ingredient_id, 
-                        total_quantity_needed, 
-                        reason=f"Order: Menu Item #{menu_item_id}"
-                    )
-                    
-                    if success:
-                        ingredient_name = InventoryManager.get_ingredient(ingredient_id)[1]
-                        transaction_summary.append({
-                            'ingredient': ingredient_name,
-                            'status': 'deducted',
-                            'quantity': total_quantity_needed
-                        })
+            requirements = InventoryManager._get_recipe_requirements(cursor, order_items)
+            
+            reason = f"Order #{order_id}" if order_id else "Order"
+            deducted, conflicts = InventoryManager._deduct_requirements(
+                cursor, requirements, reason, 'order', order_id
+            )
+            
+            for conflict in conflicts:
+                transaction_summary.append({
+                    'ingredient': conflict['ingredient'],
+                    'status': 'insufficient',
+                    'required': conflict['required']
+                })
             
+            for deduction in deducted:
+                transaction_summary.append({
+                    'ingredient': deduction['ingredient'],
+                    'status': 'deducted',
+                    'quantity': deduction['quantity']
+                })
+            
+            conn.commit()
+            report_cache.ReportCache.invalidate('ingredients')
             conn.close()
             return True, transaction_summary
         except Exception as e:
+            conn.rollback()
             conn.close()
             return False, f"Error: {str(e)}"
     
+    @staticmethod
+    def _get_recipe_requirements(cursor, order_items):
+        """
+        Total ingredient quantity needed for a list of order items
+        Returns:
+            Dict of ingredient_id -> quantity (one recipe query for the whole bill)
+        """
+        # Total servings per menu item on this bill
+        servings = {}
+        for item in order_items:
+            menu_item_id = item['item_id']
+            servings[menu_item_id] = servings.get(menu_item_id, 0) + item.get('quantity', 1)
+        
+        if not servings:
+            return {}
+        
+        placeholders = ','.join(['?'] * len(servings))
+        cursor.execute(f"""
+            SELECT menu_item_id, ingredient_id, quantity_required
+            FROM menu_ingredients
+            WHERE menu_item_id IN ({placeholders})
+        """, tuple(servings))
+        
+        requirements = {}
+        for menu_item_id, ingredient_id, quantity_per_item in cursor.fetchall():
+            requirements[ingredient_id] = (
+                requirements.get(ingredient_id, 0) + quantity_per_item * servings[menu_item_id]
+            )
+        return requirements
+    
+    @staticmethod
+    def _deduct_requirements(cursor, requirements, reason, reason_code, order_id=None):
+        """
+        Conditionally decrement each ingredient and record the movement (caller commits)
+        Args:
+            requirements: Dict of ingredient_id -> quantity
+        Returns:
+            (deducted, conflicts). Conflicting ingredients are left untouched;
+            the caller decides whether to commit the rest or roll back.
+        """
+        if not requirements:
+            return [], []
+        
+        placeholders = ','.join(['?'] * len(requirements))
+        cursor.execute(f"""
+            SELECT id, name, cost_per_unit FROM ingredients WHERE id IN ({placeholders})
+        """, tuple(requirements))
+        ingredients = {row[0]: row for row in cursor.fetchall()}
+        
+        deducted = []
+        short = {}
+        stock_records = []
+        lot_updates = []
+        consumption = []
+        
+        for ingredient_id, quantity in requirements.items():
+            cursor.execute("""
+                UPDATE ingredients
+                SET current_stock = current_stock - ?
+                WHERE id = ? AND current_stock >= ?
+            """, (quantity, ingredient_id, quantity - InventoryManager.QUANTITY_EPSILON))
+            
+            if cursor.rowcount == 0 or ingredient_id not in ingredients:
+                short[ingredient_id] = quantity
+                continue
+            
+            name, cost_per_unit = ingredients[ingredient_id][1], ingredients[ingredient_id][2]
+            planned_updates, planned_consumption = InventoryManager._plan_fifo_consumption(
+                cursor, ingredient_id, quantity, cost_per_unit, order_id
+            )
+            lot_updates.extend(planned_updates)
+            consumption.extend(planned_consumption)
+            
+            stock_records.append((
+                ingredient_id, 'out', quantity, reason, reason_code,
+                InventoryManager._consumption_value(planned_consumption)
+            ))
+            deducted.append({'ingredient_id': ingredient_id, 'ingredient': name, 'quantity': quantity})
+        
+        InventoryManager._record_stock_transactions(cursor, stock_records)
+        InventoryManager._apply_fifo_consumption(cursor, lot_updates, consumption)
+        
+        conflicts = InventoryManager._describe_conflicts(cursor, short) if short else []
+        return deducted, conflicts
+    
+    @staticmethod
+    def _describe_conflicts(cursor, short):
+        """Build conflict records (required vs available) for ingredients that could not be taken"""
+        placeholders = ','.join(['?'] * len(short))
+        cursor.execute(f"""
+            SELECT id, name, current_stock
+            FROM ingredients WHERE id IN ({placeholders})
+        """, tuple(short))
+        available = {row[0]: row for row in cursor.fetchall()}
+        
+        return [
+            {
+                'ingredient_id': ingredient_id,
+                'ingredient': available[ingredient_id][1] if ingredient_id in available else None,
+                'required': quantity,
+                'available': available[ingredient_id][2] if ingredient_id in available else 0
+            }
+            for ingredient_id, quantity in short.items()
+        ]
+    
+    @staticmethod
+    def _restore_order_stock(cursor, order_ids, reason='deleted'):
+        """
+        Put back the stock several orders consumed (caller commits)
+        Args:
+            order_ids: Orders being deleted; bind no more than SQLite's variable limit at once
+            reason: Suffix of the 'Order #<id>' stock transaction reason
+        Returns:
+            Number of ingredients restored
+        
+        Quantities return to the lots they were drawn from, and a negative
+        consumption row dated now takes the cost back out of COGS without
+        rewriting the original (possibly closed) day.
+        """
+        if not order_ids:
+            return 0
+        
+        placeholders = ','.join(['?'] * len(order_ids))
+        cursor.execute(f"""
+            SELECT lot_id, ingredient_id, order_id, SUM(quantity), unit_price
+            FROM stock_lot_consumption
+            WHERE order_id IN ({placeholders})
+            GROUP BY lot_id, ingredient_id, order_id, unit_price
+            HAVING SUM(quantity) > 0
+        """, tuple(order_ids))
+        drawn = cursor.fetchall()
+        if not drawn:
+            return 0
+        
+        consumed_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        restored = {}
+        for lot_id, ingredient_id, order_id, quantity, unit_price in drawn:
+            total_quantity, total_value = restored.get((order_id, ingredient_id), (0, 0))
+            restored[(order_id, ingredient_id)] = (total_quantity + quantity, total_value + quantity * unit_price)
+        
+        cursor.executemany("""
+            UPDATE stock_lots
+            SET remaining_quantity = remaining_quantity + ?
+            WHERE id = ?
+        """, [(quantity, lot_id) for lot_id, _, _, quantity, _ in drawn if lot_id is not None])
+        cursor.executemany("""
+            INSERT INTO stock_lot_consumption
+            (lot_id, ingredient_id, order_id, quantity, unit_price, consumed_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (lot_id, ingredient_id, order_id, -quantity, unit_price, consumed_date)
+            for lot_id, ingredient_id, order_id, quantity, unit_price in drawn
+        ])
+        
+        per_ingredient = {}
+        for (_, ingredient_id), (quantity, _) in restored.items():
+            per_ingredient[ingredient_id] = per_ingredient.get(ingredient_id, 0) + quantity
+        cursor.executemany("""
+            UPDATE ingredients
+            SET current_stock = current_stock + ?
+            WHERE id = ?
+        """, [(quantity, ingredient_id) for ingredient_id, quantity in per_ingredient.items()])
+        
+        InventoryManager._record_stock_transactions(cursor, [
+            (ingredient_id, 'in', quantity, f"Order #{order_id} {reason}", 'order', value)
+            for (order_id, ingredient_id), (quantity, value) in sorted(restored.items())
+        ])
+        return len(per_ingredient)
+    
     @staticmethod
     def set_recipe(menu_item_id, ingredients_data):
         """
@@ -276,13 +583,63 @@ class InventoryManager:
                     VALUES (?, ?, ?)
                 """, (menu_item_id, ingredient['ingredient_id'], ingredient['quantity_required']))
             
+            InventoryManager._refresh_menu_item_cost(cursor, [menu_item_id])
+            
             conn.commit()
+            report_cache.ReportCache.invalidate('menu_ingredients')
             conn.close()
             return True, "Recipe saved successfully"
         except Exception as e:
             conn.close()
             return False, f"Error: {str(e)}"
     
+    @staticmethod
+    def _refresh_menu_item_cost(cursor, menu_item_ids):
+        """Recompute the recipe cost of the given dishes (caller commits)"""
+        if not menu_item_ids:
+            return
+        
+        placeholders = ','.join(['?'] * len(menu_item_ids))
+        cursor.execute(f"DELETE FROM menu_item_cost WHERE menu_item_id IN ({placeholders})", menu_item_ids)
+        cursor.execute(f"""
+            INSERT INTO menu_item_cost (menu_item_id, recipe_cost, ingredient_count, updated_at)
+            SELECT mi.menu_item_id, SUM(mi.quantity_required * COALESCE(i.cost_per_unit, 0)), COUNT(*), ?
+            FROM menu_ingredients mi
+            JOIN ingredients i ON mi.ingredient_id = i.id
+            WHERE mi.menu_item_id IN ({placeholders})
+            GROUP BY mi.menu_item_id
+        """, [datetime.now().strftime('%Y-%m-%d %H:%M:%S')] + list(menu_item_ids))
+    
+    @staticmethod
+    def get_menu_item_costs():
+        """
+        Recipe cost and margin per dish
+        Returns:
+            Rows with menu_item_id, name, category, price (full plate price, else
+            single), recipe_cost, margin and margin_pct; dishes without a recipe
+            have recipe_cost NULL
+        """
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT m.id as menu_item_id, m.name, m.category,
+                   COALESCE(m.price_full, m.price_single) as price,
+                   c.recipe_cost,
+                   COALESCE(m.price_full, m.price_single) - c.recipe_cost as margin,
+                   CASE WHEN COALESCE(m.price_full, m.price_single) > 0
+                        THEN (COALESCE(m.price_full, m.price_single) - c.recipe_cost) * 100.0
+                             / COALESCE(m.price_full, m.price_single)
+                   END as margin_pct
+            FROM menu_items m
+            LEFT JOIN menu_item_cost c ON c.menu_item_id = m.id
+            ORDER BY margin_pct IS NULL, margin_pct ASC
+        """)
+        
+        costs = cursor.fetchall()
+        conn.close()
+        return costs
+    
     @staticmethod
     def get_recipe(menu_item_id):
         """Get recipe for a menu item"""
@@ -328,6 +685,261 @@ class InventoryManager:
         conn.close()
         return transactions
     
+    @staticmethod
+    def get_stock_lots(ingredient_id=None, open_only=True):
+        """Get stock lots, oldest first"""
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        query = """
+            SELECT sl.*, i.name as ingredient_name, i.unit, po.po_number
+            FROM stock_lots sl
+            JOIN ingredients i ON sl.ingredient_id = i.id
+            LEFT JOIN purchase_orders po ON sl.po_id = po.id
+            WHERE 1 = 1
+        """
+        params = []
+        
+        if ingredient_id:
+            query += " AND sl.ingredient_id = ?"
+            params.append(ingredient_id)
+        if open_only:
+            query += " AND sl.remaining_quantity > 0"
+        
+        query += " ORDER BY sl.ingredient_id, sl.received_date, sl.id"
+        
+        cursor.execute(query, params)
+        lots = cursor.fetchall()
+        conn.close()
+        return lots
+    
+    @staticmethod
+    def get_consumption_cost(start_date, end_date, orders_only=True):
+        """
+        Get FIFO cost of stock consumed between two dates (inclusive)
+        Args:
+            orders_only: Only count stock drawn for orders (COGS); otherwise
+                         include wastage and manual removals too
+        """
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        cost = InventoryManager._consumption_cost(cursor, start_date, end_date, orders_only)
+        conn.close()
+        return cost
+    
+    @staticmethod
+    def _consumption_cost(cursor, start_date, end_date, orders_only=True):
+        """FIFO cost of stock consumed between two dates, on an open cursor"""
+        cursor.execute(f"""
+            SELECT COALESCE(SUM(quantity * unit_price), 0)
+            FROM stock_lot_consumption
+            WHERE consumed_date >= ? AND consumed_date < date(?, '+1 day')
+            {'AND order_id IS NOT NULL' if orders_only else ''}
+        """, (str(start_date), str(end_date)))
+        return cursor.fetchone()[0]
+    
+    @staticmethod
+    def export_stock_take_sheet(file_path):
+        """Write a count sheet (CSV) listing every ingredient with a blank counted column"""
+        try:
+            with open(file_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['ingredient_id', 'name', 'unit', 'system_quantity', 'counted_quantity'])
+                for ingredient in InventoryManager.get_ingredients():
+                    writer.writerow([
+                        ingredient['id'],
+                        ingredient['name'],
+                        ingredient['unit'],
+                        ingredient['current_stock'],
+                        ''
+                    ])
+            return True, f"Count sheet saved to {file_path}"
+        except Exception as e:
+            return False, f"Error: {str(e)}"
+    
+    @staticmethod
+    def read_stock_take_csv(file_path):
+        """
+        Stream counted quantities from a CSV file
+        The file needs an 'ingredient_id' or 'name' column and a
+        'counted_quantity' column; rows with a blank count are skipped.
+        Yields:
+            Dict with 'ingredient_id' or 'name', and 'counted_quantity'
+        """
+        with open(file_path, newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                counted = (row.get('counted_quantity') or '').strip()
+                if not counted:
+                    continue
+                
+                count = {'counted_quantity': float(counted)}
+                ingredient_id = (row.get('ingredient_id') or '').strip()
+                if ingredient_id:
+                    count['ingredient_id'] = int(ingredient_id)
+                else:
+                    count['name'] = (row.get('name') or '').strip()
+                yield count
+    
+    @staticmethod
+    def post_stock_take(counts, notes=''):
+        """
+        Post a physical stock count
+        Args:
+            counts: Iterable of dict with 'ingredient_id' (or 'name') and 'counted_quantity'
+            notes: Optional notes
+        
+        Variances against current_stock are computed in one pass and every
+        adjustment is written in a single transaction.
+        Returns:
+            (True, report) where report has 'stock_take_id', 'lines',
+            'total_variance_value' and 'unmatched', or (False, message)
+        """
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            # Lock out other writers so the counted snapshot stays consistent
+            cursor.execute("BEGIN IMMEDIATE")
+            
+            cursor.execute("SELECT id, name, unit, current_stock, cost_per_unit FROM ingredients")
+            ingredients = {row['id']: row for row in cursor.fetchall()}
+            ids_by_name = {row['name'].lower(): ingredient_id for ingredient_id, row in ingredients.items()}
+            
+            counted_by_id = {}
+            unmatched = []
+            for count in counts:
+                ingredient_id = count.get('ingredient_id')
+                if ingredient_id is None:
+                    ingredient_id = ids_by_name.get((count.get('name') or '').lower())
+                if ingredient_id not in ingredients:
+                    unmatched.append(count)
+                    continue
+                # A repeated line for the same ingredient overrides the earlier one
+                counted_by_id[ingredient_id] = count['counted_quantity']
+            
+            count_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            cursor.execute("""
+                INSERT INTO stock_takes (count_date, notes)
+                VALUES (?, ?)
+            """, (count_date, notes))
+            stock_take_id = cursor.lastrowid
+            reason = f"Stock take #{stock_take_id}"
+            
+            lines = []
+            stock_updates = []
+            stock_records = []
+            lot_updates = []
+            consumption = []
+            
+            for ingredient_id, counted_quantity in counted_by_id.items():
+                ingredient = ingredients[ingredient_id]
+                system_quantity = ingredient['current_stock'] or 0
+                variance = counted_quantity - system_quantity
+                variance_value = 0
+                
+                if variance > InventoryManager.QUANTITY_EPSILON:
+                    # Found stock opens a lot at the ingredient's cost
+                    InventoryManager._create_lot(cursor, ingredient_id, variance, ingredient['cost_per_unit'])
+                    variance_value = variance * (ingredient['cost_per_unit'] or 0)
+                    stock_records.append((ingredient_id, 'in', variance, reason, 'stock_take', variance_value))
+                    stock_updates.append((counted_quantity, ingredient_id))
+                elif variance < -InventoryManager.QUANTITY_EPSILON:
+                    # Missing stock is written off from the oldest lots
+                    planned_updates, planned_consumption = InventoryManager._plan_fifo_consumption(
+                        cursor, ingredient_id, -variance, ingredient['cost_per_unit']
+                    )
+                    lot_updates.extend(planned_updates)
+                    consumption.extend(planned_consumption)
+                    variance_value = -InventoryManager._consumption_value(planned_consumption)
+                    stock_records.append((ingredient_id, 'out', -variance, reason, 'stock_take', -variance_value))
+                    stock_updates.append((counted_quantity, ingredient_id))
+                
+                lines.append({
+                    'ingredient_id': ingredient_id,
+                    'name': ingredient['name'],
+                    'unit': ingredient['unit'],
+                    'system_quantity': system_quantity,
+                    'counted_quantity': counted_quantity,
+                    'variance': variance,
+                    'variance_value': variance_value
+                })
+            
+            cursor.executemany("""
+                INSERT INTO stock_take_items
+                (stock_take_id, ingredient_id, system_quantity, counted_quantity, variance, variance_value)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [
+                (stock_take_id, line['ingredient_id'], line['system_quantity'],
+                 line['counted_quantity'], line['variance'], line['variance_value'])
+                for line in lines
+            ])
+            
+            cursor.executemany("""
+                UPDATE ingredients SET current_stock = ? WHERE id = ?
+            """, stock_updates)
+            
+            InventoryManager._record_stock_transactions(cursor, stock_records)
+            
+            InventoryManager._apply_fifo_consumption(cursor, lot_updates, consumption)
+            
+            total_variance_value = sum(line['variance_value'] for line in lines)
+            cursor.execute("""
+                UPDATE stock_takes SET line_count = ?, total_variance_value = ?
+                WHERE id = ?
+            """, (len(lines), total_variance_value, stock_take_id))
+            
+            conn.commit()
+            report_cache.ReportCache.invalidate('ingredients')
+            conn.close()
+            
+            lines.sort(key=lambda line: abs(line['variance_value']), reverse=True)
+            return True, {
+                'stock_take_id': stock_take_id,
+                'count_date': count_date,
+                'lines': lines,
+                'total_variance_value': total_variance_value,
+                'unmatched': unmatched
+            }
+        except Exception as e:
+            conn.rollback()
+            conn.close()
+            return False, f"Error: {str(e)}"
+    
+    @staticmethod
+    def import_stock_take_csv(file_path, notes=''):
+        """Post a stock take straight from a counted CSV file"""
+        return InventoryManager.post_stock_take(
+            InventoryManager.read_stock_take_csv(file_path),
+            notes or f"Imported from {file_path}"
+        )
+    
+    @staticmethod
+    def get_stock_take_report(stock_take_id):
+        """Get a posted stock take with its variance lines, largest value first"""
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT * FROM stock_takes WHERE id = ?", (stock_take_id,))
+        stock_take = cursor.fetchone()
+        
+        if not stock_take:
+            conn.close()
+            return None
+        
+        cursor.execute("""
+            SELECT sti.*, i.name, i.unit
+            FROM stock_take_items sti
+            JOIN ingredients i ON sti.ingredient_id = i.id
+            WHERE sti.stock_take_id = ?
+            ORDER BY ABS(sti.variance_value) DESC
+        """, (stock_take_id,))
+        
+        lines = cursor.fetchall()
+        conn.close()
+        
+        return {'stock_take': stock_take, 'lines': lines}
+    
     @staticmethod
     def add_supplier(name, contact='', address=''):
         """Add a new supplier"""
@@ -0,0 +1,336 @@
+"""
+Item Affinity
+Market-basket analysis: which dishes are ordered together, with pair support,
+confidence and lift, counted incrementally per business date
+"""
+
+import database
+import report_cache
+from collections import Counter
+from itertools import combinations
+
+try:
+    import numpy as np
+    import scipy.sparse as sparse
+except ImportError:
+    np = None
+    sparse = None
+
+class ItemAffinity:
+    """Item co-occurrence counts and the affinity metrics built from them"""
+    
+    TOP_N = 5
+    MIN_PAIR_COUNT = 2  # pairs seen fewer times are too noisy to recommend
+    
+    @staticmethod
+    def is_available():
+        """Pair counting uses SciPy sparse matrices when installed, plain Python otherwise"""
+        return sparse is not None
+    
+    @staticmethod
+    def count_pairs(baskets):
+        """
+        Count baskets per item and per item pair
+        Args:
+            baskets: (order_id, menu_item_id) rows, one per distinct item on a bill
+        Returns:
+            (item_counts, pair_counts) as {menu_item_id: baskets} and
+            {(item_a, item_b): baskets} with item_a < item_b
+        """
+        if not baskets:
+            return {}, {}
+        if sparse is None:
+            return ItemAffinity._count_pairs_python(baskets)
+        
+        # Order x item incidence matrix X; X.T @ X holds item counts on the
+        # diagonal and pair counts above it
+        rows = np.array(baskets, dtype=np.int64)
+        order_ids, order_index = np.unique(rows[:, 0], return_inverse=True)
+        item_ids, item_index = np.unique(rows[:, 1], return_inverse=True)
+        incidence = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int64), (order_index, item_index)),
+            shape=(len(order_ids), len(item_ids))
+        )
+        incidence.data[:] = 1  # a repeated line still counts once per bill
+        co_occurrence = (incidence.T @ incidence).tocoo()
+        
+        item_counts = {int(item_ids[i]): int(n) for i, n in enumerate(co_occurrence.diagonal())}
+        upper = co_occurrence.row < co_occurrence.col
+        pair_counts = {
+            (int(item_ids[a]), int(item_ids[b])): int(n)
+            for a, b, n in zip(co_occurrence.row[upper], co_occurrence.col[upper], co_occurrence.data[upper])
+        }
+        return item_counts, pair_counts
+    
+    @staticmethod
+    def _count_pairs_python(baskets):
+        """count_pairs without SciPy: enumerate the pairs of each bill"""
+        items_by_order = {}
+        for order_id, menu_item_id in baskets:
+            items_by_order.setdefault(order_id, set()).add(menu_item_id)
+        
+        item_counts = Counter()
+        pair_counts = Counter()
+        for items in items_by_order.values():
+            item_counts.update(items)
+            pair_counts.update(combinations(sorted(items), 2))
+        return dict(item_counts), dict(pair_counts)
+    
+    @staticmethod
+    def _apply_day_totals(cursor, business_date, sign):
+        """Add (sign=1) or remove (sign=-1) a day's counts from the running totals (caller commits)"""
+        cursor.execute("""
+            INSERT INTO item_pair_counts (item_a, item_b, pair_count)
+            SELECT item_a, item_b, ? * pair_count FROM item_pair_daily
+            WHERE business_date = ?
+            ON CONFLICT (item_a, item_b) DO UPDATE SET pair_count = pair_count + excluded.pair_count
+        """, (sign, business_date))
+        cursor.execute("""
+            INSERT INTO item_basket_counts (menu_item_id, basket_count)
+            SELECT menu_item_id, ? * basket_count FROM item_basket_daily
+            WHERE business_date = ?
+            ON CONFLICT (menu_item_id) DO UPDATE SET basket_count = basket_count + excluded.basket_count
+        """, (sign, business_date))
+        
+        if sign < 0:
+            cursor.execute("DELETE FROM item_pair_counts WHERE pair_count <= 0")
+            cursor.execute("DELETE FROM item_basket_counts WHERE basket_count <= 0")
+    
+    @staticmethod
+    def _update_day(cursor, business_date):
+        """
+        (Re)count one business date's bills into the affinity tables (caller commits)
+        
+        A day counted before is first taken back out of the totals, so a day
+        can be recounted after one of its bills is voided. Voided bills are
+        left out, whenever the void was recorded.
+        """
+        business_date = str(business_date)
+        ItemAffinity._apply_day_totals(cursor, business_date, -1)
+        cursor.execute("DELETE FROM item_pair_daily WHERE business_date = ?", (business_date,))
+        cursor.execute("DELETE FROM item_basket_daily WHERE business_date = ?", (business_date,))
+        
+        live = """
+            o.business_date = ? AND o.status = 'completed'
+            AND NOT EXISTS (
+                SELECT 1 FROM order_corrections c WHERE c.order_id = o.id AND c.correction_type = 'void'
+            )
+        """
+        cursor.execute(f"SELECT COUNT(*) FROM orders o WHERE {live}", (business_date,))
+        order_count = cursor.fetchone()[0]
+        cursor.execute(f"""
+            SELECT DISTINCT oi.order_id, oi.menu_item_id
+            FROM orders o
+            JOIN order_items oi ON oi.order_id = o.id
+            WHERE {live}
+        """, (business_date,))
+        baskets = [tuple(row) for row in cursor.fetchall()]
+        item_counts, pair_counts = ItemAffinity.count_pairs(baskets)
+        
+        cursor.executemany("""
+            INSERT INTO item_basket_daily (business_date, menu_item_id, basket_count)
+            VALUES (?, ?, ?)
+        """, [(business_date, item, count) for item, count in item_counts.items()])
+        cursor.executemany("""
+            INSERT INTO item_pair_daily (business_date, item_a, item_b, pair_count)
+            VALUES (?, ?, ?, ?)
+        """, [(business_date, a, b, count) for (a, b), count in pair_counts.items()])
+        ItemAffinity._apply_day_totals(cursor, business_date, 1)
+        
+        cursor.execute("""
+            INSERT INTO item_affinity_days (business_date, order_count, basket_count, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT (business_date) DO UPDATE SET
+                order_count = excluded.order_count,
+                basket_count = excluded.basket_count,
+                updated_at = excluded.updated_at
+        """, (business_date, order_count, len({order_id for order_id, _ in baskets})))
+    
+    @staticmethod
+    def _stale_days(cursor, through_date):
+        """
+        Business dates whose bills changed since they were counted: new days,
+        and days whose count of bills not voided no longer matches the daily
+        summary less the voids of that day's bills
+        """
+        cursor.execute("""
+            WITH live AS (
+                SELECT s.business_date, s.order_count - COALESCE(v.voided, 0) as order_count
+                FROM daily_sales_summary s
+                LEFT JOIN (
+                    SELECT o.business_date, COUNT(*) as voided
+                    FROM order_corrections c
+                    JOIN orders o ON o.id = c.order_id
+                    WHERE c.correction_type = 'void' AND o.status = 'completed'
+                    GROUP BY o.business_date
+                ) v ON v.business_date = s.business_date
+            )
+            SELECT s.business_date FROM live s
+            LEFT JOIN item_affinity_days d ON d.business_date = s.business_date
+            WHERE s.business_date <= ?
+            AND (d.business_date IS NULL OR d.order_count != s.order_count)
+            UNION
+            SELECT d.business_date FROM item_affinity_days d
+            LEFT JOIN live s ON s.business_date = d.business_date
+            WHERE d.order_count > 0 AND COALESCE(s.order_count, 0) = 0
+            UNION
+            SELECT ?
+            ORDER BY 1
+        """, (str(through_date), str(through_date)))
+        return [row[0] for row in cursor.fetchall()]
+    
+    @staticmethod
+    def _refresh_top(cursor, limit=None):
+        """Rebuild the top partners per dish from the running totals (caller commits)"""
+        cursor.execute("SELECT COALESCE(SUM(basket_count), 0) FROM item_affinity_days")
+        basket_total = cursor.fetchone()[0]
+        
+        cursor.execute("DELETE FROM item_affinity_top")
+        if not basket_total:
+            return
+        
+        cursor.execute("""
+            INSERT INTO item_affinity_top
+            (menu_item_id, rank, partner_id, pair_count, support, confidence, lift)
+            SELECT item, rank, partner, pair_count, support, confidence, lift
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY item ORDER BY lift DESC, confidence DESC, partner
+                ) as rank
+                FROM (
+                    SELECT p.item, p.partner, p.pair_count,
+                           p.pair_count * 1.0 / :total as support,
+                           p.pair_count * 1.0 / a.basket_count as confidence,
+                           p.pair_count * 1.0 * :total / (a.basket_count * b.basket_count) as lift
+                    FROM (
+                        SELECT item_a as item, item_b as partner, pair_count FROM item_pair_counts
+                        WHERE pair_count >= :min_pairs
+                        UNION ALL
+                        SELECT item_b, item_a, pair_count FROM item_pair_counts
+                        WHERE pair_count >= :min_pairs
+                    ) p
+                    JOIN item_basket_counts a ON a.menu_item_id = p.item
+                    JOIN item_basket_counts b ON b.menu_item_id = p.partner
+                )
+            )
+            WHERE rank <= :limit
+        """, {'total': basket_total, 'min_pairs': ItemAffinity.MIN_PAIR_COUNT,
+              'limit': limit or ItemAffinity.TOP_N})
+    
+    @staticmethod
+    def update(through_date=None):
+        """
+        Count every business date changed since the last update, then refresh
+        the top partners per dish
+        Args:
+            through_date: Last business date to count (default: today's)
+        """
+        through_date = through_date or database.get_business_date_string()
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            days = ItemAffinity._stale_days(cursor, through_date)
+            for business_date in days:
+                ItemAffinity._update_day(cursor, business_date)
+            ItemAffinity._refresh_top(cursor)
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            conn.close()
+            return False, f"Error: {str(e)}"
+        
+        report_cache.ReportCache.invalidate('item_pair_counts', 'item_affinity_top')
+        return True, f"Item affinities updated for {len(days)} day(s)"
+    
+    @staticmethod
+    def rebuild():
+        """Discard all counts and recount every business date"""
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        for table in ('item_affinity_days', 'item_pair_daily', 'item_basket_daily',
+                      'item_pair_counts', 'item_basket_counts', 'item_affinity_top'):
+            cursor.execute(f"DELETE FROM {table}")
+        conn.commit()
+        conn.close()
+        
+        return ItemAffinity.update()
+    
+    @staticmethod
+    @report_cache.ReportCache.cached(('item_affinity_top', 'menu_items'))
+    def get_top_affinities(menu_item_id=None):
+        """
+        Top partners per dish, as of the last update
+        Args:
+            menu_item_id: One dish, or None for all
+        Returns:
+            List of dicts with menu_item_id, item, rank, partner_id, partner,
+            pair_count, support, confidence and lift
+        """
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT t.menu_item_id, m.name as item, t.rank, t.partner_id, p.name as partner,
+                   t.pair_count, ROUND(t.support, 4) as support,
+                   ROUND(t.confidence, 4) as confidence, ROUND(t.lift, 2) as lift
+            FROM item_affinity_top t
+            JOIN menu_items m ON m.id = t.menu_item_id
+            JOIN menu_items p ON p.id = t.partner_id
+            WHERE ? IS NULL OR t.menu_item_id = ?
+            ORDER BY m.name, t.rank
+        """, (menu_item_id, menu_item_id))
+        
+        rows = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return rows
+    
+    @staticmethod
+    @report_cache.ReportCache.cached(('item_pair_counts', 'menu_items'))
+    def get_affinities(min_support=0.0, min_pair_count=None, order_by='lift', limit=50):
+        """
+        Strongest item pairs across all counted days
+        Args:
+            min_support: Minimum share of bills containing the pair
+            min_pair_count: Minimum bills containing the pair (default: MIN_PAIR_COUNT)
+            order_by: 'lift', 'confidence' or 'support'
+        Returns:
+            List of dicts with item_a, item_b, names, pair_count, support,
+            confidence_ab (P(b | a)), confidence_ba (P(a | b)) and lift
+        """
+        if order_by not in ('lift', 'confidence', 'support'):
+            raise ValueError(f"Unknown ordering: {order_by}")
+        order_column = 'MAX(confidence_ab, confidence_ba)' if order_by == 'confidence' else order_by
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(SUM(basket_count), 0) FROM item_affinity_days")
+        basket_total = cursor.fetchone()[0]
+        if not basket_total:
+            conn.close()
+            return []
+        
+        cursor.execute(f"""
+            SELECT * FROM (
+                SELECT p.item_a, ma.name as item_a_name, p.item_b, mb.name as item_b_name,
+                       p.pair_count,
+                       p.pair_count * 1.0 / :total as support,
+                       p.pair_count * 1.0 / a.basket_count as confidence_ab,
+                       p.pair_count * 1.0 / b.basket_count as confidence_ba,
+                       p.pair_count * 1.0 * :total / (a.basket_count * b.basket_count) as lift
+                FROM item_pair_counts p
+                JOIN item_basket_counts a ON a.menu_item_id = p.item_a
+                JOIN item_basket_counts b ON b.menu_item_id = p.item_b
+                JOIN menu_items ma ON ma.id = p.item_a
+                JOIN menu_items mb ON mb.id = p.item_b
+                WHERE p.pair_count >= :min_pairs
+            )
+            WHERE support >= :min_support
+            ORDER BY {order_column} DESC, pair_count DESC
+            LIMIT :limit
+        """, {'total': basket_total, 'min_support': min_support, 'limit': limit,
+              'min_pairs': ItemAffinity.MIN_PAIR_COUNT if min_pair_count is None else min_pair_count})
+        
+        rows = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return rows
@@ -0,0 +1,400 @@
+"""
+Job Scheduler
+In-process background thread that runs the nightly automation and backup
+jobs on cron-like schedules, keeping a persisted history of every run
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+import database
+from automation import AutomationManager
+from backup_manager import AutoBackupScheduler
+
+class CronSchedule:
+    """Five-field cron expression: minute hour day-of-month month day-of-week (0 or 7 = Sunday)"""
+    
+    FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+    # Days searched for a matching date; covers a 29 February schedule across a skipped leap year
+    SEARCH_DAYS = 8 * 366
+    
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = [
+            CronSchedule._parse_field(field, low, high)
+            for field, (low, high) in zip(fields, CronSchedule.FIELD_RANGES)
+        ]
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+    
+    @staticmethod
+    def _parse_field(field, low, high):
+        """
+        Values of one field as a sorted list
+        
+        Accepts '*', single values, ranges 'a-b', steps '*/n' or 'a-b/n' and
+        comma-separated lists of these.
+        """
+        values = set()
+        for part in field.split(','):
+            part, _, step = part.partition('/')
+            step = int(step) if step else 1
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-', 1))
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            if step < 1 or start < low or end > high or start > end:
+                raise ValueError(f"Invalid cron field {field!r}")
+            values.update(range(start, end + 1, step))
+        return sorted(values)
+    
+    def _matches_date(self, day):
+        """Whether a date matches the day-of-month, month and day-of-week fields"""
+        if day.month not in self.months:
+            return False
+        
+        day_match = day.day in self.days
+        weekday_match = (day.weekday() + 1) % 7 in self.weekdays
+        # As in cron, a restricted day-of-month and day-of-week match on either
+        if self.any_day and self.any_weekday:
+            return True
+        if self.any_day:
+            return weekday_match
+        if self.any_weekday:
+            return day_match
+        return day_match or weekday_match
+    
+    def next_after(self, moment):
+        """First scheduled minute strictly after moment (None if the schedule never fires)"""
+        start = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for offset in range(CronSchedule.SEARCH_DAYS):
+            day = start.date() + timedelta(days=offset)
+            if not self._matches_date(day):
+                continue
+            for hour in self.hours:
+                for minute in self.minutes:
+                    slot = datetime(day.year, day.month, day.day, hour, minute)
+                    if slot >= start:
+                        return slot
+        return None
+    
+    def previous(self, moment):
+        """Last scheduled minute at or before moment (None if there is none in SEARCH_DAYS)"""
+        for offset in range(CronSchedule.SEARCH_DAYS):
+            day = moment.date() - timedelta(days=offset)
+            if not self._matches_date(day):
+                continue
+            for hour in reversed(self.hours):
+                for minute in reversed(self.minutes):
+                    slot = datetime(day.year, day.month, day.day, hour, minute)
+                    if slot <= moment:
+                        return slot
+        return None
+
+
+class JobScheduler:
+    """Background thread running registered jobs when their schedule comes due"""
+    
+    # name -> job definition; idle_only jobs wait until no service is going on
+    JOBS = {
+        'daily_automation': {
+            'function': AutomationManager.run_daily_automation,
+            'schedule': '30 2 * * *',
+            'idle_only': True,
+            'description': 'Purchase orders, item affinity, prep forecast and menu engineering'
+        },
+        'auto_backup': {
+            'function': AutoBackupScheduler.run_auto_backup,
+            'schedule': '0 4 * * *',
+            'idle_only': True,
+            'description': 'Daily database backup'
+        }
+    }
+    
+    # Jobs running at once; SQLite has a single writer, so heavy jobs go one at a time
+    MAX_CONCURRENT_JOBS = 1
+    # Seconds between schedule checks
+    POLL_SECONDS = 30
+    # Service counts as over once no bill has been saved for this long
+    IDLE_MINUTES = 20
+    # A failed or interrupted run is retried this long after it started,
+    # up to MAX_ATTEMPTS runs per scheduled slot
+    RETRY_MINUTES = 15
+    MAX_ATTEMPTS = 3
+    
+    _lock = threading.Lock()
+    _running = {}  # job name -> worker thread
+    _stop = threading.Event()
+    _thread = None
+    
+    @staticmethod
+    def is_idle(now=None):
+        """
+        Whether the restaurant is between services
+        
+        Busy while a bill was saved in the last IDLE_MINUTES. Checked on a
+        read-only connection through idx_orders_status_date, so polling never
+        takes the write lock.
+        """
+        now = now or datetime.now()
+        conn = database.get_read_only_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT EXISTS (
+                SELECT 1 FROM orders WHERE status = 'completed' AND order_date >= ?
+            )
+        """, ((now - timedelta(minutes=JobScheduler.IDLE_MINUTES)).strftime('%Y-%m-%d %H:%M:%S'),))
+        busy = cursor.fetchone()[0]
+        
+        conn.close()
+        return not busy
+    
+    @staticmethod
+    def _due_slot(cursor, name, now):
+        """
+        Scheduled time a job should run for now, or None if it is up to date
+        
+        The latest slot at or before now is due until a run for it completes
+        (or is still running). Slots missed while the app was closed collapse
+        into that one catch-up run; a job that has never run is due at once.
+        A failed or interrupted run of the slot is retried RETRY_MINUTES after
+        it started, until MAX_ATTEMPTS runs have been made.
+        """
+        slot = CronSchedule(JobScheduler.JOBS[name]['schedule']).previous(now)
+        if slot is None:
+            return None
+        scheduled_for = slot.strftime('%Y-%m-%d %H:%M:%S')
+        
+        cursor.execute("""
+            SELECT MAX(CASE WHEN status IN ('completed', 'running') THEN scheduled_for END),
+                   COUNT(CASE WHEN status IN ('failed', 'interrupted') AND scheduled_for = ? THEN 1 END),
+                   MAX(CASE WHEN status IN ('failed', 'interrupted') AND scheduled_for = ? THEN started_at END)
+            FROM job_runs
+            WHERE job_name = ?
+        """, (scheduled_for, scheduled_for, name))
+        last, attempts, last_attempt = cursor.fetchone()
+        if last is not None and last >= scheduled_for:
+            return None
+        if attempts >= JobScheduler.MAX_ATTEMPTS:
+            return None
+        retry_after = (now - timedelta(minutes=JobScheduler.RETRY_MINUTES)).strftime('%Y-%m-%d %H:%M:%S')
+        if last_attempt is not None and last_attempt > retry_after:
+            return None
+        return scheduled_for
+    
+    @staticmethod
+    def _outcome(result):
+        """
+        Run status and message from a job's return value
+        
+        Jobs return (success, message) or, like run_daily_automation, a dict
+        with a list of tasks each carrying a status.
+        """
+        if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], bool):
+            return ('completed' if result[0] else 'failed'), str(result[1])
+        if isinstance(result, dict) and 'tasks' in result:
+            tasks = result['tasks']
+            status = 'failed' if any(task.get('status') == 'failed' for task in tasks) else 'completed'
+            return status, ', '.join(f"{task['task']}: {task.get('status', '')}" for task in tasks)
+        return 'completed', '' if result is None else str(result)
+    
+    @staticmethod
+    def _execute(name, run_id):
+        """Run one job on the calling worker thread and record how it ended"""
+        start = time.perf_counter()
+        try:
+            status, message = JobScheduler._outcome(JobScheduler.JOBS[name]['function']())
+        except Exception as e:
+            status, message = 'failed', f"Error: {str(e)}"
+        
+        try:
+            conn = database.get_connection()
+            conn.execute("""
+                UPDATE job_runs SET finished_at = ?, duration_seconds = ?, status = ?, message = ?
+                WHERE id = ?
+            """, (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), round(time.perf_counter() - start, 3),
+                  status, message, run_id))
+            conn.commit()
+            conn.close()
+        finally:
+            with JobScheduler._lock:
+                JobScheduler._running.pop(name, None)
+    
+    @staticmethod
+    def _launch(name, scheduled_for):
+        """
+        Record a run and start it on a worker thread
+        Returns:
+            (bool, message); False when the job is already running or
+            MAX_CONCURRENT_JOBS are busy
+        """
+        with JobScheduler._lock:
+            if name in JobScheduler._running:
+                return False, f"{name} is already running"
+            if len(JobScheduler._running) >= JobScheduler.MAX_CONCURRENT_JOBS:
+                return False, f"{len(JobScheduler._running)} job(s) already running"
+            
+            conn = database.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO job_runs (job_name, scheduled_for, started_at, status)
+                VALUES (?, ?, ?, 'running')
+            """, (name, scheduled_for, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            run_id = cursor.lastrowid
+            conn.commit()
+            conn.close()
+            
+            thread = threading.Thread(target=JobScheduler._execute, args=(name, run_id), daemon=True)
+            JobScheduler._running[name] = thread
+            thread.start()
+        
+        return True, f"{name} started"
+    
+    @staticmethod
+    def run_pending(now=None):
+        """
+        Start every job whose schedule has come due
+        Returns:
+            Names of the jobs started
+        
+        A due idle_only job is left due while service is going on and starts
+        on the first check that finds the restaurant idle.
+        """
+        now = now or datetime.now()
+        conn = database.get_read_only_connection()
+        cursor = conn.cursor()
+        due = [(name, JobScheduler._due_slot(cursor, name, now)) for name in JobScheduler.JOBS]
+        conn.close()
+        
+        due = [(name, slot) for name, slot in due if slot]
+        if any(JobScheduler.JOBS[name].get('idle_only') for name, _ in due) and not JobScheduler.is_idle(now):
+            due = [(name, slot) for name, slot in due if not JobScheduler.JOBS[name].get('idle_only')]
+        
+        started = []
+        for name, slot in due:
+            if JobScheduler._launch(name, slot)[0]:
+                started.append(name)
+        return started
+    
+    @staticmethod
+    def run_job(name):
+        """Start a job now, outside its schedule (admin 'Run Now')"""
+        if name not in JobScheduler.JOBS:
+            return False, f"Unknown job: {name}"
+        return JobScheduler._launch(name, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    
+    @staticmethod
+    def wait_for_jobs(timeout=None):
+        """Wait for running jobs to finish; returns True if none is left running"""
+        with JobScheduler._lock:
+            threads = list(JobScheduler._running.values())
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in threads:
+            thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+        with JobScheduler._lock:
+            return not JobScheduler._running
+    
+    @staticmethod
+    def _loop():
+        """Scheduler thread: check schedules until stopped"""
+        while not JobScheduler._stop.is_set():
+            try:
+                JobScheduler.run_pending()
+            except Exception as e:
+                print(f"Job scheduler error: {e}")
+            JobScheduler._stop.wait(JobScheduler.POLL_SECONDS)
+    
+    @staticmethod
+    def start():
+        """
+        Start the scheduler thread (once per process)
+        
+        Runs left 'running' by a previous process that exited mid-job are
+        marked interrupted; the first check then catches up on missed slots.
+        """
+        if JobScheduler._thread and JobScheduler._thread.is_alive():
+            return
+        
+        conn = database.get_connection()
+        conn.execute("""
+            UPDATE job_runs SET status = 'interrupted', finished_at = ?
+            WHERE status = 'running'
+        """, (datetime.now().strftime('%Y-%m-%d %H:%M:%S'),))
+        conn.commit()
+        conn.close()
+        
+        JobScheduler._stop.clear()
+        JobScheduler._thread = threading.Thread(target=JobScheduler._loop, daemon=True)
+        JobScheduler._thread.start()
+    
+    @staticmethod
+    def stop(timeout=None):
+        """Stop the scheduler thread and wait for running jobs"""
+        JobScheduler._stop.set()
+        if JobScheduler._thread:
+            JobScheduler._thread.join(timeout)
+            JobScheduler._thread = None
+        JobScheduler.wait_for_jobs(timeout)
+    
+    @staticmethod
+    def get_job_runs(job_name=None, limit=50):
+        """Recorded runs, newest first"""
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        if job_name:
+            cursor.execute("""
+                SELECT * FROM job_runs WHERE job_name = ? ORDER BY id DESC LIMIT ?
+            """, (job_name, limit))
+        else:
+            cursor.execute("SELECT * FROM job_runs ORDER BY id DESC LIMIT ?", (limit,))
+        runs = [dict(row) for row in cursor.fetchall()]
+        
+        conn.close()
+        return runs
+    
+    @staticmethod
+    def get_job_status(now=None):
+        """
+        One row per registered job
+        Returns:
+            List of dicts with name, description, schedule, running, next_run
+            and the last run's started_at, duration_seconds, status and message
+        """
+        now = now or datetime.now()
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        jobs = []
+        for name, job in JobScheduler.JOBS.items():
+            cursor.execute("""
+                SELECT started_at, duration_seconds, status, message FROM job_runs
+                WHERE job_name = ? ORDER BY id DESC LIMIT 1
+            """, (name,))
+            last = cursor.fetchone()
+            next_run = CronSchedule(job['schedule']).next_after(now)
+            with JobScheduler._lock:
+                running = name in JobScheduler._running
+            jobs.append({
+                'name': name,
+                'description': job.get('description', ''),
+                'schedule': job['schedule'],
+                'running': running,
+                'next_run': next_run.strftime('%Y-%m-%d %H:%M') if next_run else None,
+                'started_at': last['started_at'] if last else None,
+                'duration_seconds': last['duration_seconds'] if last else None,
+                'status': last['status'] if last else None,
+                'message': last['message'] if last else None
+            })
+        
+        conn.close()
+        return jobs
@@ -0,0 +1,411 @@
+"""
+General Ledger
+Double-entry journal postings, trial balance and period-close balances
+"""
+
+import database
+from datetime import datetime
+
+class Ledger:
+    """Double-entry general ledger"""
+    
+    GST_PAYABLE = '2000'
+    OWNER_EQUITY = '3000'
+    FOOD_SALES = '4000'
+    SERVICE_CHARGE_INCOME = '4100'
+    OPERATING_EXPENSES = '6000'
+    
+    # Accounts whose balance is debit minus credit; the rest are credit minus debit
+    DEBIT_NORMAL_TYPES = ('asset', 'expense')
+    
+    # Rounding tolerance when checking that an entry balances
+    TOLERANCE = 0.005
+    
+    @staticmethod
+    def _account_ids(cursor):
+        """GL account code -> id"""
+        cursor.execute("SELECT code, id FROM gl_accounts")
+        return {row[0]: row[1] for row in cursor.fetchall()}
+    
+    @staticmethod
+    def _cash_gl_account(cursor, account_id):
+        """GL account for a cash/bank account, created on first use"""
+        cursor.execute("SELECT id FROM gl_accounts WHERE cash_account_id = ?", (account_id,))
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+        
+        cursor.execute("SELECT name FROM accounts WHERE id = ?", (account_id,))
+        account = cursor.fetchone()
+        cursor.execute("""
+            INSERT INTO gl_accounts (code, name, account_type, cash_account_id)
+            VALUES (?, ?, 'asset', ?)
+        """, (f"1000-{account_id}", account[0] if account else f"Account {account_id}", account_id))
+        return cursor.lastrowid
+    
+    @staticmethod
+    def _post_entry(cursor, entry_date, description, lines, source=None, source_id=None):
+        """
+        Write one balanced journal entry (caller commits)
+        Args:
+            entry_date: Accounting date, 'YYYY-MM-DD'
+            lines: List of (gl_account_id, debit, credit)
+            source: What the entry is for, e.g. 'order', 'expense'
+            source_id: Id of the order/expense
+        Returns:
+            Journal entry id
+        """
+        lines = [(gl_id, round(debit, 2), round(credit, 2)) for gl_id, debit, credit in lines
+                 if abs(debit) > Ledger.TOLERANCE or abs(credit) > Ledger.TOLERANCE]
+        total_debit = sum(line[1] for line in lines)
+        total_credit = sum(line[2] for line in lines)
+        if abs(total_debit - total_credit) > Ledger.TOLERANCE:
+            raise ValueError(f"Unbalanced journal entry: debit {total_debit:.2f} != credit {total_credit:.2f}")
+        
+        cursor.execute("""
+            INSERT INTO journal_entries (entry_date, description, source, source_id, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (str(entry_date), description, source, source_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        entry_id = cursor.lastrowid
+        
+        cursor.executemany("""
+            INSERT INTO journal_lines (entry_id, gl_account_id, entry_date, debit, credit)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(entry_id, gl_id, str(entry_date), debit, credit) for gl_id, debit, credit in lines])
+        
+        return entry_id
+    
+    @staticmethod
+    def _post_order(cursor, order_id):
+        """
+        Post a checkout: tenders to their cash/bank accounts against sales,
+        service charge and GST payable (caller commits)
+        Returns:
+            Journal entry id, or None if the order is missing or already posted
+        """
+        cursor.execute("""
+            SELECT 1 FROM journal_entries WHERE source = 'order' AND source_id = ? LIMIT 1
+        """, (order_id,))
+        if cursor.fetchone():
+            return None
+        
+        cursor.execute("""
+            SELECT business_date, gst_amount, service_charge, final_amount, payment_method
+            FROM orders WHERE id = ?
+        """, (order_id,))
+        order = cursor.fetchone()
+        if not order:
+            return None
+        
+        business_date, gst_amount, service_charge, final_amount, payment_method = order
+        # Bills can carry fractions of a paisa (service charge is a percentage
+        # of the subtotal): round each header amount once and let sales take
+        # the rounding residual, so the entry always balances
+        gst_amount = round(gst_amount or 0, 2)
+        service_charge = round(service_charge or 0, 2)
+        
+        cursor.execute("""
+            SELECT COALESCE(op.account_id, pma.account_id, 1), SUM(op.amount)
+            FROM order_payments op
+            LEFT JOIN payment_method_accounts pma ON pma.payment_method = op.payment_method
+            WHERE op.order_id = ?
+            GROUP BY 1
+        """, (order_id,))
+        tenders = cursor.fetchall()
+        if not tenders:
+            cursor.execute("SELECT account_id FROM payment_method_accounts WHERE payment_method = ?",
+                           (payment_method,))
+            row = cursor.fetchone()
+            tenders = [(row[0] if row else 1, final_amount)]
+        
+        accounts = Ledger._account_ids(cursor)
+        lines = [(Ledger._cash_gl_account(cursor, account_id), round(amount or 0, 2), 0)
+                 for account_id, amount in tenders]
+        received = sum(line[1] for line in lines)
+        lines.append((accounts[Ledger.GST_PAYABLE], 0, gst_amount))
+        lines.append((accounts[Ledger.SERVICE_CHARGE_INCOME], 0, service_charge))
+        lines.append((accounts[Ledger.FOOD_SALES], 0, received - gst_amount - service_charge))
+        
+        return Ledger._post_entry(cursor, business_date, f"Order #{order_id}", lines, 'order', order_id)
+    
+    @staticmethod
+    def _post_expense(cursor, expense_id, date, amount, payment_method='cash', description=''):
+        """Post an expense paid from the account its payment method is routed to (caller commits)"""
+        cursor.execute("SELECT account_id FROM payment_method_accounts WHERE payment_method = ?",
+                       ((payment_method or 'cash').strip().lower(),))
+        row = cursor.fetchone()
+        
+        accounts = Ledger._account_ids(cursor)
+        lines = [
+            (accounts[Ledger.OPERATING_EXPENSES], amount, 0),
+            (Ledger._cash_gl_account(cursor, row[0] if row else 1), 0, amount)
+        ]
+        return Ledger._post_entry(cursor, date, description or f"Expense #{expense_id}", lines,
+                                  'expense', expense_id)
+    
+    @staticmethod
+    def _post_correction(cursor, correction_id):
+        """
+        Post a void, refund or amendment of a bill on its own date (caller commits)
+        
+        Amounts are signed deltas of the bill, so a void or refund debits
+        sales, service charge and GST payable and credits the tenders.
+        """
+        cursor.execute("""
+            SELECT order_id, correction_type, business_date, gst_amount, service_charge, final_amount
+            FROM order_corrections WHERE id = ?
+        """, (correction_id,))
+        correction = cursor.fetchone()
+        if not correction:
+            return None
+        
+        order_id, correction_type, business_date, gst_amount, service_charge, final_amount = correction
+        cursor.execute("""
+            SELECT COALESCE(pma.account_id, 1), SUM(cp.amount)
+            FROM order_correction_payments cp
+            LEFT JOIN payment_method_accounts pma ON pma.payment_method = cp.payment_method
+            WHERE cp.correction_id = ?
+            GROUP BY 1
+        """, (correction_id,))
+        tenders = cursor.fetchall()
+        
+        accounts = Ledger._account_ids(cursor)
+        # (account, signed debit): a negative debit is posted as a credit
+        signed = [(Ledger._cash_gl_account(cursor, account_id), amount) for account_id, amount in tenders]
+        signed.append((accounts[Ledger.GST_PAYABLE], -(gst_amount or 0)))
+        signed.append((accounts[Ledger.SERVICE_CHARGE_INCOME], -(service_charge or 0)))
+        signed.append((accounts[Ledger.FOOD_SALES], -((final_amount or 0) - (gst_amount or 0) - (service_charge or 0))))
+        lines = [(gl_id, max(amount, 0), max(-amount, 0)) for gl_id, amount in signed]
+        
+        return Ledger._post_entry(cursor, business_date, f"Order #{order_id} {correction_type}", lines,
+                                  'order_correction', correction_id)
+    
+    @staticmethod
+    def _reverse_source(cursor, source, source_id, description=''):
+        """
+        Post the mirror image of every entry for a source, dated today (caller commits)
+        
+        Used when a bill is deleted: the original entries stay in their
+        (possibly closed) period and the reversal lands in the current one.
+        """
+        cursor.execute("""
+            SELECT jl.gl_account_id, SUM(jl.debit), SUM(jl.credit)
+            FROM journal_entries je
+            JOIN journal_lines jl ON jl.entry_id = je.id
+            WHERE je.source = ? AND je.source_id = ?
+            GROUP BY jl.gl_account_id
+        """, (source, source_id))
+        lines = [(gl_id, credit, debit) for gl_id, debit, credit in cursor.fetchall()]
+        if not lines:
+            return None
+        
+        return Ledger._post_entry(cursor, database.get_business_date_string(),
+                                  description or f"Reversal of {source} #{source_id}",
+                                  lines, f"{source}_reversal", source_id)
+    
+    @staticmethod
+    def _reverse_sources(cursor, source, source_ids, description=''):
+        """
+        Reverse the entries of many sources of one kind with a single read (caller commits)
+        Args:
+            source_ids: Ids to reverse; bind no more than SQLite's variable limit at once
+            description: Memo prefix; each reversal is described as '<prefix> #<source_id>'
+        Returns:
+            Number of reversal entries posted
+        """
+        if not source_ids:
+            return 0
+        
+        placeholders = ','.join(['?'] * len(source_ids))
+        cursor.execute(f"""
+            SELECT je.source_id, jl.gl_account_id, SUM(jl.debit), SUM(jl.credit)
+            FROM journal_entries je
+            JOIN journal_lines jl ON jl.entry_id = je.id
+            WHERE je.source = ? AND je.source_id IN ({placeholders})
+            GROUP BY je.source_id, jl.gl_account_id
+        """, [source] + list(source_ids))
+        
+        reversals = {}
+        for source_id, gl_id, debit, credit in cursor.fetchall():
+            reversals.setdefault(source_id, []).append((gl_id, credit, debit))
+        
+        entry_date = database.get_business_date_string()
+        for source_id, lines in reversals.items():
+            Ledger._post_entry(cursor, entry_date,
+                               f"{description or f'Reversal of {source}'} #{source_id}",
+                               lines, f"{source}_reversal", source_id)
+        return len(reversals)
+    
+    @staticmethod
+    def _period_end(period):
+        """Last day of a 'YYYY-MM' period"""
+        year, month = int(period[:4]), int(period[5:7])
+        next_month = datetime(year + month // 12, month % 12 + 1, 1)
+        return (next_month - datetime.resolution).strftime('%Y-%m-%d')
+    
+    @staticmethod
+    def _balances(cursor, as_of=None):
+        """
+        Cumulative debit/credit per GL account up to as_of (inclusive)
+        
+        Starts from the latest period-close snapshot on or before as_of and
+        adds only the journal lines after it, so the cost stays bounded by
+        one open period rather than the whole history.
+        """
+        as_of = str(as_of) if as_of else '9999-12-31'
+        
+        cursor.execute("""
+            SELECT MAX(period) FROM ledger_period_balances
+            WHERE period <= substr(?, 1, 7)
+        """, (as_of,))
+        period = cursor.fetchone()[0]
+        if period and Ledger._period_end(period) > as_of:
+            cursor.execute("SELECT MAX(period) FROM ledger_period_balances WHERE period < ?", (period,))
+            period = cursor.fetchone()[0]
+        
+        balances = {}
+        start = ''
+        if period:
+            cursor.execute("""
+                SELECT gl_account_id, debit, credit FROM ledger_period_balances WHERE period = ?
+            """, (period,))
+            balances = {row[0]: [row[1], row[2]] for row in cursor.fetchall()}
+            start = Ledger._period_end(period)
+        
+        cursor.execute("""
+            SELECT gl_account_id, SUM(debit), SUM(credit)
+            FROM journal_lines
+            WHERE entry_date > ? AND entry_date <= ?
+            GROUP BY gl_account_id
+        """, (start, as_of))
+        for gl_id, debit, credit in cursor.fetchall():
+            totals = balances.setdefault(gl_id, [0, 0])
+            totals[0] += debit or 0
+            totals[1] += credit or 0
+        
+        return balances
+    
+    @staticmethod
+    def get_account_balances(as_of=None):
+        """
+        Balance of every GL account
+        Args:
+            as_of: Date 'YYYY-MM-DD' (default: all postings)
+        Returns:
+            List of dict with id, code, name, account_type, cash_account_id,
+            debit, credit and balance (in the account's normal direction)
+        """
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        balances = Ledger._balances(cursor, as_of)
+        cursor.execute("SELECT id, code, name, account_type, cash_account_id FROM gl_accounts ORDER BY code")
+        
+        accounts = []
+        for row in cursor.fetchall():
+            debit, credit = balances.get(row['id'], [0, 0])
+            balance = debit - credit if row['account_type'] in Ledger.DEBIT_NORMAL_TYPES else credit - debit
+            accounts.append({
+                'id': row['id'],
+                'code': row['code'],
+                'name': row['name'],
+                'account_type': row['account_type'],
+                'cash_account_id': row['cash_account_id'],
+                'debit': round(debit, 2),
+                'credit': round(credit, 2),
+                'balance': round(balance, 2)
+            })
+        
+        conn.close()
+        return accounts
+    
+    @staticmethod
+    def get_trial_balance(as_of=None):
+        """Trial balance: net debit or credit per account and whether they agree"""
+        rows = []
+        total_debit = 0
+        total_credit = 0
+        
+        for account in Ledger.get_account_balances(as_of):
+            net = account['debit'] - account['credit']
+            if abs(net) < Ledger.TOLERANCE:
+                continue
+            rows.append({
+                'code': account['code'],
+                'name': account['name'],
+                'account_type': account['account_type'],
+                'debit': round(max(net, 0), 2),
+                'credit': round(max(-net, 0), 2)
+            })
+            total_debit += max(net, 0)
+            total_credit += max(-net, 0)
+        
+        return {
+            'as_of': str(as_of) if as_of else None,
+            'accounts': rows,
+            'total_debit': round(total_debit, 2),
+            'total_credit': round(total_credit, 2),
+            'balanced': abs(total_debit - total_credit) < Ledger.TOLERANCE
+        }
+    
+    @staticmethod
+    def _close_period(cursor, period):
+        """
+        Snapshot cumulative balances at the end of a month (caller commits)
+        
+        Only AccountingSystem.close_period calls this, in the transaction that
+        locks the month: balances after a snapshot are read from journal lines
+        dated after the period, so an unlocked month would lose later postings.
+        Raises ValueError when a later period is already closed.
+        """
+        cursor.execute("SELECT MAX(period) FROM ledger_period_balances")
+        last_closed = cursor.fetchone()[0]
+        if last_closed and last_closed > period:
+            raise ValueError(f"Period {last_closed} is already closed")
+        
+        cursor.execute("DELETE FROM ledger_period_balances WHERE period = ?", (period,))
+        balances = Ledger._balances(cursor, Ledger._period_end(period))
+        closed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        cursor.executemany("""
+            INSERT INTO ledger_period_balances (period, gl_account_id, debit, credit, closed_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, [(period, gl_id, debit, credit, closed_at) for gl_id, (debit, credit) in balances.items()])
+    
+    @staticmethod
+    def get_journal(start_date=None, end_date=None, limit=100):
+        """Journal entries with their lines, newest first"""
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        query = "SELECT * FROM journal_entries WHERE 1=1"
+        params = []
+        if start_date:
+            query += " AND entry_date >= ?"
+            params.append(str(start_date))
+        if end_date:
+            query += " AND entry_date <= ?"
+            params.append(str(end_date))
+        query += " ORDER BY entry_date DESC, id DESC LIMIT ?"
+        params.append(limit)
+        
+        cursor.execute(query, params)
+        entries = [dict(row) for row in cursor.fetchall()]
+        
+        if entries:
+            placeholders = ','.join(['?'] * len(entries))
+            cursor.execute(f"""
+                SELECT jl.entry_id, g.code, g.name, jl.debit, jl.credit
+                FROM journal_lines jl
+                JOIN gl_accounts g ON jl.gl_account_id = g.id
+                WHERE jl.entry_id IN ({placeholders})
+                ORDER BY jl.id
+            """, [entry['id'] for entry in entries])
+            lines = {}
+            for row in cursor.fetchall():
+                lines.setdefault(row['entry_id'], []).append(dict(row))
+            for entry in entries:
+                entry['lines'] = lines.get(entry['id'], [])
+        
+        conn.close()
+        return entries
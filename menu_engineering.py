@@ -0,0 +1,210 @@
+"""
+Menu Engineering
+Classifies every dish by revenue share (ABC), demand variability (XYZ) and
+contribution margin vs popularity (stars, plowhorses, puzzles, dogs)
+"""
+
+import math
+import database
+import ledger
+import report_cache
+from datetime import datetime
+
+class MenuEngineering:
+    """Batch menu engineering classification, stored per month"""
+    
+    # Cumulative revenue share closing the A and B classes
+    ABC_THRESHOLDS = (0.80, 0.95)
+    # Coefficient of variation of daily quantity closing the X and Y classes
+    XYZ_THRESHOLDS = (0.5, 1.0)
+    # A dish is popular when its menu mix reaches this share of an even split
+    POPULARITY_FACTOR = 0.7
+    MENU_CLASSES = ('star', 'plowhorse', 'puzzle', 'dog')
+    
+    @staticmethod
+    def _compute(cursor, period):
+        """
+        Classify every dish for a month from the sales cube in one pass
+        Returns:
+            (run, items): run totals dict and one dict per dish
+        """
+        start_date = datetime.strptime(period, '%Y-%m').strftime('%Y-%m-%d')
+        end_date = min(ledger.Ledger._period_end(period), database.get_business_date_string())
+        
+        cursor.execute("""
+            SELECT menu_item_id, business_date, SUM(quantity) as quantity, SUM(revenue) as revenue
+            FROM sales_cube
+            WHERE business_date BETWEEN ? AND ?
+            GROUP BY menu_item_id, business_date
+        """, (start_date, end_date))
+        daily = cursor.fetchall()
+        cursor.execute("""
+            SELECT COUNT(*) FROM daily_sales_summary
+            WHERE business_date BETWEEN ? AND ? AND order_count > 0
+        """, (start_date, end_date))
+        trading_days = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT m.id, m.is_available, COALESCE(m.price_full, m.price_single) as price,
+                   COALESCE(c.recipe_cost, 0) as recipe_cost
+            FROM menu_items m
+            LEFT JOIN menu_item_cost c ON c.menu_item_id = m.id
+        """)
+        menu = {row['id']: row for row in cursor.fetchall()}
+        
+        # Dishes on the menu plus any dish sold during the month
+        items = {
+            item_id: {'menu_item_id': item_id, 'quantity': 0, 'revenue': 0.0, 'sum_sq': 0.0}
+            for item_id, row in menu.items() if row['is_available']
+        }
+        for row in daily:
+            if row['menu_item_id'] not in menu:
+                continue
+            item = items.setdefault(row['menu_item_id'], {
+                'menu_item_id': row['menu_item_id'], 'quantity': 0, 'revenue': 0.0, 'sum_sq': 0.0
+            })
+            item['quantity'] += row['quantity']
+            item['revenue'] += row['revenue']
+            item['sum_sq'] += row['quantity'] ** 2
+        
+        total_quantity = sum(item['quantity'] for item in items.values())
+        total_revenue = sum(item['revenue'] for item in items.values())
+        
+        for item in items.values():
+            details = menu[item['menu_item_id']]
+            item['unit_cost'] = details['recipe_cost']
+            item['total_margin'] = item['revenue'] - item['unit_cost'] * item['quantity']
+            item['contribution_margin'] = (item['total_margin'] / item['quantity'] if item['quantity']
+                                           else (details['price'] or 0) - item['unit_cost'])
+            item['menu_mix'] = item['quantity'] / total_quantity if total_quantity else 0
+            item['revenue_share'] = item['revenue'] / total_revenue if total_revenue else 0
+            
+            # Days without a sale count as zero demand
+            if item['quantity'] and trading_days:
+                mean = item['quantity'] / trading_days
+                variance = max(item['sum_sq'] / trading_days - mean ** 2, 0)
+                item['demand_cv'] = math.sqrt(variance) / mean
+            else:
+                item['demand_cv'] = None
+            x_limit, y_limit = MenuEngineering.XYZ_THRESHOLDS
+            cv = item['demand_cv']
+            item['xyz_class'] = 'Z' if cv is None or cv > y_limit else ('X' if cv <= x_limit else 'Y')
+        
+        # ABC: a dish takes the class its cumulative share starts in
+        a_limit, b_limit = MenuEngineering.ABC_THRESHOLDS
+        cumulative = 0
+        for item in sorted(items.values(), key=lambda item: (-item['revenue'], item['menu_item_id'])):
+            if not item['revenue']:
+                item['abc_class'] = 'C'
+            else:
+                item['abc_class'] = 'A' if cumulative < a_limit else ('B' if cumulative < b_limit else 'C')
+            cumulative += item['revenue_share']
+        
+        # Margin vs popularity against the menu's averages
+        average_margin = (sum(item['total_margin'] for item in items.values()) / total_quantity
+                          if total_quantity else 0)
+        popular_mix = MenuEngineering.POPULARITY_FACTOR / len(items) if items else 0
+        for item in items.values():
+            popular = total_quantity > 0 and item['menu_mix'] >= popular_mix
+            profitable = item['contribution_margin'] >= average_margin
+            item['menu_class'] = ('star' if profitable else 'plowhorse') if popular else \
+                                 ('puzzle' if profitable else 'dog')
+        
+        run = {
+            'period': period,
+            'start_date': start_date,
+            'end_date': end_date,
+            'trading_days': trading_days,
+            'item_count': len(items),
+            'total_revenue': round(total_revenue, 2),
+            'average_margin': round(average_margin, 2)
+        }
+        return run, list(items.values())
+    
+    @staticmethod
+    def refresh(period=None):
+        """
+        Compute and store the classification of a month
+        Args:
+            period: 'YYYY-MM' (default: the current business month)
+        """
+        period = period or database.get_business_date_string()[:7]
+        try:
+            datetime.strptime(period, '%Y-%m')
+        except (TypeError, ValueError):
+            return False, "Period must be in YYYY-MM format"
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            run, items = MenuEngineering._compute(cursor, period)
+            cursor.execute("DELETE FROM menu_engineering_results WHERE period = ?", (period,))
+            cursor.executemany("""
+                INSERT INTO menu_engineering_results
+                (period, menu_item_id, quantity, revenue, revenue_share, abc_class, demand_cv, xyz_class,
+                 unit_cost, contribution_margin, total_margin, menu_mix, menu_class)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (period, item['menu_item_id'], item['quantity'], round(item['revenue'], 2),
+                 round(item['revenue_share'], 4), item['abc_class'],
+                 None if item['demand_cv'] is None else round(item['demand_cv'], 3), item['xyz_class'],
+                 round(item['unit_cost'], 2), round(item['contribution_margin'], 2),
+                 round(item['total_margin'], 2), round(item['menu_mix'], 4), item['menu_class'])
+                for item in items
+            ])
+            cursor.execute("""
+                INSERT OR REPLACE INTO menu_engineering_runs
+                (period, start_date, end_date, trading_days, item_count, total_revenue, average_margin, generated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (period, run['start_date'], run['end_date'], run['trading_days'], run['item_count'],
+                  run['total_revenue'], run['average_margin']))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            conn.close()
+            return False, f"Error: {str(e)}"
+        
+        report_cache.ReportCache.invalidate('menu_engineering_results')
+        return True, f"Menu engineering for {period}: {run['item_count']} dishes classified"
+    
+    @staticmethod
+    @report_cache.ReportCache.cached(('menu_engineering_results', 'menu_items'))
+    def get_report(period=None):
+        """
+        Stored classification of a month
+        Args:
+            period: 'YYYY-MM' (default: the current business month)
+        Returns:
+            Dict with the run totals (None when the month has not been
+            computed), counts per ABC, XYZ and menu class, and items: dicts with
+            name, category and every stored measure, highest revenue first
+        """
+        period = period or database.get_business_date_string()[:7]
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT * FROM menu_engineering_runs WHERE period = ?", (period,))
+        run = cursor.fetchone()
+        cursor.execute("""
+            SELECT r.*, m.name, m.category
+            FROM menu_engineering_results r
+            JOIN menu_items m ON m.id = r.menu_item_id
+            WHERE r.period = ?
+            ORDER BY r.revenue DESC, m.name
+        """, (period,))
+        items = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+        
+        counts = {}
+        for key in ('abc_class', 'xyz_class', 'menu_class'):
+            counts[key] = {}
+            for item in items:
+                counts[key][item[key]] = counts[key].get(item[key], 0) + 1
+        
+        return {
+            'period': period,
+            'run': dict(run) if run else None,
+            'counts': counts,
+            'items': items
+        }
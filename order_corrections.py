@@ -0,0 +1,312 @@
+"""
+Order Corrections
+Voids, refunds and amendments of completed bills, recorded against the
+original bill instead of rewriting or deleting it
+"""
+
+import database
+import ledger
+import report_cache
+import sales_summary
+from inventory_manager import InventoryManager
+
+class OrderCorrections:
+    """Correction records that reference the original order"""
+    
+    CORRECTION_TYPES = ('void', 'refund', 'amendment')
+    AMOUNT_FIELDS = ('subtotal', 'gst_amount', 'service_charge', 'discount')
+    
+    # Amounts below this are treated as zero
+    TOLERANCE = 0.005
+    
+    @staticmethod
+    def _net_order(cursor, order_id):
+        """
+        A completed order with its corrections applied
+        Returns:
+            Dict with order_id, business_date, subtotal, gst_amount, service_charge,
+            discount, final_amount, voided and tenders (payment method -> amount),
+            or None if there is no completed order with this id
+        
+        Reads one order row and its corrections through idx_order_corrections_order.
+        """
+        cursor.execute("""
+            SELECT id, business_date, total_amount, gst_amount, service_charge, discount, final_amount,
+                   payment_method
+            FROM orders
+            WHERE id = ? AND status = 'completed'
+        """, (order_id,))
+        order = cursor.fetchone()
+        if not order:
+            return None
+        
+        net = {
+            'order_id': order[0],
+            'business_date': order[1],
+            'subtotal': order[2] or 0,
+            'gst_amount': order[3] or 0,
+            'service_charge': order[4] or 0,
+            'discount': order[5] or 0,
+            'final_amount': order[6] or 0
+        }
+        
+        cursor.execute("""
+            SELECT COALESCE(SUM(subtotal), 0), COALESCE(SUM(gst_amount), 0), COALESCE(SUM(service_charge), 0),
+                   COALESCE(SUM(discount), 0), COALESCE(SUM(final_amount), 0),
+                   COALESCE(MAX(correction_type = 'void'), 0)
+            FROM order_corrections
+            WHERE order_id = ?
+        """, (order_id,))
+        deltas = cursor.fetchone()
+        for key, delta in zip(OrderCorrections.AMOUNT_FIELDS + ('final_amount',), deltas):
+            net[key] += delta
+        net['voided'] = bool(deltas[5])
+        
+        cursor.execute("""
+            SELECT payment_method, SUM(amount) FROM order_payments
+            WHERE order_id = ?
+            GROUP BY payment_method
+        """, (order_id,))
+        tenders = {method: amount or 0 for method, amount in cursor.fetchall()}
+        if not tenders:
+            method = sales_summary.SalesSummary.normalize_payment_method(order[7])
+            tenders = {method: order[6] or 0}
+        
+        cursor.execute("""
+            SELECT cp.payment_method, SUM(cp.amount)
+            FROM order_corrections c
+            JOIN order_correction_payments cp ON cp.correction_id = c.id
+            WHERE c.order_id = ?
+            GROUP BY cp.payment_method
+        """, (order_id,))
+        for method, amount in cursor.fetchall():
+            tenders[method] = tenders.get(method, 0) + (amount or 0)
+        net['tenders'] = tenders
+        
+        return net
+    
+    @staticmethod
+    def _record(cursor, order_id, correction_type, deltas, tenders, reason=''):
+        """
+        Write one correction with its summary, ledger and cash book effects (caller commits)
+        Args:
+            deltas: Dict of signed changes to subtotal, gst_amount, service_charge, discount
+            tenders: Dict of payment method -> signed money taken (negative when returned)
+        Returns:
+            Correction id
+        
+        A fixed number of rows is written however old the bill is; reports
+        pick the correction up on its own business date.
+        """
+        business_date = database.get_business_date_string()
+        amounts = [round(deltas.get(key, 0), 2) for key in OrderCorrections.AMOUNT_FIELDS]
+        final_amount = round(amounts[0] + amounts[1] + amounts[2] - amounts[3], 2)
+        
+        cursor.execute("""
+            INSERT INTO order_corrections
+            (order_id, correction_type, business_date, subtotal, gst_amount, service_charge, discount,
+             final_amount, reason)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (order_id, correction_type, business_date, *amounts, final_amount, reason or ''))
+        correction_id = cursor.lastrowid
+        
+        tenders = [(method, round(amount, 2)) for method, amount in tenders.items()
+                   if abs(amount) > OrderCorrections.TOLERANCE]
+        cursor.executemany("""
+            INSERT INTO order_correction_payments (correction_id, payment_method, amount)
+            VALUES (?, ?, ?)
+        """, [(correction_id, method, amount) for method, amount in tenders])
+        
+        sales_summary.SalesSummary._apply_correction(cursor, correction_id)
+        ledger.Ledger._post_correction(cursor, correction_id)
+        
+        # Cash book: money taken is a credit, money returned a debit
+        cursor.execute("SELECT payment_method, account_id FROM payment_method_accounts")
+        accounts = {row[0]: row[1] for row in cursor.fetchall()}
+        cursor.executemany("""
+            INSERT INTO transactions (date, account_id, type, amount, description, order_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (business_date, accounts.get(method, 1), 'credit' if amount > 0 else 'debit', abs(amount),
+             f'Order #{order_id} {correction_type} ({method})', order_id)
+            for method, amount in tenders
+        ])
+        
+        return correction_id
+    
+    @staticmethod
+    def _void(cursor, net, reason=''):
+        """Void a bill given its net state: reverse what is left of it and return its stock (caller commits)"""
+        correction_id = OrderCorrections._record(
+            cursor, net['order_id'], 'void',
+            {key: -net[key] for key in OrderCorrections.AMOUNT_FIELDS},
+            {method: -amount for method, amount in net['tenders'].items()},
+            reason
+        )
+        InventoryManager._restore_order_stock(cursor, [net['order_id']], 'voided')
+        return correction_id
+    
+    @staticmethod
+    def _run(order_id, apply):
+        """Open a connection, load the bill's net state and run apply(cursor, net) in one transaction"""
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            net = OrderCorrections._net_order(cursor, order_id)
+            if not net:
+                conn.close()
+                return False, f"Bill #{order_id} is not a completed bill"
+            if net['voided']:
+                conn.close()
+                return False, f"Bill #{order_id} is already voided"
+            
+            success, message = apply(cursor, net)
+            if not success:
+                conn.rollback()
+                conn.close()
+                return False, message
+            
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            conn.rollback()
+            conn.close()
+            return False, f"Error: {str(e)}"
+        
+        report_cache.ReportCache.invalidate('orders', 'ingredients')
+        return True, message
+    
+    @staticmethod
+    def void_order(order_id, reason=''):
+        """
+        Void a completed bill
+        
+        The bill stays on record; the void takes its remaining amounts out of
+        today's figures, reverses its ledger postings and returns its stock.
+        """
+        def apply(cursor, net):
+            OrderCorrections._void(cursor, net, reason)
+            return True, f"Bill #{order_id} voided"
+        
+        return OrderCorrections._run(order_id, apply)
+    
+    @staticmethod
+    def refund_order(order_id, amount, payment_method=None, reason=''):
+        """
+        Refund part or all of a completed bill
+        Args:
+            amount: Money returned to the customer
+            payment_method: Tender the money goes back through (default: the
+                            bill's largest tender)
+        
+        Subtotal, GST and service charge are reduced in proportion to the bill.
+        """
+        try:
+            amount = round(float(amount), 2)
+        except (TypeError, ValueError):
+            return False, "Refund amount must be a number"
+        if amount <= 0:
+            return False, "Refund amount must be positive"
+        
+        def apply(cursor, net):
+            if amount > net['final_amount'] + OrderCorrections.TOLERANCE:
+                return False, f"Refund exceeds the bill's remaining ₹{net['final_amount']:.2f}"
+            
+            ratio = amount / net['final_amount']
+            gst_amount = -round(net['gst_amount'] * ratio, 2)
+            service_charge = -round(net['service_charge'] * ratio, 2)
+            discount = -round(net['discount'] * ratio, 2)
+            deltas = {
+                'subtotal': -amount - gst_amount - service_charge + discount,
+                'gst_amount': gst_amount,
+                'service_charge': service_charge,
+                'discount': discount
+            }
+            method = (sales_summary.SalesSummary.normalize_payment_method(payment_method) if payment_method
+                      else max(net['tenders'], key=net['tenders'].get))
+            OrderCorrections._record(cursor, order_id, 'refund', deltas, {method: -amount}, reason)
+            return True, f"Refunded ₹{amount:.2f} on bill #{order_id}"
+        
+        return OrderCorrections._run(order_id, apply)
+    
+    @staticmethod
+    def amend_order(order_id, subtotal=None, gst_amount=None, service_charge=None, discount=None,
+                    payment_method=None, reason=''):
+        """
+        Change the amounts of a completed bill
+        Args:
+            subtotal, gst_amount, service_charge, discount: New values (None keeps the current one)
+            payment_method: Tender that settles the difference (default: the bill's largest tender)
+        """
+        values = {'subtotal': subtotal, 'gst_amount': gst_amount, 'service_charge': service_charge,
+                  'discount': discount}
+        try:
+            values = {key: None if value is None else round(float(value), 2) for key, value in values.items()}
+        except (TypeError, ValueError):
+            return False, "Amounts must be numbers"
+        if any(value is not None and value < 0 for value in values.values()):
+            return False, "Amounts cannot be negative"
+        
+        def apply(cursor, net):
+            deltas = {key: (net[key] if value is None else value) - net[key] for key, value in values.items()}
+            difference = deltas['subtotal'] + deltas['gst_amount'] + deltas['service_charge'] - deltas['discount']
+            if all(abs(delta) <= OrderCorrections.TOLERANCE for delta in deltas.values()):
+                return False, "Nothing to amend"
+            if net['final_amount'] + difference < -OrderCorrections.TOLERANCE:
+                return False, "The amended bill total cannot be negative"
+            
+            method = (sales_summary.SalesSummary.normalize_payment_method(payment_method) if payment_method
+                      else max(net['tenders'], key=net['tenders'].get))
+            OrderCorrections._record(cursor, order_id, 'amendment', deltas, {method: difference}, reason)
+            return True, f"Bill #{order_id} amended ({'+' if difference >= 0 else '-'}₹{abs(difference):.2f})"
+        
+        return OrderCorrections._run(order_id, apply)
+    
+    @staticmethod
+    def _remove_for_orders(cursor, order_ids):
+        """
+        Take the corrections of bills being deleted back out of the summaries,
+        reverse their postings and delete them (caller commits)
+        """
+        placeholders = ','.join(['?'] * len(order_ids))
+        cursor.execute(f"SELECT id FROM order_corrections WHERE order_id IN ({placeholders})", tuple(order_ids))
+        correction_ids = [row[0] for row in cursor.fetchall()]
+        if not correction_ids:
+            return 0
+        
+        for correction_id in correction_ids:
+            sales_summary.SalesSummary._apply_correction(cursor, correction_id, sign=-1)
+        ledger.Ledger._reverse_sources(cursor, 'order_correction', correction_ids, "Deleted correction")
+        
+        placeholders = ','.join(['?'] * len(correction_ids))
+        cursor.execute(f"DELETE FROM order_correction_payments WHERE correction_id IN ({placeholders})",
+                       correction_ids)
+        cursor.execute(f"DELETE FROM order_corrections WHERE id IN ({placeholders})", correction_ids)
+        return len(correction_ids)
+    
+    @staticmethod
+    def get_order_corrections(order_id):
+        """Corrections of a bill, oldest first, each with its tenders"""
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT * FROM order_corrections WHERE order_id = ? ORDER BY id", (order_id,))
+        corrections = [dict(row) for row in cursor.fetchall()]
+        for correction in corrections:
+            cursor.execute("""
+                SELECT payment_method, amount FROM order_correction_payments WHERE correction_id = ?
+            """, (correction['id'],))
+            correction['payments'] = {row[0]: row[1] for row in cursor.fetchall()}
+        
+        conn.close()
+        return corrections
+    
+    @staticmethod
+    def get_net_order(order_id):
+        """A completed bill's amounts and tenders after its corrections (None if not found)"""
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        net = OrderCorrections._net_order(cursor, order_id)
+        conn.close()
+        return net
@@ -0,0 +1,234 @@
+"""
+Prep Forecast
+Forecasts each dish's sales per hour for the next business day from
+weekday x hour seasonal baselines, for kitchen prep planning
+"""
+
+import math
+import database
+import report_cache
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class PrepForecast:
+    """Per-dish, per-hour demand forecast and prep sheet"""
+    
+    # Days of sales history the baselines are fitted on
+    HISTORY_DAYS = 56
+    # Weight of a day relative to the same weekday one week later
+    WEEKLY_DECAY = 0.8
+    # Trading days of a weekday needed before its own pattern is used;
+    # otherwise the all-days hourly pattern stands in
+    MIN_WEEKDAY_SAMPLES = 2
+    # Prep buffer in standard deviations of a Poisson day's demand
+    PREP_BUFFER_Z = 1.0
+    # Expected quantities below this are not stored
+    MIN_EXPECTED = 0.01
+    
+    @staticmethod
+    def is_available():
+        """Forecasting needs NumPy; the prep sheet is empty without it"""
+        return np is not None
+    
+    @staticmethod
+    def load_history(end_date, days=None):
+        """
+        Quantity sold per dish, day and hour from the sales cube
+        Args:
+            end_date: First business date NOT included, 'YYYY-MM-DD'
+            days: Number of days of history (default HISTORY_DAYS)
+        Returns:
+            (item_ids, day_list, quantities, trading) where quantities[i, d, h]
+            is the quantity of item_ids[i] sold in hour h of day_list[d] and
+            trading[d] is True for days with at least one bill
+        """
+        days = days or PrepForecast.HISTORY_DAYS
+        end = datetime.strptime(str(end_date), '%Y-%m-%d')
+        day_list = [(end - timedelta(days=days - offset)).strftime('%Y-%m-%d') for offset in range(days)]
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        
+        cursor.execute("""
+            SELECT menu_item_id, business_date, hour, SUM(quantity)
+            FROM sales_cube
+            WHERE business_date >= ? AND business_date < ?
+            GROUP BY menu_item_id, business_date, hour
+        """, (day_list[0], str(end_date)))
+        rows = cursor.fetchall()
+        cursor.execute("""
+            SELECT business_date FROM daily_sales_summary
+            WHERE business_date >= ? AND business_date < ? AND order_count > 0
+        """, (day_list[0], str(end_date)))
+        trading_days = {row[0] for row in cursor.fetchall()}
+        conn.close()
+        
+        item_ids = sorted({row[0] for row in rows})
+        item_index = {item_id: i for i, item_id in enumerate(item_ids)}
+        day_index = {day: d for d, day in enumerate(day_list)}
+        
+        quantities = np.zeros((len(item_ids), days, 24))
+        if rows:
+            np.add.at(
+                quantities,
+                ([item_index[row[0]] for row in rows], [day_index[row[1]] for row in rows],
+                 [row[2] for row in rows]),
+                [row[3] for row in rows]
+            )
+        trading = np.array([day in trading_days for day in day_list], dtype=bool)
+        
+        return item_ids, day_list, quantities, trading
+    
+    @staticmethod
+    def fit_baselines(quantities, day_list, trading, decay=None):
+        """
+        Weekday x hour baseline for every dish in one vectorised pass
+        Args:
+            quantities: Dish x day x hour array from load_history
+            day_list: Dates of the day axis
+            trading: Trading-day mask of the day axis
+            decay: Weight of a day relative to a week later (default WEEKLY_DECAY)
+        Returns:
+            (baselines, samples): baselines[w, i, h] is the expected quantity of
+            dish i in hour h on weekday w (Monday = 0); samples[w] the trading
+            days of weekday w behind it
+        """
+        decay = PrepForecast.WEEKLY_DECAY if decay is None else decay
+        n_days = len(day_list)
+        
+        weekdays = np.array([datetime.strptime(day, '%Y-%m-%d').weekday() for day in day_list])
+        weeks_ago = (n_days - 1 - np.arange(n_days)) // 7
+        weights = decay ** weeks_ago * trading
+        weekday_weights = (weekdays[None, :] == np.arange(7)[:, None]) * weights
+        
+        weight_sums = weekday_weights.sum(axis=1)
+        baselines = np.einsum('wd,idh->wih', weekday_weights, quantities)
+        baselines /= np.where(weight_sums > 0, weight_sums, 1)[:, None, None]
+        samples = ((weekdays[None, :] == np.arange(7)[:, None]) & trading).sum(axis=1)
+        
+        # Weekdays with too little history take the all-days pattern
+        thin = samples < PrepForecast.MIN_WEEKDAY_SAMPLES
+        if thin.any() and weights.sum() > 0:
+            baselines[thin] = np.einsum('d,idh->ih', weights, quantities) / weights.sum()
+        
+        return baselines, samples
+    
+    @staticmethod
+    def forecast(forecast_date):
+        """
+        Expected sales per dish and hour on a business date
+        Returns:
+            (item_ids, hourly, history_start, history_end, samples) where
+            hourly[i, h] is the expected quantity of item_ids[i] in hour h
+        """
+        target = datetime.strptime(str(forecast_date), '%Y-%m-%d')
+        # Only complete business days count as history
+        history_end = min(target.strftime('%Y-%m-%d'), database.get_business_date_string())
+        item_ids, day_list, quantities, trading = PrepForecast.load_history(history_end)
+        baselines, samples = PrepForecast.fit_baselines(quantities, day_list, trading)
+        weekday = target.weekday()
+        return item_ids, baselines[weekday], day_list[0], day_list[-1], int(samples[weekday])
+    
+    @staticmethod
+    def refresh(forecast_date=None):
+        """
+        Forecast a business date (default: tomorrow's) and store it for the prep sheet
+        """
+        if np is None:
+            return False, "Prep forecast requires NumPy"
+        
+        if not forecast_date:
+            forecast_date = (database.get_business_date() + timedelta(days=1)).strftime('%Y-%m-%d')
+        forecast_date = str(forecast_date)
+        
+        try:
+            item_ids, hourly, history_start, history_end, samples = PrepForecast.forecast(forecast_date)
+        except ValueError:
+            return False, "Forecast date must be YYYY-MM-DD"
+        
+        rows = [
+            (forecast_date, item_ids[i], int(hour), round(float(hourly[i, hour]), 3))
+            for i, hour in zip(*np.nonzero(hourly >= PrepForecast.MIN_EXPECTED))
+        ]
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("DELETE FROM dish_forecast WHERE forecast_date = ?", (forecast_date,))
+            cursor.executemany("""
+                INSERT INTO dish_forecast (forecast_date, menu_item_id, hour, expected_quantity)
+                VALUES (?, ?, ?, ?)
+            """, rows)
+            cursor.execute("""
+                INSERT OR REPLACE INTO dish_forecast_runs
+                (forecast_date, history_start, history_end, weekday_samples, generated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (forecast_date, history_start, history_end, samples))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            conn.close()
+            return False, f"Error: {str(e)}"
+        
+        report_cache.ReportCache.invalidate('dish_forecast')
+        dish_count = len({row[1] for row in rows})
+        return True, f"Prep forecast for {forecast_date}: {dish_count} dishes"
+    
+    @staticmethod
+    @report_cache.ReportCache.cached(('dish_forecast', 'menu_items'))
+    def get_prep_sheet(forecast_date=None):
+        """
+        Stored forecast of a business date (default: tomorrow's) as a prep sheet
+        Returns:
+            Dict with forecast_date, generated_at (None when no forecast has
+            been stored) and dishes: list of dicts with menu_item_id, name,
+            category, expected_quantity, prep_quantity, peak_hour and hourly
+            ({hour: expected quantity}), busiest dish first
+        """
+        if not forecast_date:
+            forecast_date = (database.get_business_date() + timedelta(days=1)).strftime('%Y-%m-%d')
+        forecast_date = str(forecast_date)
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT generated_at FROM dish_forecast_runs WHERE forecast_date = ?", (forecast_date,))
+        run = cursor.fetchone()
+        cursor.execute("""
+            SELECT f.menu_item_id, m.name, m.category, f.hour, f.expected_quantity
+            FROM dish_forecast f
+            JOIN menu_items m ON m.id = f.menu_item_id
+            WHERE f.forecast_date = ?
+            ORDER BY f.menu_item_id, f.hour
+        """, (forecast_date,))
+        rows = cursor.fetchall()
+        conn.close()
+        
+        dishes = {}
+        for row in rows:
+            dish = dishes.setdefault(row['menu_item_id'], {
+                'menu_item_id': row['menu_item_id'],
+                'name': row['name'],
+                'category': row['category'],
+                'hourly': {}
+            })
+            dish['hourly'][row['hour']] = row['expected_quantity']
+        
+        for dish in dishes.values():
+            expected = sum(dish['hourly'].values())
+            dish['expected_quantity'] = round(expected, 1)
+            # Poisson demand: variance equals the mean
+            dish['prep_quantity'] = math.ceil(expected + PrepForecast.PREP_BUFFER_Z * math.sqrt(expected))
+            dish['peak_hour'] = max(dish['hourly'], key=dish['hourly'].get)
+        
+        return {
+            'forecast_date': forecast_date,
+            'generated_at': run['generated_at'] if run else None,
+            'dishes': sorted(dishes.values(), key=lambda dish: (-dish['expected_quantity'], dish['name']))
+        }
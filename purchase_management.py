@@ -4,6 +4,8 @@ Handles purchase orders, supplier payments, and accounts payable
 """
 
 import database
+import ledger
+import report_cache
 from datetime import datetime, timedelta
 
 class PurchaseManagement:
@@ -91,6 +93,8 @@ class PurchaseManagement:
         cursor = conn.cursor()
         
         try:
+            import inventory_manager
+            
             for item in received_items:
                 ingredient_id = item['ingredient_id']
                 quantity_received = item['quantity_received']
@@ -102,17 +106,22 @@ class PurchaseManagement:
                     WHERE po_id = ? AND ingredient_id = ?
                 """, (quantity_received, po_id, ingredient_id))
                 
-                # Add stock to inventory
-                import inventory_manager
-                success, message = inventory_manager.InventoryManager.add_stock(
+                # Price paid on this PO becomes the cost of the new lot
+                cursor.execute("""
+                    SELECT unit_price FROM purchase_order_items
+                    WHERE po_id = ? AND ingredient_id = ?
+                """, (po_id, ingredient_id))
+                price_row = cursor.fetchone()
+                
+                # Add stock to inventory on this connection so the receipt commits atomically
+                inventory_manager.InventoryManager._add_stock(
+                    cursor,
                     ingredient_id,
                     quantity_received,
-                    reason=f'PO #{po_id}'
+                    reason=f'PO #{po_id}',
+                    unit_price=price_row[0] if price_row else None,
+                    po_id=po_id
                 )
-                
-                if not success:
-                    conn.close()
-                    return False, f"Stock update failed: {message}"
             
             # Check if all items received
             cursor.execute("""
@@ -128,6 +137,7 @@ class PurchaseManagement:
                 """, (po_id,))
             
             conn.commit()
+            report_cache.ReportCache.invalidate('ingredients')
             conn.close()
             return True, "Items received successfully"
         except Exception as e:
@@ -289,7 +299,13 @@ class PurchaseManagement:
                 payment_method
             ))
             
+            ledger.Ledger._post_expense(
+                cursor, cursor.lastrowid, datetime.now().strftime('%Y-%m-%d'), amount_paid, payment_method,
+                f'Payment to supplier #{supplier_id}'
+            )
+            
             conn.commit()
+            report_cache.ReportCache.invalidate('expenses')
             conn.close()
             return True, "Payment recorded successfully"
         except Exception as e:
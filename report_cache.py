@@ -0,0 +1,111 @@
+"""
+Report Cache
+In-process cache of analytics and report results, expired by TTL and
+invalidated by table-level write events
+"""
+
+import time
+import threading
+import functools
+from collections import OrderedDict
+import database
+
+class ReportCache:
+    """LRU result cache keyed by function, arguments and database file"""
+    
+    MAX_ENTRIES = 256
+    DEFAULT_TTL = 300  # seconds
+    
+    _entries = OrderedDict()  # key -> (expires_at, tables, value)
+    _lock = threading.Lock()
+    _stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+    
+    @staticmethod
+    def cached(tables, ttl=None):
+        """
+        Decorator caching a report function's result
+        Args:
+            tables: Tables the result is computed from; a write event on any of
+                    them drops the entry
+            ttl: Seconds an entry stays valid (default: DEFAULT_TTL); also bounds
+                 staleness from writes made by other processes
+        
+        Cached results are shared between callers and must be treated as
+        read-only.
+        """
+        tables = frozenset(tables)
+        
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                key = (database.get_database_path(), function.__qualname__, args, tuple(sorted(kwargs.items())))
+                found, value = ReportCache._get(key)
+                if found:
+                    return value
+                
+                value = function(*args, **kwargs)
+                ReportCache._put(key, tables, value, ttl if ttl is not None else ReportCache.DEFAULT_TTL)
+                return value
+            return wrapper
+        return decorator
+    
+    @staticmethod
+    def _get(key):
+        """Look up a live entry, counting the hit or miss"""
+        with ReportCache._lock:
+            entry = ReportCache._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                ReportCache._entries.move_to_end(key)
+                ReportCache._stats['hits'] += 1
+                return True, entry[2]
+            
+            if entry:
+                del ReportCache._entries[key]
+            ReportCache._stats['misses'] += 1
+            return False, None
+    
+    @staticmethod
+    def _put(key, tables, value, ttl):
+        """Store an entry, evicting the least recently used beyond MAX_ENTRIES"""
+        with ReportCache._lock:
+            ReportCache._entries[key] = (time.monotonic() + ttl, tables, value)
+            ReportCache._entries.move_to_end(key)
+            while len(ReportCache._entries) > ReportCache.MAX_ENTRIES:
+                ReportCache._entries.popitem(last=False)
+                ReportCache._stats['evictions'] += 1
+    
+    @staticmethod
+    def invalidate(*tables):
+        """
+        Write event: drop every entry computed from any of the given tables
+        
+        Call after the write has been committed.
+        """
+        tables = set(tables)
+        with ReportCache._lock:
+            stale = [key for key, entry in ReportCache._entries.items() if entry[1] & tables]
+            for key in stale:
+                del ReportCache._entries[key]
+            ReportCache._stats['invalidations'] += len(stale)
+    
+    @staticmethod
+    def clear():
+        """Drop every entry and reset the counters"""
+        with ReportCache._lock:
+            ReportCache._entries.clear()
+            for name in ReportCache._stats:
+                ReportCache._stats[name] = 0
+    
+    @staticmethod
+    def get_stats():
+        """
+        Cache counters
+        Returns:
+            Dict with hits, misses, evictions, invalidations, entries and hit_rate (%)
+        """
+        with ReportCache._lock:
+            stats = dict(ReportCache._stats)
+            stats['entries'] = len(ReportCache._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] * 100.0 / lookups, 1) if lookups else 0
+        return stats
@@ -0,0 +1,444 @@
+"""
+Daily Sales Summary
+Per business day sales totals maintained incrementally on checkout and void
+"""
+
+import database
+from datetime import timedelta
+
+class SalesSummary:
+    """Daily sales summary tables (sales, payment methods, categories)"""
+    
+    PAYMENT_METHODS = ['cash', 'card', 'upi']
+    
+    @staticmethod
+    def normalize_payment_method(payment_method):
+        """Store payment modes as lowercase keys ('Cash' -> 'cash')"""
+        return (payment_method or 'unknown').strip().lower()
+    
+    @staticmethod
+    def _apply_order(cursor, order_id, sign=1):
+        """
+        Add a completed order to the daily summaries (caller commits)
+        Args:
+            order_id: Order to apply
+            sign: 1 on checkout, -1 when the order is voided or deleted
+        
+        Must run on the same cursor as the checkout/void so the summaries
+        never drift from the orders table.
+        """
+        cursor.execute("""
+            SELECT business_date, total_amount, gst_amount, service_charge, discount,
+                   final_amount, payment_method
+            FROM orders
+            WHERE id = ? AND status = 'completed'
+        """, (order_id,))
+        order = cursor.fetchone()
+        
+        if not order:
+            return
+        
+        business_date = order[0]
+        cursor.execute("""
+            INSERT INTO daily_sales_summary
+            (business_date, order_count, subtotal, gst_amount, service_charge, discount, final_amount)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (business_date) DO UPDATE SET
+                order_count = order_count + excluded.order_count,
+                subtotal = subtotal + excluded.subtotal,
+                gst_amount = gst_amount + excluded.gst_amount,
+                service_charge = service_charge + excluded.service_charge,
+                discount = discount + excluded.discount,
+                final_amount = final_amount + excluded.final_amount
+        """, (
+            business_date,
+            sign,
+            sign * (order[1] or 0),
+            sign * (order[2] or 0),
+            sign * (order[3] or 0),
+            sign * (order[4] or 0),
+            sign * (order[5] or 0)
+        ))
+        
+        # Split payments count towards every tender used
+        cursor.execute("""
+            SELECT payment_method, SUM(amount) FROM order_payments
+            WHERE order_id = ?
+            GROUP BY payment_method
+        """, (order_id,))
+        tenders = cursor.fetchall() or [(order[6] or 'unknown', order[5] or 0)]
+        cursor.executemany("""
+            INSERT INTO daily_payment_summary (business_date, payment_method, order_count, amount)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (business_date, payment_method) DO UPDATE SET
+                order_count = order_count + excluded.order_count,
+                amount = amount + excluded.amount
+        """, [(business_date, method, sign, sign * (amount or 0)) for method, amount in tenders])
+        
+        cursor.execute("""
+            SELECT mi.category, SUM(oi.quantity), SUM(oi.total)
+            FROM order_items oi
+            JOIN menu_items mi ON oi.menu_item_id = mi.id
+            WHERE oi.order_id = ?
+            GROUP BY mi.category
+        """, (order_id,))
+        cursor.executemany("""
+            INSERT INTO daily_category_summary (business_date, category, order_count, item_count, revenue)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (business_date, category) DO UPDATE SET
+                order_count = order_count + excluded.order_count,
+                item_count = item_count + excluded.item_count,
+                revenue = revenue + excluded.revenue
+        """, [
+            (business_date, category, sign, sign * (quantity or 0), sign * (revenue or 0))
+            for category, quantity, revenue in cursor.fetchall()
+        ])
+        
+        SalesSummary._apply_order_to_cube(cursor, order_id, sign)
+        
+        if sign < 0:
+            # Drop days/methods/categories/cube cells that no longer have any orders
+            for table in ('daily_sales_summary', 'daily_payment_summary', 'daily_category_summary',
+                          'sales_cube', 'sales_cube_orders'):
+                cursor.execute(f"DELETE FROM {table} WHERE business_date = ? AND order_count <= 0",
+                               (business_date,))
+    
+    @staticmethod
+    def _apply_order_to_cube(cursor, order_id, sign=1):
+        """Add a completed order to the sales cube cells for its hour (caller commits)"""
+        cursor.execute("""
+            INSERT INTO sales_cube_orders
+            (business_date, hour, payment_method, order_count, subtotal, final_amount)
+            SELECT business_date, CAST(strftime('%H', order_date) AS INTEGER),
+                   COALESCE(payment_method, 'unknown'), ?, ? * total_amount, ? * final_amount
+            FROM orders
+            WHERE id = ?
+            ON CONFLICT (business_date, hour, payment_method) DO UPDATE SET
+                order_count = order_count + excluded.order_count,
+                subtotal = subtotal + excluded.subtotal,
+                final_amount = final_amount + excluded.final_amount
+        """, (sign, sign, sign, order_id))
+        
+        cursor.execute("""
+            INSERT INTO sales_cube
+            (business_date, hour, menu_item_id, category, payment_method, order_count, quantity, revenue)
+            SELECT o.business_date, CAST(strftime('%H', o.order_date) AS INTEGER), oi.menu_item_id,
+                   MIN(mi.category), COALESCE(o.payment_method, 'unknown'),
+                   ?, ? * SUM(oi.quantity), ? * SUM(oi.total)
+            FROM orders o
+            JOIN order_items oi ON o.id = oi.order_id
+            JOIN menu_items mi ON oi.menu_item_id = mi.id
+            WHERE o.id = ?
+            GROUP BY oi.menu_item_id
+            ON CONFLICT (business_date, hour, menu_item_id, payment_method) DO UPDATE SET
+                order_count = order_count + excluded.order_count,
+                quantity = quantity + excluded.quantity,
+                revenue = revenue + excluded.revenue
+        """, (sign, sign, sign, order_id))
+    
+    @staticmethod
+    def _apply_correction(cursor, correction_id, sign=1):
+        """
+        Add a void, refund or amendment to the daily correction summaries (caller commits)
+        Args:
+            correction_id: Row of order_corrections to apply
+            sign: 1 when the correction is recorded, -1 when its bill is deleted
+        
+        Corrections land on their own business date, so the summaries of the
+        original bill's day are never touched. The sales cube is the exception:
+        it describes what was sold, so a correction restates the original cells.
+        """
+        cursor.execute("""
+            SELECT business_date, correction_type, subtotal, gst_amount, service_charge, discount, final_amount
+            FROM order_corrections
+            WHERE id = ?
+        """, (correction_id,))
+        correction = cursor.fetchone()
+        if not correction:
+            return
+        
+        business_date = correction[0]
+        cursor.execute("""
+            INSERT INTO daily_correction_summary
+            (business_date, correction_type, correction_count, subtotal, gst_amount, service_charge,
+             discount, final_amount)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (business_date, correction_type) DO UPDATE SET
+                correction_count = correction_count + excluded.correction_count,
+                subtotal = subtotal + excluded.subtotal,
+                gst_amount = gst_amount + excluded.gst_amount,
+                service_charge = service_charge + excluded.service_charge,
+                discount = discount + excluded.discount,
+                final_amount = final_amount + excluded.final_amount
+        """, (business_date, correction[1], sign, *(sign * (value or 0) for value in correction[2:])))
+        
+        cursor.execute("""
+            INSERT INTO daily_correction_payments (business_date, payment_method, amount)
+            SELECT ?, payment_method, ? * amount
+            FROM order_correction_payments
+            WHERE correction_id = ?
+            ON CONFLICT (business_date, payment_method) DO UPDATE SET
+                amount = amount + excluded.amount
+        """, (business_date, sign, correction_id))
+        
+        if sign < 0:
+            cursor.execute("""
+                DELETE FROM daily_correction_summary WHERE business_date = ? AND correction_count <= 0
+            """, (business_date,))
+        
+        SalesSummary._apply_correction_to_cube(cursor, correction_id, sign)
+    
+    @staticmethod
+    def _apply_correction_to_cube(cursor, correction_id, sign=1):
+        """
+        Restate the original bill's sales cube cells for a correction (caller commits)
+        
+        A void takes the bill's order count and quantities back out; every
+        correction scales the dishes' revenue by its share of the bill's
+        subtotal. When a bill is deleted its
+        corrections must be taken out before the bill itself.
+        """
+        cursor.execute("""
+            INSERT INTO sales_cube_orders
+            (business_date, hour, payment_method, order_count, subtotal, final_amount)
+            SELECT o.business_date, CAST(strftime('%H', o.order_date) AS INTEGER),
+                   COALESCE(o.payment_method, 'unknown'), ? * (c.correction_type = 'void'),
+                   ? * c.subtotal, ? * c.final_amount
+            FROM order_corrections c
+            JOIN orders o ON o.id = c.order_id
+            WHERE c.id = ?
+            ON CONFLICT (business_date, hour, payment_method) DO UPDATE SET
+                order_count = order_count + excluded.order_count,
+                subtotal = subtotal + excluded.subtotal,
+                final_amount = final_amount + excluded.final_amount
+        """, (-sign, sign, sign, correction_id))
+        
+        cursor.execute("""
+            INSERT INTO sales_cube
+            (business_date, hour, menu_item_id, category, payment_method, order_count, quantity, revenue)
+            SELECT o.business_date, CAST(strftime('%H', o.order_date) AS INTEGER), oi.menu_item_id,
+                   MIN(mi.category), COALESCE(o.payment_method, 'unknown'),
+                   ? * (c.correction_type = 'void'), ? * (c.correction_type = 'void') * SUM(oi.quantity),
+                   ? * COALESCE(c.subtotal / NULLIF(o.total_amount, 0), 0) * SUM(oi.total)
+            FROM order_corrections c
+            JOIN orders o ON o.id = c.order_id
+            JOIN order_items oi ON oi.order_id = o.id
+            JOIN menu_items mi ON oi.menu_item_id = mi.id
+            WHERE c.id = ?
+            GROUP BY oi.menu_item_id
+            ON CONFLICT (business_date, hour, menu_item_id, payment_method) DO UPDATE SET
+                order_count = order_count + excluded.order_count,
+                quantity = quantity + excluded.quantity,
+                revenue = revenue + excluded.revenue
+        """, (-sign, -sign, sign, correction_id))
+        
+        # Drop the cells of a voided bill that no longer have any orders
+        cursor.execute("""
+            SELECT o.business_date FROM order_corrections c
+            JOIN orders o ON o.id = c.order_id
+            WHERE c.id = ?
+        """, (correction_id,))
+        row = cursor.fetchone()
+        if row:
+            for table in ('sales_cube', 'sales_cube_orders'):
+                cursor.execute(f"DELETE FROM {table} WHERE business_date = ? AND order_count <= 0", (row[0],))
+    
+    @staticmethod
+    def _correction_totals(cursor, start_date, end_date, group_by_month=False):
+        """
+        Net effect of corrections dated in a range of business dates
+        Returns:
+            Dict with voided_count, subtotal, gst_amount, service_charge, discount
+            and final_amount (signed deltas), or month -> such dict
+        """
+        month = "substr(business_date, 1, 7)" if group_by_month else "''"
+        cursor.execute(f"""
+            SELECT {month} as month,
+                   COALESCE(SUM(CASE WHEN correction_type = 'void' THEN correction_count END), 0) as voided_count,
+                   COALESCE(SUM(subtotal), 0) as subtotal,
+                   COALESCE(SUM(gst_amount), 0) as gst_amount,
+                   COALESCE(SUM(service_charge), 0) as service_charge,
+                   COALESCE(SUM(discount), 0) as discount,
+                   COALESCE(SUM(final_amount), 0) as final_amount
+            FROM daily_correction_summary
+            WHERE business_date BETWEEN ? AND ?
+            GROUP BY month
+        """, (str(start_date), str(end_date)))
+        rows = {row['month']: {key: row[key] for key in row.keys() if key != 'month'} for row in cursor.fetchall()}
+        if group_by_month:
+            return rows
+        return rows.get('', {'voided_count': 0, 'subtotal': 0, 'gst_amount': 0, 'service_charge': 0,
+                             'discount': 0, 'final_amount': 0})
+    
+    @staticmethod
+    def get_totals(start_date, end_date):
+        """
+        Sales totals for a range of business dates (inclusive), net of
+        voids, refunds and amendments dated in the range
+        Returns:
+            Dict with order_count, subtotal, gst_amount, service_charge, discount, final_amount
+        """
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT COALESCE(SUM(order_count), 0) as order_count,
+                   COALESCE(SUM(subtotal), 0) as subtotal,
+                   COALESCE(SUM(gst_amount), 0) as gst_amount,
+                   COALESCE(SUM(service_charge), 0) as service_charge,
+                   COALESCE(SUM(discount), 0) as discount,
+                   COALESCE(SUM(final_amount), 0) as final_amount
+            FROM daily_sales_summary
+            WHERE business_date BETWEEN ? AND ?
+        """, (str(start_date), str(end_date)))
+        
+        totals = dict(cursor.fetchone())
+        corrections = SalesSummary._correction_totals(cursor, start_date, end_date)
+        conn.close()
+        
+        totals['order_count'] -= corrections.pop('voided_count')
+        for key, delta in corrections.items():
+            totals[key] += delta
+        return totals
+    
+    @staticmethod
+    def get_daily_totals(start_date, end_date):
+        """One summary row per business date in the range"""
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT * FROM daily_sales_summary
+            WHERE business_date BETWEEN ? AND ?
+            ORDER BY business_date
+        """, (str(start_date), str(end_date)))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    @staticmethod
+    def get_payment_totals(start_date, end_date):
+        """
+        Amount per payment method for a range of business dates, net of
+        money returned or taken by corrections dated in the range
+        Returns:
+            Dict of payment method -> amount (cash, card and upi always present)
+        """
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT payment_method, SUM(amount) FROM (
+                SELECT payment_method, amount FROM daily_payment_summary
+                WHERE business_date BETWEEN ? AND ?
+                UNION ALL
+                SELECT payment_method, amount FROM daily_correction_payments
+                WHERE business_date BETWEEN ? AND ?
+            )
+            GROUP BY payment_method
+        """, (str(start_date), str(end_date)) * 2)
+        
+        totals = {method: 0 for method in SalesSummary.PAYMENT_METHODS}
+        for method, amount in cursor.fetchall():
+            totals[method] = amount or 0
+        
+        conn.close()
+        return totals
+    
+    @staticmethod
+    def get_monthly_totals(start_month, end_month):
+        """
+        Sales totals and payment split per month
+        Args:
+            start_month, end_month: 'YYYY-MM', inclusive
+        Returns:
+            One dict per month in the range (months without sales included),
+            with month, order_count, subtotal, gst_amount, service_charge,
+            discount, final_amount and payments (method -> amount; cash, card
+            and upi always present)
+        
+        Both queries are primary key range scans of the daily summaries, so
+        each month costs at most 31 summary rows however many bills it had.
+        Split bills count towards each tender used; corrections count in the
+        month they were made.
+        """
+        year, month = int(start_month[:4]), int(start_month[5:7])
+        months = []
+        while f"{year:04d}-{month:02d}" <= end_month:
+            months.append(f"{year:04d}-{month:02d}")
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        
+        totals = {
+            key: {'month': key, 'order_count': 0, 'subtotal': 0, 'gst_amount': 0, 'service_charge': 0,
+                  'discount': 0, 'final_amount': 0,
+                  'payments': {method: 0 for method in SalesSummary.PAYMENT_METHODS}}
+            for key in months
+        }
+        if not months:
+            return []
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        # Date keys sort as text, so the whole month range is one index range
+        date_range = (f"{months[0]}-01", f"{months[-1]}-31")
+        
+        cursor.execute("""
+            SELECT substr(business_date, 1, 7) as month,
+                   SUM(order_count) as order_count, SUM(subtotal) as subtotal,
+                   SUM(gst_amount) as gst_amount, SUM(service_charge) as service_charge,
+                   SUM(discount) as discount, SUM(final_amount) as final_amount
+            FROM daily_sales_summary
+            WHERE business_date BETWEEN ? AND ?
+            GROUP BY month
+        """, date_range)
+        for row in cursor.fetchall():
+            totals[row['month']].update({key: row[key] or 0 for key in row.keys() if key != 'month'})
+        for month, corrections in SalesSummary._correction_totals(cursor, *date_range, group_by_month=True).items():
+            totals[month]['order_count'] -= corrections.pop('voided_count')
+            for key, delta in corrections.items():
+                totals[month][key] += delta
+        
+        cursor.execute("""
+            SELECT substr(business_date, 1, 7) as month, payment_method, SUM(amount) as amount FROM (
+                SELECT business_date, payment_method, amount FROM daily_payment_summary
+                WHERE business_date BETWEEN ? AND ?
+                UNION ALL
+                SELECT business_date, payment_method, amount FROM daily_correction_payments
+                WHERE business_date BETWEEN ? AND ?
+            )
+            GROUP BY month, payment_method
+        """, date_range * 2)
+        for row in cursor.fetchall():
+            totals[row['month']]['payments'][row['payment_method']] = row['amount'] or 0
+        
+        conn.close()
+        return [totals[key] for key in months]
+    
+    @staticmethod
+    def get_category_totals(start_date, end_date):
+        """Orders, items and revenue per menu category for a range of business dates"""
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT category,
+                   SUM(order_count) as order_count,
+                   SUM(item_count) as total_items,
+                   SUM(revenue) as total_revenue
+            FROM daily_category_summary
+            WHERE business_date BETWEEN ? AND ?
+            GROUP BY category
+            ORDER BY total_revenue DESC
+        """, (str(start_date), str(end_date)))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+    
+    @staticmethod
+    def get_recent_totals(days):
+        """Sales totals for the last N business days, including today"""
+        today = database.get_business_date()
+        start_date = today - timedelta(days=days - 1)
+        return SalesSummary.get_totals(start_date, today)
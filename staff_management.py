@@ -4,6 +4,8 @@ Handles staff information, attendance, leaves, and salary payments
 """
 
 import database
+import ledger
+import report_cache
 from datetime import datetime, timedelta
 
 class StaffManagement:
@@ -478,7 +480,13 @@ class StaffManagement:
             """, (datetime.now().strftime('%Y-%m-%d'), salary_amount,
                   f'Salary payment for staff #{staff_id}', payment_method))
             
+            ledger.Ledger._post_expense(
+                cursor, cursor.lastrowid, datetime.now().strftime('%Y-%m-%d'), salary_amount, payment_method,
+                f'Salary payment for staff #{staff_id}'
+            )
+            
             conn.commit()
+            report_cache.ReportCache.invalidate('expenses')
             conn.close()
             return True, "Salary payment recorded successfully"
         except Exception as e:
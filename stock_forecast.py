@@ -0,0 +1,229 @@
+"""
+Stock Forecasting
+Forecasts ingredient consumption from stock history and derives reorder points
+"""
+
+import database
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class StockForecast:
+    """Consumption forecasting and reorder-point engine"""
+    
+    # Days of consumption history used for the forecast
+    HISTORY_DAYS = 56
+    # Weight of the most recent day in the exponentially smoothed level
+    SMOOTHING_ALPHA = 0.3
+    # Days between placing and receiving a PO (auto POs expect delivery in 3 days)
+    LEAD_TIME_DAYS = 3
+    # Days of demand one order should cover after it arrives
+    REVIEW_DAYS = 7
+    # Safety stock in standard deviations of daily demand (~95% service level)
+    SERVICE_LEVEL_Z = 1.65
+    # Weekday pattern is only trusted once an ingredient has this much history
+    MIN_SEASONAL_DAYS = 14
+    # Stock movements that count as real consumption
+    CONSUMPTION_REASON_CODES = ('order', 'waste')
+    
+    @staticmethod
+    def is_available():
+        """Forecasting needs NumPy; callers fall back to min_stock rules without it"""
+        return np is not None
+    
+    @staticmethod
+    def get_daily_consumption(days=None, end_date=None, ingredient_ids=None):
+        """
+        Per-day consumption matrix from the stock rollup
+        Args:
+            days: Number of complete days of history (default HISTORY_DAYS)
+            end_date: First day NOT included, 'YYYY-MM-DD' (default today)
+            ingredient_ids: Limit to these ingredients (default all)
+        Returns:
+            (ingredient_ids, day_list, matrix) where matrix[i, d] is the quantity
+            of ingredient_ids[i] consumed on day_list[d]
+        """
+        days = days or StockForecast.HISTORY_DAYS
+        end = datetime.strptime(end_date, '%Y-%m-%d') if end_date else datetime.now()
+        end = end.replace(hour=0, minute=0, second=0, microsecond=0)
+        day_list = [(end - timedelta(days=days - offset)).strftime('%Y-%m-%d') for offset in range(days)]
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        query = "SELECT id FROM ingredients"
+        params = []
+        if ingredient_ids:
+            query += f" WHERE id IN ({','.join(['?'] * len(ingredient_ids))})"
+            params.extend(ingredient_ids)
+        cursor.execute(query + " ORDER BY id", params)
+        ids = [row[0] for row in cursor.fetchall()]
+        
+        reason_placeholders = ','.join(['?'] * len(StockForecast.CONSUMPTION_REASON_CODES))
+        cursor.execute(f"""
+            SELECT ingredient_id, day, SUM(quantity)
+            FROM stock_daily_rollup
+            WHERE transaction_type = 'out'
+            AND reason_code IN ({reason_placeholders})
+            AND day >= ? AND day < ?
+            GROUP BY ingredient_id, day
+        """, StockForecast.CONSUMPTION_REASON_CODES + (day_list[0], end.strftime('%Y-%m-%d')))
+        rows = cursor.fetchall()
+        conn.close()
+        
+        matrix = np.zeros((len(ids), days))
+        row_index = {ingredient_id: i for i, ingredient_id in enumerate(ids)}
+        day_index = {day: d for d, day in enumerate(day_list)}
+        rows = [row for row in rows if row[0] in row_index]
+        if rows:
+            np.add.at(
+                matrix,
+                ([row_index[row[0]] for row in rows], [day_index[row[1]] for row in rows]),
+                [row[2] for row in rows]
+            )
+        
+        return ids, day_list, matrix
+    
+    @staticmethod
+    def forecast_demand(matrix, day_list, horizon_days, alpha=None):
+        """
+        Forecast daily demand for every ingredient in one vectorised pass
+        Args:
+            matrix: Consumption matrix (ingredients x days) from get_daily_consumption
+            day_list: Dates of the matrix columns
+            horizon_days: Number of days to forecast, starting the day after day_list[-1]
+            alpha: Smoothing factor (default SMOOTHING_ALPHA)
+        Returns:
+            Dict of arrays: 'level' (deseasonalised daily demand), 'moving_average'
+            (last 7 days), 'seasonal_index' (ingredients x 7, Monday first),
+            'forecast' (ingredients x horizon_days), 'sigma' (daily demand std dev)
+        """
+        alpha = StockForecast.SMOOTHING_ALPHA if alpha is None else alpha
+        n_ingredients, n_days = matrix.shape
+        
+        last_day = datetime.strptime(day_list[-1], '%Y-%m-%d')
+        weekdays = np.array([datetime.strptime(day, '%Y-%m-%d').weekday() for day in day_list])
+        future_weekdays = np.array([
+            (last_day + timedelta(days=offset + 1)).weekday() for offset in range(horizon_days)
+        ])
+        
+        # Ignore days before an ingredient was first used, so new items are not diluted by zeros
+        used = matrix > 0
+        first_used = np.where(used.any(axis=1), used.argmax(axis=1), n_days)
+        active = np.arange(n_days)[None, :] >= first_used[:, None]
+        active_days = active.sum(axis=1)
+        
+        # Weekday seasonality: mean demand per weekday relative to overall mean
+        weekday_onehot = weekdays[None, :] == np.arange(7)[:, None]
+        weekday_totals = (matrix * active) @ weekday_onehot.T
+        weekday_counts = active.astype(float) @ weekday_onehot.T
+        overall_mean = np.divide(matrix.sum(axis=1), active_days, out=np.zeros(n_ingredients), where=active_days > 0)
+        weekday_mean = np.divide(weekday_totals, weekday_counts, out=np.zeros((n_ingredients, 7)), where=weekday_counts > 0)
+        seasonal_index = np.divide(weekday_mean, overall_mean[:, None], out=np.ones((n_ingredients, 7)),
+                                   where=(overall_mean[:, None] > 0) & (weekday_counts > 0))
+        seasonal_index[active_days < StockForecast.MIN_SEASONAL_DAYS] = 1.0
+        
+        # Exponentially smoothed level of the deseasonalised series
+        history_index = seasonal_index[:, weekdays]
+        open_days = active & (history_index > 0)
+        deseasonalised = np.divide(matrix, history_index, out=np.zeros_like(matrix), where=open_days)
+        weights = (1 - alpha) ** np.arange(n_days - 1, -1, -1) * open_days
+        weight_sums = weights.sum(axis=1)
+        level = np.divide((deseasonalised * weights).sum(axis=1), weight_sums,
+                          out=np.zeros(n_ingredients), where=weight_sums > 0)
+        
+        recent = active[:, -7:]
+        recent_days = recent.sum(axis=1)
+        moving_average = np.divide((matrix[:, -7:] * recent).sum(axis=1), recent_days,
+                                   out=np.zeros(n_ingredients), where=recent_days > 0)
+        
+        residuals = (matrix - level[:, None] * history_index) * active
+        sigma = np.sqrt(np.divide((residuals ** 2).sum(axis=1), np.maximum(active_days - 1, 1)))
+        
+        return {
+            'level': level,
+            'moving_average': moving_average,
+            'seasonal_index': seasonal_index,
+            'forecast': level[:, None] * seasonal_index[:, future_weekdays],
+            'sigma': sigma
+        }
+    
+    @staticmethod
+    def get_reorder_plan(ingredient_ids=None, lead_time_days=None, review_days=None, service_level_z=None):
+        """
+        Reorder point and order quantity for every ingredient
+        Args:
+            ingredient_ids: Limit to these ingredients (default all)
+            lead_time_days: Days until a new PO arrives (default LEAD_TIME_DAYS)
+            review_days: Days of demand an order should cover (default REVIEW_DAYS)
+            service_level_z: Safety stock factor (default SERVICE_LEVEL_Z)
+        Returns:
+            Dict of ingredient_id -> dict with name, available, on_order, daily_demand,
+            safety_stock, reorder_point, order_quantity, needs_reorder and method
+            ('forecast' or 'min_stock' for ingredients with no consumption history).
+            Empty dict when NumPy is not installed.
+        """
+        if np is None:
+            return {}
+        
+        lead_time_days = lead_time_days or StockForecast.LEAD_TIME_DAYS
+        review_days = review_days or StockForecast.REVIEW_DAYS
+        z = StockForecast.SERVICE_LEVEL_Z if service_level_z is None else service_level_z
+        
+        ids, day_list, matrix = StockForecast.get_daily_consumption(ingredient_ids=ingredient_ids)
+        if not ids:
+            return {}
+        forecast = StockForecast.forecast_demand(matrix, day_list, lead_time_days + review_days)
+        
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        
+        placeholders = ','.join(['?'] * len(ids))
+        cursor.execute(f"""
+            SELECT i.id, i.name, i.unit, i.min_stock,
+                   i.current_stock as available,
+                   COALESCE((
+                       SELECT SUM(MAX(poi.quantity_ordered - COALESCE(poi.quantity_received, 0), 0))
+                       FROM purchase_order_items poi
+                       JOIN purchase_orders po ON poi.po_id = po.id
+                       WHERE poi.ingredient_id = i.id AND po.status = 'pending'
+                   ), 0) as on_order
+            FROM ingredients i
+            WHERE i.id IN ({placeholders})
+        """, ids)
+        details = {row['id']: row for row in cursor.fetchall()}
+        conn.close()
+        
+        position = np.array([details[i]['available'] + details[i]['on_order'] for i in ids])
+        min_stock = np.array([details[i]['min_stock'] or 0 for i in ids], dtype=float)
+        
+        safety_stock = z * forecast['sigma'] * np.sqrt(lead_time_days)
+        lead_time_demand = forecast['forecast'][:, :lead_time_days].sum(axis=1)
+        cover_demand = forecast['forecast'].sum(axis=1)
+        
+        has_history = matrix.any(axis=1)
+        reorder_point = np.where(has_history, lead_time_demand + safety_stock, min_stock)
+        order_up_to = np.where(has_history, cover_demand + safety_stock, min_stock * 2)
+        needs_reorder = np.where(has_history, position <= reorder_point, (min_stock > 0) & (position <= min_stock))
+        order_quantity = np.where(needs_reorder, np.maximum(order_up_to - position, 0), 0)
+        
+        plan = {}
+        for i, ingredient_id in enumerate(ids):
+            plan[ingredient_id] = {
+                'name': details[ingredient_id]['name'],
+                'unit': details[ingredient_id]['unit'],
+                'available': details[ingredient_id]['available'],
+                'on_order': details[ingredient_id]['on_order'],
+                'daily_demand': round(float(forecast['level'][i]), 3),
+                'moving_average': round(float(forecast['moving_average'][i]), 3),
+                'safety_stock': round(float(safety_stock[i]), 3),
+                'reorder_point': round(float(reorder_point[i]), 3),
+                'order_quantity': round(float(order_quantity[i]), 3),
+                'needs_reorder': bool(needs_reorder[i] and order_quantity[i] > 0),
+                'method': 'forecast' if has_history[i] else 'min_stock'
+            }
+        
+        return plan
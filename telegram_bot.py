@@ -5,6 +5,8 @@ Handles bot commands for bill management and sales reports
 
 import requests
 import database
+import sales_summary
+import prep_forecast
 from datetime import datetime, timedelta
 import json
 import time
@@ -63,7 +65,7 @@ def send_telegram_message(chat_id, message, reply_markup=None):
 def get_daily_sales(date=None):
     """Get daily sales report"""
     if not date:
-        date = datetime.now().date()
+        date = database.get_business_date()
     
     conn = database.get_connection()
     cursor = conn.cursor()
@@ -72,56 +74,34 @@ def get_daily_sales(date=None):
     cursor.execute("""
         SELECT id, table_number, order_date, final_amount 
         FROM orders 
-        WHERE DATE(order_date) = ? AND status = 'completed'
+        WHERE business_date = ? AND status = 'completed'
         ORDER BY order_date DESC
-    """, (date,))
+    """, (str(date),))
     
     orders = cursor.fetchall()
-    
-    # Calculate totals
-    total_sales = sum(order[3] for order in orders)
-    total_orders = len(orders)
-    
     conn.close()
     
+    # Totals from the daily sales summary
+    totals = sales_summary.SalesSummary.get_totals(date, date)
+    
     return {
         'date': date,
-        'total_orders': total_orders,
-        'total_sales': total_sales,
+        'total_orders': totals['order_count'],
+        'total_sales': totals['final_amount'],
         'orders': orders
     }
 
 def get_total_sales_message(days=30):
     """Get total sales message for specified days"""
-    conn = database.get_connection()
-    cursor = conn.cursor()
-    
-    cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
-    
-    # Get total sales
-    cursor.execute("""
-        SELECT COUNT(*), SUM(final_amount) 
-        FROM orders 
-        WHERE order_date >= ? AND status = 'completed'
-    """, (cutoff_date,))
-    
-    result = cursor.fetchone()
-    total_orders = result[0] or 0
-    total_sales = result[1] or 0
+    # Totals from the daily sales summary
+    period_totals = sales_summary.SalesSummary.get_recent_totals(days)
+    total_orders = period_totals['order_count']
+    total_sales = period_totals['final_amount']
     
     # Get today's sales
-    today = datetime.now().date()
-    cursor.execute("""
-        SELECT COUNT(*), SUM(final_amount) 
-        FROM orders 
-        WHERE DATE(order_date) = ? AND status = 'completed'
-    """, (today,))
-    
-    result = cursor.fetchone()
-    today_orders = result[0] or 0
-    today_sales = result[1] or 0
-    
-    conn.close()
+    today_totals = sales_summary.SalesSummary.get_recent_totals(1)
+    today_orders = today_totals['order_count']
+    today_sales = today_totals['final_amount']
     
     message = f"*Sales Report ({days} Days)*\n\n"
     message += f"*Today:*\n"
@@ -210,7 +190,7 @@ def format_bill_message(bill_data):
     if service_charge > 0:
         message += f"*Service Charge:* INR {service_charge:.2f}\n"
     if gst_amount > 0:
-        message += f"*GST (5%):* INR {gst_amount:.2f}\n"
+        message += f"*GST:* INR {gst_amount:.2f}\n"
     if discount > 0:
         message += f"*Discount:* INR {discount:.2f}\n"
     message += f"*TOTAL:* INR {final_amount:.2f}\n"
@@ -263,6 +243,22 @@ def get_menu_summary():
     
     return message
 
+def get_prep_sheet_message():
+    """Get tomorrow's kitchen prep sheet"""
+    sheet = prep_forecast.PrepForecast.get_prep_sheet()
+    if not sheet['generated_at']:
+        prep_forecast.PrepForecast.refresh(sheet['forecast_date'])
+        sheet = prep_forecast.PrepForecast.get_prep_sheet(sheet['forecast_date'])
+    
+    message = f"*Prep Sheet - {sheet['forecast_date']}*\n\n"
+    if not sheet['dishes']:
+        return message + "No forecast available (not enough sales history)."
+    
+    for dish in sheet['dishes'][:20]:
+        message += f"• {dish['name']}: {dish['prep_quantity']} (expected {dish['expected_quantity']}, peak {dish['peak_hour']:02d}:00)\n"
+    
+    return message
+
 def test_bot_commands():
     """Test all bot commands"""
     print("=" * 60)
@@ -320,7 +316,8 @@ def handle_bot_message(message):
             response += "/sales - Sales report (last 30 days)\n"
             response += "/bills - List today's bills\n"
             response += "/bill <number> - Get bill details\n"
-            response += "/menu - Menu summary"
+            response += "/menu - Menu summary\n"
+            response += "/prep - Tomorrow's kitchen prep sheet"
             send_telegram_message(chat_id, response)
         
         elif command == '/help':
@@ -330,6 +327,7 @@ def handle_bot_message(message):
             response += "/bills - List all bills today\n"
             response += "/bill <number> - Get bill #number details\n"
             response += "/menu - Menu summary by category\n"
+            response += "/prep - Tomorrow's prep sheet by dish\n"
             response += "\n*Usage Examples:*\n"
             response += "/today - See today's orders and revenue\n"
             response += "/bill 123 - Get details of bill #123"
@@ -367,6 +365,9 @@ def handle_bot_message(message):
                 print(f"Error in /bills command: {e}")
                 send_telegram_message(chat_id, f"Error: {str(e)}")
         
+        elif command == '/prep':
+            send_telegram_message(chat_id, get_prep_sheet_message())
+        
         elif command.startswith('/bill'):
             parts = text.split()
             if len(parts) > 1:
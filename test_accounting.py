@@ -0,0 +1,1150 @@
+"""
+Accounting Report Tests
+Pins the numbers produced by the daily sales report
+"""
+
+import os
+import sys
+import contextlib
+import io
+import json
+import sqlite3
+import threading
+import pytest
+from datetime import date, datetime
+import database
+from accounting import AccountingSystem
+from sales_summary import SalesSummary
+from ledger import Ledger
+from inventory_manager import InventoryManager
+from gst_engine import GSTEngine
+from analytics import Analytics, DashboardEngine, SalesCube
+from report_cache import ReportCache
+from columnar_analytics import ColumnarAnalytics
+from item_affinity import ItemAffinity
+from prep_forecast import PrepForecast
+from menu_engineering import MenuEngineering
+from bill_manager import BillManager
+from order_corrections import OrderCorrections
+from purchase_management import PurchaseManagement
+from staff_management import StaffManagement
+from job_scheduler import CronSchedule, JobScheduler
+from backup_manager import BackupManager, AutoBackupScheduler
+
+@pytest.fixture
+def temp_dir(tmp_path, monkeypatch):
+    """Point the app at a fresh database in a temporary directory (restored after the test)"""
+    monkeypatch.setattr(database, 'DATABASE_NAME', str(tmp_path / 'test_accounting.db'))
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_database()
+    return str(tmp_path)
+
+def add_menu_item(cursor, name, price):
+    cursor.execute("""
+        INSERT INTO menu_items (name, price_single, price_full, category, food_type, plate_type)
+        VALUES (?, ?, ?, 'THALIS', 'veg', 'full')
+    """, (name, price, price))
+    return cursor.lastrowid
+
+def add_order(cursor, order_date, total, gst, service, items, status='completed', payment_method='cash',
+              business_date=None):
+    """Insert an order with its items; items are (menu_item_id, quantity, price)"""
+    cursor.execute("""
+        INSERT INTO orders (table_number, order_date, business_date, total_amount, gst_amount,
+                            service_charge, discount, final_amount, status, payment_method)
+        VALUES ('1', ?, ?, ?, ?, ?, 0, ?, ?, ?)
+    """, (order_date, business_date or order_date[:10], total, gst, service, total + gst + service, status,
+          payment_method))
+    order_id = cursor.lastrowid
+    for menu_item_id, quantity, price in items:
+        cursor.execute("""
+            INSERT INTO order_items (order_id, menu_item_id, quantity, price, total)
+            VALUES (?, ?, ?, ?, ?)
+        """, (order_id, menu_item_id, quantity, price, quantity * price))
+    return order_id
+
+def seed_sales_day():
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Veg Thali', 150)
+    naan = add_menu_item(cursor, 'Butter Naan', 40)
+    
+    add_order(cursor, '2024-03-10 00:15:00', 230, 11.5, 0, [(thali, 1, 150), (naan, 2, 40)])
+    add_order(cursor, '2024-03-10 13:30:00', 300, 15, 30, [(thali, 2, 150)])
+    add_order(cursor, '2024-03-10 23:59:59', 40, 2, 0, [(naan, 1, 40)])
+    # Excluded: cancelled, and outside the day
+    add_order(cursor, '2024-03-10 20:00:00', 999, 50, 0, [(thali, 5, 150)], status='cancelled')
+    add_order(cursor, '2024-03-09 23:59:59', 150, 7.5, 0, [(thali, 1, 150)])
+    add_order(cursor, '2024-03-11 00:00:00', 150, 7.5, 0, [(thali, 1, 150)])
+    conn.commit()
+    conn.close()
+
+def test_daily_sales_report_totals(temp_dir):
+    seed_sales_day()
+    report = AccountingSystem.get_daily_sales_report('2024-03-10')
+    
+    assert report['date'] == '2024-03-10'
+    assert report['order_count'] == 3
+    assert report['total_sales'] == 570
+    assert report['total_gst'] == 28.5
+    assert report['total_service_charge'] == 30
+    assert report['total_revenue'] == 628.5
+    assert report['items_sold'] == {
+        'Veg Thali': {'quantity': 3, 'revenue': 450},
+        'Butter Naan': {'quantity': 3, 'revenue': 120},
+    }
+
+def test_daily_sales_report_accepts_date_and_empty_day(temp_dir):
+    seed_sales_day()
+    assert AccountingSystem.get_daily_sales_report(date(2024, 3, 10))['order_count'] == 3
+    
+    report = AccountingSystem.get_daily_sales_report('2024-03-12')
+    assert report['order_count'] == 0
+    assert report['total_revenue'] == 0
+    assert report['items_sold'] == {}
+
+def test_daily_sales_report_uses_business_date_and_nets_voids(temp_dir):
+    seed_sales_day()
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM menu_items WHERE name = 'Butter Naan'")
+    naan = cursor.fetchone()[0]
+    # Billed at 00:30 after midnight: still the previous business day
+    add_order(cursor, '2024-03-11 00:30:00', 80, 4, 0, [(naan, 2, 40)], business_date='2024-03-10')
+    today = database.get_business_date_string()
+    voided = add_order(cursor, f'{today} 12:00:00', 80, 4, 0, [(naan, 2, 40)])
+    kept = add_order(cursor, f'{today} 13:00:00', 40, 2, 0, [(naan, 1, 40)])
+    conn.commit()
+    conn.close()
+    
+    report = AccountingSystem.get_daily_sales_report('2024-03-10')
+    assert (report['order_count'], report['total_revenue']) == (4, 628.5 + 84)
+    assert report['items_sold']['Butter Naan'] == {'quantity': 5, 'revenue': 200}
+    assert AccountingSystem.get_daily_sales_report('2024-03-11')['order_count'] == 1
+    
+    assert OrderCorrections.void_order(voided)[0]
+    report = AccountingSystem.get_daily_sales_report(today)
+    assert (report['order_count'], report['total_revenue']) == (1, 42)
+    assert report['items_sold'] == {'Butter Naan': {'quantity': 1, 'revenue': 40}}
+    assert OrderCorrections.void_order(kept)[0]
+    assert AccountingSystem.get_daily_sales_report(today)['items_sold'] == {}
+
+def test_sales_summary_tracks_checkout_and_void(temp_dir):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Veg Thali', 150)
+    orders = [
+        add_order(cursor, '2024-03-10 12:00:00', 300, 15, 0, [(thali, 2, 150)], payment_method='cash'),
+        add_order(cursor, '2024-03-10 13:00:00', 150, 7.5, 15, [(thali, 1, 150)], payment_method='upi'),
+        add_order(cursor, '2024-03-11 13:00:00', 150, 7.5, 0, [(thali, 1, 150)], payment_method='card'),
+    ]
+    for order_id in orders:
+        SalesSummary._apply_order(cursor, order_id)
+    conn.commit()
+    
+    totals = SalesSummary.get_totals('2024-03-10', '2024-03-11')
+    assert totals['order_count'] == 3
+    assert totals['final_amount'] == 315 + 172.5 + 157.5
+    assert SalesSummary.get_payment_totals('2024-03-10', '2024-03-10') == {'cash': 315, 'card': 0, 'upi': 172.5}
+    
+    report = AccountingSystem.get_sales_report('2024-03-10', '2024-03-10')
+    assert report['summary']['total_orders'] == 2
+    assert report['summary']['total_gst'] == 22.5
+    assert len(report['orders']) == 2
+    
+    # Void the UPI bill
+    SalesSummary._apply_order(cursor, orders[1], sign=-1)
+    cursor.execute("DELETE FROM order_items WHERE order_id = ?", (orders[1],))
+    cursor.execute("DELETE FROM orders WHERE id = ?", (orders[1],))
+    conn.commit()
+    conn.close()
+    
+    totals = SalesSummary.get_totals('2024-03-10', '2024-03-10')
+    assert totals['order_count'] == 1
+    assert totals['final_amount'] == 315
+    assert SalesSummary.get_payment_totals('2024-03-10', '2024-03-10')['upi'] == 0
+    categories = SalesSummary.get_category_totals('2024-03-10', '2024-03-11')
+    assert [(row['category'], row['order_count'], row['total_items']) for row in categories] == [('THALIS', 2, 3)]
+
+def test_sales_summary_backfilled_from_existing_orders(temp_dir):
+    seed_sales_day()
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_database()
+    
+    totals = SalesSummary.get_totals('2024-03-10', '2024-03-10')
+    assert totals['order_count'] == 3
+    assert totals['final_amount'] == 628.5
+    assert SalesSummary.get_payment_totals('2024-03-10', '2024-03-10')['cash'] == 628.5
+
+def test_split_payment_routed_per_method(temp_dir):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Veg Thali', 150)
+    order_id = add_order(cursor, '2024-03-10 12:00:00', 150, 7.5, 15, [(thali, 1, 150)], payment_method='split')
+    AccountingSystem._record_order_payments(cursor, order_id, '2024-03-10', [('cash', 100), ('upi', 72.5)])
+    SalesSummary._apply_order(cursor, order_id)
+    conn.commit()
+    conn.close()
+    
+    assert AccountingSystem.record_order_transaction(order_id, 172.5, 'Split')
+    
+    breakdown = AccountingSystem.get_payment_method_breakdown('2024-03-10')
+    assert breakdown == {'cash': 100, 'card': 0, 'upi': 72.5, 'total': 172.5}
+    assert AccountingSystem.get_shift_payment_breakdown('2000-01-01 00:00:00')['total'] == 172.5
+    
+    balances = {row['id']: row['balance'] for row in AccountingSystem.get_account_summary()}
+    assert balances[1] == 100
+    assert balances[2] == 0
+    assert balances[3] == 72.5
+
+def test_ledger_postings_balance_and_survive_period_close(temp_dir):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Veg Thali', 150)
+    march = add_order(cursor, '2024-03-10 12:00:00', 300, 15, 30, [(thali, 2, 150)], payment_method='card')
+    april = add_order(cursor, '2024-04-02 12:00:00', 150, 7.5, 0, [(thali, 1, 150)], payment_method='cash')
+    conn.commit()
+    conn.close()
+    
+    assert AccountingSystem.record_order_transaction(march, 345, 'card')
+    assert AccountingSystem.record_order_transaction(april, 157.5, 'cash')
+    # Posting twice is a no-op in the ledger
+    assert AccountingSystem.record_order_transaction(april, 157.5, 'cash')
+    assert AccountingSystem.add_expense('2024-04-03', 'Gas', 50, 'Cylinder', 'cash')[0]
+    
+    trial_balance = Ledger.get_trial_balance()
+    assert trial_balance['balanced']
+    assert trial_balance['total_debit'] == 345 + 107.5 + 50
+    
+    balances = {row['code']: row['balance'] for row in Ledger.get_account_balances()}
+    assert balances['1000'] == 107.5
+    assert balances['1010'] == 345
+    assert balances['2000'] == 22.5
+    assert balances['4000'] == 450
+    assert balances['4100'] == 30
+    assert balances['6000'] == 50
+    
+    # Snapshot March; later balances are snapshot + April lines
+    assert AccountingSystem.close_period('2024-03')[0]
+    assert not AccountingSystem.close_period('2024-02')[0]
+    assert {row['code']: row['balance'] for row in Ledger.get_account_balances()} == balances
+    march_balances = {row['code']: row['balance'] for row in Ledger.get_account_balances('2024-03-31')}
+    assert march_balances['1000'] == 0
+    assert march_balances['1010'] == 345
+    
+    sheet = AccountingSystem.get_balance_sheet()
+    assert sheet['assets']['cash_bank'] == 452.5
+    assert sheet['liabilities']['gst_payable'] == 22.5
+    assert sheet['retained_earnings'] == 430
+    
+    # Deleting a bill posts a reversal instead of rewriting history
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    Ledger._reverse_source(cursor, 'order', april)
+    conn.commit()
+    conn.close()
+    balances = {row['code']: row['balance'] for row in Ledger.get_account_balances()}
+    assert balances['1000'] == -50
+    assert balances['4000'] == 300
+    assert Ledger.get_trial_balance()['balanced']
+
+def test_order_posting_rounds_fractional_paisa(temp_dir):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Paneer Thali', 205)
+    # 5% GST and a 2.5% service charge on 205: the bill carries fractions of a paisa
+    single = add_order(cursor, '2024-03-10 12:00:00', 205, 10.25, 5.125, [(thali, 1, 205)])
+    split = add_order(cursor, '2024-03-10 13:00:00', 205, 10.25, 5.125, [(thali, 1, 205)], payment_method='split')
+    AccountingSystem._record_order_payments(cursor, split, '2024-03-10', [('cash', 110.1875), ('upi', 110.1875)])
+    conn.commit()
+    conn.close()
+    
+    assert AccountingSystem.record_order_transaction(single, 220.375, 'cash')
+    assert AccountingSystem.record_order_transaction(split, 220.375, 'Split')
+    
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT je.source_id, SUM(jl.debit), SUM(jl.credit) FROM journal_entries je
+        JOIN journal_lines jl ON jl.entry_id = je.id
+        WHERE je.source = 'order'
+        GROUP BY je.source_id ORDER BY je.source_id
+    """)
+    entries = cursor.fetchall()
+    conn.close()
+    assert [row[0] for row in entries] == [single, split]
+    assert all(abs(row[1] - row[2]) < 1e-9 for row in entries)
+    assert Ledger.get_trial_balance()['balanced']
+
+def test_checkout_saves_bill_and_posting_together(temp_dir, monkeypatch):
+    app = pytest.importorskip('app')
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Paneer Thali', 205)
+    conn.commit()
+    conn.close()
+    items = [{'item_id': thali, 'price': 205}]
+    
+    order_id = app.RestaurantApp.save_order_to_db(None, '4', items, 205, 5.125, 10.25, 220.375, 'Cash')
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM journal_entries WHERE source = 'order' AND source_id = ?", (order_id,))
+    assert cursor.fetchone()[0] == 1
+    cursor.execute("SELECT type, amount FROM transactions WHERE order_id = ?", (order_id,))
+    assert [tuple(row) for row in cursor.fetchall()] == [('credit', 220.375)]
+    conn.close()
+    assert Ledger.get_trial_balance()['balanced']
+    
+    # A posting failure reaches the caller and leaves no bill behind
+    def fail(cursor, order_id):
+        raise ValueError('Unbalanced journal entry')
+    monkeypatch.setattr(Ledger, '_post_order', fail)
+    with pytest.raises(ValueError):
+        app.RestaurantApp.save_order_to_db(None, '5', items, 205, 5.125, 10.25, 220.375, 'Cash')
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    assert cursor.execute("SELECT COUNT(*) FROM orders").fetchone()[0] == 1
+    assert cursor.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 1
+    assert cursor.execute("SELECT SUM(order_count) FROM daily_sales_summary").fetchone()[0] == 1
+    conn.close()
+
+def test_supplier_and_salary_payments_post_to_ledger(temp_dir):
+    try:
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        thali = add_menu_item(cursor, 'Veg Thali', 150)
+        order = add_order(cursor, '2024-04-02 12:00:00', 150, 7.5, 0, [(thali, 1, 150)], payment_method='cash')
+        cursor.execute("INSERT INTO suppliers (name) VALUES ('Metro Wholesale')")
+        supplier_id = cursor.lastrowid
+        cursor.execute("""
+            INSERT INTO accounts_payable (supplier_id, amount_due) VALUES (?, 1500)
+        """, (supplier_id,))
+        ap_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        assert AccountingSystem.record_order_transaction(order, 157.5, 'cash')
+        
+        assert StaffManagement.add_staff('Ravi', StaffManagement.ROLES[0], 12000)[0]
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        staff_id = cursor.execute("SELECT id FROM staff").fetchone()[0]
+        cursor.execute("""
+            INSERT INTO salary_payments (staff_id, month, year, basic_salary, deductions, bonuses, total_amount, status)
+            VALUES (?, 3, 2024, 12000, 500, 0, 11500, 'pending')
+        """, (staff_id,))
+        conn.commit()
+        conn.close()
+        
+        # Cached reports pick the payments up at once
+        ReportCache.clear()
+        today = datetime.now().strftime('%Y-%m-%d')
+        assert AccountingSystem.get_profit_loss(today, today)['expenses'] == 0
+        assert PurchaseManagement.record_supplier_payment(supplier_id, ap_id, 1000, 'card')[0]
+        assert AccountingSystem.get_profit_loss(today, today)['expenses'] == 1000
+        assert StaffManagement.pay_salary(staff_id, 3, 2024, 'cash')[0]
+        assert AccountingSystem.get_profit_loss(today, today)['expenses'] == 1000 + 11500
+        
+        trial_balance = Ledger.get_trial_balance()
+        assert trial_balance['balanced']
+        assert trial_balance['total_debit'] == trial_balance['total_credit'] == 1000 + 11500
+        balances = {row['code']: row['balance'] for row in Ledger.get_account_balances()}
+        assert balances['1000'] == 157.5 - 11500
+        assert balances['1010'] == -1000
+        assert balances['6000'] == 1000 + 11500
+        conn = database.get_connection()
+        assert conn.execute("SELECT SUM(amount) FROM expenses").fetchone()[0] == balances['6000']
+        conn.close()
+        assert AccountingSystem.get_balance_sheet()['assets']['cash_bank'] == 157.5 - 11500 - 1000
+    finally:
+        ReportCache.clear()
+
+def test_recipe_cogs_follows_recipe_and_price_changes(temp_dir):
+    InventoryManager.add_ingredient('Paneer', 'kg', 10, 0, 400)
+    InventoryManager.add_ingredient('Butter', 'kg', 10, 0, 500)
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Paneer Thali', 150)
+    naan = add_menu_item(cursor, 'Plain Naan', 40)
+    bill = add_order(cursor, '2024-03-10 12:00:00', 380, 19, 0, [(thali, 2, 150), (naan, 2, 40)])
+    add_order(cursor, '2024-03-10 13:00:00', 150, 7.5, 0, [(thali, 1, 150)], status='cancelled')
+    cursor.execute("SELECT id FROM ingredients ORDER BY id")
+    paneer, butter = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+    conn.close()
+    
+    assert InventoryManager.set_recipe(thali, [
+        {'ingredient_id': paneer, 'quantity_required': 0.1},
+        {'ingredient_id': butter, 'quantity_required': 0.02},
+    ])[0]
+    costs = {row['name']: row for row in InventoryManager.get_menu_item_costs()}
+    assert costs['Paneer Thali']['recipe_cost'] == 50
+    assert costs['Paneer Thali']['margin'] == 100
+    assert costs['Plain Naan']['recipe_cost'] is None
+    assert AccountingSystem.get_recipe_cogs('2024-03-10', '2024-03-10') == 100
+    
+    # A price change re-costs every dish using the ingredient
+    assert InventoryManager.update_ingredient(paneer, 'Paneer', 'kg', 0, 450)[0]
+    assert AccountingSystem.get_recipe_cogs('2024-03-10', '2024-03-10') == 110
+    assert AccountingSystem.get_profit_loss('2024-03-10', '2024-03-10')['recipe_cogs'] == 110
+    
+    # Restarting keeps the maintained costs (backfill only fills an empty table)
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_database()
+    assert AccountingSystem.get_recipe_cogs('2024-03-10', '2024-03-10') == 110
+    
+    # A void takes the dishes' cost off on its own business date, like the revenue
+    today = database.get_business_date_string()
+    assert OrderCorrections.void_order(bill)[0]
+    assert AccountingSystem.get_recipe_cogs('2024-03-10', '2024-03-10') == 110
+    assert AccountingSystem.get_recipe_cogs(today, today) == -110
+    assert AccountingSystem.get_recipe_cogs('2024-03-10', today) == 0
+
+def test_closed_period_snapshots_and_lock(temp_dir):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Veg Thali', 150)
+    march = add_order(cursor, '2024-03-10 12:00:00', 300, 15, 30, [(thali, 2, 150)])
+    april = add_order(cursor, '2024-04-02 12:00:00', 150, 7.5, 0, [(thali, 1, 150)])
+    for order_id in (march, april):
+        SalesSummary._apply_order(cursor, order_id)
+    conn.commit()
+    conn.close()
+    assert AccountingSystem.add_expense('2024-03-05', 'Gas', 50, 'Cylinder')[0]
+    assert AccountingSystem.add_expense('2024-04-05', 'Rent', 500)[0]
+    
+    before = AccountingSystem.get_profit_loss('2024-03-01', '2024-04-30')
+    assert AccountingSystem.close_period('2024-03')[0]
+    assert not AccountingSystem.close_period('2024-03')[0]
+    assert not AccountingSystem.close_period('2024-02')[0]
+    assert not AccountingSystem.close_period('March')[0]
+    
+    # Reports spanning the closed month read its snapshot and agree with live data
+    assert AccountingSystem.get_profit_loss('2024-03-01', '2024-04-30') == before
+    totals = AccountingSystem.get_period_totals('2024-03-01', '2024-04-30')
+    assert totals['revenue'] == 345 + 157.5
+    assert totals['expenses_by_category'] == {'Gas': 50, 'Rent': 500}
+    assert AccountingSystem.get_tax_summary('2024-03-15', '2024-04-30')['gst_collected'] == 7.5
+    assert AccountingSystem.get_accounting_periods()[0]['revenue'] == 345
+    
+    # Late edits to the closed month are rejected by the database
+    assert not AccountingSystem.add_expense('2024-03-20', 'Gas', 10)[0]
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    for statement, params in [
+        ("DELETE FROM order_items WHERE order_id = ?", (march,)),
+        ("UPDATE orders SET final_amount = 0 WHERE id = ?", (march,)),
+        ("UPDATE orders SET business_date = '2024-03-31' WHERE id = ?", (april,)),
+    ]:
+        try:
+            cursor.execute(statement, params)
+            assert False, f"{statement} was allowed"
+        except sqlite3.DatabaseError as e:
+            assert 'closed' in str(e)
+    # The open month is unaffected
+    cursor.execute("UPDATE orders SET discount = 0 WHERE id = ?", (april,))
+    conn.commit()
+    conn.close()
+    
+    assert not AccountingSystem.reopen_period('2024-02')[0]
+    assert AccountingSystem.reopen_period('2024-03')[0]
+    assert AccountingSystem.add_expense('2024-03-20', 'Gas', 10)[0]
+    assert AccountingSystem.get_profit_loss('2024-03-01', '2024-03-31')['expenses'] == 60
+
+def test_gst_engine_rate_wise_summary_and_export(temp_dir):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Veg Thali', 150)
+    cola = add_menu_item(cursor, 'Cola', 40)
+    conn.commit()
+    conn.close()
+    assert GSTEngine.set_item_tax(cola, 18, '220210')[0]
+    assert not GSTEngine.set_item_tax(9999, 5)[0]
+    
+    cart = [{'item_id': thali, 'price': 150}, {'item_id': cola, 'price': 40}]
+    assert GSTEngine.apply_item_taxes(cart) == 7.5 + 7.2
+    assert (cart[1]['hsn_code'], cart[1]['cgst'], cart[1]['sgst']) == ('220210', 3.6, 3.6)
+    assert GSTEngine.apply_item_taxes([{'item_id': cola, 'price': 40}], gst_enabled=False) == 0
+    
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    for order_date in ('2024-03-10 12:00:00', '2024-03-11 12:00:00'):
+        order_id = add_order(cursor, order_date, 190, 14.7, 0, [])
+        for item in cart:
+            cursor.execute("""
+                INSERT INTO order_items (order_id, menu_item_id, quantity, price, total,
+                                         hsn_code, gst_rate, taxable_value, cgst, sgst)
+                VALUES (?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+            """, (order_id, item['item_id'], item['price'], item['price'], item['hsn_code'],
+                  item['gst_rate'], item['taxable_value'], item['cgst'], item['sgst']))
+    conn.commit()
+    conn.close()
+    
+    rates = [dict(row) for row in GSTEngine.get_rate_summary('2024-03-01', '2024-03-31')]
+    assert [(row['hsn_code'], row['gst_rate'], row['taxable_value'], row['total_tax']) for row in rates] == [
+        ('996331', 5, 300, 15), ('220210', 18, 80, 14.4)
+    ]
+    daily = GSTEngine.get_daily_summary('2024-03-11', '2024-03-11')
+    assert [(row['gst_rate'], row['invoice_count'], row['cgst']) for row in daily] == [(5, 1, 3.75), (18, 1, 3.6)]
+    summary = GSTEngine.get_return_summary('2024-03-01', '2024-03-31')
+    assert (summary['invoice_count'], summary['taxable_value'], summary['total_tax']) == (2, 380, 29.4)
+    
+    csv_path = os.path.join(temp_dir, 'gst.csv')
+    assert GSTEngine.export_return('2024-03-01', '2024-03-31', csv_path)[0]
+    with open(csv_path, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    assert lines[0].split(',') == GSTEngine.EXPORT_FIELDS
+    assert len(lines) == 5
+    
+    json_path = os.path.join(temp_dir, 'gst.json')
+    assert GSTEngine.export_return('2024-03-01', '2024-03-31', json_path, 'json')[0]
+    with open(json_path, encoding='utf-8') as f:
+        exported = json.load(f)
+    assert exported['summary']['total_tax'] == 29.4
+    assert [line['gst_rate'] for line in exported['lines']] == [5, 18, 5, 18]
+    assert not GSTEngine.export_return('2024-03-01', '2024-03-31', json_path, 'xml')[0]
+    
+    # A void is a credit note on its own business date against the original invoice
+    today = database.get_business_date_string()
+    assert OrderCorrections.void_order(order_id)[0]
+    summary = GSTEngine.get_return_summary('2024-03-01', today)
+    assert (summary['invoice_count'], summary['note_count'], summary['taxable_value'], summary['total_tax']) == (
+        1, 1, 190, 14.7
+    )
+    assert [(row['gst_rate'], row['line_count'], row['quantity']) for row in summary['rates']] == [(5, 1, 1), (18, 1, 1)]
+    daily = GSTEngine.get_daily_summary(today, today)
+    assert [(row['gst_rate'], row['invoice_count'], row['taxable_value'], row['cgst']) for row in daily] == [
+        (5, -1, -150, -3.75), (18, -1, -40, -3.6)
+    ]
+    assert GSTEngine.export_return('2024-03-01', today, json_path, 'json')[0]
+    with open(json_path, encoding='utf-8') as f:
+        notes = json.load(f)['lines'][4:]
+    assert [(line['invoice_no'], line['document_type'], line['quantity'], line['total_tax']) for line in notes] == [
+        (order_id, 'void', -1, -7.5), (order_id, 'void', -1, -7.2)
+    ]
+
+def test_dashboard_widgets_computed_in_parallel_read_only(temp_dir):
+    seed_sales_day()
+    streamed = []
+    widgets, errors = Analytics.get_dashboard_widgets(lambda name, data, elapsed_ms: streamed.append(name))
+    assert list(widgets) == list(DashboardEngine.WIDGETS)
+    assert errors == {}
+    assert sorted(streamed) == sorted(DashboardEngine.WIDGETS)
+    
+    widgets, timings, errors = DashboardEngine.compute(['today_summary', 'low_stock'])
+    assert errors == {}
+    assert set(timings) == {'today_summary', 'low_stock'}
+    
+    # Worker connections refuse writes
+    def write():
+        conn = database.get_connection()
+        conn.execute("DELETE FROM orders")
+    DashboardEngine.WIDGETS['write'] = (write, ())
+    try:
+        assert 'readonly' in DashboardEngine.compute(['write'])[2]['write']
+        # A failed widget is reported, not passed off as a widget with no data
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            widgets, errors = Analytics.get_dashboard_widgets()
+        assert widgets['write'] is None and 'readonly' in errors['write']
+        assert list(errors) == ['write'] and 'write' in output.getvalue()
+    finally:
+        del DashboardEngine.WIDGETS['write']
+    assert AccountingSystem.get_daily_sales_report('2024-03-10')['order_count'] == 3
+
+def test_report_cache_hits_and_write_invalidation(temp_dir):
+    try:
+        seed_sales_day()
+        ReportCache.clear()
+        first = AccountingSystem.get_profit_loss('2024-03-01', '2024-03-31')
+        assert AccountingSystem.get_profit_loss('2024-03-01', '2024-03-31') is first
+        assert ReportCache.get_stats()['hits'] == 1
+        
+        # Writes to a table the report reads drop it; unrelated writes do not
+        ReportCache.invalidate('attendance')
+        assert AccountingSystem.get_profit_loss('2024-03-01', '2024-03-31') is first
+        assert AccountingSystem.add_expense('2024-03-05', 'Gas', 50)[0]
+        assert AccountingSystem.get_profit_loss('2024-03-01', '2024-03-31')['expenses'] == 50
+        stats = ReportCache.get_stats()
+        assert (stats['hits'], stats['misses'], stats['invalidations']) == (2, 2, 1)
+        
+        # Expired entries are recomputed; the least recently used are evicted
+        ReportCache._entries[next(reversed(ReportCache._entries))] = (0, frozenset(), None)
+        assert AccountingSystem.get_profit_loss('2024-03-01', '2024-03-31')['expenses'] == 50
+        max_entries = ReportCache.MAX_ENTRIES
+        ReportCache.MAX_ENTRIES = 2
+        try:
+            for day in ('2024-03-10', '2024-03-11', '2024-03-12'):
+                AccountingSystem.get_daily_sales_report(day)
+            assert ReportCache.get_stats()['entries'] == 2
+            assert ReportCache.get_stats()['evictions'] == 2
+        finally:
+            ReportCache.MAX_ENTRIES = max_entries
+    finally:
+        ReportCache.clear()
+
+def test_sales_cube_slice_dice_roll_up(temp_dir):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Veg Thali', 150)
+    naan = add_menu_item(cursor, 'Butter Naan', 40)
+    orders = [
+        add_order(cursor, '2023-12-31 13:10:00', 190, 0, 0, [(thali, 1, 150), (naan, 1, 40)], payment_method='cash'),
+        add_order(cursor, '2024-03-10 13:30:00', 380, 0, 0, [(thali, 2, 150), (naan, 2, 40)], payment_method='upi'),
+        add_order(cursor, '2024-03-10 13:45:00', 40, 0, 0, [(naan, 1, 40)], payment_method='cash'),
+        add_order(cursor, '2024-03-10 20:00:00', 150, 0, 0, [(thali, 1, 150)], payment_method='card'),
+    ]
+    for order_id in orders:
+        SalesSummary._apply_order(cursor, order_id)
+    conn.commit()
+    conn.close()
+    
+    by_item = SalesCube.query(('item',), order_by='revenue')
+    assert [(row['name'], row['quantity'], row['revenue'], row['order_count']) for row in by_item] == [
+        ('Veg Thali', 4, 600, 3), ('Butter Naan', 4, 160, 3)
+    ]
+    
+    # Slice one day, dice two payment methods, roll up to hour and year
+    hours = SalesCube.query(('hour',), start_date='2024-03-10', end_date='2024-03-10', grain='orders')
+    assert [(row['hour'], row['order_count'], row['final_amount']) for row in hours] == [(13, 2, 420), (20, 1, 150)]
+    diced = SalesCube.query((), filters={'payment_method': ['cash', 'card']}, grain='orders')
+    assert diced == [{'order_count': 3, 'subtotal': 380, 'final_amount': 380}]
+    years = SalesCube.query(('year',), filters={'item': naan})
+    assert [(row['year'], row['quantity']) for row in years] == [('2023', 1), ('2024', 3)]
+    assert SalesCube.query((), start_date='2030-01-01', grain='orders')[0]['order_count'] == 0
+    for bad in [lambda: SalesCube.query(('item; DROP TABLE orders',)),
+                lambda: SalesCube.query(('item',), grain='orders')]:
+        try:
+            bad()
+            assert False, "invalid query accepted"
+        except ValueError:
+            pass
+    
+    hourly = Analytics.get_hourly_sales_trend('2024-03-10')
+    assert hourly == [{'hour': '13', 'order_count': 2, 'revenue': 420}, {'hour': '20', 'order_count': 1, 'revenue': 150}]
+    preferences = Analytics.get_customer_preferences()
+    assert preferences['food_preference'] == [{'food_type': 'veg', 'order_count': 6, 'total_quantity': 8}]
+    
+    # Voiding a bill takes it out of the cube
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    SalesSummary._apply_order(cursor, orders[3], sign=-1)
+    cursor.execute("DELETE FROM order_items WHERE order_id = ?", (orders[3],))
+    cursor.execute("DELETE FROM orders WHERE id = ?", (orders[3],))
+    conn.commit()
+    conn.close()
+    assert [row['hour'] for row in SalesCube.query(('hour',), start_date='2024-03-10', grain='orders')] == [13]
+    
+    # The cube is rebuilt from orders for databases that predate it
+    conn = database.get_connection()
+    conn.execute("DELETE FROM sales_cube")
+    conn.execute("DELETE FROM sales_cube_orders")
+    conn.commit()
+    conn.close()
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_database()
+    assert SalesCube.query((), grain='orders')[0]['order_count'] == 3
+    assert SalesCube.query((), filters={'item': thali})[0]['quantity'] == 3
+
+def test_columnar_sales_patterns(temp_dir):
+    pytest.importorskip('numpy')
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Veg Thali', 150)
+    naan = add_menu_item(cursor, 'Butter Naan', 40)
+    # 2024-03-11 is a Monday
+    add_order(cursor, '2024-03-11 13:30:00', 380, 0, 0, [(thali, 2, 150), (naan, 2, 40)])
+    add_order(cursor, '2024-03-11 20:00:00', 150, 0, 0, [(thali, 1, 150)])
+    add_order(cursor, '2024-03-12 13:10:00', 40, 0, 0, [(naan, 1, 40)])
+    add_order(cursor, '2024-03-12 14:00:00', 999, 0, 0, [(thali, 1, 150)], status='cancelled')
+    conn.commit()
+    conn.close()
+    
+    patterns = ColumnarAnalytics.analyze_period('2024-03-11', '2024-03-13', rolling_window=2)
+    assert (patterns['order_count'], patterns['revenue']) == (3, 570)
+    assert (patterns['hourly']['orders'][13], patterns['hourly']['revenue'][13]) == (2, 420)
+    matrix = patterns['weekday_hour_orders']
+    assert (matrix[0][13], matrix[0][20], matrix[1][13], sum(map(sum, matrix))) == (1, 1, 1, 3)
+    assert patterns['weekday_hour_revenue'][0][20] == 150
+    assert patterns['daily_revenue'] == {
+        'days': ['2024-03-11', '2024-03-12', '2024-03-13'],
+        'revenue': [530, 40, 0],
+        'rolling_average': [None, 285, 20]
+    }
+    assert patterns['basket_size']['counts'] == [0, 2, 0, 0, 1]
+    assert patterns['bill_percentiles'][50] == 150
+    
+    empty = ColumnarAnalytics.analyze_period('2025-01-01', '2025-01-02')
+    assert empty['order_count'] == 0 and empty['bill_percentiles'][90] == 0
+    assert Analytics.get_sales_patterns('2024-03-11', '2024-03-13')['revenue'] == 570
+
+def test_item_affinity_counts_pairs_incrementally(temp_dir):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Veg Thali', 150)
+    naan = add_menu_item(cursor, 'Butter Naan', 40)
+    lassi = add_menu_item(cursor, 'Lassi', 60)
+    dal = add_menu_item(cursor, 'Dal Fry', 120)
+    orders = [
+        add_order(cursor, '2024-03-11 12:00:00', 190, 0, 0, [(thali, 1, 150), (naan, 1, 40)]),
+        add_order(cursor, '2024-03-11 13:00:00', 310, 0, 0, [(thali, 1, 150), (thali, 1, 150), (naan, 1, 40), (lassi, 1, 60)]),
+        add_order(cursor, '2024-03-11 14:00:00', 120, 0, 0, [(dal, 1, 120)]),
+        add_order(cursor, '2024-03-11 20:00:00', 190, 0, 0, [(thali, 1, 150), (naan, 1, 40)]),
+        add_order(cursor, '2024-03-12 13:00:00', 210, 0, 0, [(thali, 1, 150), (lassi, 1, 60)]),
+        add_order(cursor, '2024-03-12 14:00:00', 100, 0, 0, [(naan, 1, 40), (lassi, 1, 60)]),
+    ]
+    add_order(cursor, '2024-03-12 15:00:00', 190, 0, 0, [(dal, 1, 120), (naan, 1, 40)], status='cancelled')
+    for order_id in orders:
+        SalesSummary._apply_order(cursor, order_id)
+    conn.commit()
+    
+    assert ItemAffinity.update('2024-03-12')[0]
+    pairs = {(row['item_a_name'], row['item_b_name']): row for row in ItemAffinity.get_affinities()}
+    assert {key: row['pair_count'] for key, row in pairs.items()} == {
+        ('Veg Thali', 'Butter Naan'): 3, ('Veg Thali', 'Lassi'): 2, ('Butter Naan', 'Lassi'): 2
+    }
+    thali_naan = pairs[('Veg Thali', 'Butter Naan')]
+    assert (thali_naan['support'], thali_naan['confidence_ab'], thali_naan['lift']) == (0.5, 0.75, 1.125)
+    top = ItemAffinity.get_top_affinities(thali)
+    assert [(row['rank'], row['partner']) for row in top] == [(1, 'Butter Naan'), (2, 'Lassi')]
+    
+    # Nothing changed: only the last day is recounted
+    assert ItemAffinity.update('2024-03-12')[1] == "Item affinities updated for 1 day(s)"
+    
+    # Voiding a bill on an earlier day recounts that day only
+    SalesSummary._apply_order(cursor, orders[3], sign=-1)
+    cursor.execute("DELETE FROM order_items WHERE order_id = ?", (orders[3],))
+    cursor.execute("DELETE FROM orders WHERE id = ?", (orders[3],))
+    conn.commit()
+    assert ItemAffinity.update('2024-03-12')[1] == "Item affinities updated for 2 day(s)"
+    cursor.execute("SELECT pair_count FROM item_pair_counts WHERE item_a = ? AND item_b = ?", (thali, naan))
+    assert cursor.fetchone()[0] == 2
+    cursor.execute("SELECT SUM(basket_count) FROM item_affinity_days")
+    assert cursor.fetchone()[0] == 5
+    assert ItemAffinity.get_top_affinities(thali)[0]['pair_count'] == 2
+    
+    # A void recorded later recounts the original day and leaves the bill out
+    conn.close()
+    assert OrderCorrections.void_order(orders[0])[0]
+    assert ItemAffinity.update('2024-03-12')[1] == "Item affinities updated for 2 day(s)"
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT pair_count FROM item_pair_counts WHERE item_a = ? AND item_b = ?", (thali, naan))
+    assert cursor.fetchone()[0] == 1
+    cursor.execute("SELECT order_count FROM item_affinity_days WHERE business_date = '2024-03-11'")
+    assert cursor.fetchone()[0] == 2
+    
+    # Sparse and plain Python counting agree
+    cursor.execute("SELECT order_id, menu_item_id FROM order_items")
+    baskets = [tuple(row) for row in cursor.fetchall()]
+    conn.close()
+    expected = ItemAffinity._count_pairs_python(baskets)
+    assert ItemAffinity.count_pairs(baskets) == expected
+    assert expected[0][thali] == 3 and expected[1][(thali, lassi)] == 2
+
+def test_prep_forecast_weekday_hour_baselines(temp_dir):
+    pytest.importorskip('numpy')
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Veg Thali', 150)
+    naan = add_menu_item(cursor, 'Butter Naan', 40)
+    # Four Mondays of lunch thalis, four Tuesdays of dinner naan
+    for day in (4, 11, 18, 25):
+        order_id = add_order(cursor, f'2024-03-{day:02d} 13:15:00', 300, 0, 0, [(thali, 2, 150)])
+        SalesSummary._apply_order(cursor, order_id)
+        order_id = add_order(cursor, f'2024-03-{day + 1:02d} 20:30:00', 40, 0, 0, [(naan, 1, 40)])
+        SalesSummary._apply_order(cursor, order_id)
+    conn.commit()
+    conn.close()
+    
+    assert PrepForecast.refresh('2024-04-01') == (True, "Prep forecast for 2024-04-01: 1 dishes")
+    sheet = PrepForecast.get_prep_sheet('2024-04-01')
+    assert sheet['generated_at']
+    assert [(dish['name'], dish['hourly'], dish['expected_quantity'], dish['prep_quantity'], dish['peak_hour'])
+            for dish in sheet['dishes']] == [('Veg Thali', {13: 2.0}, 2.0, 4, 13)]
+    
+    # No Wednesday history: the recency-weighted all-days pattern is used
+    assert PrepForecast.refresh('2024-04-03')[0]
+    dishes = {dish['name']: dish['hourly'] for dish in PrepForecast.get_prep_sheet('2024-04-03')['dishes']}
+    assert dishes == {'Veg Thali': {13: 1.0}, 'Butter Naan': {20: 0.5}}
+    
+    assert PrepForecast.get_prep_sheet('2024-04-02') == {'forecast_date': '2024-04-02', 'generated_at': None, 'dishes': []}
+
+def test_menu_engineering_classification(temp_dir):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Veg Thali', 150)
+    naan = add_menu_item(cursor, 'Butter Naan', 40)
+    lassi = add_menu_item(cursor, 'Lassi', 60)
+    dal = add_menu_item(cursor, 'Dal Fry', 120)
+    add_menu_item(cursor, 'Tomato Soup', 80)
+    cursor.executemany("""
+        INSERT INTO menu_item_cost (menu_item_id, recipe_cost, ingredient_count, updated_at)
+        VALUES (?, ?, 1, '2024-03-01')
+    """, [(thali, 60), (naan, 10), (lassi, 15)])
+    for day, extra in (('04', None), ('05', (lassi, 1, 60)), ('06', (dal, 1, 120))):
+        items = [(thali, 2, 150), (naan, 4, 40)] + ([extra] if extra else [])
+        total = sum(quantity * price for _, quantity, price in items)
+        SalesSummary._apply_order(cursor, add_order(cursor, f'2024-03-{day} 13:00:00', total, 0, 0, items))
+    conn.commit()
+    conn.close()
+    
+    assert MenuEngineering.get_report('2024-03')['run'] is None
+    assert MenuEngineering.refresh('2024-03') == (True, "Menu engineering for 2024-03: 5 dishes classified")
+    report = MenuEngineering.get_report('2024-03')
+    assert (report['run']['trading_days'], report['run']['total_revenue'], report['run']['average_margin']) == (3, 1560, 53.25)
+    assert [(item['name'], item['abc_class'], item['xyz_class'], item['menu_class']) for item in report['items']] == [
+        ('Veg Thali', 'A', 'X', 'star'),
+        ('Butter Naan', 'A', 'X', 'plowhorse'),
+        ('Dal Fry', 'B', 'Z', 'puzzle'),
+        ('Lassi', 'C', 'Z', 'dog'),
+        ('Tomato Soup', 'C', 'Z', 'puzzle'),
+    ]
+    lassi_row = report['items'][3]
+    assert (lassi_row['contribution_margin'], lassi_row['demand_cv'], lassi_row['total_margin']) == (45, 1.414, 45)
+    assert report['counts']['abc_class'] == {'A': 2, 'B': 1, 'C': 2}
+    
+    assert MenuEngineering.refresh('March')[0] is False
+
+def test_monthly_revenue_trend_splits_tenders_and_fills_months(temp_dir):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Veg Thali', 150)
+    SalesSummary._apply_order(cursor, add_order(cursor, '2024-01-31 21:00:00', 150, 0, 0, [(thali, 1, 150)], payment_method='card'))
+    SalesSummary._apply_order(cursor, add_order(cursor, '2024-01-05 13:00:00', 150, 0, 0, [(thali, 1, 150)], payment_method='cash'))
+    split = add_order(cursor, '2024-03-10 12:00:00', 300, 0, 0, [(thali, 2, 150)], payment_method='split')
+    AccountingSystem._record_order_payments(cursor, split, '2024-03-10', [('cash', 100), ('upi', 200)])
+    SalesSummary._apply_order(cursor, split)
+    conn.commit()
+    conn.close()
+    
+    trend = Analytics.get_monthly_revenue_trend(start_month='2023-12', end_month='2024-03')
+    assert [(month['month'], month['total_orders'], month['revenue']) for month in trend] == [
+        ('2023-12', 0, 0), ('2024-01', 2, 300), ('2024-02', 0, 0), ('2024-03', 1, 300)
+    ]
+    assert (trend[1]['cash_revenue'], trend[1]['card_revenue']) == (150, 150)
+    assert (trend[3]['cash_revenue'], trend[3]['upi_revenue'], trend[3]['card_revenue']) == (100, 200, 0)
+    assert 'split_revenue' not in trend[3]
+    
+    assert [month['month'] for month in Analytics.get_monthly_revenue_trend(3, end_month='2024-01')] == \
+        ['2023-11', '2023-12', '2024-01']
+    assert Analytics.get_monthly_revenue_trend(start_month='2024-05', end_month='2024-04') == []
+
+def test_sales_report_keyset_pages(temp_dir):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Veg Thali', 150)
+    for hour in (12, 12, 13, 14, 20, 20, 21):
+        add_order(cursor, f'2024-03-10 {hour}:00:00', 150, 0, 0, [(thali, 1, 150)])
+    # Past midnight: the 00:30 bill on the 12th belongs to business date the 11th,
+    # the 00:30 bill on the 10th to the 9th
+    late = add_order(cursor, '2024-03-12 00:30:00', 150, 0, 0, [(thali, 1, 150), (thali, 1, 150)])
+    early = add_order(cursor, '2024-03-10 00:30:00', 150, 0, 0, [(thali, 1, 150)])
+    cursor.execute("UPDATE orders SET business_date = '2024-03-11' WHERE id = ?", (late,))
+    cursor.execute("UPDATE orders SET business_date = '2024-03-09' WHERE id = ?", (early,))
+    add_order(cursor, '2024-03-10 15:00:00', 150, 0, 0, [(thali, 1, 150)], status='cancelled')
+    conn.commit()
+    conn.close()
+    
+    streamed = [order['order_id'] for order in AccountingSystem.iter_sales_report('2024-03-10', '2024-03-11', batch_size=2)]
+    assert len(streamed) == 8 and streamed[0] == late and early not in streamed
+    
+    paged, after, pages = [], None, 0
+    while True:
+        orders, after = AccountingSystem.get_sales_report_page('2024-03-10', '2024-03-11', after, page_size=3)
+        paged.extend(order['order_id'] for order in orders)
+        pages += 1
+        if after is None:
+            break
+    assert paged == streamed and pages == 3
+    
+    first_page, _ = AccountingSystem.get_sales_report_page('2024-03-10', '2024-03-11', page_size=3)
+    assert first_page[0]['item_count'] == 2
+    assert AccountingSystem.get_sales_report_page('2024-03-12', '2024-03-12') == ([], None)
+
+def test_bill_browser_filters_pages_and_selections(temp_dir):
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Veg Thali', 150)
+    bills = [add_order(cursor, f'2024-03-{day:02d} 13:00:00', 100 * day, 0, 0, [(thali, 1, 150)])
+             for day in range(1, 8)]
+    cursor.execute("UPDATE orders SET table_number = NULL WHERE id IN (?, ?)", (bills[1], bills[4]))
+    cursor.execute("UPDATE orders SET status = 'cancelled' WHERE id = ?", (bills[6],))
+    conn.commit()
+    conn.close()
+    
+    paged, before_id = [], None
+    while True:
+        page, before_id = BillManager.get_bills_page(before_id=before_id, page_size=3)
+        paged.extend(bill['id'] for bill in page)
+        if before_id is None:
+            break
+    assert paged == bills[::-1]
+    
+    takeaway, _ = BillManager.get_bills_page({'table_number': 'Takeaway'})
+    assert [bill['id'] for bill in takeaway] == [bills[4], bills[1]]
+    
+    filters = {'start_date': '2024-03-02', 'end_date': '2024-03-07', 'min_amount': 300, 'status': 'completed'}
+    assert BillManager.get_filter_totals(filters) == {'bill_count': 4, 'total_amount': 1800}
+    assert BillManager.get_filter_totals({'max_amount': 250}) == {'bill_count': 2, 'total_amount': 300}
+    
+    # A filter selection is resolved in chunks, leaving out the unticked bills
+    selection = {'filters': filters, 'exclude': [bills[3]]}
+    chunks = list(BillManager.iter_selection(selection, chunk_size=2))
+    assert chunks == [[bills[2]], [bills[4], bills[5]]]
+    assert BillManager.count_selection(selection) == 3
+    
+    picked = {'ids': [bills[5], bills[0], bills[5], bills[2]]}
+    assert list(BillManager.iter_selection(picked, chunk_size=2)) == [[bills[0], bills[2]], [bills[5]]]
+    assert BillManager.count_selection(picked) == 3
+
+def test_bulk_bill_delete_reverses_summaries_ledger_and_stock(temp_dir):
+    InventoryManager.add_ingredient('Paneer', 'kg', 10, 0, 400)
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Paneer Thali', 150)
+    cursor.execute("SELECT id FROM ingredients")
+    paneer = cursor.fetchone()[0]
+    conn.commit()
+    conn.close()
+    assert InventoryManager.set_recipe(thali, [{'ingredient_id': paneer, 'quantity_required': 0.5}])[0]
+    
+    bills = []
+    for day in (1, 2, 3, 4, 5):
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        order_date = f"2024-{'02' if day == 1 else '03'}-{day:02d} 13:00:00"
+        bill = add_order(cursor, order_date, 150, 0, 0, [(thali, 1, 150)])
+        SalesSummary._apply_order(cursor, bill)
+        conn.commit()
+        conn.close()
+        assert AccountingSystem.record_order_transaction(bill, 150, 'cash')
+        assert InventoryManager.deduct_order_stock([{'item_id': thali, 'quantity': 1, 'plate_type': 'full'}], bill)[0]
+        bills.append(bill)
+    assert AccountingSystem.close_period('2024-02')[0]
+    
+    progress = []
+    success, result = BillManager.delete_bills(
+        {'ids': bills[:4]}, progress=lambda done, total: progress.append((done, total)), chunk_size=2
+    )
+    assert success, result
+    # The February bill is in a closed period and stays
+    assert (result['deleted'], result['locked'], result['total_amount']) == (3, 1, 450)
+    assert progress == [(2, 4), (4, 4)]
+    
+    assert SalesSummary.get_totals('2024-03-01', '2024-03-31')['order_count'] == 1
+    assert SalesSummary.get_totals('2024-02-01', '2024-02-29')['order_count'] == 1
+    assert Ledger.get_trial_balance()['balanced']
+    balances = {row['code']: row['balance'] for row in Ledger.get_account_balances()}
+    assert balances['1000'] == 300 and balances['4000'] == 300
+    
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT current_stock FROM ingredients WHERE id = ?", (paneer,))
+    assert abs(cursor.fetchone()[0] - 9) < 1e-9
+    cursor.execute("SELECT SUM(remaining_quantity) FROM stock_lots WHERE ingredient_id = ?", (paneer,))
+    assert abs(cursor.fetchone()[0] - 9) < 1e-9
+    cursor.execute("SELECT SUM(CASE type WHEN 'credit' THEN amount ELSE -amount END) FROM transactions")
+    assert cursor.fetchone()[0] == 300
+    cursor.execute("SELECT COUNT(*) FROM orders")
+    assert cursor.fetchone()[0] == 2
+    conn.close()
+    # Stock was drawn today too; the deleted bills' share leaves today's COGS
+    today = database.get_business_date_string()
+    assert abs(InventoryManager.get_consumption_cost(today, today) - 2 * 200) < 1e-6
+    
+    assert AccountingSystem.reopen_period('2024-02')[0]
+    success, result = BillManager.delete_bills({'filters': {}, 'exclude': []})
+    assert success and result['deleted'] == 2
+    assert Ledger.get_trial_balance()['balanced']
+    # Bill numbers are never reused once the table empties
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    assert add_order(cursor, '2024-03-06 13:00:00', 150, 0, 0, [(thali, 1, 150)]) > bills[-1]
+    conn.close()
+
+def test_void_refund_and_amendment_corrections(temp_dir):
+    InventoryManager.add_ingredient('Paneer', 'kg', 10, 0, 400)
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    thali = add_menu_item(cursor, 'Paneer Thali', 150)
+    cursor.execute("SELECT id FROM ingredients")
+    paneer = cursor.fetchone()[0]
+    conn.commit()
+    conn.close()
+    assert InventoryManager.set_recipe(thali, [{'ingredient_id': paneer, 'quantity_required': 0.5}])[0]
+    
+    today = database.get_business_date_string()
+    bills = []
+    for order_date, method in (('2024-03-10 12:00:00', 'cash'), ('2024-03-10 13:00:00', 'upi'),
+                               (f'{today} 13:00:00', 'card')):
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        bill = add_order(cursor, order_date, 200, 10, 20, [(thali, 1, 150)], payment_method=method)
+        SalesSummary._apply_order(cursor, bill)
+        conn.commit()
+        conn.close()
+        assert AccountingSystem.record_order_transaction(bill, 230, method)
+        assert InventoryManager.deduct_order_stock([{'item_id': thali, 'quantity': 1, 'plate_type': 'full'}], bill)[0]
+        bills.append(bill)
+    assert AccountingSystem.close_period('2024-03')[0]
+    march_before = SalesSummary.get_totals('2024-03-01', '2024-03-31')
+    
+    # Corrections of a bill in a closed month land on today's figures
+    assert OrderCorrections.void_order(bills[0], 'Wrong table')[0]
+    assert not OrderCorrections.void_order(bills[0])[0]
+    assert not OrderCorrections.refund_order(bills[0], 10)[0]
+    assert not OrderCorrections.refund_order(bills[1], 500)[0]
+    assert OrderCorrections.refund_order(bills[1], 46, reason='Cold food')[0]
+    assert not OrderCorrections.amend_order(bills[2])[0]
+    assert OrderCorrections.amend_order(bills[2], discount=30, reason='Loyalty')[0]
+    
+    assert SalesSummary.get_totals('2024-03-01', '2024-03-31') == march_before
+    march_items = SalesCube.query(('item',), start_date='2024-03-01', end_date='2024-03-31')
+    assert [(row['order_count'], row['quantity']) for row in march_items] == [(1, 1)]
+    assert abs(march_items[0]['revenue'] - 150 * (1 - 40 / 200)) < 1e-6
+    totals = SalesSummary.get_totals(today, today)
+    assert totals['order_count'] == 1 - 1
+    assert abs(totals['final_amount'] - (230 - 230 - 46 - 30)) < 1e-6
+    assert abs(totals['gst_amount'] - (10 - 10 - 2)) < 1e-6
+    assert abs(totals['service_charge'] - (20 - 20 - 4)) < 1e-6
+    payments = SalesSummary.get_payment_totals(today, today)
+    assert payments == {'cash': -230, 'card': 200, 'upi': -46}
+    
+    refund = OrderCorrections.get_order_corrections(bills[1])
+    assert [(c['correction_type'], c['final_amount'], c['payments']) for c in refund] == [('refund', -46, {'upi': -46})]
+    net = OrderCorrections.get_net_order(bills[1])
+    assert net['final_amount'] == 184 and net['tenders'] == {'upi': 184} and not net['voided']
+    
+    # Ledger, cash book and stock follow the corrections
+    assert Ledger.get_trial_balance()['balanced']
+    balances = {row['code']: row['balance'] for row in Ledger.get_account_balances()}
+    assert abs(balances['2000'] - (30 - 10 - 2)) < 1e-6
+    assert abs(balances['4000'] - (3 * 200 - 200 - 40 - 30)) < 1e-6
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT SUM(CASE type WHEN 'credit' THEN amount ELSE -amount END) FROM transactions")
+    assert abs(cursor.fetchone()[0] - (3 * 230 - 230 - 46 - 30)) < 1e-6
+    cursor.execute("SELECT current_stock FROM ingredients WHERE id = ?", (paneer,))
+    assert abs(cursor.fetchone()[0] - 9) < 1e-9
+    cursor.execute("SELECT COUNT(*) FROM orders")
+    assert cursor.fetchone()[0] == 3
+    conn.close()
+    
+    page, _ = BillManager.get_bills_page({'status': 'voided'})
+    assert [bill['id'] for bill in page] == [bills[0]] and page[0]['voided']
+    success, result = BillManager.void_bills({'ids': bills}, 'End of day', chunk_size=2)
+    assert success and (result['voided'], result['skipped']) == (2, 1)
+    assert abs(result['total_amount'] - (184 + 200)) < 1e-6
+    assert SalesSummary.get_totals(today, today)['final_amount'] == 230 - 3 * 230
+    
+    # Deleting the open-month bill takes its corrections with it
+    success, result = BillManager.delete_bills({'ids': bills})
+    assert success and (result['deleted'], result['locked']) == (1, 2)
+    assert SalesSummary.get_totals(today, today)['final_amount'] == -2 * 230
+    assert SalesCube.query(('item',), start_date=today, end_date=today) == []
+    assert Ledger.get_trial_balance()['balanced']
+
+def test_cron_schedule_next_and_previous_slots():
+    nightly = CronSchedule('30 2 * * *')
+    assert nightly.next_after(datetime(2024, 3, 10, 2, 30)) == datetime(2024, 3, 11, 2, 30)
+    assert nightly.next_after(datetime(2024, 3, 10, 2, 29, 59)) == datetime(2024, 3, 10, 2, 30)
+    assert nightly.previous(datetime(2024, 3, 10, 2, 29)) == datetime(2024, 3, 9, 2, 30)
+    assert nightly.previous(datetime(2024, 3, 10, 2, 30)) == datetime(2024, 3, 10, 2, 30)
+    
+    # 2024-03-09 is a Saturday
+    weekdays = CronSchedule('0 9 * * 1-5')
+    assert weekdays.next_after(datetime(2024, 3, 9, 8, 0)) == datetime(2024, 3, 11, 9, 0)
+    assert weekdays.previous(datetime(2024, 3, 10, 23, 0)) == datetime(2024, 3, 8, 9, 0)
+    quarter_hours = CronSchedule('*/15 10-11 * * *')
+    assert quarter_hours.next_after(datetime(2024, 3, 10, 10, 50)) == datetime(2024, 3, 10, 11, 0)
+    assert quarter_hours.next_after(datetime(2024, 3, 10, 11, 45)) == datetime(2024, 3, 11, 10, 0)
+    # Restricted day of month and day of week match on either, Sunday as 0 or 7
+    assert CronSchedule('0 0 1 * 7').next_after(datetime(2024, 3, 2)) == datetime(2024, 3, 3)
+    assert CronSchedule('0 0 1 * 0').next_after(datetime(2024, 3, 31)) == datetime(2024, 4, 1)
+    assert CronSchedule('0 12 29 2 *').next_after(datetime(2024, 3, 1)) == datetime(2028, 2, 29, 12, 0)
+    assert CronSchedule('0 0 31 2 *').next_after(datetime(2024, 3, 1)) is None
+    for expression in ('0 2 * *', '60 * * * *', '0 5-3 * * *', '*/0 * * * *'):
+        try:
+            CronSchedule(expression)
+            assert False, expression
+        except ValueError:
+            pass
+
+def test_job_scheduler_runs_catch_up_and_concurrency(temp_dir):
+    jobs, max_jobs, backup_dir = JobScheduler.JOBS, JobScheduler.MAX_CONCURRENT_JOBS, BackupManager.BACKUP_DIR
+    release = threading.Event()
+    
+    def broken():
+        raise RuntimeError('disk full')
+    
+    try:
+        JobScheduler.JOBS = {
+            'slow': {'function': lambda: release.wait(10) and (True, 'slow done'), 'schedule': '0 1 * * *'},
+            'broken': {'function': broken, 'schedule': '0 1 * * *'},
+            'nightly': {'function': lambda: {'tasks': [{'task': 'forecast', 'status': 'completed'}]},
+                        'schedule': '0 2 * * *', 'idle_only': True}
+        }
+        JobScheduler.MAX_CONCURRENT_JOBS = 1
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        add_order(cursor, '2024-03-10 02:50:00', 100, 5, 0, [])
+        conn.commit()
+        conn.close()
+        
+        # One job at a time; the idle-only job waits out the late bill
+        assert JobScheduler.run_pending(datetime(2024, 3, 10, 3, 0)) == ['slow']
+        assert not JobScheduler.run_job('slow')[0]
+        assert not JobScheduler.run_job('broken')[0]
+        release.set()
+        assert JobScheduler.wait_for_jobs(10)
+        assert JobScheduler.run_pending(datetime(2024, 3, 10, 3, 0)) == ['broken']
+        assert JobScheduler.wait_for_jobs(10)
+        assert JobScheduler.run_pending(datetime(2024, 3, 10, 3, 5)) == []
+        assert JobScheduler.run_pending(datetime(2024, 3, 10, 3, 30)) == ['nightly']
+        assert JobScheduler.wait_for_jobs(10)
+        assert JobScheduler.run_pending(datetime(2024, 3, 10, 23, 0)) == []
+        
+        runs = {run['job_name']: run for run in JobScheduler.get_job_runs()}
+        assert (runs['slow']['status'], runs['slow']['message']) == ('completed', 'slow done')
+        assert runs['slow']['duration_seconds'] >= 0 and runs['slow']['finished_at']
+        assert runs['broken']['status'] == 'failed' and 'disk full' in runs['broken']['message']
+        assert (runs['nightly']['status'], runs['nightly']['message']) == ('completed', 'forecast: completed')
+        assert runs['nightly']['scheduled_for'] == '2024-03-10 02:00:00'
+        
+        # Three nights missed while closed collapse into one catch-up run each
+        JobScheduler.MAX_CONCURRENT_JOBS = 3
+        assert sorted(JobScheduler.run_pending(datetime(2024, 3, 13, 11, 0))) == ['broken', 'nightly', 'slow']
+        assert JobScheduler.wait_for_jobs(10)
+        nightly = JobScheduler.get_job_runs('nightly')
+        assert [run['scheduled_for'] for run in nightly] == ['2024-03-13 02:00:00', '2024-03-10 02:00:00']
+        status = {job['name']: job for job in JobScheduler.get_job_status(datetime(2024, 3, 13, 11, 0))}
+        assert status['nightly']['next_run'] == '2024-03-14 02:00' and not status['nightly']['running']
+        assert status['broken']['status'] == 'failed'
+        
+        # A failed slot is retried RETRY_MINUTES after each attempt, up to MAX_ATTEMPTS runs
+        for attempt in range(2, JobScheduler.MAX_ATTEMPTS + 2):
+            conn = database.get_connection()
+            conn.execute("UPDATE job_runs SET started_at = '2024-03-13 10:30:00' WHERE job_name = 'broken'")
+            conn.commit()
+            conn.close()
+            assert JobScheduler.run_pending(datetime(2024, 3, 13, 10, 40)) == []
+            expected = ['broken'] if attempt <= JobScheduler.MAX_ATTEMPTS else []
+            assert JobScheduler.run_pending(datetime(2024, 3, 13, 11, 0)) == expected
+            assert JobScheduler.wait_for_jobs(10)
+        assert [run['status'] for run in JobScheduler.get_job_runs('broken')] == ['failed'] * 4
+        
+        # Backups are snapshots of the committed state, taken once a day
+        BackupManager.BACKUP_DIR = os.path.join(temp_dir, 'backups')
+        success, backup_file = AutoBackupScheduler.run_auto_backup()
+        assert success
+        assert not AutoBackupScheduler.run_auto_backup()[0]
+        backup = sqlite3.connect(os.path.join(BackupManager.BACKUP_DIR, backup_file))
+        assert backup.execute("SELECT COUNT(*) FROM job_runs").fetchone()[0] == 8
+        backup.close()
+    finally:
+        release.set()
+        JobScheduler.wait_for_jobs(10)
+        JobScheduler.JOBS, JobScheduler.MAX_CONCURRENT_JOBS = jobs, max_jobs
+        BackupManager.BACKUP_DIR = backup_dir
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))
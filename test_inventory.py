@@ -0,0 +1,337 @@
+"""
+Inventory Concurrency Tests
+Stock deduction under several billing terminals at once
+"""
+
+import os
+import sys
+import contextlib
+import io
+import multiprocessing
+import pytest
+from datetime import date, datetime, timedelta
+import database
+from inventory_manager import InventoryManager
+from accounting import AccountingSystem
+import stock_forecast
+from stock_forecast import StockForecast
+from automation import Automation
+
+TERMINALS = 6
+BILLS_PER_TERMINAL = 25
+
+@pytest.fixture
+def temp_dir(tmp_path, monkeypatch):
+    """Point the app at a fresh database in a temporary directory (restored after the test)"""
+    monkeypatch.setattr(database, 'DATABASE_NAME', str(tmp_path / 'test_inventory.db'))
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_database()
+    return str(tmp_path)
+
+def create_stocked_item(stock):
+    """Create one menu item whose recipe uses 1 unit of a single ingredient"""
+    InventoryManager.add_ingredient('Paneer', 'kg', stock, 0, 100)
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM ingredients WHERE name = 'Paneer'")
+    ingredient_id = cursor.fetchone()[0]
+    cursor.execute("""
+        INSERT INTO menu_items (name, price_single, price_full, category, food_type, plate_type)
+        VALUES ('Paneer Tikka', 200, 200, 'Starters', 'veg', 'full')
+    """)
+    menu_item_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    InventoryManager.set_recipe(menu_item_id, [{'ingredient_id': ingredient_id, 'quantity_required': 1}])
+    return ingredient_id, menu_item_id
+
+def get_stock(ingredient_id):
+    """Current stock of an ingredient"""
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT current_stock FROM ingredients WHERE id = ?", (ingredient_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return row[0]
+
+def get_rollup(ingredient_id):
+    """stock_daily_rollup rows of an ingredient keyed by (day, type, reason code)"""
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT day, transaction_type, reason_code, quantity, value, txn_count
+        FROM stock_daily_rollup WHERE ingredient_id = ?
+    """, (ingredient_id,))
+    rollup = {tuple(row[:3]): tuple(row[3:]) for row in cursor.fetchall()}
+    conn.close()
+    return rollup
+
+def terminal_worker(db_path, menu_item_id, bills, results):
+    """One billing terminal: bill one dish per order and count the stock it got"""
+    database.DATABASE_NAME = db_path
+    sold = 0
+    for _ in range(bills):
+        success, summary = InventoryManager.deduct_order_stock(
+            [{'item_id': menu_item_id, 'quantity': 1, 'plate_type': 'full'}]
+        )
+        if success:
+            sold += sum(line['quantity'] for line in summary if line['status'] == 'deducted')
+    results.put(sold)
+
+def test_remove_stock_rejects_oversell(temp_dir):
+    ingredient_id, _ = create_stocked_item(5)
+    assert InventoryManager.remove_stock(ingredient_id, 3, 'Wastage')[0]
+    assert not InventoryManager.remove_stock(ingredient_id, 3, 'Wastage')[0]
+    assert get_stock(ingredient_id) == 2
+
+def test_order_deduction_reports_short_ingredients(temp_dir):
+    ingredient_id, menu_item_id = create_stocked_item(5)
+    InventoryManager.add_ingredient('Butter', 'kg', 1, 0, 50)
+    conn = database.get_connection()
+    butter_id = conn.execute("SELECT id FROM ingredients WHERE name = 'Butter'").fetchone()[0]
+    conn.close()
+    InventoryManager.set_recipe(menu_item_id, [{'ingredient_id': ingredient_id, 'quantity_required': 1},
+                                               {'ingredient_id': butter_id, 'quantity_required': 1}])
+    
+    # Butter runs short: it is reported and left untouched, paneer still leaves stock
+    success, summary = InventoryManager.deduct_order_stock([{'item_id': menu_item_id, 'quantity': 2,
+                                                             'plate_type': 'full'}], order_id=1)
+    assert success
+    assert {line['ingredient']: line['status'] for line in summary} == {'Paneer': 'deducted', 'Butter': 'insufficient'}
+    assert (get_stock(ingredient_id), get_stock(butter_id)) == (3, 1)
+    assert InventoryManager.check_stock_availability(butter_id, 1)
+    assert not InventoryManager.check_stock_availability(butter_id, 2)
+
+def test_concurrent_terminals_never_oversell(temp_dir):
+    stock = TERMINALS * BILLS_PER_TERMINAL // 2
+    ingredient_id, menu_item_id = create_stocked_item(stock)
+    
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(
+            target=terminal_worker,
+            args=(database.DATABASE_NAME, menu_item_id, BILLS_PER_TERMINAL, results)
+        )
+        for _ in range(TERMINALS)
+    ]
+    for worker in workers:
+        worker.start()
+    sold = sum(results.get(timeout=120) for _ in workers)
+    for worker in workers:
+        worker.join()
+    
+    assert sold == stock
+    assert get_stock(ingredient_id) == 0
+    
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT COALESCE(SUM(quantity), 0) FROM stock_transactions
+        WHERE ingredient_id = ? AND transaction_type = 'out'
+    """, (ingredient_id,))
+    assert cursor.fetchone()[0] == stock
+    cursor.execute("SELECT COALESCE(SUM(remaining_quantity), 0) FROM stock_lots WHERE ingredient_id = ?",
+                   (ingredient_id,))
+    assert cursor.fetchone()[0] == 0
+    conn.close()
+
+def test_fifo_lots_draw_oldest_first_and_cost_cogs(temp_dir):
+    ingredient_id, menu_item_id = create_stocked_item(10)
+    assert InventoryManager.add_stock(ingredient_id, 10, 'Purchase', unit_price=150)[0]
+    
+    # A bill of 12 takes the 10 opening units at 100 before 2 of the newer lot at 150
+    assert InventoryManager.deduct_order_stock([{'item_id': menu_item_id, 'quantity': 12, 'plate_type': 'full'}],
+                                               order_id=1)[0]
+    lots = InventoryManager.get_stock_lots(ingredient_id, open_only=False)
+    assert [(lot['unit_price'], lot['remaining_quantity']) for lot in lots] == [(100, 0), (150, 8)]
+    assert AccountingSystem.get_inventory_valuation() == 8 * 150
+    
+    today = date.today()
+    assert InventoryManager.get_consumption_cost(today, today) == 10 * 100 + 2 * 150
+    assert InventoryManager.remove_stock(ingredient_id, 1, 'Wastage')[0]
+    assert InventoryManager.get_consumption_cost(today, today) == 10 * 100 + 2 * 150
+    assert InventoryManager.get_consumption_cost(today, today, orders_only=False) == 10 * 100 + 3 * 150
+    assert AccountingSystem.get_inventory_valuation() == 7 * 150
+    
+    # Stock held before lot tracking becomes an opening lot drawn ahead of newer purchases
+    conn = database.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO ingredients (name, unit, current_stock, min_stock, cost_per_unit)
+        VALUES ('Ghee', 'kg', 5, 0, 40)
+    """)
+    ghee_id = cursor.lastrowid
+    cursor.execute("""
+        INSERT INTO stock_transactions (ingredient_id, transaction_type, quantity, reason, timestamp)
+        VALUES (?, 'in', 5, 'Initial stock', '2024-01-01 09:00:00')
+    """, (ghee_id,))
+    conn.commit()
+    conn.close()
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_database()
+    assert InventoryManager.add_stock(ghee_id, 5, 'Purchase', unit_price=60)[0]
+    lots = InventoryManager.get_stock_lots(ghee_id)
+    assert [(lot['received_date'], lot['unit_price']) for lot in lots][0] == ('2024-01-01 09:00:00', 40)
+    assert InventoryManager.remove_stock(ghee_id, 6, 'Wastage')[0]
+    assert InventoryManager.get_consumption_cost(today, today, orders_only=False) == 1450 + 5 * 40 + 60
+    assert [lot['remaining_quantity'] for lot in InventoryManager.get_stock_lots(ghee_id)] == [4]
+
+def test_stock_take_posts_variances_and_rolls_back_bad_sheet(temp_dir):
+    paneer_id, _ = create_stocked_item(10)
+    assert InventoryManager.add_stock(paneer_id, 5, 'Purchase', unit_price=150)[0]
+    assert InventoryManager.add_ingredient('Butter', 'kg', 2, 0, 50)[0]
+    
+    sheet = os.path.join(temp_dir, 'count.csv')
+    with open(sheet, 'w', encoding='utf-8') as f:
+        f.write("ingredient_id,name,unit,system_quantity,counted_quantity\n")
+        f.write(f"{paneer_id},Paneer,kg,15,12\n")
+        f.write(",butter,kg,2,3\n")
+        f.write(",Saffron,grams,0,1\n")
+        f.write(",Salt,kg,0,\n")
+    success, report = InventoryManager.import_stock_take_csv(sheet)
+    assert success
+    assert [(line['name'], line['variance'], line['variance_value']) for line in report['lines']] == [
+        ('Paneer', -3, -300), ('Butter', 1, 50)
+    ]
+    assert report['total_variance_value'] == -250
+    assert [count['name'] for count in report['unmatched']] == ['Saffron']
+    
+    # Missing stock comes out of the oldest lot, found stock opens a lot at cost
+    assert get_stock(paneer_id) == 12
+    lots = InventoryManager.get_stock_lots(paneer_id)
+    assert [(lot['unit_price'], lot['remaining_quantity']) for lot in lots] == [(100, 7), (150, 5)]
+    butter_id = report['lines'][1]['ingredient_id']
+    assert [lot['remaining_quantity'] for lot in InventoryManager.get_stock_lots(butter_id)] == [2, 1]
+    saved = InventoryManager.get_stock_take_report(report['stock_take_id'])
+    assert saved['stock_take']['line_count'] == 2
+    assert [(line['name'], line['counted_quantity']) for line in saved['lines']] == [('Paneer', 12), ('Butter', 3)]
+    
+    # A bad row fails the whole sheet
+    with open(sheet, 'w', encoding='utf-8') as f:
+        f.write("ingredient_id,counted_quantity\n")
+        f.write(f"{paneer_id},0\n")
+        f.write(f"{butter_id},three\n")
+    assert not InventoryManager.import_stock_take_csv(sheet)[0]
+    assert get_stock(paneer_id) == 12
+    assert [lot['remaining_quantity'] for lot in InventoryManager.get_stock_lots(paneer_id)] == [7, 5]
+    conn = database.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM stock_takes").fetchone()[0] == 1
+    conn.close()
+
+def test_stock_reason_codes_and_daily_rollup(temp_dir):
+    assert [InventoryManager.classify_stock_reason(reason) for reason in (
+        'Wastage', 'Spoiled milk', 'expired', 'PO #PO-7 received', 'Local purchase', 'Stock take #3',
+        'Order #12', 'Initial stock', 'Opening balance', 'Correction', None
+    )] == ['waste', 'waste', 'waste', 'purchase', 'purchase', 'stock_take',
+           'order', 'opening', 'opening', 'adjustment', 'adjustment']
+    
+    ingredient_id, menu_item_id = create_stocked_item(10)
+    assert InventoryManager.add_stock(ingredient_id, 5, 'PO #PO-7 received', unit_price=150)[0]
+    assert InventoryManager.remove_stock(ingredient_id, 2, 'Spoiled')[0]
+    assert InventoryManager.remove_stock(ingredient_id, 1, 'Wastage')[0]
+    assert InventoryManager.deduct_order_stock([{'item_id': menu_item_id, 'quantity': 8, 'plate_type': 'full'}],
+                                               order_id=1)[0]
+    
+    # One row per day, direction and reason; out values are FIFO costs
+    today = date.today().isoformat()
+    assert get_rollup(ingredient_id) == {
+        (today, 'in', 'opening'): (10, 1000, 1),
+        (today, 'in', 'purchase'): (5, 750, 1),
+        (today, 'out', 'waste'): (3, 300, 2),
+        (today, 'out', 'order'): (8, 7 * 100 + 150, 1)
+    }
+    
+    # Rows written before reason codes are classified and the rollup rebuilt on startup
+    conn = database.get_connection()
+    conn.execute("""
+        INSERT INTO stock_transactions (ingredient_id, transaction_type, quantity, reason, timestamp)
+        VALUES (?, 'out', 4, 'Expired stock', '2024-02-01 22:00:00')
+    """, (ingredient_id,))
+    conn.execute("DELETE FROM stock_daily_rollup")
+    conn.commit()
+    conn.close()
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_database()
+    rollup = get_rollup(ingredient_id)
+    assert rollup[('2024-02-01', 'out', 'waste')] == (4, 400, 1)
+    assert {key: value[0] for key, value in rollup.items() if key[0] == today} == {
+        (today, 'in', 'opening'): 10, (today, 'in', 'purchase'): 5,
+        (today, 'out', 'waste'): 3, (today, 'out', 'order'): 8
+    }
+
+def test_forecast_weekday_seasonality():
+    np = pytest.importorskip('numpy')
+    # Four weeks from a Monday: 4 units on Saturdays, 1 on other days
+    day_list = [(date(2024, 3, 4) + timedelta(days=offset)).isoformat() for offset in range(28)]
+    saturday_heavy = [4.0 if date.fromisoformat(day).weekday() == 5 else 1.0 for day in day_list]
+    matrix = np.array([saturday_heavy, [2.0] * 28, [0.0] * 28])
+    
+    forecast = StockForecast.forecast_demand(matrix, day_list, 7)
+    mean = 40 / 28
+    assert np.allclose(forecast['seasonal_index'][0], [1 / mean] * 5 + [4 / mean, 1 / mean])
+    assert np.allclose(forecast['level'], [mean, 2, 0])
+    # The horizon starts on Monday 1 April; Saturday is its sixth day
+    assert np.allclose(forecast['forecast'][0], [1, 1, 1, 1, 1, 4, 1])
+    assert np.allclose(forecast['forecast'][1], [2] * 7)
+    assert np.allclose(forecast['sigma'][:2], [0, 0]) and not forecast['forecast'][2].any()
+
+def test_reorder_plan_and_forecast_purchase_orders(temp_dir):
+    stock_np = stock_forecast.np
+    try:
+        InventoryManager.add_supplier('Metro Wholesale')
+        InventoryManager.add_ingredient('Rice', 'kg', 5, 10, 60)
+        InventoryManager.add_ingredient('Oil', 'liters', 8, 10, 150)
+        InventoryManager.add_ingredient('Salt', 'kg', 3, 5, 20)
+        conn = database.get_connection()
+        cursor = conn.cursor()
+        ids = {row['name']: row['id'] for row in cursor.execute("SELECT id, name FROM ingredients")}
+        
+        # 28 days of order consumption: rice 2 a day, oil 0.1 a day, salt none
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        for offset in range(1, 29):
+            day = (today - timedelta(days=offset)).strftime('%Y-%m-%d')
+            for name, quantity in (('Rice', 2), ('Oil', 0.1)):
+                cursor.execute("""
+                    INSERT INTO stock_daily_rollup
+                    (ingredient_id, day, transaction_type, reason_code, quantity, value, txn_count)
+                    VALUES (?, ?, 'out', 'order', ?, 0, 1)
+                """, (ids[name], day, quantity))
+        conn.commit()
+        conn.close()
+        
+        if StockForecast.is_available():
+            plan = StockForecast.get_reorder_plan()
+            rice, oil, salt = plan[ids['Rice']], plan[ids['Oil']], plan[ids['Salt']]
+            # Rice: 3 days of lead-time demand, topped up to 10 days of cover
+            assert (rice['method'], rice['daily_demand'], rice['safety_stock']) == ('forecast', 2, 0)
+            assert (rice['reorder_point'], rice['order_quantity'], rice['needs_reorder']) == (6, 15, True)
+            # Oil is below min_stock but the forecast says the stock lasts
+            assert (oil['method'], oil['needs_reorder'], oil['order_quantity']) == ('forecast', False, 0)
+            assert (salt['method'], salt['reorder_point'], salt['order_quantity']) == ('min_stock', 5, 7)
+            
+            success, message = Automation.auto_generate_purchase_order(ids['Oil'])
+            assert not success and 'No order needed' in message
+            created = Automation.check_all_low_stock_and_create_pos()
+            assert sorted(po['ingredient'] for po in created) == ['Rice', 'Salt']
+            conn = database.get_connection()
+            ordered = dict(conn.execute("SELECT ingredient_id, quantity_ordered FROM purchase_order_items").fetchall())
+            conn.execute("DELETE FROM purchase_order_items")
+            conn.execute("DELETE FROM purchase_orders")
+            conn.commit()
+            conn.close()
+            assert ordered == {ids['Rice']: 15, ids['Salt']: 7}
+        
+        # Without NumPy every ingredient at or below min_stock is ordered up to 2x min_stock
+        stock_forecast.np = None
+        assert not StockForecast.is_available() and StockForecast.get_reorder_plan() == {}
+        created = Automation.check_all_low_stock_and_create_pos()
+        assert sorted(po['ingredient'] for po in created) == ['Oil', 'Rice', 'Salt']
+        conn = database.get_connection()
+        ordered = dict(conn.execute("SELECT ingredient_id, quantity_ordered FROM purchase_order_items").fetchall())
+        conn.close()
+        assert ordered == {ids['Rice']: 20, ids['Oil']: 20, ids['Salt']: 10}
+    finally:
+        stock_forecast.np = stock_np
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__]))